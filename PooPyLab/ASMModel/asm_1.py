@@ -33,10 +33,27 @@ Reference:
 ## @file asm_1.py
 
 
+import numpy as np
+
 from ..ASMModel import constants
 from .asmbase import asm_model
 
 
+## order of the kinetic/stoichiometric parameters in the flat parameter vector of ASM_1
+_PARAM_NAMES = ('u_max_H', 'b_LH', 'u_max_A', 'b_LA', 'K_S', 'K_OH', 'K_OA', 'K_NH', 'K_NO', 'k_h', 'K_X', 'k_a',
+                'Y_H', 'Y_A', 'f_D', 'cf_h', 'cf_g', 'i_N_XB', 'i_N_XD')
+
+## Arrhenius temperature coefficients of the parameters, in the order of _PARAM_NAMES:
+##      param @ T = param @ 20C * theta ^ (T - 20)
+## u_max_H 1.072, b_LH 1.12, u_max_A 1.103, b_LA 1.114, k_h 1.116, K_X 1.116, k_a 1.072; the half saturation
+## coefficients (other than K_X), yields, and stoichiometric fractions do not change w/ temperature.
+_THETAS = np.array([1.072, 1.12, 1.103, 1.114, 1.0, 1.0, 1.0, 1.0, 1.0, 1.116, 1.116, 1.072,
+                    1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+## parameters the stoichiometric matrix depends on
+_STOICH_PARAMS = ('Y_H', 'Y_A', 'f_D', 'i_N_XB', 'i_N_XD')
+
+
 class ASM_1(asm_model):
     """
     Kinetics and stoichiometrics of IWA ASM 1 model.
@@ -64,6 +81,15 @@ class ASM_1(asm_model):
         asm_model.__init__(self)
         self.__class__.__id += 1
 
+        # flat vector of the kinetic parameters @ project temperature, ordered as in _PARAM_NAMES
+        self._param_vec = np.zeros(len(_PARAM_NAMES))
+
+        # dense stoichiometric (Petersen) matrix, processes x components
+        self._stoich_mat = np.zeros((constants._NUM_ASM1_PROCESSES, constants._NUM_ASM1_COMPONENTS))
+
+        # values of _STOICH_PARAMS the stoichiometrics were last set with
+        self._stoich_key = None
+
         self._set_ideal_kinetics_20C_to_defaults()
 
         # wastewater temperature used in the model, degC
@@ -194,64 +220,9 @@ class ASM_1(asm_model):
             _set_stoichs().
         """
 
-        # Ideal Growth Rate of Heterotrophs (u_max_H, 1/DAY)
-        self._params['u_max_H'] = self._kinetics_20C['u_max_H'] * pow(1.072, self._delta_t)
-
-        # Decay Rate of Heterotrophs (b_H, 1/DAY)
-        self._params['b_LH'] = self._kinetics_20C['b_LH'] * pow(1.12, self._delta_t)
-
-        # Ideal Growth Rate of Autotrophs (u_max_A, 1/DAY)
-        self._params['u_max_A'] = self._kinetics_20C['u_max_A'] * pow(1.103, self._delta_t)
-
-        # Decay Rate of Autotrophs (b_A, 1/DAY)
-        self._params['b_LA'] = self._kinetics_20C['b_LA'] * pow(1.114, self._delta_t)
-
-        # Half Growth Rate Concentration of Heterotrophs (K_s, mgCOD/L)
-
-        self._params['K_S'] = self._kinetics_20C['K_S']
-
-        # Switch Coefficient for Dissolved O2 of Hetero. (K_OH, mgO2/L)
-        self._params['K_OH'] = self._kinetics_20C['K_OH']
-
-        # Association Conc. for Dissolved O2 of Auto. (K_OA, mgN/L)
-        self._params['K_OA'] = self._kinetics_20C['K_OA']
-
-        # Association Conc. for NH3-N of Auto. (K_NH, mgN/L)
-        self._params['K_NH'] = self._kinetics_20C['K_NH']
-
-        # Association Conc. for NOx of Hetero. (K_NO, mgN/L)
-        self._params['K_NO'] = self._kinetics_20C['K_NO']
-
-        # Hydrolysis Rate (k_h, mgCOD/mgBiomassCOD-day)
-        self._params['k_h'] = self._kinetics_20C['k_h'] * pow(1.116, self._delta_t)
-
-        # Half Rate Conc. for Hetero. Growth on Part. COD
-        # (K_X, mgCOD/mgBiomassCOD)
-        self._params['K_X'] = self._kinetics_20C['K_X'] * pow(1.116, self._delta_t)
-
-        # Ammonification of Org-N in biomass (k_a, L/mgBiomassCOD-day)
-        self._params['k_a'] = self._kinetics_20C['k_a'] * pow(1.072, self._delta_t)
-
-        # Yield of Hetero. Growth on COD (Y_H, mgBiomassCOD/mgCODremoved)
-        self._params['Y_H'] = self._kinetics_20C['Y_H']
-
-        # Yield of Auto. Growth on TKN (Y_A, mgBiomassCOD/mgTKNoxidized)
-        self._params['Y_A'] = self._kinetics_20C['Y_A']
-
-        # Fract. of Debris in Lysed Biomass(f_D, gDebrisCOD/gBiomassCOD)
-        self._params['f_D'] = self._kinetics_20C['f_D']
-
-        # Correction Factor for Hydrolysis (cf_h, unitless)
-        self._params['cf_h'] = self._kinetics_20C['cf_h']
-
-        # Correction Factor for Anoxic Heterotrophic Growth (cf_g, unitless)
-        self._params['cf_g'] = self._kinetics_20C['cf_g']
-
-        # Ratio of N in Active Biomass (i_N_XB, mgN/mgActiveBiomassCOD)
-        self._params['i_N_XB'] = self._kinetics_20C['i_N_XB']
-
-        # Ratio of N in Debris Biomass (i_N_XD, mgN/mgDebrisBiomassCOD)
-        self._params['i_N_XD'] = self._kinetics_20C['i_N_XD']
+        # the temperature dependent ones are corrected by their Arrhenius coefficients (see _THETAS)
+        self._param_vec = params_at_temperature(self.get_param_vector_20C(), self._temperature)
+        self._params = dict(zip(_PARAM_NAMES, self._param_vec.tolist()))
 
         return None
 
@@ -267,11 +238,17 @@ class ASM_1(asm_model):
 
             _stoichs['x_y'] ==> x is process rate id, and y is component id
 
+        The stoichiometrics do not depend on temperature, and are only set again when any of _STOICH_PARAMS changed.
+
         See:
             _set_params();
             _set_ideal_kinetics_20C();
             update().
         """
+        _key = tuple(self._params[_n] for _n in _STOICH_PARAMS)
+        if _key == self._stoich_key:
+            return None
+        self._stoich_key = _key
 
         # S_O for aerobic hetero. growth, as O2
         self._stoichs['0_0'] = (self._params['Y_H'] - 1.0) / self._params['Y_H']
@@ -365,9 +342,49 @@ class ASM_1(asm_model):
         # X_NS consumed in hydrolysis of part. TKN, as N
         self._stoichs['7_12'] = -1.0
 
+        # dense copy of the Petersen matrix for the vectorized rate calculations
+        self._stoich_mat = np.zeros((constants._NUM_ASM1_PROCESSES, constants._NUM_ASM1_COMPONENTS))
+        for _k, _v in self._stoichs.items():
+            _j, _i = _k.split('_')
+            self._stoich_mat[int(_j), int(_i)] = _v
+
         return None
 
 
+    def get_param_vector_20C(self):
+        """
+        Return the kinetic parameters @ 20C as a flat vector, in the order of _PARAM_NAMES.
+
+        See:
+            params_at_temperature().
+        """
+        return np.array([self._kinetics_20C[_n] for _n in _PARAM_NAMES])
+
+
+    def get_param_vector(self):
+        """
+        Return a copy of the kinetic parameters @ project temperature as a flat vector.
+
+        The order of the parameters follows _PARAM_NAMES.
+
+        See:
+            get_params();
+            get_stoich_matrix().
+        """
+        return self._param_vec.copy()
+
+
+    def get_stoich_matrix(self):
+        """
+        Return a copy of the stoichiometric (Petersen) matrix, processes x components.
+
+        See:
+            get_stoichs();
+            get_param_vector().
+        """
+        return self._stoich_mat.copy()
+
+
     # PROCESS RATE DEFINITIONS (Rj, M/L^3/T):
     #
 
@@ -434,6 +451,169 @@ class ASM_1(asm_model):
         return self._rate_res[:]
 
 
+    def _process_rates(self, comps):
+        """
+        Process rates of the 8 biological processes from the flat parameter vector.
+
+        This is the same rate expressions as in _reaction_rate() but without the dictionary lookups and the
+        bookkeeping of the intermediate Monod terms, for use in the vectorized _dCdt().
+
+        Args:
+            comps:  model components (concentrations), list or numpy array.
+
+        Return:
+            list of process rates, M/L^3/T
+
+        See:
+            _reaction_rate();
+            _dCdt().
+        """
+        u_max_H, b_LH, u_max_A, b_LA, K_S, K_OH, K_OA, K_NH, K_NO, k_h, K_X, k_a, \
+                Y_H, Y_A, f_D, cf_h, cf_g, i_N_XB, i_N_XD = self._param_vec.tolist()
+
+        if isinstance(comps, np.ndarray):
+            comps = comps.tolist()
+
+        S_DO, S_I, S_S, S_NH, S_NS, S_NO, S_ALK, X_I, X_S, X_BH, X_BA, X_D, X_NS = comps
+
+        _m_S = S_S / (S_S + K_S)
+        _m_OH = S_DO / (S_DO + K_OH)
+        _m_NO = S_NO / (S_NO + K_NO)
+        _i_OH = K_OH / (K_OH + S_DO)
+        _ratio_XS = X_S / X_BH
+
+        _hydr = k_h * _ratio_XS / (_ratio_XS + K_X) * (_m_OH + cf_h * _i_OH * _m_NO) * X_BH
+
+        return [u_max_H * _m_S * _m_OH * X_BH,
+                u_max_H * _m_S * _m_NO * _i_OH * cf_g * X_BH,
+                u_max_A * S_NH / (S_NH + K_NH) * S_DO / (S_DO + K_OA) * X_BA,
+                b_LH * X_BH,
+                b_LA * X_BA,
+                k_a * S_NS * X_BH,
+                _hydr,
+                _hydr * X_NS / X_S]
+
+
+    def _process_rate_derivs(self, comps):
+        """
+        Partial derivatives of the 8 process rates w.r.t. the 13 model components.
+
+        Args:
+            comps:  model components (concentrations), list or numpy array.
+
+        Return:
+            numpy.ndarray of d(rate_j)/d(comp_i), processes x components
+
+        See:
+            _process_rates();
+            jacobian().
+        """
+        u_max_H, b_LH, u_max_A, b_LA, K_S, K_OH, K_OA, K_NH, K_NO, k_h, K_X, k_a, \
+                Y_H, Y_A, f_D, cf_h, cf_g, i_N_XB, i_N_XD = self._param_vec.tolist()
+
+        if isinstance(comps, np.ndarray):
+            comps = comps.tolist()
+
+        S_DO, S_I, S_S, S_NH, S_NS, S_NO, S_ALK, X_I, X_S, X_BH, X_BA, X_D, X_NS = comps
+
+        # Monod/inhibition terms and their derivatives w.r.t. their own concentration
+        _m_S = S_S / (S_S + K_S)
+        _dm_S = K_S / (S_S + K_S) ** 2
+        _m_OH = S_DO / (S_DO + K_OH)
+        _dm_OH = K_OH / (S_DO + K_OH) ** 2
+        _i_OH = K_OH / (K_OH + S_DO)
+        _di_OH = -K_OH / (K_OH + S_DO) ** 2
+        _m_NO = S_NO / (S_NO + K_NO)
+        _dm_NO = K_NO / (S_NO + K_NO) ** 2
+        _m_NH = S_NH / (S_NH + K_NH)
+        _dm_NH = K_NH / (S_NH + K_NH) ** 2
+        _m_OA = S_DO / (S_DO + K_OA)
+        _dm_OA = K_OA / (S_DO + K_OA) ** 2
+
+        # hydrolysis: k_h * h(X_S/X_BH) * E(S_DO, S_NO) * X_BH
+        _ratio_XS = X_S / X_BH
+        _h = _ratio_XS / (_ratio_XS + K_X)
+        _dh = K_X / (_ratio_XS + K_X) ** 2
+        _E = _m_OH + cf_h * _i_OH * _m_NO
+        _hydr = k_h * _h * _E * X_BH
+
+        d = np.zeros((8, 13))
+
+        # Aerobic Growth of Heterotrophs
+        d[0, 0] = u_max_H * _m_S * _dm_OH * X_BH
+        d[0, 2] = u_max_H * _dm_S * _m_OH * X_BH
+        d[0, 9] = u_max_H * _m_S * _m_OH
+
+        # Anoxic Growth of Heterotrophs
+        _anox = u_max_H * cf_g
+        d[1, 0] = _anox * _m_S * _m_NO * _di_OH * X_BH
+        d[1, 2] = _anox * _dm_S * _m_NO * _i_OH * X_BH
+        d[1, 5] = _anox * _m_S * _dm_NO * _i_OH * X_BH
+        d[1, 9] = _anox * _m_S * _m_NO * _i_OH
+
+        # Aerobic Growth of Autotrophs
+        d[2, 0] = u_max_A * _m_NH * _dm_OA * X_BA
+        d[2, 3] = u_max_A * _dm_NH * _m_OA * X_BA
+        d[2, 10] = u_max_A * _m_NH * _m_OA
+
+        # Death and Lysis of Heterotrophs and Autotrophs
+        d[3, 9] = b_LH
+        d[4, 10] = b_LA
+
+        # Ammonification of Soluable Organic N
+        d[5, 4] = k_a * X_BH
+        d[5, 9] = k_a * S_NS
+
+        # Hydrolysis of Particulate Organics
+        d[6, 0] = k_h * _h * X_BH * (_dm_OH + cf_h * _di_OH * _m_NO)
+        d[6, 5] = k_h * _h * X_BH * cf_h * _i_OH * _dm_NO
+        d[6, 8] = k_h * _E * _dh
+        d[6, 9] = k_h * _E * (_h - _dh * _ratio_XS)
+
+        # Hydrolysis of Particulate Organic N, i.e. rate_6 * X_NS / X_S
+        d[7] = d[6] * (X_NS / X_S)
+        d[7, 8] -= _hydr * X_NS / X_S ** 2
+        d[7, 12] = _hydr / X_S
+
+        return d
+
+
+    def jacobian(self, t, mo_comps, vol, flow, in_comps, fix_DO, DO_sat_T):
+        """
+        Exact Jacobian of the reactor mass balance _dCdt() w.r.t. the reactor (mainstream outlet) components.
+
+        d(dC/dt)/dC == -1/HRT * I + transpose(stoichiometric matrix) * d(rates)/dC
+
+        The arguments are identical to those of _dCdt() so that this function can be handed over to
+        scipy.integrate.solve_ivp() as "jac" for the implicit methods (BDF, Radau, LSODA).
+
+        Args:
+            t:          time for use in ODE integration routine, d
+            mo_comps:   list of model component for mainstream outlet, mg/L.
+            vol:        reactor's active volume, m3;
+            flow:       reactor's total inflow, m3/d
+            in_comps:   list of model components for inlet, mg/L;
+            fix_DO:     whether to use a fix DO setpoint, bool
+            DO_sat_T:   saturation DO of the project elev. and temp, mg/L
+
+        Return:
+            numpy.ndarray, components x components
+
+        See:
+            _dCdt();
+            _process_rate_derivs().
+        """
+        jac = np.dot(self._stoich_mat.T, self._process_rate_derivs(mo_comps))
+        jac[np.diag_indices_from(jac)] -= flow / vol
+
+        if fix_DO or self._bulk_DO == 0:
+            jac[0, :] = 0.0
+        else:
+            jac[0, 0] -= self._KLa
+
+        return jac
+
+
     # OVERALL PROCESS RATE EQUATIONS FOR INDIVIDUAL COMPONENTS
 
 
@@ -628,6 +808,57 @@ class ASM_1(asm_model):
         '''
         Defines dC/dt for the reactor based on mass balance.
 
+        Overall mass balance:
+        dComp/dt == InfFlow / Actvol * (in_comps - mo_comps) + GrowthRate
+                 == (in_comps - mo_comps) / HRT + GrowthRate
+
+        The growth rates of all the components are evaluated in one go as the transposed stoichiometric matrix times
+        the vector of process rates.
+
+        Args:
+            t:          time for use in ODE integration routine, d
+            mo_comps:   list of model component for mainstream outlet, mg/L.
+            vol:        reactor's active volume, m3;
+            flow:       reactor's total inflow, m3/d
+            in_comps:   list of model components for inlet, mg/L;
+            fix_DO:     whether to use a fix DO setpoint, bool
+            DO_sat_T:   saturation DO of the project elev. and temp, mg/L
+
+        Return:
+            dC/dt of the system (numpy.ndarray)
+
+        ASM1 Components:
+            0_S_DO, 1_S_I, 2_S_S, 3_S_NH, 4_S_NS, 5_S_NO, 6_S_ALK,
+            7_X_I, 8_X_S, 9_X_BH, 10_X_BA, 11_X_D, 12_X_NS
+
+        See:
+            _process_rates();
+            _dCdt_ref().
+        '''
+
+        mo_comps = np.asarray(mo_comps, dtype=float)
+
+        result = np.dot(self._process_rates(mo_comps), self._stoich_mat)
+        result += (np.asarray(in_comps, dtype=float) - mo_comps) * (flow / vol)
+
+        # set DO rate to zero since DO is set to a fix conc., which is
+        # recommended for steady state simulation; alternatively, use the given
+        # KLa to dynamically estimate residual DO
+        if fix_DO or self._bulk_DO == 0:
+            result[0] = 0.0
+        else:  #TODO: what if the user provides a fix scfm of air?
+            result[0] += self._KLa * (DO_sat_T - mo_comps[0])
+
+        return result
+
+
+    def _dCdt_ref(self, t, mo_comps, vol, flow, in_comps, fix_DO, DO_sat_T):
+        '''
+        Reference dC/dt assembled component by component from the _rateN_*() functions.
+
+        This is the original (non-vectorized) implementation kept for verification of and benchmarking against the
+        vectorized _dCdt().
+
         Overall mass balance:
         dComp/dt == InfFlow / Actvol * (in_comps - mo_comps) + GrowthRate
                  == (in_comps - mo_comps) / HRT + GrowthRate
@@ -702,3 +933,222 @@ class ASM_1(asm_model):
 
         return result[:]
 
+
+
+# ----------------------------------------------------------------------------
+# BATCHED KINETICS OF MULTIPLE ASM 1 REACTORS
+#
+# The functions below evaluate the ASM 1 kinetics of n reactors in one go. The model components are given as an
+# (n, 13) array (one row per reactor), the kinetic parameters as an (n, 19) array (one row per reactor, in the order
+# of _PARAM_NAMES), and the stoichiometrics as an (n, 8, 13) array. A single row of parameters or a single 8 x 13
+# stoichiometric matrix is broadcast to all reactors.
+
+
+def params_at_temperature(params_20C, temps):
+    """
+    Kinetic parameters at wastewater temperatures, from their values at 20C.
+
+    The Arrhenius corrections (see _THETAS) are evaluated in closed form for all the temperatures at once, e.g. for a
+    temperature profile of a dynamic simulation. The stoichiometrics do not depend on temperature.
+
+    Args:
+        params_20C: (19,) or (n, 19) array of kinetic parameters at 20C (see ASM_1.get_param_vector_20C());
+        temps:      temperature(s), degC: a scalar, or an array broadcast against the rows of params_20C, e.g. (n,)
+                    for n reactors, or (m, 1) for m times of n reactors
+
+    Return:
+        array of kinetic parameters, shape = broadcast shape of temps and the rows of params_20C + (19,)
+    """
+    _dt = np.asarray(temps, dtype=float) - 20.0
+    return np.asarray(params_20C, dtype=float) * np.power(_THETAS, _dt[..., None])
+
+
+def stack_models(sludges=[]):
+    """
+    Collect the parameters and stoichiometrics of a list of ASM_1 models for batched evaluation.
+
+    Args:
+        sludges:    list of ASM_1 models, e.g. the "sludge" of each asm_reactor in a plant.
+
+    Return:
+        (n, 19) array of kinetic parameters, (n, 8, 13) array of stoichiometrics
+
+    See:
+        ASM_1.get_param_vector();
+        ASM_1.get_stoich_matrix().
+    """
+    params = np.array([s.get_param_vector() for s in sludges])
+    stoichs = np.array([s.get_stoich_matrix() for s in sludges])
+    return params, stoichs
+
+
+def batch_process_rates(comps, params):
+    """
+    Process rates of the 8 biological processes for n reactors.
+
+    Args:
+        comps:  (n, 13) array of model components;
+        params: (n, 19) or (19,) array of kinetic parameters.
+
+    Return:
+        (n, 8) array of process rates, M/L^3/T
+
+    See:
+        ASM_1._process_rates().
+    """
+    comps = np.atleast_2d(np.asarray(comps, dtype=float))
+    params = np.asarray(params, dtype=float)
+
+    u_max_H, b_LH, u_max_A, b_LA, K_S, K_OH, K_OA, K_NH, K_NO, k_h, K_X, k_a, \
+            Y_H, Y_A, f_D, cf_h, cf_g, i_N_XB, i_N_XD = params.T
+
+    S_DO, S_I, S_S, S_NH, S_NS, S_NO, S_ALK, X_I, X_S, X_BH, X_BA, X_D, X_NS = comps.T
+
+    _m_S = S_S / (S_S + K_S)
+    _m_OH = S_DO / (S_DO + K_OH)
+    _m_NO = S_NO / (S_NO + K_NO)
+    _i_OH = K_OH / (K_OH + S_DO)
+    _ratio_XS = X_S / X_BH
+
+    _hydr = k_h * _ratio_XS / (_ratio_XS + K_X) * (_m_OH + cf_h * _i_OH * _m_NO) * X_BH
+
+    rates = np.empty((comps.shape[0], constants._NUM_ASM1_PROCESSES))
+    rates[:, 0] = u_max_H * _m_S * _m_OH * X_BH
+    rates[:, 1] = u_max_H * _m_S * _m_NO * _i_OH * cf_g * X_BH
+    rates[:, 2] = u_max_A * S_NH / (S_NH + K_NH) * S_DO / (S_DO + K_OA) * X_BA
+    rates[:, 3] = b_LH * X_BH
+    rates[:, 4] = b_LA * X_BA
+    rates[:, 5] = k_a * S_NS * X_BH
+    rates[:, 6] = _hydr
+    rates[:, 7] = _hydr * X_NS / X_S
+
+    return rates
+
+
+def batch_process_rate_derivs(comps, params):
+    """
+    Partial derivatives of the 8 process rates w.r.t. the 13 model components for n reactors.
+
+    Args:
+        comps:  (n, 13) array of model components;
+        params: (n, 19) or (19,) array of kinetic parameters.
+
+    Return:
+        (n, 8, 13) array of d(rate_j)/d(comp_i)
+
+    See:
+        ASM_1._process_rate_derivs().
+    """
+    comps = np.atleast_2d(np.asarray(comps, dtype=float))
+    params = np.asarray(params, dtype=float)
+
+    u_max_H, b_LH, u_max_A, b_LA, K_S, K_OH, K_OA, K_NH, K_NO, k_h, K_X, k_a, \
+            Y_H, Y_A, f_D, cf_h, cf_g, i_N_XB, i_N_XD = params.T
+
+    S_DO, S_I, S_S, S_NH, S_NS, S_NO, S_ALK, X_I, X_S, X_BH, X_BA, X_D, X_NS = comps.T
+
+    # Monod/inhibition terms and their derivatives w.r.t. their own concentration
+    _m_S = S_S / (S_S + K_S)
+    _dm_S = K_S / (S_S + K_S) ** 2
+    _m_OH = S_DO / (S_DO + K_OH)
+    _dm_OH = K_OH / (S_DO + K_OH) ** 2
+    _i_OH = K_OH / (K_OH + S_DO)
+    _di_OH = -K_OH / (K_OH + S_DO) ** 2
+    _m_NO = S_NO / (S_NO + K_NO)
+    _dm_NO = K_NO / (S_NO + K_NO) ** 2
+    _m_NH = S_NH / (S_NH + K_NH)
+    _dm_NH = K_NH / (S_NH + K_NH) ** 2
+    _m_OA = S_DO / (S_DO + K_OA)
+    _dm_OA = K_OA / (S_DO + K_OA) ** 2
+
+    # hydrolysis: k_h * h(X_S/X_BH) * E(S_DO, S_NO) * X_BH
+    _ratio_XS = X_S / X_BH
+    _h = _ratio_XS / (_ratio_XS + K_X)
+    _dh = K_X / (_ratio_XS + K_X) ** 2
+    _E = _m_OH + cf_h * _i_OH * _m_NO
+    _hydr = k_h * _h * _E * X_BH
+
+    d = np.zeros((comps.shape[0], constants._NUM_ASM1_PROCESSES, comps.shape[1]))
+
+    # Aerobic Growth of Heterotrophs
+    d[:, 0, 0] = u_max_H * _m_S * _dm_OH * X_BH
+    d[:, 0, 2] = u_max_H * _dm_S * _m_OH * X_BH
+    d[:, 0, 9] = u_max_H * _m_S * _m_OH
+
+    # Anoxic Growth of Heterotrophs
+    _anox = u_max_H * cf_g
+    d[:, 1, 0] = _anox * _m_S * _m_NO * _di_OH * X_BH
+    d[:, 1, 2] = _anox * _dm_S * _m_NO * _i_OH * X_BH
+    d[:, 1, 5] = _anox * _m_S * _dm_NO * _i_OH * X_BH
+    d[:, 1, 9] = _anox * _m_S * _m_NO * _i_OH
+
+    # Aerobic Growth of Autotrophs
+    d[:, 2, 0] = u_max_A * _m_NH * _dm_OA * X_BA
+    d[:, 2, 3] = u_max_A * _dm_NH * _m_OA * X_BA
+    d[:, 2, 10] = u_max_A * _m_NH * _m_OA
+
+    # Death and Lysis of Heterotrophs and Autotrophs
+    d[:, 3, 9] = b_LH
+    d[:, 4, 10] = b_LA
+
+    # Ammonification of Soluable Organic N
+    d[:, 5, 4] = k_a * X_BH
+    d[:, 5, 9] = k_a * S_NS
+
+    # Hydrolysis of Particulate Organics
+    d[:, 6, 0] = k_h * _h * X_BH * (_dm_OH + cf_h * _di_OH * _m_NO)
+    d[:, 6, 5] = k_h * _h * X_BH * cf_h * _i_OH * _dm_NO
+    d[:, 6, 8] = k_h * _E * _dh
+    d[:, 6, 9] = k_h * _E * (_h - _dh * _ratio_XS)
+
+    # Hydrolysis of Particulate Organic N, i.e. rate_6 * X_NS / X_S
+    d[:, 7] = d[:, 6] * (X_NS / X_S)[:, None]
+    d[:, 7, 8] -= _hydr * X_NS / X_S ** 2
+    d[:, 7, 12] = _hydr / X_S
+
+    return d
+
+
+def batch_reaction_rates(comps, params, stoichs):
+    """
+    Overall reaction rates of the 13 model components for n reactors.
+
+    Args:
+        comps:      (n, 13) array of model components;
+        params:     (n, 19) or (19,) array of kinetic parameters;
+        stoichs:    (n, 8, 13) or (8, 13) array of stoichiometrics.
+
+    Return:
+        (n, 13) array of reaction rates, M/L^3/T
+
+    See:
+        batch_process_rates();
+        batch_reaction_jacobians().
+    """
+    rates = batch_process_rates(comps, params)
+    if np.ndim(stoichs) == 2:
+        return rates @ stoichs
+    return np.matmul(rates[:, None, :], stoichs)[:, 0, :]
+
+
+def batch_reaction_jacobians(comps, params, stoichs):
+    """
+    Jacobians of the overall reaction rates w.r.t. the model components for n reactors.
+
+    Only the reaction part is included. The dilution (-Q/V) and aeration (-KLa on DO) terms of a reactor's mass
+    balance are left to the caller since they depend on the plant configuration.
+
+    Args:
+        comps:      (n, 13) array of model components;
+        params:     (n, 19) or (19,) array of kinetic parameters;
+        stoichs:    (n, 8, 13) or (8, 13) array of stoichiometrics.
+
+    Return:
+        (n, 13, 13) array of d(reaction_rate_i)/d(comp_k)
+
+    See:
+        batch_process_rate_derivs();
+        ASM_1.jacobian().
+    """
+    drho = batch_process_rate_derivs(comps, params)
+    return np.matmul(np.swapaxes(stoichs, -1, -2), drho)
@@ -0,0 +1,185 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the composite variables (TSS, VSS, COD, TN, ...) of the ASM1 model components.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Composite variables of the ASM1 model components.
+
+A composite variable (TSS, COD, TN, ...) is a linear combination of the model components. The composition_matrix
+holds all of them as one (composites x model components) matrix, so that every composite of a branch, of all the
+branches of a plant, or of all the records of a trajectory is one matrix product:
+
+    composites = comps @ matrix.T,      comps: (..., 13) model components, composites: (..., number of composites)
+
+The conversion factors of the particulate COD to the suspended solids differ among types of sludge, so a
+composition_matrix is built w/ its own factors:
+
+    COD_TSS:    g COD / g TSS of the particulate model components, 1.2 by default;
+
+    COD_VSS:    g COD / g VSS of the particulate model components, 1.42 by default.
+
+Every process unit has a composition_matrix (DEFAULT_COMPOSITION unless set by splitter.set_composition()), which its
+get_TSS(), get_COD(), etc. and the plant wide solvers use.
+
+Usage:
+
+    eff = composition_matrix().evaluate(comps, ['TSS', 'TN'])
+    res = branch_composites(trajectory, [u.get_composition() for u, br in branches])
+"""
+## @namespace composition
+## @file composition.py
+
+
+import numpy as np
+
+from ..ASMModel import constants
+
+
+## composite variables: name, indices of the model components summed up, and the conversion factor dividing the sum
+## (None for no conversion)
+COMPOSITES = (('TSS', [7, 8, 9, 10, 11], 'COD_TSS'),
+              ('VSS', [7, 8, 9, 10, 11], 'COD_VSS'),
+              ('COD', [1, 2, 7, 8, 9, 10, 11], None),
+              ('sCOD', [1, 2], None),
+              ('pCOD', [7, 8, 9, 10, 11], None),
+              ('TN', [3, 4, 5, 12], None),
+              ('TKN', [3, 4, 12], None),
+              ('orgN', [4, 12], None),
+              ('inorgN', [3, 5], None),
+              ('pN', [12], None),
+              ('sN', [3, 4, 5], None),
+              ('NH3N', [3], None),
+              ('NOxN', [5], None))
+
+## default conversion factors (see the module docstring)
+DEFAULT_FACTORS = {'COD_TSS': 1.2, 'COD_VSS': 1.42}
+
+
+class composition_matrix(object):
+    """
+    Composite variables of the ASM1 model components, w/ the conversion factors of a type of sludge.
+
+    General Functions:
+        get_names(), get_factors(), get_matrix(), get_row(), evaluate()
+    """
+
+    def __init__(self, COD_TSS=DEFAULT_FACTORS['COD_TSS'], COD_VSS=DEFAULT_FACTORS['COD_VSS']):
+        """
+        Args:
+            COD_TSS:    g COD / g TSS of the particulate model components;
+            COD_VSS:    g COD / g VSS of the particulate model components
+
+        Return:
+            None
+        """
+        self._factors = {'COD_TSS': COD_TSS, 'COD_VSS': COD_VSS}
+        self._names = [_c[0] for _c in COMPOSITES]
+        self._index = {_n: _k for _k, _n in enumerate(self._names)}
+
+        self._matrix = np.zeros((len(COMPOSITES), constants._NUM_ASM1_COMPONENTS))
+        for _k, (_name, _idx, _factor) in enumerate(COMPOSITES):
+            self._matrix[_k, _idx] = 1.0 if _factor is None else 1.0 / self._factors[_factor]
+        self._matrix.flags.writeable = False
+        return None
+
+
+    def get_names(self):
+        """
+        Return the names of the composites, in the order of the rows of the matrix.
+        """
+        return self._names[:]
+
+
+    def get_factors(self):
+        """
+        Return the conversion factors, {'COD_TSS': float, 'COD_VSS': float}.
+        """
+        return self._factors.copy()
+
+
+    def get_matrix(self, names=None):
+        """
+        Return the (composites x model components) matrix, of all the composites or of the named ones.
+        """
+        if names is None:
+            return self._matrix
+        return self._matrix[[self._index[_n] for _n in names]]
+
+
+    def get_row(self, name):
+        """
+        Return the weights of the model components in a composite.
+        """
+        return self._matrix[self._index[name]]
+
+
+    def evaluate(self, comps, names=None):
+        """
+        Return the composites of model components.
+
+        Args:
+            comps:  (..., 13) model components, e.g. of a branch, of all branches, or of a trajectory;
+            names:  names of the composites; all if None
+
+        Return:
+            (..., number of composites) array
+        """
+        return np.asarray(comps, dtype=float) @ self.get_matrix(names).T
+
+
+## composition of the process units unless set otherwise
+DEFAULT_COMPOSITION = composition_matrix()
+
+
+def branch_composites(results, compositions=DEFAULT_COMPOSITION, names=None):
+    """
+    Return the composites of the results of the branches of a plant, w/ the composition of every branch.
+
+    The branches sharing a composition are evaluated in one matrix product; a plant of one type of sludge takes one
+    product altogether.
+
+    Args:
+        results:        (..., number of branches, 14) [flow, model components] of the branches (e.g. a plant_state
+                        or the records of a results_store), or (..., number of branches, 13) model components;
+        compositions:   composition_matrix of all the branches, or a list of one per branch;
+        names:          names of the composites; all if None
+
+    Return:
+        (..., number of branches, number of composites) array
+    """
+    _X = np.asarray(results, dtype=float)
+    _C = _X[..., 1:] if _X.shape[-1] == constants._NUM_ASM1_COMPONENTS + 1 else _X
+    if isinstance(compositions, composition_matrix):
+        return compositions.evaluate(_C, names)
+
+    _groups = {}
+    for _b, _comp in enumerate(compositions):
+        _groups.setdefault(id(_comp), (_comp, []))[1].append(_b)
+    if len(_groups) == 1:
+        return compositions[0].evaluate(_C, names)
+
+    _k = len(COMPOSITES) if names is None else len(names)
+    _out = np.empty(_C.shape[:-1] + (_k,))
+    for _comp, _bs in _groups.values():
+        _out[..., _bs, :] = _comp.evaluate(_C[..., _bs, :], names)
+    return _out
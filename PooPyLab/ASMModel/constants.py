@@ -29,6 +29,8 @@
 
 ## number of ASM 1 model components
 _NUM_ASM1_COMPONENTS = 13
+## number of ASM 1 biological processes
+_NUM_ASM1_PROCESSES = 8
 ## number of ASM 3 model components
 _NUM_ASM3_COMPONENTS = 13
 ## number of ASM 2d model components
@@ -198,6 +198,86 @@ class poopy_lab_obj(object):
         pass
 
 
+    @abstractmethod
+    def get_main_outlet_concs(self):
+        """
+        Return a copy of the mainstream outlet concentrations.
+        """
+        pass
+
+
+    @abstractmethod
+    def set_mainstream_flow(self, flow):
+        """
+        Define the mainstream outlet flow.
+        """
+        pass
+
+
+    @abstractmethod
+    def get_main_outflow(self):
+        """
+        Return the mainstream outlet flow.
+        """
+        pass
+
+
+    @abstractmethod
+    def set_sidestream_flow(self, flow):
+        """
+        Define the sidestream outlet flow.
+        """
+        pass
+
+
+    @abstractmethod
+    def get_side_outflow(self):
+        """
+        Return the sidestream outlet flow.
+        """
+        pass
+
+
+    @abstractmethod
+    def totalize_inflow(self):
+        """
+        Combine the individual flows received at the inlet into one.
+        """
+        pass
+
+
+    @abstractmethod
+    def blend_inlet_comps(self):
+        """
+        Calculate the flow weighted average model component concentrations of the inlet.
+        """
+        pass
+
+
+    @abstractmethod
+    def update_combined_input(self):
+        """
+        Update the total inflow and the blended inlet concentrations.
+        """
+        pass
+
+
+    @abstractmethod
+    def discharge(self, method_name, fix_DO, DO_sat_T):
+        """
+        Pass the total flow and blended components to the downstreams.
+        """
+        pass
+
+
+    @abstractmethod
+    def is_converged(self, limit):
+        """
+        Return whether the unit has converged between two rounds of the main loop.
+        """
+        pass
+
+
     @abstractmethod
     def get_TSS(self, branch='Main'):
         """
@@ -36,7 +36,7 @@
 ## @file physchem.py
 
 
-from ..unit_procs.streams import splitter
+from ..unit_procs.streams import splitter, _copy_comps
 
 
 # ----------------------------------------------------------------------------
@@ -136,52 +136,53 @@ class final_clarifier(splitter):
         return None
 
 
-##    #NOTE: 2024-01-22 KZ, commented out since it is not needed in the equation based solving sys.
-##    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
-##        """
-##        Pass the total flow and blended components to the downstreams.
-##
-##        This function is re-implemented for "final_clarifier" because of the need to settle the solids (particulate)
-##        and concentrate them at the sidestream (underflow). The function first calls _branch_flow_helper() to set
-##        the flows for inlet, mainstream outlet, and sidestream outlet, then calls _settle_solids() to fractions the
-##        particulate components according to the branch flows and user set percent solids capture.
-##
-##        Args:
-##            method_name:    integration method as per scipy.integrate.solveivp;
-##            fix_DO:         whether to simulate w/ a fix DO setpoint;
-##            DO_sat_T:       saturated DO conc. under the site conditions (mg/L)
-##            (see note)
-##
-##        Return:
-##            None
-##
-##        Note:
-##            Argument method_name is not used as of now but will be applicable when a settling model is placed here in
-##            the final_clarifier class.
-##
-##            Arguments of fix_DO and DO_sat_T are dummies for now because it is assumed that there is no biochemical
-##            reactions in the clarifier.
-##
-##        See:
-##            _settle_solids();
-##            set_capture_rate();
-##            _branch_flow_helper().
-##        """
-##        # record last round's results before updating/discharging:
-##        self._prev_mo_comps = self._mo_comps[:]
-##        self._prev_so_comps = self._so_comps[:]
-##
-##        self._branch_flow_helper()
-##
-##        # for a clarifier, the main and side outlets have different solids
-##        # concentrations than the inlet's
-##        self._settle_solids()
-##
-##        self._discharge_main_outlet()
-##        self._discharge_side_outlet()
-##
-##        return None
-##
+    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
+        """
+        Pass the total flow and blended components to the downstreams.
+
+        This function is re-implemented for "final_clarifier" because of the need to settle the solids (particulate)
+        and concentrate them at the sidestream (underflow). The function first calls _branch_flow_helper() to set
+        the flows for inlet, mainstream outlet, and sidestream outlet, then calls _settle_solids() to fractions the
+        particulate components according to the branch flows and user set percent solids capture.
+
+        Args:
+            method_name:    integration method as per scipy.integrate.solveivp;
+            fix_DO:         whether to simulate w/ a fix DO setpoint;
+            DO_sat_T:       saturated DO conc. under the site conditions (mg/L)
+            (see note)
+
+        Return:
+            None
+
+        Note:
+            Argument method_name is not used as of now but will be applicable when a settling model is placed here in
+            the final_clarifier class.
+
+            Arguments of fix_DO and DO_sat_T are dummies for now because it is assumed that there is no biochemical
+            reactions in the clarifier.
+
+        See:
+            _settle_solids();
+            set_capture_rate();
+            _branch_flow_helper().
+        """
+        # record last round's results before updating/discharging:
+        self._prev_mo_comps = _copy_comps(self._mo_comps)
+        self._prev_so_comps = _copy_comps(self._so_comps)
+
+        self._branch_flow_helper()
+
+        # for a clarifier, the main and side outlets have different solids
+        # concentrations than the inlet's
+        if self._mo_flow > 0 and self._so_flow > 0:
+            self._settle_solids()
+        else:
+            print('WARN:', self.__name__, 'has no overflow or underflow; solids not settled.')
+            self._mo_comps[:] = self._in_comps
+            self._so_comps[:] = self._in_comps
+
+        return None
+
 
     def get_config(self):
         """
@@ -312,8 +313,8 @@ class final_clarifier(splitter):
 
         
         # initiate _mo_comps and _so_comps so that all dissolved component (S_*) are identical among the three streams 
-        self._mo_comps = self._in_comps[:]
-        self._so_comps = self._in_comps[:]
+        self._mo_comps[:] = self._in_comps
+        self._so_comps[:] = self._in_comps
 
         # split the ASM model components associated with solids (X_*), assuming each component is split into the       
         # overflow and underflow keeping its fraction in clarifier inlet TSS.                                          
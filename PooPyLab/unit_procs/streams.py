@@ -37,13 +37,29 @@ import math
 import json
 from pathlib import Path
 
+import numpy as np
+
+from ..ASMModel.composition import DEFAULT_COMPOSITION
 from ..unit_procs.base import poopy_lab_obj
 from ..utils.datatypes import flow_data_src
+from ..utils.inf_reader import influent_reader
 #from ..ASMModel import constants
 
 # -----------------------------------------------------------------------------
 
 
+def _copy_comps(comps):
+    """
+    Return a list copy of model components, held either in a list or in a numpy view of a utils.plant_state.
+
+    The model components of the units are updated in place (e.g. self._mo_comps[:] = ...), so that the views of a
+    plant_state stay bound to the units; a slice of a view would not be a copy.
+    """
+    return comps.tolist() if isinstance(comps, np.ndarray) else comps[:]
+
+# -----------------------------------------------------------------------------
+
+
 class splitter(poopy_lab_obj):
     """
     Stream element with an inlet, a mainstream outlet, and a sidestream outlet.
@@ -116,6 +132,13 @@ class splitter(poopy_lab_obj):
         ## flag to confirm it has received _so_flow > 0 m3/d
         self._so_flow_defined = False
 
+        ## total inlet flow, m3/d
+        self._total_inflow = 0.0
+        ## mainstream outlet flow, m3/d
+        self._mo_flow = 0.0
+        ## sidestream outlet flow, m3/d
+        self._so_flow = 0.0
+
         # TODO: not sure why saturated DO estimate is here.
         # site elevation, meter above MSL
         self._elev = 100.0
@@ -129,6 +152,9 @@ class splitter(poopy_lab_obj):
         ## flag on whether this splitter is SRT controller
         self._SRT_controller = False
 
+        ## composite variables (TSS, COD, TN, ...) of the model components, w/ the conversion factors of the sludge
+        self._composition = DEFAULT_COMPOSITION
+
         # inlet/main_outlet/side_oulet model components:
         #    _comps[0]: flow rate
         #    _comps[1]: S_DO as DO
@@ -155,6 +181,14 @@ class splitter(poopy_lab_obj):
         ## sidestream outlet model components
         self._so_comps = []
 
+        ## mainstream outlet model components of the previous round in the main loop
+        self._prev_mo_comps = []
+        ## sidestream outlet model components of the previous round in the main loop
+        self._prev_so_comps = []
+
+        ## flag on whether the unit has converged between two rounds of the main loop
+        self._converged = False
+
         self._model_file_path = "/home/kai/PythonPrograms/PooPyLab_Project/PooPyLab/ASMModel/splitter.pmt"
 
         return None
@@ -306,9 +340,9 @@ class splitter(poopy_lab_obj):
             None
         """
 
-        self._in_comps = init_guess_lst[:]
-        self._mo_comps = init_guess_lst[:]
-        self._so_comps = init_guess_lst[:]
+        self._in_comps[:] = init_guess_lst
+        self._mo_comps[:] = init_guess_lst
+        self._so_comps[:] = init_guess_lst
         return None
 
 
@@ -595,49 +629,300 @@ class splitter(poopy_lab_obj):
         Return:
             list
         """
-        return self._so_comps[:]
+        return _copy_comps(self._so_comps)
+
+
+    def get_main_outlet_concs(self):
+        """
+        Return a copy of the mainstream outlet concentrations.
+
+        Args:
+            None
+
+        Return:
+            list
+        """
+        return _copy_comps(self._mo_comps)
+
+
+    def set_mainstream_flow(self, flow=0):
+        """
+        Define the mainstream outlet flow.
+
+        Setting the mainstream outlet flow marks its flow data source as flow_data_src.PRG, unless the flow data
+        source has already been determined (e.g. flow_data_src.DNS when the flow is back-calculated from the
+        downstream during the simulation).
+
+        Args:
+            flow:   mainstream outlet flow, m3/d
+
+        Return:
+            None
+
+        See:
+            set_sidestream_flow();
+            set_flow_data_src().
+        """
+        if flow >= 0:
+            self._mo_flow = flow
+            self.set_flow_data_src('Main', flow_data_src.PRG)
+        else:
+            print('ERROR:', self.__name__, 'given mainstream flow < 0.')
+        return None
+
+
+    def get_main_outflow(self):
+        """
+        Return the mainstream outlet flow, m3/d.
+        """
+        return self._mo_flow
+
+
+    def set_sidestream_flow(self, flow=0):
+        """
+        Define the sidestream outlet flow.
+
+        Args:
+            flow:   sidestream outlet flow, m3/d
+
+        Return:
+            None
+
+        See:
+            set_mainstream_flow();
+            set_flow_data_src().
+        """
+        if flow >= 0:
+            self._so_flow = flow
+            self._so_flow_defined = True
+            self.set_flow_data_src('Side', flow_data_src.PRG)
+        else:
+            print('ERROR:', self.__name__, 'given sidestream flow < 0.')
+        return None
+
+
+    def get_side_outflow(self):
+        """
+        Return the sidestream outlet flow, m3/d.
+        """
+        return self._so_flow
+
+
+    def set_mainstream_flow_by_upstream(self, f=True):
+        """
+        Set whether the mainstream flow = (total inflow - side outflow).
+
+        Args:
+            f:  True/False
+
+        Return:
+            None
+        """
+        self._upstream_set_mo_flow = f
+        return None
+
+
+    def totalize_inflow(self):
+        """
+        Combine the individual flows received at the inlet into one.
+
+        When the inlet flow is set by the downstream (flow_data_src.DNS), the total inflow is the sum of the
+        mainstream and sidestream outflows. Otherwise, it is the sum of the flows the upstream dischargers send to
+        the current unit.
+
+        Args:
+            None
+
+        Return:
+            total inflow, m3/d
+
+        See:
+            blend_inlet_comps();
+            update_combined_input().
+        """
+        if self._in_flow_ds == flow_data_src.DNS:
+            self._total_inflow = self._mo_flow + self._so_flow
+        else:
+            self._total_inflow = sum([_u.get_main_outflow() if _u.get_downstream_main() == self
+                                      else _u.get_side_outflow() for _u in self._inlet])
+        return self._total_inflow
+
+
+    def blend_inlet_comps(self):
+        """
+        Calculate the flow weighted average model component concentrations of the inlet.
+
+        Args:
+            None
+
+        Return:
+            Copy of the blended inlet components.
+
+        See:
+            totalize_inflow();
+            update_combined_input().
+        """
+        _flows = []
+        _comps = []
+        # the outlet components are only read here, so no copies of them are made
+        for _u in self._inlet:
+            if _u.get_downstream_main() == self:
+                _flows.append(_u.get_main_outflow())
+                _comps.append(_u._mo_comps)
+            else:
+                _flows.append(_u.get_side_outflow())
+                _comps.append(_u._so_comps)
+
+        _sum = sum(_flows)
+        if _sum > 0 and len(_comps[0]):
+            self._in_comps[:] = [sum([_f * _c[i] for _f, _c in zip(_flows, _comps)]) / _sum
+                                 for i in range(len(_comps[0]))]
+
+        return _copy_comps(self._in_comps)
+
+
+    def update_combined_input(self):
+        """
+        Update the total inflow and the blended inlet model components.
+
+        See:
+            totalize_inflow();
+            blend_inlet_comps().
+        """
+        self.totalize_inflow()
+        self.blend_inlet_comps()
+        return None
+
+
+    def _branch_flow_helper(self):
+        """
+        Calculate 1 of the 3 branches' flow based on the other 2.
+
+        The branch whose flow data source is flow_data_src.UPS gets the balance of the total inflow and the third
+        branch. Nothing needs to be calculated when the inlet flow is set by the downstream, i.e. total inflow =
+        mainstream outflow + sidestream outflow (see totalize_inflow()).
+
+        See:
+            totalize_inflow();
+            set_flow_data_src().
+        """
+        if self._in_flow_ds == flow_data_src.DNS:
+            return None
+
+        if self._mo_flow_ds == flow_data_src.UPS \
+                or (self._mo_flow_ds == flow_data_src.TBD and self._upstream_set_mo_flow):
+            self._mo_flow = self._total_inflow - self._so_flow
+        elif self._so_flow_ds == flow_data_src.UPS:
+            self._so_flow = self._total_inflow - self._mo_flow
+        return None
+
+
+    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
+        """
+        Pass the total flow and blended components to the downstreams.
+
+        The branch flows are balanced first. The model components of a splitter are identical among its inlet,
+        mainstream outlet, and sidestream outlet.
+
+        Args:
+            method_name:    integration method as per scipy.integrate.solve_ivp (not used by splitter);
+            fix_DO:         whether to simulate w/ a fix DO setpoint (not used by splitter);
+            DO_sat_T:       saturated DO conc. under the site conditions, mg/L (not used by splitter)
+
+        Return:
+            None
+
+        Note:
+            The downstream units pull the flows and model components from the current unit in their
+            update_combined_input().
+
+        See:
+            _branch_flow_helper();
+            update_combined_input().
+        """
+        self._prev_mo_comps = _copy_comps(self._mo_comps)
+        self._prev_so_comps = _copy_comps(self._so_comps)
+
+        self._branch_flow_helper()
+
+        self._mo_comps[:] = self._in_comps
+        self._so_comps[:] = self._in_comps
+
+        return None
+
+
+    def is_converged(self, limit=1E-4):
+        """
+        Return whether the outlet model components have converged between two rounds of the main loop.
+
+        A model component is converged when | current - previous | <= limit * (1 + | previous |).
+
+        Args:
+            limit:  convergence limit
+
+        Return:
+            bool
+        """
+        self._converged = (self._comps_converged(self._mo_comps, self._prev_mo_comps, limit)
+                           and (not self._has_sidestream
+                                or self._comps_converged(self._so_comps, self._prev_so_comps, limit)))
+        return self._converged
+
+
+    def _comps_converged(self, cur, prev, limit):
+        """
+        Check whether two lists of model components are within the limit of each other.
+
+        See:
+            is_converged().
+        """
+        if len(cur) != len(prev) or len(cur) == 0:
+            return False
+        for _c, _p in zip(cur, prev):
+            if abs(_c - _p) > limit * (1.0 + abs(_p)):
+                return False
+        return True
 
 
     def get_TSS(self, br='Main'):
         """
         Return the Total Suspended Solids of the specified branch.
+
+        See:
+            set_composition().
         """
-        #TODO: need to make COD/TSS = 1.2 changeable for different type of
-        # sludge
-        index_list = [7, 8, 9, 10, 11]
-        return self._sum_helper(br, index_list) / 1.2
+        return self._composite_helper(br, 'TSS')
 
 
     def get_VSS(self, br='Main'):
         """
         Return the Volatile Suspended Solids of the specified branch.
+
+        See:
+            set_composition().
         """
-        #TODO: need to make COD/VSS = 1.42 changeable for diff. type of sludge
-        index_list = [7, 8, 9, 10, 11]
-        return self._sum_helper(br, index_list) / 1.42
+        return self._composite_helper(br, 'VSS')
 
 
     def get_COD(self, br='Main'):
         """
         Return the Chemical Oxygen Demand (total) of the specified branch.
         """
-        index_list = [1, 2, 7, 8, 9, 10, 11]
-        return self._sum_helper(br, index_list)
+        return self._composite_helper(br, 'COD')
 
 
     def get_sCOD(self, br='Main'):
         """
         Return the soluble COD of the specified branch.
         """
-        index_list = [1, 2]
-        return self._sum_helper(br, index_list)
+        return self._composite_helper(br, 'sCOD')
 
 
     def get_pCOD(self, br='Main'):
         """
         Return the particultate COD of the specified branch.
         """
-        return self.get_COD(br) - self.get_sCOD(br)
+        return self._composite_helper(br, 'pCOD')
 
 
     def get_TN(self, br='Main'):
@@ -646,37 +931,56 @@ class splitter(poopy_lab_obj):
 
         TN = TKN + NOx_N
         """
-        index_list = [3, 4, 5, 12]
-        return self._sum_helper(br, index_list)
+        return self._composite_helper(br, 'TN')
 
 
     def get_orgN(self, br='Main'):
         """
         Return the organic nitrogen of the specified branch.
         """
-        index_list = [4, 12]
-        return self._sum_helper(br, index_list)
+        return self._composite_helper(br, 'orgN')
 
 
     def get_inorgN(self, br='Main'):
         """
         Return the inorganic nitrogen of the specified branch.
         """
-        return self.get_TN(br) - self.get_orgN(br)
+        return self._composite_helper(br, 'inorgN')
 
 
     def get_pN(self, br='Main'):
         """
         Return the particulate nitrogen of the specified branch.
         """
-        return self._sum_helper(br, [12])
+        return self._composite_helper(br, 'pN')
 
 
     def get_sN(self, br='Main'):
         """
         Return the soluble nitrogen of the specified branch.
         """
-        return self.get_TN(br) - self.get_pN(br)
+        return self._composite_helper(br, 'sN')
+
+
+    def set_composition(self, composition):
+        """
+        Set the composite variables of the model components, e.g. w/ the COD/TSS and COD/VSS of a type of sludge.
+
+        Args:
+            composition:    ASMModel.composition.composition_matrix
+
+        Return:
+            None
+        """
+        self._composition = composition
+        return None
+
+
+    def get_composition(self):
+        """
+        Return the composition_matrix of the composite variables (TSS, COD, TN, ...) of the unit.
+        """
+        return self._composition
 
 
     def update_proj_conditions(self, ww_temp=20, elev=100, salinity=1.0):
@@ -829,26 +1133,27 @@ class splitter(poopy_lab_obj):
         return self._SRT_controller
 
 
-    def _sum_helper(self, branch='Main', index_list=[]):
+    def _composite_helper(self, branch='Main', name='TSS'):
         """
-        Sum up the model components indicated by the index_list.
+        Evaluate a composite variable of the model components of a branch.
 
         Args:
             branch: {'Inlet'|'Main'|'Side'}
-            index_list: a list of indices for the model components to use
+            name:   name of the composite (see ASMModel.composition.COMPOSITES)
 
         Return:
             float
         """
-
-        _sum = 0.0
+        _comps = []
         if branch == 'Main':
-            _sum = sum(self._mo_comps[i] for i in index_list)
+            _comps = self._mo_comps
         elif branch == 'Inlet':
-            _sum = sum(self._in_comps[i] for i in index_list)
+            _comps = self._in_comps
         elif branch == 'Side' and self.has_sidestream():
-            _sum = sum(self._so_comps[i] for i in index_list)
-        return _sum
+            _comps = self._so_comps
+        if len(_comps) == 0:
+            return 0.0
+        return float(np.dot(self._composition.get_row(name), _comps))
     #
     # END OF FUNCTIONS UNIQUE TO SPLITTER
 
@@ -902,12 +1207,11 @@ class pipe(splitter):
         # a pipe's sidestream flow IS DEFINED as ZERO
         self._so_flow_defined = True
 
-        # inlet and main outlet components are identical for a pipe
-        # make main outlet components an alias of the inlet components
-        self._mo_comps = self._in_comps
-        # side outlet components equal to the inlet, if they existed.
-        # make side outlet components an alias of the inlet components
-        self._so_comps = self._in_comps
+        # inlet and main outlet components are identical for a pipe, and so would the side outlet components be if
+        # they existed: discharge() copies the inlet components to the outlets. They are kept in separate lists as
+        # they are updated in place (see _copy_comps()).
+        self._mo_comps = self._in_comps[:]
+        self._so_comps = self._in_comps[:]
 
         self._model_file_path = "/home/kai/PythonPrograms/PooPyLab_Project/PooPyLab/ASMModel/pipe.pmt"
 
@@ -915,19 +1219,19 @@ class pipe(splitter):
 
     # ADJUSTMENTS TO COMMON INTERFACE TO FIT THE NEEDS OF PIPE:
     #
-##    def _branch_flow_helper(self):
-##        """
-##        Calculate 1 of the 3 branches' flow based on the other 2.
-##
-##        For a "pipe", the sidestream flow is set to 0 m3/d. The mainstream outlet flow always equals to the
-##        total inlet flow.
-##        """
-##        if self._upstream_set_mo_flow:
-##            self._mo_flow = self._total_inflow
-##        else:
-##            self._total_inflow = self._mo_flow
-##        return None
-##
+    def _branch_flow_helper(self):
+        """
+        Calculate 1 of the 3 branches' flow based on the other 2.
+
+        For a "pipe", the sidestream flow is set to 0 m3/d. The mainstream outlet flow always equals to the
+        total inlet flow.
+        """
+        if self._upstream_set_mo_flow:
+            self._mo_flow = self._total_inflow
+        else:
+            self._total_inflow = self._mo_flow
+        return None
+
 
     def set_downstream_side(self, receiver):
         """
@@ -940,16 +1244,16 @@ class pipe(splitter):
         return None
 
 
-##    def set_sidestream_flow(self, flow):
-##        """
-##        Define the flow rate for the sidestream.
-##
-##        This function is bypassed for a "pipe" whose sidestream is set to "None" and sidestream flow 0 m3/d.
-##        A warning message is displayed if called.
-##        """
-##        print("WARN:", self.__name__, "has sidestream flow of ZERO.")
-##        return None
-##
+    def set_sidestream_flow(self, flow):
+        """
+        Define the flow rate for the sidestream.
+
+        This function is bypassed for a "pipe" whose sidestream is set to "None" and sidestream flow 0 m3/d.
+        A warning message is displayed if called.
+        """
+        print("WARN:", self.__name__, "has sidestream flow of ZERO.")
+        return None
+
     #
     # END OF ADJUSTMENT TO COMMON INTERFACE
 
@@ -961,6 +1265,51 @@ class pipe(splitter):
     # END OF FUNCTIONS UNIQUE TO PIPE
 
 
+# -----------------------------------------------------------------------------
+
+def batch_fractionate(inf_concs, fracs):
+    """
+    Fractionate many samples of the conventional influent constituents into ASM1 model components at once.
+
+    This is the vectorized form of influent._convert_to_model_comps(). Each fraction may be a scalar or an array of
+    one value per sample (e.g. for Monte Carlo runs over the fractions).
+
+    Args:
+        inf_concs:  (n, 9) array of the constituents, in the order of influent.set_constituents();
+        fracs:      ASM1 fractions {name: scalar or (n,) array}, see influent._model_fracs['ASM1']
+
+    Return:
+        (n, 13) numpy.ndarray of model components (a transposed view of a (13, n) array),
+
+        (n,) bool numpy.ndarray, True for the samples with any negative model component
+    """
+    # one contiguous row per constituent/model component, so that every step works on contiguous memory
+    _c = np.atleast_2d(np.asarray(inf_concs, dtype=float)).T.copy()
+
+    _TCOD = np.multiply(fracs['COD:BOD5'], _c[0])
+    _SCOD = np.multiply(fracs['SCOD:COD'], _TCOD)
+    _PCOD = _TCOD - _SCOD
+    _RBCOD = np.multiply(fracs['RBCOD:SCOD'], _SCOD)
+    _SBCOD = np.multiply(fracs['SBCOD:PCOD'], _PCOD)
+    _SON = np.multiply(fracs['SON:SCOD'], _SCOD)
+    _PON = _c[3] - _c[4] - _SON
+
+    _comps = np.zeros((13, _c.shape[1]))
+    _comps[0] = _c[8]
+    _comps[1] = _SCOD - _RBCOD
+    _comps[2] = _RBCOD
+    _comps[3] = _c[4]
+    # as in _convert_to_model_comps(): RBON:SON = RBCOD:SCOD, and SBON:PON = SBCOD:PCOD
+    _comps[4] = np.multiply(fracs['RBCOD:SCOD'], _SON)
+    _comps[5] = _c[5]
+    _comps[6] = _c[7]
+    _comps[7] = _PCOD - _SBCOD
+    _comps[8] = _SBCOD
+    _comps[12] = np.multiply(fracs['SBCOD:PCOD'], _PON)
+
+    return _comps.T, (_comps < 0).any(axis=0)
+
+
 # -----------------------------------------------------------------------------
 
 class influent(pipe):
@@ -1049,21 +1398,24 @@ class influent(pipe):
         #   will use MGD. DEFAULT VALUE = 10 MGD.
         self._design_flow = 37800
 
+        # time series of the influent for dynamic simulations (see set_time_series())
+        self._series = None
+
         return None
 
     # ADJUSTMENTS TO THE COMMON INTERFACE TO FIT THE NEEDS OF INFLUENT
     #
 
-##    def _branch_flow_helper(self):
-##        """
-##        Calculate 1 of the 3 branches' flow based on the other 2.
-##
-##        For an "influent" unit, the mainstream outflow always equals to its design flow.
-##        """
-##
-##        self._mo_flow = self._design_flow
-##        self._so_flow = 0.0
-##        return None
+    def _branch_flow_helper(self):
+        """
+        Calculate 1 of the 3 branches' flow based on the other 2.
+
+        For an "influent" unit, the mainstream outflow always equals to its design flow.
+        """
+
+        self._mo_flow = self._design_flow
+        self._so_flow = 0.0
+        return None
 
 
     def assign_initial_guess(self, init_guess_lst):
@@ -1076,14 +1428,14 @@ class influent(pipe):
         pass
 
 
-##    def is_converged(self, limit=1E-6):
-##        """
-##        Return the convergence status of the unit.
-##
-##        The "influent" unit gets flows and loads from the user. Convergence is irrelevant here. This function
-##        is by-passed for "influent" by setting the _converged to True.
-##        """
-##        return self._converged  # which is always True
+    def is_converged(self, limit=1E-6):
+        """
+        Return the convergence status of the unit.
+
+        The "influent" unit gets flows and loads from the user. Convergence is irrelevant here. This function
+        is by-passed for "influent" by setting the _converged to True.
+        """
+        return self._converged  # which is always True
 
 
     def add_upstream(self, discharger, branch):
@@ -1097,40 +1449,40 @@ class influent(pipe):
         return None
 
 
-##    def totalize_inflow(self):
-##        """
-##        Combine the individual flows specified in the self._inlet into one.
-##
-##        For an "influent" unit, there is no further upstream. The total inflow is the design flow.
-##
-##        See:
-##            _branch_flow_helper()
-##        """
-##        self._branch_flow_helper()
-##        return self._design_flow
-##
-##
-##    def blend_inlet_comps(self):
-##        """
-##        Calculate the flow weighted average model component concentrations.
-##
-##        This function is re-implemented for the "influent" who doesn't have further upstream units
-##        discharging into it. Rather, this function becomes a wrapper for the _convert_to_model_comps() which
-##        fractions the wastewater constituents measured in BOD, TSS, VSS, TKN, NH3-N, etc. into the model
-##        components such as substrate COD, slowly biodegradable COD, inert suspended solids, etc.
-##
-##        Args:
-##            None
-##
-##        Return:
-##            Copy of the blended influent components.
-##
-##        See:
-##            _convert_to_model_comps().
-##        """
-##        self._in_comps = self._convert_to_model_comps(asm_ver='ASM1', verbose=False)
-##        return self._in_comps[:]
-##
+    def totalize_inflow(self):
+        """
+        Combine the individual flows specified in the self._inlet into one.
+
+        For an "influent" unit, there is no further upstream. The total inflow is the design flow.
+
+        See:
+            _branch_flow_helper()
+        """
+        self._branch_flow_helper()
+        return self._design_flow
+
+
+    def blend_inlet_comps(self):
+        """
+        Calculate the flow weighted average model component concentrations.
+
+        This function is re-implemented for the "influent" who doesn't have further upstream units
+        discharging into it. Rather, this function becomes a wrapper for the _convert_to_model_comps() which
+        fractions the wastewater constituents measured in BOD, TSS, VSS, TKN, NH3-N, etc. into the model
+        components such as substrate COD, slowly biodegradable COD, inert suspended solids, etc.
+
+        Args:
+            None
+
+        Return:
+            Copy of the blended influent components.
+
+        See:
+            _convert_to_model_comps().
+        """
+        self._in_comps[:] = self._convert_to_model_comps(asm_ver='ASM1', verbose=False)
+        return _copy_comps(self._in_comps)
+
 
     def remove_upstream(self, discharger):
         """
@@ -1143,25 +1495,25 @@ class influent(pipe):
         return None
 
 
-##    def set_mainstream_flow(self, flow=37800):
-##        """
-##        Define the mainstream outlet flow.
-##
-##        This function is re-implemented for the "influent" and essentially becomes a wrapper for setting the
-##        design flow (m3/d).
-##
-##        Args:
-##            flow:   design flow of the influent, m3/d
-##
-##        Return:
-##            None
-##        """
-##        if flow > 0:
-##            self._design_flow = flow
-##        else:
-##            print("ERROR:", self.__name__, "shall have design flow > 0 M3/d."
-##                    "Design flow NOT CHANGED due to error in user input.")
-##        return None
+    def set_mainstream_flow(self, flow=37800):
+        """
+        Define the mainstream outlet flow.
+
+        This function is re-implemented for the "influent" and essentially becomes a wrapper for setting the
+        design flow (m3/d).
+
+        Args:
+            flow:   design flow of the influent, m3/d
+
+        Return:
+            None
+        """
+        if flow > 0:
+            self._design_flow = flow
+        else:
+            print("ERROR:", self.__name__, "shall have design flow > 0 M3/d."
+                    "Design flow NOT CHANGED due to error in user input.")
+        return None
 
 
     def set_mainstream_flow_by_upstream(self, f):
@@ -1174,52 +1526,51 @@ class influent(pipe):
         pass
 
 
-##    def get_main_outflow(self):
-##        """
-##        Return the mainstream outlet flow.
-##
-##        For an "influent", this function will return the design flow.
-##
-##        Return:
-##            self._design_flow
-##        """
-##        return self._design_flow
-##
-##
-##    def set_flow(self, discharger, flow):
-##        """
-##        Specify the flow from the discharger.
-##
-##        This function is bypassed for the "influent".
-##        """
-##        pass
-##
-##
-##    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
-##        """
-##        Pass the total flow and blended components to the downstreams.
-##
-##        This function is re-implemented for the "influent". An "influent" does not care the changes from the
-##        previous round to the current since it is the source for the entire WWTP. Therefore, _prev_mo_comps,
-##        _prev_so_comps, _mo_comps, and _so_comps all equal to _in_comps.
-##
-##        Args:
-##            (see the note in the discharge() in the splitter class)
-##
-##        Return:
-##            None
-##        """
-##
-##        # influent concentrations don't change for steady state simulation
-##        self._prev_mo_comps = self._prev_so_comps = self._in_comps[:]
-##        self._mo_comps = self._so_comps = self._in_comps[:]
-##
-##        if self._main_outlet is not None:
-##            self._discharge_main_outlet()
-##        else:
-##            print("ERROR:", self.__name__, "main outlet incomplete")
-##
-##        return None
+    def get_main_outflow(self):
+        """
+        Return the mainstream outlet flow.
+
+        For an "influent", this function will return the design flow.
+
+        Return:
+            self._design_flow
+        """
+        return self._design_flow
+
+
+    def set_flow(self, discharger, flow):
+        """
+        Specify the flow from the discharger.
+
+        This function is bypassed for the "influent".
+        """
+        pass
+
+
+    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
+        """
+        Pass the total flow and blended components to the downstreams.
+
+        This function is re-implemented for the "influent". An "influent" does not care the changes from the
+        previous round to the current since it is the source for the entire WWTP. Therefore, _prev_mo_comps,
+        _prev_so_comps, _mo_comps, and _so_comps all equal to _in_comps.
+
+        Args:
+            (see the note in the discharge() in the splitter class)
+
+        Return:
+            None
+        """
+
+        # influent concentrations don't change for steady state simulation
+        self._prev_mo_comps = self._prev_so_comps = _copy_comps(self._in_comps)
+        self._mo_comps[:] = self._in_comps
+        self._so_comps[:] = self._in_comps
+
+        if self._main_outlet is None:
+            print("ERROR:", self.__name__, "main outlet incomplete")
+
+        return None
     #
     # END OF ADJUSTMENT TO COMMON INTERFACE
 
@@ -1295,6 +1646,78 @@ class influent(pipe):
         return self._model_fracs.copy()
 
 
+    def fractionate(self, inf_concs, asm_ver='ASM1'):
+        """
+        Fractionate many samples of the conventional constituents into model components at once.
+
+        The fractions are the current ones of the influent (see set_fractions()). Negative model components, which
+        come from constituents inconsistent with the fractions, are set to 0 with a warning.
+
+        Args:
+            inf_concs:  (n, 9) array of the constituents, in the order of set_constituents();
+            asm_ver:    ASM version: 'ASM1' | 'ASM2d' | 'ASM3'
+
+        Return:
+            (n, 13) numpy.ndarray of model components
+
+        See:
+            batch_fractionate();
+            _convert_to_model_comps().
+        """
+        if asm_ver != 'ASM1':
+            print('ERROR: Fractionation of {} is not available.'.format(asm_ver))
+            return np.zeros((len(np.atleast_2d(inf_concs)), 13))
+
+        _comps, _neg = batch_fractionate(inf_concs, self._model_fracs['ASM1'])
+        if _neg.any():
+            print('WARN: {} influent sample(s) with negative model components, set to 0.'.format(
+                    np.count_nonzero(_neg)))
+            np.maximum(_comps, 0.0, out=_comps)
+        return _comps
+
+
+    def set_time_series(self, source, chunk_size=10000, columns=None, delimiter=','):
+        """
+        Attach a time series of flows and constituents to the influent for dynamic simulations.
+
+        The records are read in chunks and fractionated with the current fractions of the influent as they are read.
+
+        Args:
+            source:     CSV/.npy/raw float64 binary file path, or an iterable of records (see utils.inf_reader);
+            chunk_size: number of records per chunk;
+            columns:    names of the source columns (see utils.inf_reader.COLUMNS);
+            delimiter:  delimiter of a CSV file
+
+        Return:
+            the influent_reader of the series
+
+        See:
+            utils.inf_reader;
+            get_inflow_at();
+            run.get_dynamic().
+        """
+        self._series = influent_reader(source, self.fractionate, chunk_size, columns, delimiter)
+        return self._series
+
+
+    def get_time_series(self):
+        """
+        Return the time series of the influent (None if there is none).
+        """
+        return self._series
+
+
+    def get_inflow_at(self, t):
+        """
+        Return the flow (m3/d) and the model components (mg/L) of the influent at time t (d).
+
+        The design flow and the constant constituents are used if there is no time series.
+        """
+        if self._series is None:
+            return self._design_flow, np.array(self._convert_to_model_comps())
+        return self._series.lookup(t)
+
+
     def _convert_to_model_comps(self, asm_ver='ASM1', verbose=False):
         """
         Fractions the wastewater constituents into model components.
@@ -1318,7 +1741,7 @@ class influent(pipe):
         """
 
 
-        _temp_comps = self._in_comps[:]
+        _temp_comps = _copy_comps(self._in_comps)
 
         if asm_ver == 'ASM1':
             # total COD
@@ -1375,7 +1798,7 @@ class influent(pipe):
                 if tc < 0:
                     print('ERROR in fractions resulting in negative model',
                             ' components. Influent components NOT UPDATED')
-                    return self._in_comps[:]  # nothing changed
+                    return _copy_comps(self._in_comps)  # nothing changed
 
 
             if asm_ver == 'ASM1' and verbose:
@@ -1452,22 +1875,22 @@ class effluent(pipe):
         print('ERROR:', self.__name__, 'has no downstream side outlet.')
 
 
-##    def _branch_flow_helper(self):
-##        """
-##        Calculate 1 of the 3 branches' flow based on the other 2.
-##
-##        This function is re-implemented for "effluent" because the actual effluent flow rate of a WWTP has
-##        to do with its waste sludge flow (WAS flow). The WAS flow is set during simulation by PooPyLab. As a
-##        result, the effluent flow rate is the balance of the plant influent flow and WAS flow.
-##
-##        Occasionally, there may be a WWTP without dedicated WAS unit when the effluent flow rate equals to
-##        that of the influent.
-##        """
-##
-##        # the _mo_flow of an effluent is set externally (global main loop)
-##        if self._upstream_set_mo_flow:
-##            self._mo_flow = self._total_inflow  # _so_flow = 0
-##        return None
+    def _branch_flow_helper(self):
+        """
+        Calculate 1 of the 3 branches' flow based on the other 2.
+
+        This function is re-implemented for "effluent" because the actual effluent flow rate of a WWTP has
+        to do with its waste sludge flow (WAS flow). The WAS flow is set during simulation by PooPyLab. As a
+        result, the effluent flow rate is the balance of the plant influent flow and WAS flow.
+
+        Occasionally, there may be a WWTP without dedicated WAS unit when the effluent flow rate equals to
+        that of the influent.
+        """
+
+        # the _mo_flow of an effluent is set externally (global main loop)
+        if self._upstream_set_mo_flow:
+            self._mo_flow = self._total_inflow  # _so_flow = 0
+        return None
 
 
 #    def set_mainstream_flow(self, flow=0):
@@ -1483,41 +1906,41 @@ class effluent(pipe):
 #            print("ERROR:", self.__name__, "receives flow < 0.")
 #            self._mo_flow = 0.0
 #        return None
-##
-##
-##    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
-##        """
-##        Pass the total flow and blended components to the downstreams.
-##
-##        This function is re-implemented for "effluent" because there is no further downstream units on either
-##        the main or side outlet.
-##
-##        Args:
-##            (see the note in the discharge() defined in the splitter class)
-##
-##        Return:
-##            None
-##
-##        """
-##        self._prev_mo_comps = self._mo_comps[:]
-##        self._prev_so_comps = self._so_comps[:]
-##
-##        self._branch_flow_helper()
-##
-##        self._mo_comps = self._in_comps[:]
-##        self._so_comps = self._in_comps[:]
-##
-##        return None
-##
-##    #
-##    # END OF ADJUSTMENTS TO COMMON INTERFACE
-##
-##    # FUNCTIONS UNIQUE TO EFFLUENT
-##    #
-##    # (INSERT CODE HERE)
-##    #
-##    # END OF FUNCTIONS UNIQUE TO EFFLUENT
-##
+
+
+    def discharge(self, method_name='BDF', fix_DO=True, DO_sat_T=10):
+        """
+        Pass the total flow and blended components to the downstreams.
+
+        This function is re-implemented for "effluent" because there is no further downstream units on either
+        the main or side outlet.
+
+        Args:
+            (see the note in the discharge() defined in the splitter class)
+
+        Return:
+            None
+
+        """
+        self._prev_mo_comps = _copy_comps(self._mo_comps)
+        self._prev_so_comps = _copy_comps(self._so_comps)
+
+        self._branch_flow_helper()
+
+        self._mo_comps[:] = self._in_comps
+        self._so_comps[:] = self._in_comps
+
+        return None
+
+    #
+    # END OF ADJUSTMENTS TO COMMON INTERFACE
+
+    # FUNCTIONS UNIQUE TO EFFLUENT
+    #
+    # (INSERT CODE HERE)
+    #
+    # END OF FUNCTIONS UNIQUE TO EFFLUENT
+
 
 
 # ------------------------------------------------------------------------------
@@ -1597,67 +2020,67 @@ class WAS(pipe):
     #
 
 
-##    def get_solids_inventory(self, reactor_list=[]):
-##        """
-##        Calculate the total solids mass in active reactors.
-##
-##        Args:
-##            reactor_list: list of the asm_reactors with active treatment;
-##
-##        Return:
-##            solids inventory (float) in grams.
-##
-##        See:
-##            set_WAS_flow().
-##        """
-##
-##        inventory = 0.0
-##        for unit in reactor_list:
-##            inventory += unit.get_TSS() * unit.get_active_vol()
-##
-##        return inventory
-##
-##
-##    def set_WAS_flow(self, SRT=5, reactor_list=[], effluent_list=[]):
-##        """
-##        Set the waste sludge flow to meet the WWTP's solids retention time.
-##
-##        Args:
-##            SRT:            WWTP's SRT in days;
-##            reactor_list:   list of active asm_reactors;
-##            effluent_list:  list of all effluent units in the WWTP.
-##
-##        Return:
-##            Mainstream outflow in m3/d
-##
-##        See:
-##            get_solids_inventory().
-##        """
-##
-##        # TODO: Need to re-write this function
-##        #
-##        #self.update_combined_input()
-##
-##        _eff_solids = 0.0
-##        for _u in effluent_list:
-##            _eff_solids += _u.get_TSS() * _u.get_main_outflow()
-##
-##        _wf = 0.0
-##        if self.get_TSS() != 0:
-##            _wf = ((self.get_solids_inventory(reactor_list) / SRT
-##                    - _eff_solids) / self.get_TSS())
-##
-##        # screen out the potential < 0 WAS flow
-##        if _wf < 0:
-##            print('WARN: SRT specified can not be achieved.')
-##            self._mo_flow = 0.0
-##        else:
-##            self._mo_flow = _wf
-##
-##        #TODO: in MAIN function, we need to check whether the WAS flow
-##        # is higher than the influent flow; The WAS flow is then passed to the
-##        # SRT controlling splitter by the main loop.
-##        return self._mo_flow
-##
+    def get_solids_inventory(self, reactor_list=[]):
+        """
+        Calculate the total solids mass in active reactors.
+
+        Args:
+            reactor_list: list of the asm_reactors with active treatment;
+
+        Return:
+            solids inventory (float) in grams.
+
+        See:
+            set_WAS_flow().
+        """
+
+        inventory = 0.0
+        for unit in reactor_list:
+            inventory += unit.get_TSS() * unit.get_active_vol()
+
+        return inventory
+
+
+    def set_WAS_flow(self, SRT=5, reactor_list=[], effluent_list=[]):
+        """
+        Set the waste sludge flow to meet the WWTP's solids retention time.
+
+        Args:
+            SRT:            WWTP's SRT in days;
+            reactor_list:   list of active asm_reactors;
+            effluent_list:  list of all effluent units in the WWTP.
+
+        Return:
+            Mainstream outflow in m3/d
+
+        See:
+            get_solids_inventory().
+        """
+
+        # TODO: Need to re-write this function
+        #
+        #self.update_combined_input()
+
+        _eff_solids = 0.0
+        for _u in effluent_list:
+            _eff_solids += _u.get_TSS() * _u.get_main_outflow()
+
+        _wf = 0.0
+        if self.get_TSS() != 0:
+            _wf = ((self.get_solids_inventory(reactor_list) / SRT
+                    - _eff_solids) / self.get_TSS())
+
+        # screen out the potential < 0 WAS flow
+        if _wf < 0:
+            print('WARN: SRT specified can not be achieved.')
+            self._mo_flow = 0.0
+        else:
+            self._mo_flow = _wf
+
+        #TODO: in MAIN function, we need to check whether the WAS flow
+        # is higher than the influent flow; The WAS flow is then passed to the
+        # SRT controlling splitter by the main loop.
+        return self._mo_flow
+
     #
     # END OF FUNCTIONS UNIQUE TO WAS
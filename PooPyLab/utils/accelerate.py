@@ -0,0 +1,319 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the convergence accelerator for the sequential modular steady state loop.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Convergence acceleration of the tear streams in the sequential modular loop.
+
+One pass of the sequential modular loop (see run.traverse_blocks()) maps the model components it starts from to the
+ones it ends with. The pass starts from the previous results of:
+
+    1) the tear streams, i.e. the branches that are read by units visited before the discharging units in the pass
+    (recycles such as RAS and IR);
+
+    2) the contents of the asm_reactors, which are integrated for one day from where they were.
+
+Plain successive substitution simply uses the end of one pass as the start of the next one. The accelerators here
+extrapolate from the history of the passes instead:
+
+    1) Wegstein: element-wise secant slope s, with the weight q = s / (s - 1) bounded in [q_min, q_max];
+
+    2) Anderson: least squares mixing of the last few passes.
+
+The mixing is done on the log of the model components, and an accelerated value stays within a factor of _MAX_RATIO
+of the unaccelerated one. The history is discarded whenever a pass ends up further from convergence than the one
+before it. When the residual has not reached a new low for a number of passes (patience), the history is discarded
+and the accelerated step is damped by half; once the damping falls below _MIN_DAMPING, the loop carries on w/ plain
+successive substitution.
+
+The units that the main loop no longer calculates (e.g. those of the settled blocks, see run.traverse_blocks()) are
+not moved by the accelerator, since their next pass would not correct them.
+
+Only the model components are accelerated. The branch flows, those of the tear streams included, are solved from the
+flow balances of the plant at the beginning of every pass (see flow_system).
+"""
+## @namespace accelerate
+## @file accelerate.py
+
+
+import numpy as np
+
+
+## offset of the log transform of the model components, mg/L
+_LOG_OFFSET = 1E-3
+
+## max. ratio between an accelerated value and the unaccelerated one
+_MAX_RATIO = 10.0
+
+## smallest damping of the accelerated step before the accelerator gives way to plain substitution
+_MIN_DAMPING = 0.1
+
+
+def find_tear_streams(order):
+    """
+    Find the branches that are read before they are updated in a pass.
+
+    Args:
+        order:  list of process units in their visited order
+
+    Return:
+        list of (discharger, branch) tuples, branch = 'Main' | 'Side'
+    """
+    _rank = {_u: _i for _i, _u in enumerate(order)}
+    _tears = []
+    for _u in order:
+        for _ds in _u.get_upstream() or []:
+            if _rank.get(_ds, -1) >= _rank[_u]:
+                _br = 'Main' if _ds.get_downstream_main() == _u else 'Side'
+                if (_ds, _br) not in _tears:
+                    _tears.append((_ds, _br))
+    return _tears
+
+
+class tear_accelerator(object):
+    """
+    Bounded Wegstein/Anderson acceleration of the sequential modular loop.
+
+    Usage in the main loop:
+
+        acc = tear_accelerator(wwtp, order, 'Wegstein')
+
+        while not converged:
+            (set the flows of the pass)
+            acc.start_pass()
+            (traverse the plant)
+            acc.end_pass()
+
+    General Functions:
+        start_pass(), end_pass(), get_tear_streams(), get_residuals()
+    """
+    __id = 0
+
+    def __init__(self, wwtp, order, method='Wegstein', q_min=-5.0, q_max=0.0, depth=5, delay=2, patience=10):
+        """
+        Args:
+            wwtp:       all process units of the plant;
+            order:      process units in the order they are visited in a pass (see partition.calc_order() and
+                        partition.flatten());
+            method:     'Wegstein', 'Anderson', or None for plain successive substitution;
+            q_min:      lower bound of the Wegstein weight;
+            q_max:      upper bound of the Wegstein weight;
+            depth:      number of previous passes used by Anderson mixing;
+            delay:      number of plain passes before the acceleration starts;
+            patience:   number of passes w/o a new low of the residual before the step is damped.
+        """
+        self.__class__.__id += 1
+        self.__name__ = 'Tear_Accel_' + str(self.__id)
+
+        if method not in (None, 'Wegstein', 'Anderson'):
+            print('ERROR: Unknown accelerator {}, plain successive substitution used instead.'.format(method))
+            method = None
+        self._method = method
+
+        self._q_min = q_min
+        self._q_max = q_max
+        self._depth = depth
+        self._delay = delay
+        self._patience = patience
+        ## weight of the accelerated step vs. the unaccelerated one, halved at every stall
+        self._damping = 1.0
+        self._best = np.inf
+        self._since_best = 0
+
+        self._order = order[:]
+        self._tears = find_tear_streams(self._order)
+
+        # (unit, branch) whose model components are carried from one pass to the next
+        self._carried = self._tears + [(_u, 'Main') for _u in wwtp
+                                       if _u.get_type() == 'ASMReactor' and (_u, 'Main') not in self._tears]
+
+        # start and end of the previous pass
+        self._x_prev = None
+        self._g_prev = None
+
+        # Anderson history of the changes in the pass results and in the residuals
+        self._dG = []
+        self._dF = []
+
+        # start of the current pass
+        self._x = None
+
+        self._passes = 0
+        self._residuals = []
+        return None
+
+
+    def get_tear_streams(self):
+        """
+        Return the tear streams as a list of (discharger, branch) tuples.
+        """
+        return self._tears[:]
+
+
+    def get_residuals(self):
+        """
+        Return the residual of every pass, max(|end - start| / (1 + |start|)).
+        """
+        return self._residuals[:]
+
+
+    def start_pass(self):
+        """
+        Record the model components the pass starts from.
+
+        The branch flows must have been set for the pass (see flow_system.set_flows()). Otherwise, the tear streams
+        carry no flow in the first pass, and the reactors lose most of their initial biomass to the washout before
+        the recycles catch up.
+        """
+        self._x = self._gather()
+        return None
+
+
+    def end_pass(self, verbose=False, accelerate=True, fixed=()):
+        """
+        Record the results of the pass and set the start of the next one.
+
+        Args:
+            verbose:    whether to print the residual of the pass;
+            accelerate: whether to move the start of the next pass (False after the last pass);
+            fixed:      units not to be moved, e.g. those no longer calculated by the main loop
+
+        Return:
+            residual of the pass (float)
+        """
+        _g = self._gather()
+        _x = self._x
+        _res = float(np.max(np.abs(_g - _x) / (1.0 + np.abs(_x)))) if len(_x) else 0.0
+        self._residuals.append(_res)
+        self._passes += 1
+        self._check_stall(_res)
+
+        # mix the log of the model components: the biomass grows (or decays) exponentially from pass to pass
+        _x = np.log(np.maximum(_x, 0.0) + _LOG_OFFSET)
+        _g = np.log(np.maximum(_g, 0.0) + _LOG_OFFSET)
+
+        if self._method is not None and self._x_prev is not None:
+            if len(self._residuals) > 1 and _res > self._residuals[-2]:
+                # the last step made things worse: start over from plain substitution
+                self._dG, self._dF = [], []
+                _new = None
+            elif self._method == 'Wegstein':
+                _new = self._wegstein(_x, _g)
+            else:
+                _new = self._anderson(_x, _g)
+
+            if accelerate and _new is not None and self._passes > self._delay:
+                _bound = np.log(_MAX_RATIO)
+                _new = _g + self._damping * (np.clip(_new, _g - _bound, _g + _bound) - _g)
+                self._scatter(np.exp(_new) - _LOG_OFFSET, fixed)
+
+        self._x_prev = _x
+        self._g_prev = _g
+
+        if verbose:
+            print('{} pass {}: residual = {:.3e}'.format(self._method or 'Substitution', self._passes, _res))
+
+        return _res
+
+
+    def _check_stall(self, res):
+        """
+        Damp the accelerated step, or give way to plain substitution, when the residual has stopped decreasing.
+        """
+        if res < self._best:
+            self._best = res
+            self._since_best = 0
+            return None
+        self._since_best += 1
+        if self._method is None or self._since_best < self._patience:
+            return None
+        self._dG, self._dF = [], []
+        self._since_best = 0
+        self._damping *= 0.5
+        if self._damping < _MIN_DAMPING:
+            print('WARN: {} acceleration stalled; plain substitution from pass {} on.'.format(self._method,
+                                                                                             self._passes))
+            self._method = None
+        return None
+
+
+    def _wegstein(self, x, g):
+        """
+        Bounded Wegstein step, element-wise.
+        """
+        _dx = x - self._x_prev
+        _dg = g - self._g_prev
+        _q = np.zeros(len(x))
+        _ok = np.abs(_dx) > 1e-12 * (1.0 + np.abs(x))
+        _s = _dg[_ok] / _dx[_ok]
+        # s close to 1 makes q unbounded: the bounds take over
+        with np.errstate(divide='ignore', invalid='ignore'):
+            _q[_ok] = np.where(np.abs(_s - 1.0) > 1e-12, _s / (_s - 1.0), self._q_min)
+        _q = np.clip(_q, self._q_min, self._q_max)
+        return _q * x + (1.0 - _q) * g
+
+
+    def _anderson(self, x, g):
+        """
+        Anderson mixing of the last passes (type II, no damping).
+        """
+        _f = g - x
+        self._dG.append(g - self._g_prev)
+        self._dF.append(_f - (self._g_prev - self._x_prev))
+        if len(self._dF) > self._depth:
+            self._dG.pop(0)
+            self._dF.pop(0)
+
+        _DF = np.array(self._dF).T
+        _DG = np.array(self._dG).T
+        _gamma = np.linalg.lstsq(_DF, _f, rcond=None)[0]
+        return g - _DG @ _gamma
+
+
+    def _gather(self):
+        """
+        Collect the model components carried between passes into one array.
+        """
+        _c = [_u.get_main_outlet_concs() if _br == 'Main' else _u.get_side_outlet_concs()
+              for _u, _br in self._carried]
+        return np.concatenate(_c) if _c else np.zeros(0)
+
+
+    def _scatter(self, x, fixed=()):
+        """
+        Put the accelerated model components back into the units, except for the fixed ones.
+        """
+        _nc = len(x) // len(self._carried) if self._carried else 0
+        for _i, (_u, _br) in enumerate(self._carried):
+            if _u in fixed:
+                continue
+            _comps = x[_i * _nc:(_i + 1) * _nc].tolist()
+            if _u.get_type() == 'ASMReactor':
+                _u._mo_comps[:] = _comps
+                _u._so_comps[:] = _comps
+                _u._sludge._comps = _comps[:]
+            elif _br == 'Main':
+                _u._mo_comps[:] = _comps
+            else:
+                _u._so_comps[:] = _comps
+        return None
@@ -0,0 +1,249 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the calibration of the model parameters against plant data.
+#
+#    Author: Kai Zhang
+#
+#
+"""Calibration of the ASM1 parameters of a plant against its measured steady state.
+
+The parameters (kinetic parameters at 20C, see asm_1._PARAM_NAMES, or other scenario columns of utils.scenarios) are
+found within their ranges by scipy.optimize.least_squares, minimizing the weighted residuals
+
+    weight x (simulated - measured)
+
+of the measurements. A measurement is an output of the plant as in utils.scenarios.scenario_runner, e.g. 'get_TN' of
+the effluent or ('ASMReactor', 'get_TSS') for the MLSS, w/ its measured value and weight (e.g. 1 / std. deviation).
+
+The parameters are scaled to [0, 1] over their ranges. The finite difference columns of the Jacobian are solved at the
+same time by the workers of a scenario_runner. Every parameter vector solved is memoized w/ its converged state, and
+a new one starts from the state of the nearest vector solved so far, which usually takes a few Newton iterations.
+
+Usage:
+
+    from MLE import construct
+
+    with calibrator(construct, {'u_max_A': (0.4, 1.2), 'b_LH': (0.3, 0.9)},
+                    [('get_TN', 12.0, 1.0), (('ASMReactor', 'get_TSS'), 3200, 0.01)],
+                    target_SRT=15, solver='Newton') as cal:
+        res = cal.fit()
+"""
+## @namespace calibration
+## @file calibration.py
+
+
+import time
+
+import numpy as np
+from scipy.optimize import least_squares
+
+from ..ASMModel import asm_1
+from ..utils.monte_carlo import kinetic_setters
+from ..utils.scenarios import scenario_runner, STATUS
+
+
+## residual of a measurement at a parameter vector whose steady state failed
+_FAILED_RESIDUAL = 1E6
+
+
+class calibrator(object):
+    """
+    Least squares fit of the parameters of a plant to its measurements, w/ parallel Jacobians and memoized steady
+    states.
+
+    General Functions:
+        evaluate(), residuals(), jacobian(), fit(), close()
+    """
+
+    def __init__(self, construct, params, measurements, max_workers=None, timeout=None, rel_step=0.01,
+                 **solver_args):
+        """
+        Args:
+            construct:      function building the plant (see utils.scenarios.scenario_runner);
+            params:         {kinetic parameter at 20C or scenario column: (low, high)};
+            measurements:   [(output, measured value, weight)], the weight being 1 if left out;
+            max_workers:    number of worker processes (see utils.scenarios.scenario_runner);
+            timeout:        max. time of a steady state, sec;
+            rel_step:       finite difference step, as a fraction of the parameter ranges;
+            solver_args:    keyword arguments of run.get_steady_state(), e.g. solver='Newton', target_SRT=10
+
+        Return:
+            None
+        """
+        self._names = list(params)
+        self._lo, self._hi = (np.array([params[_n][_j] for _n in self._names], dtype=float) for _j in (0, 1))
+        self._outputs = [_m[0] for _m in measurements]
+        self._measured = np.array([_m[1] for _m in measurements], dtype=float)
+        self._weights = np.array([_m[2] if len(_m) > 2 else 1.0 for _m in measurements], dtype=float)
+        self._rel_step = rel_step
+
+        ## {scaled parameter vector (bytes): (outputs, converged state or None)}
+        self._memo = {}
+        self._memo_hits = 0
+        self._runner = scenario_runner(construct, kinetic_setters(self._names), max_workers, timeout,
+                                       outputs=self._outputs, **solver_args)
+        return None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+    def close(self):
+        """
+        Shut the worker processes down.
+        """
+        self._runner.close()
+        return None
+
+
+    def _to_params(self, z):
+        return self._lo + np.asarray(z) * (self._hi - self._lo)
+
+
+    def _nearest_state(self, z):
+        """
+        Return the converged state of the memoized vector nearest to z, or None.
+        """
+        _best, _best_d = None, np.inf
+        for _key, (_y, _state) in self._memo.items():
+            if _state is None:
+                continue
+            _d = np.sum((np.frombuffer(_key) - z) ** 2)
+            if _d < _best_d:
+                _best, _best_d = _state, _d
+        return _best
+
+
+    def evaluate(self, Z):
+        """
+        Return the outputs at scaled parameter vectors, solving the ones not memoized in parallel.
+
+        Args:
+            Z:  (n, number of params) parameter vectors scaled to [0, 1] over their ranges
+
+        Return:
+            (n, number of measurements) outputs, NaN where the steady state failed
+        """
+        _Z = np.atleast_2d(np.asarray(Z, dtype=float))
+        _keys = [_z.tobytes() for _z in _Z]
+        _new = list(dict.fromkeys(_k for _k in _keys if _k not in self._memo))
+        self._memo_hits += len(_keys) - len(_new)
+
+        if _new:
+            _Znew = np.array([np.frombuffer(_k) for _k in _new])
+            _inits = [self._nearest_state(_z) for _z in _Znew]
+            _res = self._runner.run(self._to_params(_Znew), self._names, chunk_size=1, init_states=_inits,
+                                    keep_states=True)
+            for _k, _st, _y, _state in zip(_new, _res['status'], _res['outputs'], _res['states']):
+                _ok = _st == STATUS.index('ok')
+                self._memo[_k] = (_y if _ok else np.full(len(self._outputs), np.nan), _state if _ok else None)
+        return np.array([self._memo[_k][0] for _k in _keys])
+
+
+    def residuals(self, z):
+        """
+        Return the weighted residuals at a scaled parameter vector.
+        """
+        _r = self._weights * (self.evaluate(z)[0] - self._measured)
+        if not np.isfinite(_r).all():
+            print('WARN: Steady state failed at {}.'.format(self._to_params(z)))
+            _r = np.full_like(_r, _FAILED_RESIDUAL)
+        return _r
+
+
+    def jacobian(self, z):
+        """
+        Return the forward (backward at the upper bounds) difference Jacobian of the residuals at a scaled parameter
+        vector. The columns are solved at the same time.
+        """
+        _z = np.asarray(z, dtype=float)
+        _k = len(_z)
+        _h = np.where(_z + self._rel_step <= 1.0, self._rel_step, -self._rel_step)
+        _Z = np.repeat(_z[None, :], _k + 1, axis=0)
+        _Z[1 + np.arange(_k), np.arange(_k)] += _h
+        _Y = self.evaluate(_Z)
+        _J = self._weights[:, None] * (_Y[1:] - _Y[0]).T / _h
+        if not np.isfinite(_J).all():
+            print('WARN: Steady state failed in the Jacobian at {}.'.format(self._to_params(_z)))
+            _J = np.nan_to_num(_J, nan=0.0, posinf=0.0, neginf=0.0)
+        return _J
+
+
+    def fit(self, x0=None, verbose=0, **ls_args):
+        """
+        Fit the parameters to the measurements.
+
+        Args:
+            x0:         initial parameter values; the ASM1 defaults (or the middle of the ranges) if None;
+            verbose:    verbosity of scipy.optimize.least_squares;
+            ls_args:    other keyword arguments of scipy.optimize.least_squares, e.g. xtol
+
+        Return:
+            {'params': [names], 'x': fitted values, 'std': approx. std. errors, 'x0': initial values,
+            'simulated': outputs at x, 'measured': measured values, 'residuals': weighted residuals, 'cost': float,
+            'success': bool, 'message': str, 'nfev': int, 'njev': int, 'evaluations': steady states solved,
+            'memo_hits': int, 'wall_time': float}
+        """
+        if x0 is None:
+            _defaults = asm_1.ASM_1()._kinetics_20C
+            x0 = [_defaults.get(_n, 0.5 * (_l + _h)) for _n, _l, _h in zip(self._names, self._lo, self._hi)]
+        _z0 = np.clip((np.asarray(x0, dtype=float) - self._lo) / (self._hi - self._lo), 0.0, 1.0)
+
+        _start = time.time()
+        _sol = least_squares(self.residuals, _z0, jac=self.jacobian, bounds=(0.0, 1.0), verbose=verbose,
+                             **ls_args)
+        _wall_time = time.time() - _start
+
+        # std. errors from the Jacobian at the solution, in the units of the parameters
+        _J = _sol.jac / (self._hi - self._lo)
+        _dof = max(len(_sol.fun) - len(_z0), 1)
+        try:
+            _cov = np.linalg.inv(_J.T @ _J) * (2 * _sol.cost / _dof)
+            _std = np.sqrt(np.abs(np.diag(_cov)))
+        except np.linalg.LinAlgError:
+            _std = np.full(len(_z0), np.nan)
+
+        return {'params': self._names[:], 'x': self._to_params(_sol.x), 'std': _std, 'x0': self._to_params(_z0),
+                'simulated': self.evaluate(_sol.x)[0], 'measured': self._measured.copy(), 'residuals': _sol.fun,
+                'cost': _sol.cost, 'success': _sol.success, 'message': _sol.message, 'nfev': _sol.nfev,
+                'njev': _sol.njev, 'evaluations': len(self._memo), 'memo_hits': self._memo_hits,
+                'wall_time': _wall_time}
+
+
+def calibrate(construct, params, measurements, x0=None, max_workers=None, timeout=None, rel_step=0.01, verbose=0,
+              **solver_args):
+    """
+    Fit the parameters of a plant to its measurements.
+
+    Args:
+        construct, params, measurements, max_workers, timeout, rel_step, solver_args:   see calibrator;
+        x0, verbose:                                                                    see calibrator.fit()
+
+    Return:
+        see calibrator.fit()
+    """
+    with calibrator(construct, params, measurements, max_workers, timeout, rel_step, **solver_args) as _cal:
+        return _cal.fit(x0, verbose)
@@ -0,0 +1,306 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the linear flow balance system of a whole wastewater treatment plant.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Linear flow balances of a whole plant.
+
+There is one unknown flow per outlet branch of every process unit ('Main' of every unit, plus 'Side' if the unit has a
+sidestream), and one equation per branch:
+
+    1) an influent's outflow equals its design flow;
+
+    2) every other unit has a flow balance: total inflow = mainstream + sidestream outflows;
+
+    3) a splitter's branch whose flow is set by the user (flow_data_src.PRG) keeps that flow;
+
+    4) the total WAS flow equals the value given for the current round of the main loop (e.g. from WAS.set_WAS_flow()).
+
+The flow balance of a unit is placed on a branch of that unit whose flow is not defined by the user. Equations left
+without a branch of their own (e.g. the WAS flow) take the rows left empty (e.g. the underflow of a final_clarifier
+whose flows are both set by the downstream).
+
+The sparse matrix only depends on the connections and is factorized once. Only the right hand side changes with the
+WAS flow. This replaces the propagation of the flow_data_src tags (run.forward_set_flow() and run.backward_set_flow())
+in the steady state loop.
+"""
+## @namespace flow_system
+## @file flow_system.py
+
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from ..utils.datatypes import flow_data_src
+
+
+class flow_system(object):
+    """
+    Sparse linear flow balances of a PFD with a cached factorization.
+
+    General Functions:
+        is_ready(), get_branches(), matrix(), rhs(), solve(), set_flows(), update_specs()
+    """
+
+    def __init__(self, wwtp=[]):
+        """
+        Index the branches of the PFD, assemble the flow equations, and factorize them.
+
+        Args:
+            wwtp:   list of all process units of the plant
+
+        Return:
+            None
+        """
+        self._wwtp = wwtp[:]
+
+        ## (unit, 'Main'|'Side') of every branch
+        self._branches = []
+        ## {(unit, 'Main'|'Side'): index of the branch}
+        self._bid = {}
+        ## {unit: index of the unit in self._wwtp}
+        self._uid = {}
+
+        for _k, _u in enumerate(self._wwtp):
+            self._uid[_u] = _k
+            self._bid[(_u, 'Main')] = len(self._branches)
+            self._branches.append((_u, 'Main'))
+            if _u.has_sidestream():
+                self._bid[(_u, 'Side')] = len(self._branches)
+                self._branches.append((_u, 'Side'))
+
+        self._num_units = len(self._wwtp)
+        self._num_branches = len(self._branches)
+
+        # incidence matrices: inlet (branch -> receiving unit) and outlet (branch -> owning unit)
+        _in_r, _in_c, _out_r = [], [], []
+        for _b, (_u, _br) in enumerate(self._branches):
+            _out_r.append(self._uid[_u])
+            _rcvr = _u.get_downstream_main() if _br == 'Main' else _u.get_downstream_side()
+            if _rcvr in self._uid:
+                _in_r.append(self._uid[_rcvr])
+                _in_c.append(_b)
+        _shape = (self._num_units, self._num_branches)
+        self._inlet_mat = sparse.csr_matrix((np.ones(len(_in_r)), (_in_r, _in_c)), shape=_shape)
+        self._outlet_mat = sparse.csr_matrix((np.ones(self._num_branches), (_out_r, range(self._num_branches))),
+                                             shape=_shape)
+
+        self._lu = None
+        self._ready = self._set_flow_eqs()
+        if self._ready:
+            self._ready = self._factorize()
+
+        return None
+
+
+    def _set_flow_eqs(self):
+        """
+        Assign one flow equation to every branch.
+
+        Return:
+            bool, whether the number of flow equations matches that of the branches.
+        """
+        _rows = [None] * self._num_branches
+        _extra = []
+
+        self._inf_rows, self._design_flows = [], []
+        self._bal_rows, self._bal_units = [], []
+        self._spec_rows, self._spec_flows = [], []
+
+        for _u in self._wwtp:
+            _mo = self._bid[(_u, 'Main')]
+            if _u.get_type() == 'Influent':
+                _rows[_mo] = 'INF'
+                self._inf_rows.append(_mo)
+                self._design_flows.append(_u.get_main_outflow())
+                continue
+
+            if not _u.has_sidestream():
+                _rows[_mo] = 'BAL'
+                self._bal_rows.append(_mo)
+                self._bal_units.append(self._uid[_u])
+                continue
+
+            _so = self._bid[(_u, 'Side')]
+            _in_fds, _mo_fds, _so_fds = _u.get_flow_data_src()
+            _free = []
+            for _b, _fds, _f in ((_mo, _mo_fds, _u.get_main_outflow()), (_so, _so_fds, _u.get_side_outflow())):
+                if _fds == flow_data_src.PRG:
+                    _rows[_b] = 'SPEC'
+                    self._spec_rows.append(_b)
+                    self._spec_flows.append(_f)
+                else:
+                    _free.append(_b)
+            if _free:
+                _rows[_free[0]] = 'BAL'
+                self._bal_rows.append(_free[0])
+            else:
+                _extra.append('BAL')
+                self._bal_rows.append(None)
+            self._bal_units.append(self._uid[_u])
+
+        self._was_branches = [self._bid[(_u, 'Main')] for _u in self._wwtp if _u.get_type() == 'WAS']
+        self._eff_branches = [self._bid[(_u, 'Main')] for _u in self._wwtp if _u.get_type() == 'Effluent']
+        if self._was_branches:
+            _extra.append('SRT')
+
+        _spare = [_b for _b in range(self._num_branches) if _rows[_b] is None]
+        if len(_spare) != len(_extra):
+            print('ERROR: The PFD has {} undefined branch flow(s) but {} extra flow equation(s).'.format(
+                    len(_spare), len(_extra)))
+            return False
+
+        ## row of the total WAS flow (the SRT relation in plant_system)
+        self._srt_row = None
+        for _b, _eq in zip(_spare, _extra):
+            if _eq == 'SRT':
+                self._srt_row = _b
+            else:
+                self._bal_rows[self._bal_rows.index(None)] = _b
+
+        self._inf_rows = np.array(self._inf_rows, dtype=int)
+        self._design_flows = np.array(self._design_flows, dtype=float)
+        self._bal_rows = np.array(self._bal_rows, dtype=int)
+        self._bal_units = np.array(self._bal_units, dtype=int)
+        self._spec_rows = np.array(self._spec_rows, dtype=int)
+        self._spec_flows = np.array(self._spec_flows, dtype=float)
+
+        ## reference flow for scaling, m3/d
+        self._ref_flow = max(float(np.sum(self._design_flows)), 1.0)
+
+        return True
+
+
+    def _factorize(self):
+        """
+        Factorize the flow matrix once for all the right hand sides.
+
+        Return:
+            bool, whether the flows are fully determined by the equations.
+        """
+        try:
+            self._lu = splu(self.matrix())
+        except RuntimeError:
+            print('ERROR: The flow balances of the PFD do not determine all the branch flows.')
+            return False
+        return True
+
+
+    def is_ready(self):
+        """
+        Return whether the flow equations are square and non-singular.
+        """
+        return self._ready
+
+
+    def get_branches(self):
+        """
+        Return the (unit, 'Main'|'Side') of every branch, in the order of the flows.
+        """
+        return self._branches[:]
+
+
+    def matrix(self):
+        """
+        Return the sparse flow matrix (scipy.sparse.csc_matrix, B x B).
+        """
+        _B = self._num_branches
+        _bal = (self._inlet_mat - self._outlet_mat)[self._bal_units].tocoo()
+        _rows = np.concatenate([self._inf_rows, self._bal_rows[_bal.row], self._spec_rows,
+                                np.full(len(self._was_branches), -1 if self._srt_row is None else self._srt_row)])
+        _cols = np.concatenate([self._inf_rows, _bal.col, self._spec_rows, self._was_branches])
+        _vals = np.concatenate([np.ones(len(self._inf_rows)), _bal.data, np.ones(len(self._spec_rows)),
+                                np.ones(len(self._was_branches))])
+        return sparse.csc_matrix((_vals, (_rows.astype(int), _cols.astype(int))), shape=(_B, _B))
+
+
+    def rhs(self, WAS_flow=0.0, design_flows=None):
+        """
+        Return the right hand side of the flow equations for a total WAS flow (m3/d).
+
+        The influent flows (m3/d, in the PFD order of the influents) replace the design flows if given.
+        """
+        _rhs = np.zeros(self._num_branches)
+        _rhs[self._inf_rows] = self._design_flows if design_flows is None else design_flows
+        _rhs[self._spec_rows] = self._spec_flows
+        if self._srt_row is not None:
+            _rhs[self._srt_row] = WAS_flow
+        return _rhs
+
+
+    def solve(self, WAS_flow=0.0, design_flows=None):
+        """
+        Solve the branch flows for a total WAS flow with the cached factorization.
+
+        Args:
+            WAS_flow:       total WAS flow, m3/d;
+            design_flows:   flows of the influents (in the PFD order) in place of their design flows, m3/d
+
+        Return:
+            flows of the branches (numpy.ndarray), m3/d
+        """
+        return self._lu.solve(self.rhs(WAS_flow, design_flows))
+
+
+    def update_specs(self):
+        """
+        Re-read the influent design flows and the user defined splitter flows into the right hand side.
+
+        The matrix (and its factorization) does not change as long as the connections and the flow_data_src.PRG tags
+        of the branches stay the same.
+        """
+        self._design_flows = np.array([self._branches[_b][0].get_main_outflow() for _b in self._inf_rows],
+                                      dtype=float)
+        self._spec_flows = np.array([self._branches[_b][0].get_main_outflow() if self._branches[_b][1] == 'Main'
+                                     else self._branches[_b][0].get_side_outflow() for _b in self._spec_rows],
+                                    dtype=float)
+        self._ref_flow = max(float(np.sum(self._design_flows)), 1.0)
+        return None
+
+
+    def set_flows(self, WAS_flow=0.0):
+        """
+        Solve the branch flows and write them into the process units.
+
+        The total inflow of every unit is updated as well, so that the flows the units calculate for themselves
+        in discharge() agree with the solution.
+
+        Args:
+            WAS_flow:   total WAS flow, m3/d
+
+        Return:
+            flows of the branches (numpy.ndarray), m3/d
+        """
+        _flows = self.solve(WAS_flow)
+        if np.any(_flows < -1E-9 * self._ref_flow):
+            print('WARN: Negative branch flow(s) at the WAS flow of {:.3f} m3/d.'.format(WAS_flow))
+        for (_u, _br), _f in zip(self._branches, _flows):
+            if _br == 'Main':
+                _u._mo_flow = _f
+            else:
+                _u._so_flow = _f
+        for _u, _f in zip(self._wwtp, self._inlet_mat @ _flows):
+            if _u.get_type() != 'Influent':
+                _u._total_inflow = _f
+        return _flows
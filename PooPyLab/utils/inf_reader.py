@@ -0,0 +1,345 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the chunked reader of influent time series.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Streaming reader of influent time series.
+
+A record of an influent time series has the time, the flow, and the 9 conventional constituents of
+influent.set_constituents() (see COLUMNS). The records may come from:
+
+    1) a CSV (text) file, with or without a header line. A header names the columns (see COLUMNS, case and '-'
+    insensitive, e.g. 'NH3-N'), in any order. The time is either in days or an ISO 8601 timestamp (counted in days
+    from the first record);
+
+    2) a .npy file, or a raw binary file of float64 records, read through a memory map;
+
+    3) any iterable of records (1-D) or blocks of records (2-D).
+
+The records are read one chunk at a time and fractionated into model components as they are read. Only the chunk in
+use and the one before it are held in memory, which covers the times an integrator looks back to (e.g. for the
+outputs within its last step). The time-indexed lookup interpolates linearly between records, and holds the
+first/last records outside the time span of the series.
+
+The reader remembers where each chunk starts, so that files can also be looked up further back. An iterable can not
+be looked up before the chunk in front of the one in use.
+"""
+## @namespace inf_reader
+## @file inf_reader.py
+
+
+import numpy as np
+
+
+## columns of an influent record: time (d), flow (m3/d), and the constituents of influent.set_constituents()
+COLUMNS = ('time', 'flow', 'BOD5', 'TSS', 'VSS', 'TKN', 'NH3N', 'NOxN', 'TP', 'Alk', 'DO')
+
+
+def _column_key(name):
+    """
+    Normalize a column name for matching, e.g. 'NH3-N' -> 'nh3n'.
+    """
+    return name.strip().strip('"\'').replace('-', '').replace('_', '').replace(' ', '').lower()
+
+
+class influent_reader(object):
+    """
+    Chunked, time-indexed influent time series.
+
+    Usage:
+
+        reader = influent_reader('influent.csv', inf_unit.fractionate)
+
+        flow, comps = reader(t)     # at time t, d
+
+    General Functions:
+        lookup(), chunks(), rewind(), close()
+    """
+
+    def __init__(self, source, fractionate, chunk_size=10000, columns=None, delimiter=','):
+        """
+        Args:
+            source:         file path (CSV/text, .npy, or raw float64 binary), or an iterable of records;
+            fractionate:    function converting an (n, 9) array of constituents into (n, 13) model components (see
+                            influent.fractionate());
+            chunk_size:     number of records per chunk;
+            columns:        names of the source columns (see COLUMNS), in their order in the source. The CSV header,
+                            or COLUMNS, is used if None;
+            delimiter:      delimiter of a CSV file
+
+        Return:
+            None
+        """
+        self._fractionate = fractionate
+        self._chunk_size = max(int(chunk_size), 2)
+        self._delimiter = delimiter
+        self._names = list(columns) if columns is not None else None
+
+        self._file = None
+        self._array = None
+        self._iter = None
+        self._source = source
+
+        ## positions in the source where the chunks start (byte offsets of text files), by chunk index
+        self._starts = []
+        ## time of the first record of every chunk read so far
+        self._first_t = []
+        ## timestamp of the first record of a CSV with ISO 8601 times
+        self._epoch = None
+
+        if isinstance(source, str):
+            if source.endswith('.npy'):
+                self._array = np.load(source, mmap_mode='r')
+            elif source.endswith(('.csv', '.txt', '.dat')):
+                self._file = open(source, 'r')
+                self._read_header()
+            else:
+                _n = len(self._names or COLUMNS)
+                self._array = np.memmap(source, dtype=np.float64, mode='r').reshape(-1, _n)
+        else:
+            self._iter = iter(source)
+
+        self._index = self._column_index()
+
+        # chunk in use: index, and the times, flows, and model components of its records, with those of the chunk
+        # before it in front
+        self._k = -1
+        self._t = np.zeros(0)
+        self._q = np.zeros(0)
+        self._c = np.zeros((0, 13))
+        self._cur = (self._t, self._q, self._c)
+        self._exhausted = False
+
+        self._load(0)
+        return None
+
+
+    def _read_header(self):
+        """
+        Take the column names from the header of a CSV file, if there is one.
+        """
+        _pos = self._file.tell()
+        _line = self._file.readline()
+        _fields = _line.strip().split(self._delimiter)
+        try:
+            float(_fields[1])
+        except (ValueError, IndexError):
+            if self._names is None:
+                self._names = [_f.strip().strip('"\'') for _f in _fields]
+            self._starts.append(self._file.tell())
+            return None
+        self._starts.append(_pos)
+        return None
+
+
+    def _column_index(self):
+        """
+        Return the source column of every column in COLUMNS.
+        """
+        if self._names is None:
+            return np.arange(len(COLUMNS))
+        _keys = [_column_key(_n) for _n in self._names]
+        _index = []
+        for _c in COLUMNS:
+            if _column_key(_c) not in _keys:
+                print('ERROR: Influent time series has no {} column.'.format(_c))
+                _index.append(0)
+            else:
+                _index.append(_keys.index(_column_key(_c)))
+        return np.array(_index)
+
+
+    def _raw_chunk(self, k):
+        """
+        Read chunk k from the source.
+
+        Return:
+            (n, number of source columns) numpy.ndarray, or None past the end of the source
+        """
+        _cs = self._chunk_size
+
+        if self._array is not None:
+            _rows = self._array[k * _cs:(k + 1) * _cs]
+            return np.array(_rows, dtype=float) if len(_rows) else None
+
+        if self._file is not None:
+            if k >= len(self._starts):
+                # chunks are found in sequence
+                for _j in range(len(self._starts) - 1, k):
+                    if self._raw_chunk(_j) is None:
+                        return None
+            self._file.seek(self._starts[k])
+            _lines = []
+            while len(_lines) < _cs:
+                _line = self._file.readline()
+                if not _line:
+                    break
+                if _line.strip():
+                    _lines.append(_line)
+            if len(self._starts) == k + 1:
+                self._starts.append(self._file.tell())
+            return self._parse(_lines) if _lines else None
+
+        if k != self._k + 1:
+            print('ERROR: An influent iterator can only be read forward.')
+            return None
+        _rows = []
+        _n = 0
+        for _r in self._iter:
+            _r = np.atleast_2d(np.asarray(_r, dtype=float))
+            _rows.append(_r)
+            _n += len(_r)
+            if _n >= _cs:
+                break
+        return np.concatenate(_rows) if _rows else None
+
+
+    def _parse(self, lines):
+        """
+        Parse the lines of a CSV chunk into an array.
+        """
+        _fields = [_l.strip().split(self._delimiter) for _l in lines]
+        _t_col = self._index[0]
+        try:
+            return np.array(_fields, dtype=float)
+        except ValueError:
+            pass
+        # ISO 8601 timestamps in the time column
+        _t = np.array([_f[_t_col].strip().strip('"\'') for _f in _fields], dtype='datetime64[s]')
+        if self._epoch is None:
+            self._epoch = _t[0]
+        for _f, _d in zip(_fields, (_t - self._epoch) / np.timedelta64(1, 'D')):
+            _f[_t_col] = _d
+        return np.array(_fields, dtype=float)
+
+
+    def _load(self, k):
+        """
+        Make chunk k the chunk in use, with the records of chunk k - 1 in front of it.
+
+        Return:
+            bool, whether chunk k exists
+        """
+        if k > 0 and self._k != k - 1:
+            # not the next chunk: chunk k - 1 is read again to go in front of it
+            _prev = self._raw_chunk(k - 1)
+            if _prev is None:
+                self._exhausted = True
+                return False
+            _prev = _prev[:, self._index]
+            self._cur = (_prev[:, 0], _prev[:, 1], self._fractionate(_prev[:, 2:]))
+        _raw = self._raw_chunk(k)
+        if _raw is None:
+            self._exhausted = True
+            return False
+
+        _raw = _raw[:, self._index]
+        _t, _q, _c = _raw[:, 0], _raw[:, 1], self._fractionate(_raw[:, 2:])
+        if k == len(self._first_t):
+            self._first_t.append(_t[0])
+
+        if k > 0:
+            self._t = np.concatenate([self._cur[0], _t])
+            self._q = np.concatenate([self._cur[1], _q])
+            self._c = np.vstack([self._cur[2], _c])
+        else:
+            self._t, self._q, self._c = _t, _q, _c
+        self._cur = (_t, _q, _c)
+        self._k = k
+        self._exhausted = False
+        return True
+
+
+    def rewind(self):
+        """
+        Go back to the first chunk.
+        """
+        if self._iter is not None:
+            print('ERROR: An influent iterator can not be rewound.')
+            return None
+        self._k = -1
+        self._load(0)
+        return None
+
+
+    def lookup(self, t):
+        """
+        Return the influent at time t.
+
+        Args:
+            t:  time, d
+
+        Return:
+            flow (m3/d), numpy.ndarray of the 13 model components (mg/L)
+        """
+        while t > self._t[-1] and not self._exhausted:
+            if not self._load(self._k + 1):
+                break
+
+        if t < self._t[0] and self._k > 0:
+            if self._iter is not None:
+                print('ERROR: Influent at t = {} has been passed by the iterator.'.format(t))
+            else:
+                self._load(max(int(np.searchsorted(self._first_t, t, side='right')) - 1, 0))
+
+        if len(self._t) == 1 or t <= self._t[0]:
+            return float(self._q[0]), self._c[0].copy()
+        if t >= self._t[-1]:
+            return float(self._q[-1]), self._c[-1].copy()
+        _j = int(np.searchsorted(self._t, t, side='right')) - 1
+        _f = (t - self._t[_j]) / (self._t[_j + 1] - self._t[_j])
+        _q = self._q[_j] + _f * (self._q[_j + 1] - self._q[_j])
+        return float(_q), self._c[_j] + _f * (self._c[_j + 1] - self._c[_j])
+
+
+    def __call__(self, t):
+        """
+        Same as lookup(), so that a reader can be used as an influent time series of utils.plant_dynamics.
+        """
+        return self.lookup(t)
+
+
+    def chunks(self):
+        """
+        Iterate over the series one chunk at a time, from the first chunk (files) or the chunk in use (iterables).
+
+        Return:
+            generator of (times, flows, model components) of the records of every chunk
+        """
+        if self._iter is None:
+            self.rewind()
+        while True:
+            yield self._cur
+            if not self._load(self._k + 1):
+                break
+        return None
+
+
+    def close(self):
+        """
+        Close the source file, if any.
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return None
@@ -0,0 +1,351 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the instrumentation of the simulation runs.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Instrumentation of the steady state and dynamic runs.
+
+An instrument records, per run:
+
+    phases:     calls and time of the phases of the solver, e.g. 'flow' (WAS and branch flows), 'traverse' (the
+                units of a sequential modular pass), 'accelerate', 'newton', 'ptc', 'integrate', 'output';
+
+    counters:   e.g. residual and jacobian evaluations of the plant_system, steps, rejected steps, rhs and jacobian
+                evaluations and LU decompositions of the integrator of plant_dynamics;
+
+    residuals:  the residual norm of every outer iteration (sequential modular pass, Newton iteration, or
+                pseudo-transient step);
+
+    units:      per process unit, calls and time of update_combined_input(), discharge() and the flow balance of the
+                unit (_branch_flow_helper(), within discharge()), and for the asm_reactors the steps, rhs and jacobian
+                evaluations and LU decompositions of their integrators.
+
+The units are instrumented by wrapping their methods on the instances for the duration of a run (attach()/detach()),
+and the solvers only check for an instrument once per iteration. W/o an instrument nothing is wrapped, which keeps the
+overhead of a run that is not instrumented at nil.
+
+The runs can be exported to JSON (to_json(), save_json()) for dashboards, or printed (summary()).
+
+Usage:
+
+    instr = instrument()
+    run.get_steady_state(wwtp, target_SRT=10, instr=instr)
+    instr.summary()
+    instr.save_json('cmas_profile.json')
+"""
+## @namespace instrument
+## @file instrument.py
+
+
+import contextlib
+import json
+import time
+
+import numpy as np
+
+
+## methods of the process units timed in a run, and their names in the records
+UNIT_METHODS = (('update_combined_input', 'update_combined_input'), ('discharge', 'discharge'),
+                ('_branch_flow_helper', 'flow'))
+
+
+def _timer():
+    return {'calls': 0, 'time': 0.0}
+
+
+class instrument(object):
+    """
+    Recorder of the phases, counters, residual norms, and per unit timings of simulation runs.
+
+    General Functions:
+        start_run(), end_run(), attach(), wrap(), detach(), phase(), count(), add_residual(), get_runs(),
+        get_last_run(), summary(), to_json(), save_json()
+    """
+
+    def __init__(self):
+        """
+        Return:
+            None
+        """
+        ## records of the finished runs, and the current one
+        self._runs = []
+        self._run = None
+        self._t0 = 0.0
+        ## (object, method name, method in the instance __dict__ or None) of the wrapped methods
+        self._wrapped = []
+        ## units attached to the current run
+        self._attached = set()
+        return None
+
+
+    def start_run(self, kind, **info):
+        """
+        Start the record of a run.
+
+        Args:
+            kind:   e.g. 'steady_state', 'dynamic';
+            info:   other entries of the record, e.g. solver='SM'
+
+        Return:
+            the record of the run (dict)
+        """
+        if self._run is not None:
+            self.end_run()
+        self._run = {'kind': kind, 'start': time.time(), 'wall_time': 0.0, 'phases': {}, 'counters': {},
+                     'residuals': [], 'units': {}}
+        self._run.update(info)
+        self._t0 = time.perf_counter()
+        return self._run
+
+
+    def end_run(self, **info):
+        """
+        Finish the record of the current run, and detach its units.
+
+        Args:
+            info:   entries to add to the record, e.g. converged=True, iterations=12
+
+        Return:
+            the record of the run (dict), or None if no run was started
+        """
+        if self._run is None:
+            return None
+        self.detach()
+        self._run['wall_time'] = time.perf_counter() - self._t0
+        self._run.update(info)
+        self._runs.append(self._run)
+        _run, self._run = self._run, None
+        return _run
+
+
+    def _timed(self, func, rec, post=None):
+        """
+        Return func wrapped to add its calls and time into rec, calling post() after every call.
+        """
+        def _wrapper(*args, **kwargs):
+            _t0 = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                rec['calls'] += 1
+                rec['time'] += time.perf_counter() - _t0
+                if post is not None:
+                    post()
+        return _wrapper
+
+
+    def attach(self, wwtp):
+        """
+        Time the methods of the process units (see UNIT_METHODS) in the current run, until detach().
+
+        Args:
+            wwtp:   process units of the plant
+
+        Return:
+            None
+        """
+        if self._run is None:
+            print('WARN: No run started; the units are not instrumented.')
+            return None
+        for _u in wwtp:
+            if _u in self._attached:
+                continue
+            self._attached.add(_u)
+            _rec = self._run['units'].setdefault(_u.__name__, {'type': _u.get_type()})
+            for _method, _key in UNIT_METHODS:
+                _rec[_key] = _timer()
+                _post = None
+                if _method == 'discharge' and _u.get_type() == 'ASMReactor':
+                    _rec.update({'steps': 0, 'rhs_evals': 0, 'jac_evals': 0, 'lu_decomps': 0})
+                    _post = self._integrator_counter(_u, _rec)
+                self.wrap(_u, _method, _rec[_key], _post)
+        return None
+
+
+    def wrap(self, obj, method, rec=None, post=None):
+        """
+        Time a method of an object in the current run, until detach().
+
+        Args:
+            obj:    e.g. a plant_system;
+            method: name of the method;
+            rec:    {'calls': int, 'time': float} to add to; the phase of the method's name if None;
+            post:   function called after every call, or None
+
+        Return:
+            None
+        """
+        if self._run is None:
+            print('WARN: No run started; {} is not instrumented.'.format(method))
+            return None
+        if any(_obj is obj and _method == method for _obj, _method, _orig in self._wrapped):
+            return None
+        if rec is None:
+            rec = self._run['phases'].setdefault(method, _timer())
+        # an instance attribute would already hide the method of the class
+        self._wrapped.append((obj, method, obj.__dict__.get(method)))
+        setattr(obj, method, self._timed(getattr(obj, method), rec, post))
+        return None
+
+
+    def _integrator_counter(self, reactor, rec):
+        """
+        Return a function adding the stats of the last integration of an asm_reactor into rec.
+        """
+        def _count():
+            _sol = getattr(reactor, '_solultion', None)
+            if _sol is None:
+                return None
+            rec['steps'] += max(len(_sol.t) - 1, 0)
+            rec['rhs_evals'] += _sol.nfev
+            rec['jac_evals'] += _sol.njev
+            rec['lu_decomps'] += _sol.nlu
+            return None
+        return _count
+
+
+    def detach(self):
+        """
+        Put the original methods back into the attached units.
+        """
+        for _obj, _method, _orig in reversed(self._wrapped):
+            if _orig is None:
+                delattr(_obj, _method)
+            else:
+                setattr(_obj, _method, _orig)
+        self._wrapped = []
+        self._attached = set()
+        return None
+
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context manager adding the calls and time of a phase of the current run.
+        """
+        _t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._run is not None:
+                _rec = self._run['phases'].setdefault(name, _timer())
+                _rec['calls'] += 1
+                _rec['time'] += time.perf_counter() - _t0
+
+
+    def count(self, name, n=1):
+        """
+        Add n to a counter of the current run.
+        """
+        if self._run is not None:
+            self._run['counters'][name] = self._run['counters'].get(name, 0) + n
+        return None
+
+
+    def add_residual(self, norm):
+        """
+        Append the residual norm of an outer iteration to the current run.
+        """
+        if self._run is not None:
+            self._run['residuals'].append(float(norm))
+        return None
+
+
+    def get_runs(self):
+        """
+        Return the records of the finished runs.
+        """
+        return self._runs[:]
+
+
+    def get_last_run(self):
+        """
+        Return the record of the last finished run, or None.
+        """
+        return self._runs[-1] if self._runs else None
+
+
+    def to_json(self, indent=None):
+        """
+        Return the records of the finished runs as a JSON string.
+        """
+        return json.dumps({'runs': self._runs}, indent=indent, default=_to_builtin)
+
+
+    def save_json(self, path, indent=1):
+        """
+        Write the records of the finished runs into a JSON file.
+        """
+        with open(path, 'w') as _f:
+            _f.write(self.to_json(indent))
+        return None
+
+
+    def summary(self, run=None, top=10):
+        """
+        Print the phases, counters, and the most time consuming units of a run.
+
+        Args:
+            run:    record of a run; the last finished run if None;
+            top:    max. number of units listed
+
+        Return:
+            None
+        """
+        _run = run if run is not None else self.get_last_run()
+        if _run is None:
+            print('WARN: No instrumented run to summarize.')
+            return None
+
+        print('{} run: {:.3f} s'.format(_run['kind'], _run['wall_time']))
+        if _run['phases']:
+            print(' {:<24s} {:>8s} {:>10s} {:>7s}'.format('phase', 'calls', 'time, s', '%'))
+            for _name, _rec in sorted(_run['phases'].items(), key=lambda _p: -_p[1]['time']):
+                print(' {:<24s} {:>8d} {:>10.4f} {:>7.1f}'.format(_name, _rec['calls'], _rec['time'],
+                                                                   100 * _rec['time'] / max(_run['wall_time'], 1e-12)))
+        for _name, _n in sorted(_run['counters'].items()):
+            print(' {:<24s} {:>8d}'.format(_name, _n))
+        if _run['residuals']:
+            print(' residual norms: {} iterations, first {:.3e}, last {:.3e}'.format(
+                len(_run['residuals']), _run['residuals'][0], _run['residuals'][-1]))
+
+        _units = sorted(_run['units'].items(), key=lambda _u: -_u[1]['discharge']['time'])[:top]
+        if _units:
+            print(' {:<24s} {:>10s} {:>10s} {:>10s} {:>8s} {:>8s}'.format('unit', 'discharge', 'input', 'flow',
+                                                                          'steps', 'rhs'))
+            for _name, _rec in _units:
+                print(' {:<24s} {:>10.4f} {:>10.4f} {:>10.4f} {:>8s} {:>8s}'.format(
+                    _name, _rec['discharge']['time'], _rec['update_combined_input']['time'], _rec['flow']['time'],
+                    str(_rec.get('steps', '-')), str(_rec.get('rhs_evals', '-'))))
+        return None
+
+
+def _to_builtin(obj):
+    """
+    Turn the numpy scalars and arrays of a record into JSON types.
+    """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
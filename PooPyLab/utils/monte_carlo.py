@@ -0,0 +1,332 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the Monte Carlo analysis of the uncertainty of the model parameters.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Monte Carlo analysis of the effluent quality under uncertain kinetics.
+
+The kinetic parameters at 20C (see ASMModel.asmbase.asm_model.alter_kinetic_20C()) of all the asm_reactors, and the
+scenario columns of utils.scenarios (e.g. 'temp'), are drawn from their distributions:
+
+    ('uniform', low, high);
+    ('normal', mean, std. deviation), truncated at 0;
+    ('lognormal', median, std. deviation of the log);
+    ('triangular', low, mode, high).
+
+The draws come in batches, each a Latin hypercube of its own seeded by (seed, batch number), so that any number of
+draws can be made w/o keeping the earlier ones, and a run can be resumed at any batch. The steady state of every draw
+is solved by the workers of a utils.scenarios.scenario_runner.
+
+The statistics of the outputs are accumulated as the batches come back: the mean and variance by Welford's method, and
+the quantiles by the P-square algorithm (Jain and Chlamtac, 1985), in memory that does not grow w/ the number of
+draws. After every batch they can be saved to a checkpoint file, from which a run that stopped picks up.
+
+Usage:
+
+    from MLE import construct
+
+    res = monte_carlo(construct, {'u_max_A': ('lognormal', 0.8, 0.2), 'K_NH': ('uniform', 0.5, 1.5)}, 2000,
+                      checkpoint='mc.npz', target_SRT=15, solver='Newton')
+    res['quantiles'][:, res['outputs'].index('NH3N')]
+"""
+## @namespace monte_carlo
+## @file monte_carlo.py
+
+
+import functools
+import json
+import os
+
+import numpy as np
+from scipy import stats
+
+from ..ASMModel import asm_1
+from ..ASMModel.composition import DEFAULT_COMPOSITION
+from ..utils import pfd
+from ..utils.scenarios import scenario_runner, STATUS
+
+
+## outputs of a draw: composites of the effluent model components (see ASMModel.composition.COMPOSITES)
+OUTPUTS = ('NH3N', 'NOxN', 'TN', 'sCOD', 'TSS')
+
+
+def _set_kinetic_20C(name, wwtp, value):
+    """
+    Set a kinetic parameter at 20C of all the asm_reactors (scenario setter of a parameter, w/ its name bound).
+    """
+    for _r in pfd.get_all_units(wwtp, 'ASMReactor'):
+        _r._sludge.alter_kinetic_20C(name, value)
+        _r._sludge.update(_r._sludge._temperature, _r._sludge._bulk_DO)
+    return None
+
+
+def kinetic_setters(names):
+    """
+    Return the scenario setters of the kinetic parameters at 20C among names (see asm_1._PARAM_NAMES).
+
+    Args:
+        names:  parameter and other scenario column names
+
+    Return:
+        {parameter name: picklable function of (wwtp, value)}
+    """
+    return {_n: functools.partial(_set_kinetic_20C, _n) for _n in names if _n in asm_1._PARAM_NAMES}
+
+
+def _frozen(dist):
+    """
+    Return the scipy.stats distribution of a distribution spec.
+    """
+    _kind, _p = dist[0], [float(_v) for _v in dist[1:]]
+    if _kind == 'uniform':
+        return stats.uniform(loc=_p[0], scale=_p[1] - _p[0])
+    if _kind == 'normal':
+        return stats.truncnorm(-_p[0] / _p[1], np.inf, loc=_p[0], scale=_p[1])
+    if _kind == 'lognormal':
+        return stats.lognorm(_p[1], scale=_p[0])
+    if _kind == 'triangular':
+        return stats.triang((_p[1] - _p[0]) / (_p[2] - _p[0]), loc=_p[0], scale=_p[2] - _p[0])
+    print('ERROR: Unknown distribution {}.'.format(_kind))
+    return None
+
+
+def latin_hypercube(dists, n, rng):
+    """
+    Draw a Latin hypercube sample.
+
+    Every distribution is cut into n intervals of equal probability, and every interval is drawn from exactly once.
+
+    Args:
+        dists:  [distribution spec];
+        n:      number of draws;
+        rng:    numpy.random.Generator
+
+    Return:
+        (n, number of distributions) numpy.ndarray
+    """
+    _sample = np.empty((n, len(dists)))
+    for _j, _d in enumerate(dists):
+        _u = (rng.permutation(n) + rng.random(n)) / n
+        _sample[:, _j] = _frozen(_d).ppf(_u)
+    return _sample
+
+
+class streaming_stats(object):
+    """
+    Mean, variance, and quantiles of a stream of output vectors, in constant memory.
+
+    General Functions:
+        update(), get_mean(), get_var(), get_quantiles(), get_state(), set_state()
+    """
+
+    def __init__(self, num_outputs, quantiles=(0.05, 0.5, 0.95)):
+        """
+        Args:
+            num_outputs:    length of the output vectors;
+            quantiles:      probabilities of the quantiles to track
+
+        Return:
+            None
+        """
+        self._p = np.array(quantiles, dtype=float)
+        _m = num_outputs
+        self._n = 0
+        self._mean = np.zeros(_m)
+        self._m2 = np.zeros(_m)
+        # P-square markers of every quantile and output: heights, positions, desired positions
+        self._h = np.zeros((len(self._p), 5, _m))
+        self._pos = np.tile(np.arange(1.0, 6.0)[None, :, None], (len(self._p), 1, _m))
+        self._want = (1 + 4 * np.stack([np.zeros_like(self._p), self._p / 2, self._p, (1 + self._p) / 2,
+                                        np.ones_like(self._p)], axis=1))[:, :, None] * np.ones((1, 1, _m))
+        self._dwant = np.stack([np.zeros_like(self._p), self._p / 2, self._p, (1 + self._p) / 2,
+                                np.ones_like(self._p)], axis=1)[:, :, None]
+        return None
+
+
+    def __len__(self):
+        return self._n
+
+
+    def update(self, x):
+        """
+        Add an output vector, or an (n, num_outputs) array of them.
+        """
+        for _x in np.atleast_2d(np.asarray(x, dtype=float)):
+            self._n += 1
+            _d = _x - self._mean
+            self._mean += _d / self._n
+            self._m2 += _d * (_x - self._mean)
+            self._p2_update(_x)
+        return None
+
+
+    def _p2_update(self, x):
+        """
+        Move the P-square markers for a new output vector.
+        """
+        if self._n <= 5:
+            self._h[:, self._n - 1, :] = x
+            if self._n == 5:
+                self._h.sort(axis=1)
+            return None
+
+        _h, _pos = self._h, self._pos
+        # the cell of x between the marker heights, with the extreme markers moved out to x
+        _h[:, 0, :] = np.minimum(_h[:, 0, :], x)
+        _h[:, 4, :] = np.maximum(_h[:, 4, :], x)
+        _k = np.clip((x[None, None, :] >= _h[:, 1:4, :]).sum(axis=1), 0, 3)
+        _pos += (np.arange(5)[None, :, None] > _k[:, None, :])
+        self._want += self._dwant
+
+        for _i in (1, 2, 3):
+            _d = self._want[:, _i, :] - _pos[:, _i, :]
+            _up = (_d >= 1) & (_pos[:, _i + 1, :] - _pos[:, _i, :] > 1)
+            _dn = (_d <= -1) & (_pos[:, _i - 1, :] - _pos[:, _i, :] < -1)
+            _move = _up | _dn
+            if not _move.any():
+                continue
+            _s = np.where(_up, 1.0, -1.0)
+            _hm, _h0, _hp = _h[:, _i - 1, :], _h[:, _i, :], _h[:, _i + 1, :]
+            _nm, _n0, _np = _pos[:, _i - 1, :], _pos[:, _i, :], _pos[:, _i + 1, :]
+            _par = _h0 + _s / (_np - _nm) * ((_n0 - _nm + _s) * (_hp - _h0) / (_np - _n0)
+                                             + (_np - _n0 - _s) * (_h0 - _hm) / (_n0 - _nm))
+            _lin = np.where(_up, _h0 + (_hp - _h0) / (_np - _n0), _h0 - (_hm - _h0) / (_nm - _n0))
+            _new = np.where((_hm < _par) & (_par < _hp), _par, _lin)
+            _h[:, _i, :] = np.where(_move, _new, _h0)
+            _pos[:, _i, :] += np.where(_move, _s, 0.0)
+        return None
+
+
+    def get_mean(self):
+        return self._mean.copy()
+
+
+    def get_var(self):
+        """
+        Return the sample variance.
+        """
+        return self._m2 / (self._n - 1) if self._n > 1 else np.full_like(self._m2, np.nan)
+
+
+    def get_quantiles(self):
+        """
+        Return the (number of quantiles, num_outputs) quantile estimates.
+        """
+        if self._n < 5:
+            if self._n == 0:
+                return np.full(self._h[:, 0, :].shape, np.nan)
+            return np.quantile(self._h[0, :self._n, :], self._p, axis=0)
+        return self._h[:, 2, :].copy()
+
+
+    def get_state(self):
+        """
+        Return the state of the estimators as a dict of arrays, e.g. for numpy.savez().
+        """
+        return {'n': np.array(self._n), 'p': self._p, 'mean': self._mean, 'm2': self._m2, 'h': self._h,
+                'pos': self._pos, 'want': self._want}
+
+
+    def set_state(self, state):
+        """
+        Restore the state returned by get_state().
+        """
+        self._n = int(state['n'])
+        self._p = np.array(state['p'])
+        self._mean = np.array(state['mean'])
+        self._m2 = np.array(state['m2'])
+        self._h = np.array(state['h'])
+        self._pos = np.array(state['pos'])
+        self._want = np.array(state['want'])
+        self._dwant = np.stack([np.zeros_like(self._p), self._p / 2, self._p, (1 + self._p) / 2,
+                                np.ones_like(self._p)], axis=1)[:, :, None]
+        return None
+
+
+def effluent_outputs(effluent):
+    """
+    Return the OUTPUTS of (n, 13) effluent model components as an (n, number of OUTPUTS) array.
+    """
+    return DEFAULT_COMPOSITION.evaluate(np.atleast_2d(effluent), OUTPUTS)
+
+
+def monte_carlo(construct, dists, num_draws, batch_size=256, seed=0, quantiles=(0.05, 0.5, 0.95), checkpoint=None,
+                max_workers=None, timeout=None, progress=None, **solver_args):
+    """
+    Run a Monte Carlo analysis of the effluent of a plant w/ uncertain kinetics.
+
+    Args:
+        construct:      function building the plant (see utils.scenarios.scenario_runner);
+        dists:          {kinetic parameter at 20C or scenario column: distribution spec};
+        num_draws:      total number of draws;
+        batch_size:     number of draws per Latin hypercube batch;
+        seed:           seed of the random numbers;
+        quantiles:      probabilities of the quantiles to track;
+        checkpoint:     .npz file the statistics are saved to after every batch, and resumed from if it exists;
+        max_workers:    number of worker processes (see utils.scenarios.scenario_runner);
+        timeout:        max. time of a draw, sec;
+        progress:       function of (draws done, num_draws) called after every batch, or None;
+        solver_args:    keyword arguments of run.get_steady_state(), e.g. solver='Newton', target_SRT=10
+
+    Return:
+        {'outputs': [output names], 'draws': int, 'failed': int, 'mean': array, 'std': array,
+        'p': quantile probabilities, 'quantiles': (number of quantiles, number of outputs) array}
+    """
+    _names = list(dists)
+    _specs = [dists[_n] for _n in _names]
+    _setters = kinetic_setters(_names)
+    _config = json.dumps({'dists': [[_n, list(_s)] for _n, _s in zip(_names, _specs)], 'batch_size': batch_size,
+                          'seed': seed, 'quantiles': list(quantiles)})
+
+    _stats = streaming_stats(len(OUTPUTS), quantiles)
+    _batch = 0
+    _failed = 0
+    if checkpoint is not None and os.path.exists(checkpoint):
+        with np.load(checkpoint) as _saved:
+            if str(_saved['config']) != _config:
+                print('WARN: Checkpoint {} is from another analysis; starting over.'.format(checkpoint))
+            else:
+                _stats.set_state(_saved)
+                _batch = int(_saved['batch'])
+                _failed = int(_saved['failed'])
+
+    _num_batches = int(np.ceil(num_draws / batch_size))
+    with scenario_runner(construct, _setters, max_workers, timeout, **solver_args) as _runner:
+        while _batch < _num_batches:
+            _n = min(batch_size, num_draws - _batch * batch_size)
+            _draws = latin_hypercube(_specs, batch_size, np.random.default_rng([seed, _batch]))[:_n]
+            _res = _runner.run(_draws, _names)
+
+            _ok = _res['status'] == STATUS.index('ok')
+            _stats.update(effluent_outputs(_res['effluent'][_ok]))
+            _failed += int(np.count_nonzero(~_ok))
+            _batch += 1
+
+            if checkpoint is not None:
+                np.savez(checkpoint, config=_config, batch=_batch, failed=_failed, **_stats.get_state())
+            if progress is not None:
+                progress(min(_batch * batch_size, num_draws), num_draws)
+
+    return {'outputs': list(OUTPUTS), 'draws': len(_stats), 'failed': _failed,
+            'mean': _stats.get_mean(), 'std': np.sqrt(_stats.get_var()), 'p': np.array(quantiles),
+            'quantiles': _stats.get_quantiles()}
@@ -0,0 +1,318 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of global functions for partitioning and tearing the process flow diagram.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Partitioning and tearing of the process flow diagram for the sequential modular loop.
+
+The purpose of partitioning a PFD is to find the groups of units that must be solved together, with as few units as
+possible (Biegler, Grossmann, and Westerberg, 1997, Chapter 8):
+
+    1) the strongly connected components (SCC) of the PFD are the groups (see plant_graph.get_groups()). The groups
+    in topological order form the calculation sequence;
+
+    2) the elementary circuits (loops) of every group are enumerated (Johnson, 1975);
+
+    3) a minimum set of streams that breaks all the loops of a group is torn. The units of the group are calculated
+    in the topological order of the group without the tear streams.
+
+A stream is identified by its discharger and branch: (unit, 'Main') or (unit, 'Side').
+
+The prototypes of these functions, FindGroups() and FindLoops(), are archived in tests/archive/test_functions_3.py.
+"""
+## @namespace partition
+## @file partition.py
+
+
+from itertools import combinations
+
+from ..utils.plant_graph import plant_graph
+
+
+## max. number of loops to enumerate in a group before the tear set falls back to the back edges of a DFS
+_MAX_LOOPS = 1000
+
+## max. number of candidate tear sets to check for the minimum one before the greedy choice takes over
+_MAX_TEAR_SETS = 100000
+
+
+def _receivers(unit):
+    """
+    Return the (receiver, branch) of the outlets of a unit.
+    """
+    _r = []
+    _m = unit.get_downstream_main()
+    if _m is not None:
+        _r.append((_m, 'Main'))
+    if unit.has_sidestream():
+        _s = unit.get_downstream_side()
+        if _s is not None:
+            _r.append((_s, 'Side'))
+    return _r
+
+
+def find_groups(wwtp, graph=None):
+    """
+    Partition the PFD into strongly connected components.
+
+    A unit that is not on any loop forms a group by itself.
+
+    Args:
+        wwtp:   list of all the process units in the plant;
+        graph:  plant_graph of wwtp, built here if not given.
+
+    Return:
+        list of groups (list of units) in the calculation (topological) order
+
+    See:
+        plant_graph.get_groups().
+    """
+    if graph is None:
+        graph = plant_graph(wwtp)
+    return [[graph.get_unit(_i) for _i in _g] for _g in graph.get_groups()]
+
+
+def find_loops(group, max_loops=_MAX_LOOPS):
+    """
+    Enumerate the elementary circuits of a group (Johnson, 1975).
+
+    Args:
+        group:      units in the same strongly connected component;
+        max_loops:  max. number of loops to enumerate.
+
+    Return:
+        list of loops (each a list of streams, i.e. (discharger, branch) tuples),
+
+        whether all the loops have been found (bool)
+    """
+    _rank = {_u: _i for _i, _u in enumerate(group)}
+    _succ = {_u: [(_v, _br) for _v, _br in _receivers(_u) if _v in _rank] for _u in group}
+    _loops = []
+
+    for _start in group:
+        # circuits through _start among the units ranked no lower than _start
+        _ok = lambda _v: _rank[_v] >= _rank[_start]
+        _path = [_start]
+        _streams = []
+        _blocked = {_start}
+        _B = {}
+        _closed = set()
+        _stack = [(_start, [(_v, _br) for _v, _br in _succ[_start] if _ok(_v)])]
+        while _stack:
+            _u, _nbrs = _stack[-1]
+            if _nbrs:
+                _v, _br = _nbrs.pop()
+                if _v is _start:
+                    _loops.append(_streams + [(_u, _br)])
+                    if len(_loops) >= max_loops:
+                        return _loops, False
+                    _closed.update(_path)
+                elif _v not in _blocked:
+                    _path.append(_v)
+                    _streams.append((_u, _br))
+                    _stack.append((_v, [(_w, _b) for _w, _b in _succ[_v] if _ok(_w)]))
+                    _closed.discard(_v)
+                    _blocked.add(_v)
+                    continue
+            if not _nbrs:
+                if _u in _closed:
+                    _unblock(_u, _blocked, _B)
+                else:
+                    for _v, _br in _succ[_u]:
+                        if _ok(_v):
+                            _B.setdefault(_v, set()).add(_u)
+                _stack.pop()
+                _path.pop()
+                if _streams:
+                    _streams.pop()
+
+    return _loops, True
+
+
+def _unblock(unit, blocked, B):
+    """
+    Unblock a unit and those waiting on it in Johnson's algorithm.
+    """
+    _stack = [unit]
+    while _stack:
+        _u = _stack.pop()
+        if _u in blocked:
+            blocked.discard(_u)
+            _stack.extend(B.pop(_u, ()))
+    return None
+
+
+def select_tears(group, loops):
+    """
+    Choose the minimum set of streams that breaks all the loops of a group.
+
+    Streams on exactly the same loops are interchangeable. Among them, the one entering a mixing point (a unit with
+    more than one inlet) is preferred, so that a recycle is torn where it meets the forward flow. Streams on a subset
+    of the loops of another stream are never needed in a minimum tear set.
+
+    Args:
+        group:  units in the same strongly connected component;
+        loops:  all the loops of the group, see find_loops()
+
+    Return:
+        list of tear streams, (discharger, branch) tuples
+    """
+    _rank = {_u: _i for _i, _u in enumerate(group)}
+
+    _cover = {}
+    for _i, _lp in enumerate(loops):
+        for _s in _lp:
+            _cover.setdefault(_s, set()).add(_i)
+
+    def _pref(_s):
+        _u, _br = _s
+        _rcv = _u.get_downstream_main() if _br == 'Main' else _u.get_downstream_side()
+        return (len(_rcv.get_upstream()) < 2, _rank[_u], _br)
+
+    # one stream per distinct set of loops
+    _reps = {}
+    for _s in sorted(_cover, key=_pref):
+        _reps.setdefault(frozenset(_cover[_s]), _s)
+    _sets = [_k for _k in _reps if not any(_k < _o for _o in _reps)]
+    _sets.sort(key=lambda _k: (-len(_k), _pref(_reps[_k])))
+
+    _all = set(range(len(loops)))
+    _checked = 0
+    for _n in range(1, len(_sets) + 1):
+        for _combo in combinations(_sets, _n):
+            _checked += 1
+            if _checked > _MAX_TEAR_SETS:
+                return _greedy_tears(_sets, _reps, _all)
+            if set().union(*_combo) == _all:
+                return [_reps[_k] for _k in _combo]
+    return []
+
+
+def _greedy_tears(sets, reps, all_loops):
+    """
+    Tear the stream on the most loops that are not broken yet, until all are broken.
+    """
+    _left = set(all_loops)
+    _tears = []
+    while _left:
+        _k = max(sets, key=lambda _s: len(_s & _left))
+        _tears.append(reps[_k])
+        _left -= _k
+    return _tears
+
+
+def _back_edges(group):
+    """
+    Return the streams closing the loops of a depth first search of the group.
+
+    This tear set breaks all the loops but is not necessarily the minimum.
+    """
+    _member = set(group)
+    _state = {}
+    _tears = []
+    for _root in group:
+        if _root in _state:
+            continue
+        _state[_root] = 1
+        _work = [(_root, iter([(_v, _br) for _v, _br in _receivers(_root) if _v in _member]))]
+        while _work:
+            _u, _it = _work[-1]
+            _nxt = next(_it, None)
+            if _nxt is None:
+                _state[_u] = 2
+                _work.pop()
+                continue
+            _v, _br = _nxt
+            if _v not in _state:
+                _state[_v] = 1
+                _work.append((_v, iter([(_w, _b) for _w, _b in _receivers(_v) if _w in _member])))
+            elif _state[_v] == 1:
+                _tears.append((_u, _br))
+    return _tears
+
+
+def _order_group(group, tears):
+    """
+    Return the units of a group in the topological order of the group without the tear streams.
+    """
+    _rank = {_u: _i for _i, _u in enumerate(group)}
+    _torn = set(tears)
+    _indeg = {_u: 0 for _u in group}
+    for _u in group:
+        for _v, _br in _receivers(_u):
+            if _v in _rank and (_u, _br) not in _torn:
+                _indeg[_v] += 1
+    _ready = [_u for _u in group if _indeg[_u] == 0]
+    _order = []
+    while _ready:
+        _ready.sort(key=_rank.get)
+        _u = _ready.pop(0)
+        _order.append(_u)
+        for _v, _br in _receivers(_u):
+            if _v in _rank and (_u, _br) not in _torn:
+                _indeg[_v] -= 1
+                if _indeg[_v] == 0:
+                    _ready.append(_v)
+    if len(_order) < len(group):
+        print('ERROR: The tear streams do not break all the loops of', [_u.__name__ for _u in group])
+        _order += [_u for _u in group if _u not in _order]
+    return _order
+
+
+def calc_order(wwtp, max_loops=_MAX_LOOPS, graph=None):
+    """
+    Partition and tear the PFD into a calculation sequence.
+
+    Each block of the sequence is either a unit that is not on any loop (no tear streams), which only needs to be
+    calculated once its upstream blocks are, or a group of units on loops, which is iterated with its tear streams.
+
+    Args:
+        wwtp:       list of all the process units in the plant;
+        max_loops:  max. number of loops to enumerate in a group;
+        graph:      plant_graph of wwtp, built here if not given.
+
+    Return:
+        list of blocks, each a tuple of ([units in the calculation order], [tear streams])
+
+    See:
+        find_groups();
+        find_loops();
+        select_tears().
+    """
+    _blocks = []
+    for _g in find_groups(wwtp, graph):
+        _self_loop = [(_u, _br) for _u in _g for _v, _br in _receivers(_u) if _v is _u]
+        if len(_g) == 1:
+            _blocks.append((_g, _self_loop))
+            continue
+        _loops, _complete = find_loops(_g, max_loops)
+        _tears = select_tears(_g, _loops) if _complete else _back_edges(_g)
+        _blocks.append((_order_group(_g, _tears), _tears))
+    return _blocks
+
+
+def flatten(blocks):
+    """
+    Return the units of the blocks in the calculation order as one list.
+    """
+    return [_u for _units, _tears in blocks for _u in _units]
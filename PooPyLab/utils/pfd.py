@@ -32,6 +32,7 @@ import json
 from ..unit_procs.streams import influent, effluent, WAS, pipe, splitter
 from ..unit_procs.bio import asm_reactor
 from ..unit_procs.physchem import final_clarifier
+from ..utils.plant_graph import plant_graph
 
 
 def _check_connection(pfd=[]):
@@ -170,45 +171,7 @@ def _check_sidestream_flows(mysplitters):
     return _undefined == 0
 
 
-def _find_main_only_prefix(cur, pms):
-    """
-    Find the mainstream only loop in the PFD.
-
-    Rules:
-        1) A recycle/recirculation (loop) shall be via a splitter sidestream;
-
-    Args:
-        cur:    current process unit;
-        pms:    list of mainstream units (prefixes) leading to "cur".
-
-    Return:
-        bool
-
-    See:
-        _has_main_only_loops().
-    """
-    if cur in pms:
-        # found a mainstream-only loop
-        return True
-
-    if cur is None or cur.get_type() == 'Effluent' or cur.get_type() == 'WAS':
-        # current ms_prefix leads to dead end
-        if len(pms) > 0:
-            pms.pop()
-        return False
-
-    pms.append(cur)
-
-    if _find_main_only_prefix(cur.get_downstream_main(), pms):
-        return True
-    elif len(pms) > 0:
-        pms.pop()
-        return False
-    else:
-        return False
-
-
-def _has_main_only_loops(pfd):
+def _has_main_only_loops(pfd, graph=None):
     """
     Analyze a PFD and see whether it has a loop only via mainstream outlets.
 
@@ -217,21 +180,22 @@ def _has_main_only_loops(pfd):
 
     Args:
         pfd:    Process Flow Diagram (list of process units in the WWTP);
+        graph:  plant_graph of the PFD, built here if not given.
 
     Return:
         bool
 
     See:
-        _find_main_only_prefix().
+        plant_graph.find_main_only_loop().
     """
-    for _u in pfd:
-        prefix_ms = []
-        if _find_main_only_prefix(_u, prefix_ms):
-            print('PFD ERROR: Found a mainstream-only loop.')
-            print(' Loop={}'.format([x.__name__ for x in prefix_ms]))
-            return True
-        else:
-            return False
+    if graph is None:
+        graph = plant_graph(pfd)
+    _loop = graph.find_main_only_loop()
+    if _loop:
+        print('PFD ERROR: Found a mainstream-only loop.')
+        print(' Loop={}'.format([graph.get_unit(_i).__name__ for _i in _loop]))
+        return True
+    return False
 
 
 def get_all_units(wwtp, type='ASMReactor'):
@@ -244,6 +208,9 @@ def get_all_units(wwtp, type='ASMReactor'):
 
     Return:
         a list of process units
+
+    See:
+        plant_graph.get_units() for repeated queries on the same PFD.
     """
     return [w for w in wwtp if w.get_type() == type]
 
@@ -264,14 +231,16 @@ def check(wwtp):
         _check_sidestream_flows();
     """
 
-    _all_WAS = get_all_units(wwtp, 'WAS')
+    _graph = plant_graph(wwtp)
+
+    _all_WAS = _graph.get_units('WAS')
 
-    _all_splitters = get_all_units(wwtp, 'Splitter')
+    _all_splitters = _graph.get_units('Splitter')
 
     _le = _check_connection(wwtp)
     _WAS_ok, _srt_ctrl_ = _check_WAS(_all_WAS)
     _side_flow_defined = _check_sidestream_flows(_all_splitters)
-    _has_ms_loops = _has_main_only_loops(wwtp)
+    _has_ms_loops = _has_main_only_loops(wwtp, _graph)
 
     if _le == 0 and _WAS_ok and _side_flow_defined and _has_ms_loops is False:
         print('Found one SRT controller splitter; Moved to the back of PFD')
@@ -325,6 +294,21 @@ def show(wwtp=[]):
     return None
 
 
+def get_config(wwtp=[], global_params={}):
+    """ Return the plant configuration as saved by save_wwtp()
+
+        Args:
+            wwtp: [all process units in the wastewater treatment plant]
+            global_params: {global parameters (e.g SRT) for the WWTP}
+
+        Return:
+            {'Flowsheet': {codename: unit config}, 'Global Params': global_params}
+    """
+    return {'Flowsheet': {unit.get_codename(): unit.get_config() for unit in wwtp},
+            'Global Params': global_params
+           }
+
+
 def save_wwtp(wwtp=[], global_params={}, filename='myWWTP.json'):
     """ Save the plant configuratoin to a file in json
 
@@ -336,9 +320,7 @@ def save_wwtp(wwtp=[], global_params={}, filename='myWWTP.json'):
         Return:
             None
     """
-    plant_def = {'Flowsheet': {unit.get_codename(): unit.get_config() for unit in wwtp},
-                 'Global Params': global_params
-                }
+    plant_def = get_config(wwtp, global_params)
     print(json.dumps(plant_def, sort_keys=False, indent=4))
         
     with open(filename, "w") as savef:
@@ -0,0 +1,204 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the generator of synthetic process flow diagrams.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Synthetic process flow diagrams of any size, for scaling tests.
+
+regional_plant() builds a plant of parallel activated sludge trains out of the regular process units:
+
+    influent -> distribution splitters -> N trains -> effluent
+
+    train:  [step feed splitters] -> K zones of (anoxic -> aerobic) -> IR splitter -> [distribution splitters] ->
+            M final clarifiers
+
+    the underflows of all the clarifiers -> SRT controlling splitter -> RAS distribution splitters -> the first
+    anoxic zone of every train; its sidestream -> WAS
+
+With N = K = M = 1 the plant is the MLE example. Every connection is made through a pipe, as in the examples, and
+every splitter other than the SRT controller has its sidestream flow defined, so the plant passes pfd.check(). The
+rules of pfd.check() allow only one SRT controlling splitter in a PFD, so the trains share theirs.
+
+The flows of a train are the plant flow split evenly: every zone gets 1/K of the train's influent, every clarifier
+1/M of the train's mixed liquor flow. The flow balances alone would leave the split of the underflows among the
+clarifiers open, so every clarifier but the last one of the plant has its underflow set to its share of the RAS; the
+last one's also carries the WAS. The reactors are sized by their hydraulic retention times. The units are named
+after their trains, e.g. 'T03_OX2' is the aerobic reactor of the 2nd zone of the 3rd train.
+
+Usage:
+
+    wwtp = regional_plant(num_trains=40, num_zones=4, num_clarifiers=2)
+    pfd.check(wwtp)
+    pfd.save_wwtp(wwtp, {'SRT': 10}, 'regional.json')
+"""
+## @namespace pfd_generator
+## @file pfd_generator.py
+
+
+from ..unit_procs.streams import influent, effluent, WAS, splitter, pipe
+from ..unit_procs.bio import asm_reactor
+from ..unit_procs.physchem import final_clarifier
+
+
+def count_units(num_trains=1, num_zones=1, num_clarifiers=1):
+    """
+    Return the number of process units of a regional_plant().
+    """
+    return 1 + num_trains * (7 * num_zones + 6 * num_clarifiers + 3)
+
+
+def _named(unit, name, wwtp):
+    unit.set_name(name)
+    wwtp.append(unit)
+    return unit
+
+
+def _distribute(source, flows, prefix, wwtp):
+    """
+    Split the outflow of a unit among len(flows) receivers, through a chain of splitters.
+
+    Every splitter of the chain sends one of the flows to its sidestream; the mainstream of the last one carries the
+    rest, i.e. the last of the flows is not imposed. A source other than a pipe is connected through a new pipe.
+
+    Args:
+        source: the unit discharging the flow to split;
+        flows:  flows of the receivers, m3/d;
+        prefix: prefix of the names of the splitters and pipes;
+        wwtp:   list of process units the new units are added to
+
+    Return:
+        the pipes leading to the receivers, in the order of flows
+    """
+    _outlets = []
+    _src = source
+    if source.get_type() != 'Pipe':
+        _src = _named(pipe(), '{}_P0'.format(prefix), wwtp)
+        source.set_downstream_main(_src)
+    for _k, _flow in enumerate(flows[:-1]):
+        _splt = _named(splitter(), '{}_SPLT{}'.format(prefix, _k + 1), wwtp)
+        _side = _named(pipe(), '{}_P{}'.format(prefix, _k + 1), wwtp)
+        _main = _named(pipe(), '{}_PM{}'.format(prefix, _k + 1), wwtp)
+        _src.set_downstream_main(_splt)
+        _splt.set_downstream_side(_side)
+        _splt.set_downstream_main(_main)
+        _splt.set_sidestream_flow(_flow)
+        _outlets.append(_side)
+        _src = _main
+    _outlets.append(_src)
+    return _outlets
+
+
+def regional_plant(num_trains=1, num_zones=1, num_clarifiers=1, inf_flow=37800, RAS_ratio=0.5, IR_ratio=3.0,
+                   AX_HRT=0.106, OX_HRT=0.265, temp=20, DO=2.0):
+    """
+    Build a plant of parallel MLE trains w/ step feed zones and several final clarifiers per train.
+
+    Args:
+        num_trains:     number of parallel trains (N);
+        num_zones:      number of step feed zones, each an anoxic and an aerobic reactor, per train (K);
+        num_clarifiers: number of final clarifiers per train (M);
+        inf_flow:       plant influent flow, m3/d;
+        RAS_ratio:      RAS flow / influent flow, of the plant and of every train;
+        IR_ratio:       internal recirculation (end of the last aerobic zone to the first anoxic zone) / influent
+                        flow of a train;
+        AX_HRT:         hydraulic retention time of all the anoxic zones of a train, d;
+        OX_HRT:         hydraulic retention time of all the aerobic zones of a train, d;
+        temp:           wastewater temperature of the reactors, degC;
+        DO:             DO setpoint of the aerobic reactors, mg/L
+
+    Return:
+        all process units of the plant, count_units() of them (list)
+    """
+    if min(num_trains, num_zones, num_clarifiers) < 1:
+        print('ERROR: A regional plant needs at least one train, zone, and clarifier.')
+        return []
+
+    wwtp = []
+    _q = float(inf_flow) / num_trains
+
+    _inlet = _named(influent(), 'INF', wwtp)
+    _inlet.set_mainstream_flow(inf_flow)
+    _outlet = _named(effluent(), 'EFF', wwtp)
+    _waste = _named(WAS(), 'WAS', wwtp)
+
+    _srt = _named(splitter(), 'SRT_SPLT', wwtp)
+    _srt.set_as_SRT_controller(True)
+    _srt.set_mainstream_flow(RAS_ratio * inf_flow)
+    _pw = _named(pipe(), 'WAS_P', wwtp)
+    _srt.set_downstream_side(_pw)
+    _pw.set_downstream_main(_waste)
+    _ras = _named(pipe(), 'RAS_P', wwtp)
+    _srt.set_downstream_main(_ras)
+
+    _feeds = _distribute(_inlet, [_q] * num_trains, 'INF', wwtp)
+    _returns = _distribute(_ras, [RAS_ratio * _q] * num_trains, 'RAS', wwtp)
+
+    for _t in range(num_trains):
+        _tn = 'T{:02d}'.format(_t + 1)
+
+        # step feed, and the zones
+        _steps = _distribute(_feeds[_t], [_q / num_zones] * num_zones, _tn + '_SF', wwtp)
+        _first_ax = None
+        _prev = None
+        for _k in range(num_zones):
+            _ax = _named(asm_reactor(), '{}_AX{}'.format(_tn, _k + 1), wwtp)
+            _ox = _named(asm_reactor(), '{}_OX{}'.format(_tn, _k + 1), wwtp)
+            _p_ax = _named(pipe(), '{}_P_AX{}'.format(_tn, _k + 1), wwtp)
+            _p_ox = _named(pipe(), '{}_P_OX{}'.format(_tn, _k + 1), wwtp)
+            _ax.set_active_vol(AX_HRT * _q / num_zones)
+            _ox.set_active_vol(OX_HRT * _q / num_zones)
+            _ax.set_model_condition(temp, 0.0)
+            _ox.set_model_condition(temp, DO)
+            _steps[_k].set_downstream_main(_ax)
+            if _prev is not None:
+                _prev.set_downstream_main(_ax)
+            _ax.set_downstream_main(_p_ax)
+            _p_ax.set_downstream_main(_ox)
+            _ox.set_downstream_main(_p_ox)
+            _prev = _p_ox
+            _first_ax = _first_ax or _ax
+        _returns[_t].set_downstream_main(_first_ax)
+
+        # internal recirculation
+        _ir_splt = _named(splitter(), _tn + '_IR_SPLT', wwtp)
+        _ir = _named(pipe(), _tn + '_IR', wwtp)
+        _prev.set_downstream_main(_ir_splt)
+        _ir_splt.set_downstream_side(_ir)
+        _ir_splt.set_sidestream_flow(IR_ratio * _q)
+        _ir.set_downstream_main(_first_ax)
+
+        # final clarifiers
+        _ml = (1.0 + RAS_ratio) * _q / num_clarifiers
+        for _m, _p_fc in enumerate(_distribute(_ir_splt, [_ml] * num_clarifiers, _tn + '_FC', wwtp)):
+            _fc = _named(final_clarifier(), '{}_FC{}'.format(_tn, _m + 1), wwtp)
+            _p_eff = _named(pipe(), '{}_P_EFF{}'.format(_tn, _m + 1), wwtp)
+            _p_uf = _named(pipe(), '{}_P_UF{}'.format(_tn, _m + 1), wwtp)
+            _p_fc.set_downstream_main(_fc)
+            _fc.set_downstream_main(_p_eff)
+            _fc.set_downstream_side(_p_uf)
+            _p_eff.set_downstream_main(_outlet)
+            _p_uf.set_downstream_main(_srt)
+            if _t < num_trains - 1 or _m < num_clarifiers - 1:
+                _fc.set_sidestream_flow(RAS_ratio * _q / num_clarifiers)
+
+    return wwtp
@@ -0,0 +1,503 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the whole plant dynamic (time dependent) equation system.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Dynamic simulation of a whole plant as one ODE system.
+
+The only differential states are the model components of the asm_reactors. Everything else is algebraic at any time:
+
+    1) the branch flows are solved from the flow balances of the plant (see flow_system) at the influent flows of the
+    moment and a fixed WAS flow;
+
+    2) the concentrations of the other branches (pipes, splitters, final clarifiers, effluent, WAS) follow from the
+    reactor concentrations and the influent concentrations by the (linear) inlet blending and the solids split of the
+    final clarifiers.
+
+Eliminating the algebraic part leaves, for every model component, a linear transport between the reactors plus the
+kinetics inside each reactor:
+
+    dC/dt = ((T @ [C_reactors, C_influents]) - Q_in * C) / V + r(C) + KLa * (DO_sat - DO)
+
+T only depends on the flows, i.e. on time, and is computed once per time the integrator asks for. The jacobian is
+analytic: the transport part is T itself, and the kinetics part comes from ASMModel.asm_1.batch_reaction_jacobians().
+
+The wastewater temperature of the asm_reactors may follow a profile too. The kinetic parameters at the temperatures of
+the moment are then evaluated in closed form from the parameters at 20C (see ASMModel.asm_1.params_at_temperature()),
+once per time the integrator asks for; the stoichiometrics do not change w/ temperature.
+
+The results are passed to a writer at regular output times as the integration goes, so that long simulations do not
+need to be kept in memory.
+"""
+## @namespace plant_dynamics
+## @file plant_dynamics.py
+
+
+import contextlib
+import time
+
+import numpy as np
+from scipy import integrate
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from ..ASMModel import asm_1
+from ..utils.plant_system import plant_system, _PARTICULATE_INDEX, _CLARIFIER_ANOXIC_HRT
+
+
+## model component indices of the transport classes: soluble, particulate (split by a final_clarifier), and DO
+## (zeroed in an anoxic final_clarifier)
+_CLASS_INDEX = ([1, 2, 3, 4, 5, 6], _PARTICULATE_INDEX, [0])
+
+## max. number of algebraic branches solved with dense matrices (sparse LU above it)
+_DENSE_LIMIT = 200
+
+## integration methods of scipy.integrate that take the analytic jacobian
+_IMPLICIT = ('BDF', 'Radau', 'LSODA')
+
+
+def interp_series(times, flows, comps):
+    """
+    Make a piecewise linear influent time series.
+
+    Args:
+        times:  (n,) ascending times, d;
+        flows:  (n,) influent flows, m3/d;
+        comps:  (n, 13) influent model components, mg/L
+
+    Return:
+        function of time t (d) returning (flow, numpy.ndarray of the 13 model components)
+    """
+    _t = np.asarray(times, dtype=float)
+    _q = np.asarray(flows, dtype=float)
+    _c = np.asarray(comps, dtype=float)
+
+    def _lookup(t):
+        if len(_t) == 1:
+            return float(_q[0]), _c[0].copy()
+        _k = min(max(int(np.searchsorted(_t, t, side='right')) - 1, 0), len(_t) - 2)
+        _f = min(max((t - _t[_k]) / (_t[_k + 1] - _t[_k]), 0.0), 1.0)
+        return float(_q[_k] + _f * (_q[_k + 1] - _q[_k])), _c[_k] + _f * (_c[_k + 1] - _c[_k])
+
+    return _lookup
+
+
+def interp_temperatures(times, temps):
+    """
+    Make a piecewise linear wastewater temperature profile.
+
+    Args:
+        times:  (n,) ascending times, d;
+        temps:  (n,) temperatures of all the asm_reactors, or (n, number of asm_reactors) temperatures, degC
+
+    Return:
+        function of time t (d) returning the temperature(s), degC
+    """
+    _t = np.asarray(times, dtype=float)
+    _T = np.asarray(temps, dtype=float).reshape(len(_t), -1)
+
+    def _lookup(t):
+        if len(_t) == 1:
+            return _T[0].copy()
+        _k = min(max(int(np.searchsorted(_t, t, side='right')) - 1, 0), len(_t) - 2)
+        _f = min(max((t - _t[_k]) / (_t[_k + 1] - _t[_k]), 0.0), 1.0)
+        return _T[_k] + _f * (_T[_k + 1] - _T[_k])
+
+    return _lookup
+
+
+class plant_dynamics(plant_system):
+    """
+    Whole plant dynamic equation system built from a process flow diagram.
+
+    The initial state is read from the process units (e.g. after run.get_steady_state()), and the state at the end of
+    a simulation is written back into them.
+
+    General Functions:
+        is_ready(), get_reactor_state(), dydt(), ode_jacobian(), expand(), simulate()
+    """
+
+    def __init__(self, wwtp=[], influent_series={}, WAS_flow=None, fix_DO=True, DO_sat_T=10, temp_series=None):
+        """
+        Args:
+            wwtp:               list of all process units of the plant (see utils.pfd.check());
+            influent_series:    {influent unit: function of time t (d) returning (flow, 13 model components)}, or
+                                (times, flows, comps) arrays in place of the function (see interp_series()).
+                                Influents not listed follow their own time series (see influent.set_time_series())
+                                or keep their current flow and model components;
+            WAS_flow:           total WAS flow during the simulation, m3/d. The current flows of the WAS units are
+                                used if None;
+            fix_DO:             whether to simulate w/ fix DO setpoints in the asm_reactors;
+            DO_sat_T:           saturated DO conc. under the site conditions, mg/L;
+            temp_series:        function of time t (d) returning the wastewater temperature of all the asm_reactors
+                                (or an array of one per reactor), degC, or (times, temps) arrays in place of the
+                                function (see interp_temperatures()). The reactors keep their temperatures if None
+
+        Return:
+            None
+        """
+        plant_system.__init__(self, wwtp, 5, fix_DO, DO_sat_T)
+        if not self._ready:
+            return None
+
+        self._series = []
+        for _b in self._inf_b:
+            _u = self._branches[_b][0]
+            _s = influent_series.get(_u, _u.get_time_series())
+            if _s is not None and not callable(_s):
+                _s = interp_series(*_s)
+            self._series.append(_s)
+
+        if temp_series is not None and not callable(temp_series):
+            temp_series = interp_temperatures(*temp_series)
+        self._temp_series = temp_series
+        self._reac_params_20C = np.array([_r._sludge.get_param_vector_20C() for _r in self._reactors])
+        self._t_kin = None
+
+        if WAS_flow is None:
+            WAS_flow = sum([self._branches[_b][0].get_main_outflow() for _b in self._was_branches])
+        self._WAS_flow = WAS_flow
+
+        # algebraic branches: all but the influents and the asm_reactors
+        _fixed = set(self._inf_b.tolist()) | set(self._reac_b.tolist())
+        self._alg_b = np.array([_b for _b in range(self._num_branches) if _b not in _fixed], dtype=int)
+        self._alg_u = np.array([self._uid[self._branches[_b][0]] for _b in self._alg_b], dtype=int)
+        self._known_b = np.concatenate([self._reac_b, self._inf_b]).astype(int)
+
+        # solids split and volume of the final clarifier owning an algebraic branch
+        self._alg_clar = np.zeros(len(self._alg_b), dtype=bool)
+        self._alg_split = np.ones(len(self._alg_b))
+        self._alg_vol = np.zeros(len(self._alg_b))
+        _pos = {_b: _i for _i, _b in enumerate(self._alg_b)}
+        for _u, _mo, _so, _cap, _vol in self._clar:
+            for _b, _f in ((_mo, 1.0 - _cap), (_so, _cap)):
+                self._alg_clar[_pos[_b]] = True
+                self._alg_split[_pos[_b]] = _f
+                self._alg_vol[_pos[_b]] = _vol
+
+        self._nr = len(self._reac_b)
+
+        # (row, column, branch) of the inlet flows of the algebraic branches and the reactors, split by whether the
+        # discharging branch is algebraic or known
+        _alg_pos = {_b: _i for _i, _b in enumerate(self._alg_b)}
+        _known_pos = {_b: _i for _i, _b in enumerate(self._known_b)}
+        _inlet = self._flows._inlet_mat.tocsr()
+        self._in_unit = _inlet.tocoo().row
+        self._in_branch = _inlet.tocoo().col
+        _pairs = {'alg_alg': [], 'alg_known': [], 'reac_alg': [], 'reac_known': []}
+        for _owner, _units in (('alg', self._alg_u), ('reac', self._reac_u)):
+            for _i, _k in enumerate(_units):
+                for _b in _inlet.indices[_inlet.indptr[_k]:_inlet.indptr[_k + 1]]:
+                    if _b in _alg_pos:
+                        _pairs[_owner + '_alg'].append((_i, _alg_pos[_b], _b))
+                    else:
+                        _pairs[_owner + '_known'].append((_i, _known_pos[_b], _b))
+        self._pairs = {_k: np.array(_v, dtype=int).reshape(-1, 3).T for _k, _v in _pairs.items()}
+
+        # transport at the last time asked for
+        self._t_cache = None
+        self._Q = None
+        self._Cf = None
+        self._G = [None] * len(_CLASS_INDEX)
+        self._T = [None] * len(_CLASS_INDEX)
+
+        ## number of transport updates and derivative evaluations
+        self._num_transport = 0
+        self._num_rhs = 0
+        return None
+
+
+    def get_reactor_state(self):
+        """
+        Return the current model components of the asm_reactors as the ODE state vector.
+
+        The DO of the reactors with a fixed DO is set to the setpoint.
+        """
+        _Y = np.array([_r.get_main_outlet_concs() for _r in self._reactors], dtype=float).reshape(-1, self._nc)
+        _Y[self._reac_fix_DO, 0] = self._reac_DO[self._reac_fix_DO]
+        return _Y.ravel()
+
+
+    def _influent_at(self, t):
+        """
+        Return the flows (n_inf,) and model components (n_inf, 13) of the influents at time t.
+        """
+        _Q = self._design_flows.copy()
+        _C = self._inf_comps.copy()
+        for _i, _s in enumerate(self._series):
+            if _s is not None:
+                _q, _c = _s(t)
+                _Q[_i] = _q
+                _C[_i] = _c
+        return _Q, _C
+
+
+    def _transport(self, t):
+        """
+        Solve the flows at time t, and eliminate the algebraic branches from the component balances.
+
+        For every class of model components, G maps [C_reactors, C_influents] to the concentrations of the algebraic
+        branches, and T maps them to the inlet mass flows of the reactors.
+        """
+        if t == self._t_cache:
+            return None
+        self._num_transport += 1
+
+        _Qf, self._Cf = self._influent_at(t)
+        _Q = self._flows.solve(self._WAS_flow, _Qf)
+        _Qin = np.bincount(self._in_unit, _Q[self._in_branch], minlength=self._num_units)
+        _n, _nk = len(self._alg_b), len(self._known_b)
+
+        # inlet blending, unless a clarifier splits the solids or strips the DO
+        _qin = _Qin[self._alg_u]
+        _a = np.tile(_qin, (len(_CLASS_INDEX), 1))
+        _w = np.ones_like(_a)
+        _c = self._alg_clar
+        _a[1, _c] = _Q[self._alg_b[_c]]
+        _w[1, _c] = self._alg_split[_c]
+        _anoxic = _c & ((_qin <= 0) | (self._alg_vol > _CLARIFIER_ANOXIC_HRT * _qin))
+        _a[2, _anoxic] = 1.0
+        _w[2, _anoxic] = 0.0
+        _zero = _a <= 0
+        _a[_zero] = 1.0
+        _w[_zero] = 0.0
+
+        # inlet mass flows of the reactors per unit conc. of the algebraic and the known branches
+        _i, _j, _b = self._pairs['reac_alg']
+        _Mr_alg = np.zeros((self._nr, _n))
+        _Mr_alg[_i, _j] = _Q[_b]
+        _i, _j, _b = self._pairs['reac_known']
+        _Mr_known = np.zeros((self._nr, _nk))
+        _Mr_known[_i, _j] = _Q[_b]
+
+        _ai, _aj, _ab = self._pairs['alg_alg']
+        _ki, _kj, _kb = self._pairs['alg_known']
+        _diag = np.arange(_n)
+        for _k in range(len(_CLASS_INDEX)):
+            if _n:
+                _R = np.zeros((_n, _nk))
+                _R[_ki, _kj] = _w[_k, _ki] * _Q[_kb]
+                if _n > _DENSE_LIMIT:
+                    _A = sparse.csc_matrix((np.concatenate([_a[_k], -_w[_k, _ai] * _Q[_ab]]),
+                                            (np.concatenate([_diag, _ai]), np.concatenate([_diag, _aj]))),
+                                           shape=(_n, _n))
+                    self._G[_k] = splu(_A).solve(_R)
+                else:
+                    _A = np.diag(_a[_k])
+                    _A[_ai, _aj] -= _w[_k, _ai] * _Q[_ab]
+                    self._G[_k] = np.linalg.solve(_A, _R)
+                self._T[_k] = _Mr_alg @ self._G[_k] + _Mr_known
+            else:
+                self._G[_k] = np.zeros((0, _nk))
+                self._T[_k] = _Mr_known
+
+        self._Q = _Q
+        self._Qin_r = _Qin[self._reac_u]
+        self._t_cache = t
+        return None
+
+
+    def _kinetics_at(self, t):
+        """
+        Set the kinetic parameters of the asm_reactors to their temperatures at time t.
+        """
+        if self._temp_series is None or t == self._t_kin:
+            return None
+        self._t_kin = t
+        _T = np.broadcast_to(np.asarray(self._temp_series(t), dtype=float), (self._nr,))
+        self._reac_params = asm_1.params_at_temperature(self._reac_params_20C, _T)
+        return None
+
+
+    def dydt(self, t, y):
+        """
+        Time derivatives of the model components of the asm_reactors, mg/L/d.
+
+        Args:
+            t:  time, d;
+            y:  reactor state vector (see get_reactor_state())
+
+        Return:
+            numpy.ndarray of the same size as y
+        """
+        self._transport(t)
+        self._kinetics_at(t)
+        self._num_rhs += 1
+        _Y = y.reshape(self._nr, self._nc)
+        _Min = np.empty_like(_Y)
+        for _k, _idx in enumerate(_CLASS_INDEX):
+            _Min[:, _idx] = self._T[_k] @ np.vstack([_Y[:, _idx], self._Cf[:, _idx]])
+        _dY = -self._reactor_residual(_Y, self._Qin_r, _Min)
+        _dY[self._reac_fix_DO, 0] = 0.0
+        return _dY.ravel()
+
+
+    def ode_jacobian(self, t, y):
+        """
+        Analytic jacobian of dydt().
+
+        Return:
+            scipy.sparse.csc_matrix
+        """
+        self._transport(t)
+        self._kinetics_at(t)
+        _Y = y.reshape(self._nr, self._nc)
+        _kin = asm_1.batch_reaction_jacobians(_Y, self._reac_params, self._reac_stoichs)
+        _kin[:, 0, 0] -= self._reac_KLa
+        _J = sparse.block_diag(list(_kin), format='csr') if self._nr else sparse.csr_matrix((0, 0))
+
+        for _k, _idx in enumerate(_CLASS_INDEX):
+            _tr = (self._T[_k][:, :self._nr] - np.diag(self._Qin_r)) / self._reac_vols[:, None]
+            _mask = np.zeros(self._nc)
+            _mask[_idx] = 1.0
+            _J = _J + sparse.kron(sparse.csr_matrix(_tr), sparse.diags(_mask))
+
+        _keep = np.ones((self._nr, self._nc))
+        _keep[self._reac_fix_DO, 0] = 0.0
+        return (sparse.diags(_keep.ravel()) @ _J).tocsc()
+
+
+    def expand(self, t, y):
+        """
+        Return the flows and model components of all the branches at time t.
+
+        Args:
+            t:  time, d;
+            y:  reactor state vector
+
+        Return:
+            (B, 14) numpy.ndarray of [flow, 13 model components] in the branch order (see get_branches())
+        """
+        self._transport(t)
+        _Y = y.reshape(self._nr, self._nc)
+        _X = np.zeros((self._num_branches, self._bs))
+        _X[:, 0] = self._Q
+        _X[self._reac_b, 1:] = _Y
+        _X[self._inf_b, 1:] = self._Cf
+        for _k, _idx in enumerate(_CLASS_INDEX):
+            _X[np.ix_(self._alg_b, [_i + 1 for _i in _idx])] = self._G[_k] @ np.vstack([_Y[:, _idx],
+                                                                                       self._Cf[:, _idx]])
+        return _X
+
+
+    def get_branches(self):
+        """
+        Return the (unit, 'Main'|'Side') of every branch, in the order of the rows of expand().
+        """
+        return self._branches[:]
+
+
+    def simulate(self, t_span, dt_out=1/96, method='BDF', rtol=1E-5, atol=1E-3, writer=None, verbose=False,
+                 instr=None):
+        """
+        Integrate the plant over a time span and pass the results to the writer at every output time.
+
+        Args:
+            t_span:     (start, end) times, d;
+            dt_out:     interval between the outputs, d;
+            method:     integration method of scipy.integrate, e.g. 'BDF', 'Radau', 'LSODA', 'RK45';
+            rtol:       relative tolerance;
+            atol:       absolute tolerance, mg/L;
+            writer:     function of (t, (B, 14) results of expand()) called at every output time. The results are
+                        collected and returned if None;
+            verbose:    whether to print the progress;
+            instr:      utils.instrument.instrument w/ a run started, recording the integration ('integrate') and
+                        output ('output') times, the jacobian evaluations ('ode_jacobian'), and the steps, rejected
+                        steps, rhs and jacobian evaluations, and LU decompositions of the integrator, or None
+
+        Note:
+            A step counts as rejected when the integrator had to take a shorter step than it proposed, i.e. it failed
+            its error test (or, for BDF, its Newton iterations) at least once. LSODA does not tell its step sizes.
+
+        Return:
+            {'t': numpy.ndarray of output times, 'results': (n_t, B, 14) numpy.ndarray (None w/ a writer),
+            'success': bool, 'message': str, 'steps': int, 'rhs_evals': int, 'wall_time': float}
+        """
+        _start = time.time()
+        _t0, _t1 = float(t_span[0]), float(t_span[1])
+        _n_out = int(np.floor((_t1 - _t0) / dt_out + 1E-9)) + 1
+        _times = _t0 + dt_out * np.arange(_n_out)
+        if _times[-1] < _t1 - 1E-9 * max(1.0, abs(_t1)):
+            _times = np.append(_times, _t1)
+
+        _results = []
+        _write = writer if writer is not None else (lambda _t, _X: _results.append(_X))
+
+        if not hasattr(integrate, method):
+            print('ERROR: Unknown integration method {}, BDF used instead.'.format(method))
+            method = 'BDF'
+        if instr is not None:
+            instr.wrap(self, 'ode_jacobian')
+        _phase = instr.phase if instr is not None else (lambda _name: contextlib.nullcontext())
+
+        _kw = {}
+        if method == 'LSODA':
+            _kw['jac'] = lambda _t, _y: self.ode_jacobian(_t, _y).toarray()
+        elif method in _IMPLICIT:
+            _kw['jac'] = self.ode_jacobian
+
+        _y = self.get_reactor_state()
+        _solver = getattr(integrate, method)(self.dydt, _t0, _y, _t1, rtol=rtol, atol=atol, **_kw)
+
+        _write(_t0, self.expand(_t0, _y))
+        _next = 1
+        _steps = 0
+        _rejected = 0
+        _msg = None
+        while _solver.status == 'running' and _next < len(_times):
+            _h = getattr(_solver, 'h_abs', None) if instr is not None else None
+            with _phase('integrate'):
+                _msg = _solver.step()
+            _steps += 1
+            if _h is not None and _solver.step_size is not None and _solver.t < _t1 \
+                    and _solver.step_size < _h * (1 - 1E-9):
+                _rejected += 1
+            if _solver.status == 'failed':
+                break
+            if _times[_next] <= _solver.t:
+                with _phase('output'):
+                    _dense = _solver.dense_output()
+                    while _next < len(_times) and _times[_next] <= _solver.t:
+                        _write(_times[_next], self.expand(_times[_next], _dense(_times[_next])))
+                        _next += 1
+            if verbose and _steps % 100 == 0:
+                print('t = {:.4f} d, {} steps, {} rhs evaluations'.format(_solver.t, _steps, self._num_rhs))
+
+        _success = _solver.status != 'failed'
+        if instr is not None:
+            for _name, _n in (('steps', _steps), ('rejected_steps', _rejected), ('rhs_evals', _solver.nfev),
+                              ('jac_evals', _solver.njev), ('lu_decomps', _solver.nlu)):
+                instr.count(_name, _n)
+        if not _success:
+            print('ERROR: The dynamic simulation failed at t = {:.4f} d: {}'.format(_solver.t, _msg))
+
+        # leave the last state (and temperatures) in the process units
+        self.set_state(self.expand(_solver.t, _solver.y).ravel())
+        if self._temp_series is not None:
+            _T = np.broadcast_to(np.asarray(self._temp_series(_solver.t), dtype=float), (self._nr,))
+            for _r, _temp in zip(self._reactors, _T):
+                _r.set_model_condition(float(_temp), _r._sludge.get_bulk_DO())
+
+        return {'t': _times[:_next], 'results': np.array(_results) if writer is None else None,
+                'success': _success, 'message': _msg or '', 'steps': _steps,
+                'rhs_evals': self._num_rhs, 'wall_time': time.time() - _start}
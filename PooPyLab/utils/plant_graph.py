@@ -0,0 +1,276 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the compiled connectivity of a process flow diagram.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Compiled connectivity of a process flow diagram (PFD).
+
+The process units are numbered by their positions in the PFD list. The connections are held in integer arrays:
+
+    1) main[i], side[i]: the receivers of the mainstream and sidestream outlets of unit i (-1 if not connected);
+
+    2) CSR (compressed sparse row) arrays of the outlets (receivers) and inlets (dischargers) of every unit, with the
+    branch of each connection (BRANCHES[0] = 'Main', BRANCHES[1] = 'Side').
+
+The strongly connected components (groups) in topological order and the units of each type are computed once and
+cached. The graph does not follow later changes of the connections: build a new one after changing the PFD.
+"""
+## @namespace plant_graph
+## @file plant_graph.py
+
+
+import numpy as np
+
+
+## branch names by their codes in the CSR arrays
+BRANCHES = ('Main', 'Side')
+
+
+class plant_graph(object):
+    """
+    Integer indexed connectivity of a PFD for the graph analysis of pfd, partition, and run.
+
+    General Functions:
+        size(), get_id(), get_unit(), get_units(), get_ids(), receivers(), dischargers(), get_groups(),
+        topo_order(), find_main_only_loop(), bfs_order()
+    """
+
+    def __init__(self, wwtp):
+        """
+        Args:
+            wwtp:   list of all the process units in the plant
+        """
+        self._units = list(wwtp)
+        self._id = {_u: _i for _i, _u in enumerate(self._units)}
+        _n = len(self._units)
+
+        self._main = np.full(_n, -1, dtype=np.int64)
+        self._side = np.full(_n, -1, dtype=np.int64)
+        self._types = {}
+
+        _in_lists = [[] for _i in range(_n)]
+        for _i, _u in enumerate(self._units):
+            self._types.setdefault(_u.get_type(), []).append(_i)
+            _m = self._id.get(_u.get_downstream_main(), -1)
+            _s = self._id.get(_u.get_downstream_side(), -1) if _u.has_sidestream() else -1
+            self._main[_i] = _m
+            self._side[_i] = _s
+            for _ds in _u.get_upstream() or []:
+                if _ds in self._id:
+                    _in_lists[_i].append(self._id[_ds])
+
+        # outlets: main first, then side
+        _has = np.stack([self._main >= 0, self._side >= 0], axis=1)
+        self._out_ptr = np.concatenate([[0], np.cumsum(_has.sum(axis=1))]).astype(np.int64)
+        self._out_idx = np.stack([self._main, self._side], axis=1)[_has]
+        self._out_br = np.broadcast_to(np.array([0, 1], dtype=np.int8), (_n, 2))[_has]
+
+        # inlets, in the order of the units' _inlet
+        self._in_ptr = np.concatenate([[0], np.cumsum([len(_l) for _l in _in_lists])]).astype(np.int64)
+        self._in_idx = np.array([_j for _l in _in_lists for _j in _l], dtype=np.int64)
+        self._in_br = np.array([0 if self._main[_j] == _i else 1
+                                for _i, _l in enumerate(_in_lists) for _j in _l], dtype=np.int8)
+
+        self._groups = None
+        return None
+
+
+    def size(self):
+        """
+        Return the number of units in the graph.
+        """
+        return len(self._units)
+
+
+    def get_id(self, unit):
+        """
+        Return the integer id of a unit (-1 if the unit is not in the graph).
+        """
+        return self._id.get(unit, -1)
+
+
+    def get_unit(self, i):
+        """
+        Return the unit of an integer id.
+        """
+        return self._units[i]
+
+
+    def get_ids(self, type):
+        """
+        Return the ids of all the units of a type, e.g. 'ASMReactor'.
+        """
+        return self._types.get(type, [])[:]
+
+
+    def get_units(self, type='ASMReactor'):
+        """
+        Return all the units of a type in the PFD order (see pfd.get_all_units()).
+        """
+        return [self._units[_i] for _i in self._types.get(type, [])]
+
+
+    def receivers(self, i):
+        """
+        Return the ids and branch codes of the receivers of unit i.
+        """
+        _a, _b = self._out_ptr[i], self._out_ptr[i + 1]
+        return self._out_idx[_a:_b], self._out_br[_a:_b]
+
+
+    def dischargers(self, i):
+        """
+        Return the ids and branch codes of the dischargers into unit i.
+        """
+        _a, _b = self._in_ptr[i], self._in_ptr[i + 1]
+        return self._in_idx[_a:_b], self._in_br[_a:_b]
+
+
+    def get_groups(self):
+        """
+        Return the strongly connected components in topological order.
+
+        A unit on no loop forms a group by itself. The ids in a group are sorted. The result is cached.
+
+        Return:
+            list of lists of ids
+        """
+        if self._groups is None:
+            self._groups = self._tarjan()
+        return [_g[:] for _g in self._groups]
+
+
+    def topo_order(self):
+        """
+        Return the ids of all the units with the groups in topological order.
+        """
+        return [_i for _g in self.get_groups() for _i in _g]
+
+
+    def _tarjan(self):
+        """
+        Tarjan's strongly connected components, without recursion.
+        """
+        _n = self.size()
+        _ptr = self._out_ptr.tolist()
+        _idx = self._out_idx.tolist()
+        _index = [-1] * _n
+        _low = [0] * _n
+        _on_stack = [False] * _n
+        _stack = []
+        _groups = []
+        _counter = 0
+
+        for _root in range(_n):
+            if _index[_root] >= 0:
+                continue
+            _index[_root] = _low[_root] = _counter
+            _counter += 1
+            _stack.append(_root)
+            _on_stack[_root] = True
+            _work = [[_root, _ptr[_root]]]
+            while _work:
+                _top = _work[-1]
+                _u = _top[0]
+                if _top[1] < _ptr[_u + 1]:
+                    _v = _idx[_top[1]]
+                    _top[1] += 1
+                    if _index[_v] < 0:
+                        _index[_v] = _low[_v] = _counter
+                        _counter += 1
+                        _stack.append(_v)
+                        _on_stack[_v] = True
+                        _work.append([_v, _ptr[_v]])
+                    elif _on_stack[_v] and _index[_v] < _low[_u]:
+                        _low[_u] = _index[_v]
+                    continue
+                _work.pop()
+                if _work and _low[_u] < _low[_work[-1][0]]:
+                    _low[_work[-1][0]] = _low[_u]
+                if _low[_u] == _index[_u]:
+                    _g = []
+                    while True:
+                        _w = _stack.pop()
+                        _on_stack[_w] = False
+                        _g.append(_w)
+                        if _w == _u:
+                            break
+                    _g.sort()
+                    _groups.append(_g)
+
+        # the groups are completed in the reverse topological order
+        _groups.reverse()
+        return _groups
+
+
+    def find_main_only_loop(self):
+        """
+        Find a loop formed by mainstream connections only.
+
+        Every unit has at most one mainstream receiver, so following the mainstreams from every unit not visited yet
+        finds all such loops in one pass over the units.
+
+        Return:
+            list of ids on the first loop found ([] if there is none)
+        """
+        _main = self._main.tolist()
+        _stamp = [-1] * self.size()
+        for _start in range(self.size()):
+            _path = []
+            _i = _start
+            while _i >= 0 and _stamp[_i] < 0:
+                _stamp[_i] = _start
+                _path.append(_i)
+                _i = _main[_i]
+            if _i >= 0 and _stamp[_i] == _start:
+                return _path[_path.index(_i):]
+        return []
+
+
+    def bfs_order(self, starts):
+        """
+        Return the ids of the units reachable from the starts, in breadth first order.
+
+        The sidestream receiver of a unit is queued before its mainstream receiver (see run.traverse_plant()).
+
+        Args:
+            starts: list of ids to start from
+
+        Return:
+            list of ids
+        """
+        _seen = np.zeros(self.size(), dtype=bool)
+        _order = []
+        _queue = list(starts)
+        _head = 0
+        while _head < len(_queue):
+            _i = _queue[_head]
+            _head += 1
+            if _seen[_i]:
+                continue
+            _seen[_i] = True
+            _order.append(_i)
+            for _j in (self._side[_i], self._main[_i]):
+                if _j >= 0 and not _seen[_j]:
+                    _queue.append(_j)
+        return _order
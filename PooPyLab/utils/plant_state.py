@@ -0,0 +1,205 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the contiguous buffer of the state of a plant.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Contiguous, array backed state of a plant.
+
+By default every process unit keeps its inlet and outlet model components in Python lists of its own. A plant_state
+moves them into one float64 buffer:
+
+    (B, 14) [flow, 13 model components] of the branches, in the order of flow_system.get_branches() (the same as the
+    state vector of plant_system);
+
+    (U, 13) inlet model components of the units, in the order of the PFD,
+
+and gives every unit numpy views of its rows in place of its lists (_mo_comps, _so_comps, _in_comps). The units update
+their model components in place, so the buffer always holds the current state of the plant: a solver can read or
+write the model components of all the branches as one array, and a snapshot of the plant is one copy of the buffer.
+
+The flows are scalars of the units; they are gathered into the flow column by sync_flows() (and by get_state() and
+snapshot()), and put back by set_state() and restore(). A unit w/o a sidestream has its side outlet view on its main
+outlet row.
+
+Usage:
+
+    state = plant_state(wwtp)
+    run.get_steady_state(wwtp, target_SRT=10)
+    snap = state.snapshot()
+    ...
+    state.restore(snap)
+    state.release()
+"""
+## @namespace plant_state
+## @file plant_state.py
+
+
+import numpy as np
+
+from ..ASMModel import constants
+from ..ASMModel.composition import branch_composites
+from ..utils.flow_system import flow_system
+
+
+class plant_state(object):
+    """
+    One contiguous buffer of the model components of a plant, bound to its process units as numpy views.
+
+    General Functions:
+        get_branches(), get_branch_comps(), get_inlet_comps(), get_composites(), sync_flows(), get_state(),
+        set_state(), snapshot(), restore(), release()
+    """
+
+    def __init__(self, wwtp=[]):
+        """
+        Move the current model components of the units into the buffer, and bind the units to their views.
+
+        Args:
+            wwtp:   all process units of the plant
+
+        Return:
+            None
+        """
+        self._wwtp = wwtp[:]
+        self._branches = flow_system(wwtp).get_branches()
+        self._nc = constants._NUM_ASM1_COMPONENTS
+        _B, _U = len(self._branches), len(self._wwtp)
+
+        self._buf = np.zeros(_B * (self._nc + 1) + _U * self._nc)
+        self._X = self._buf[:_B * (self._nc + 1)].reshape(_B, self._nc + 1)
+        self._I = self._buf[_B * (self._nc + 1):].reshape(_U, self._nc)
+        self._bid = {_br: _b for _b, _br in enumerate(self._branches)}
+        ## branch index of the side outlet of every unit (its main outlet if it has no sidestream)
+        self._side = {_u: self._bid.get((_u, 'Side'), self._bid[(_u, 'Main')]) for _u in self._wwtp}
+
+        for _k, _u in enumerate(self._wwtp):
+            _mo, _so = self._bid[(_u, 'Main')], self._side[_u]
+            for _row, _comps in ((self._X[_mo, 1:], _u._mo_comps), (self._I[_k], _u._in_comps)):
+                if len(_comps) == self._nc:
+                    _row[:] = _comps
+            if _so != _mo and len(_u._so_comps) == self._nc:
+                self._X[_so, 1:] = _u._so_comps
+            _u._mo_comps = self._X[_mo, 1:]
+            _u._so_comps = self._X[_so, 1:]
+            _u._in_comps = self._I[_k]
+        self.sync_flows()
+        return None
+
+
+    def get_branches(self):
+        """
+        Return the (unit, 'Main'|'Side') of every branch, in the order of the rows of the buffer.
+        """
+        return self._branches[:]
+
+
+    def get_branch_comps(self):
+        """
+        Return the live (B, 13) view of the model components of the branches.
+        """
+        return self._X[:, 1:]
+
+
+    def get_inlet_comps(self):
+        """
+        Return the live (U, 13) view of the inlet model components of the units.
+        """
+        return self._I
+
+
+    def get_composites(self, names=None):
+        """
+        Return the (B, number of composites) composites (TSS, COD, TN, ...) of the branches, w/ the composition of
+        their units (see ASMModel.composition).
+        """
+        return branch_composites(self._X, [_u.get_composition() for _u, _br in self._branches], names)
+
+
+    def sync_flows(self):
+        """
+        Gather the current branch flows of the units into the flow column of the buffer.
+        """
+        for _b, (_u, _br) in enumerate(self._branches):
+            self._X[_b, 0] = _u._mo_flow if _br == 'Main' else _u._so_flow
+        return None
+
+
+    def _scatter_flows(self):
+        """
+        Put the flow column of the buffer back into the units, and the reactor components into their models.
+        """
+        for _b, (_u, _br) in enumerate(self._branches):
+            if _br == 'Main':
+                _u._mo_flow = float(self._X[_b, 0])
+            else:
+                _u._so_flow = float(self._X[_b, 0])
+        for _u in self._wwtp:
+            if _u.get_type() == 'ASMReactor':
+                _u._sludge._comps = _u._mo_comps.tolist()
+        return None
+
+
+    def get_state(self):
+        """
+        Return a copy of the flows and model components of the branches as a state vector (see
+        plant_system.get_state()).
+        """
+        self.sync_flows()
+        return self._X.ravel().copy()
+
+
+    def set_state(self, x):
+        """
+        Write a state vector (see get_state()) into the units: the model components in one copy, then the flows.
+        """
+        self._X[:] = np.asarray(x, dtype=float).reshape(self._X.shape)
+        self._scatter_flows()
+        return None
+
+
+    def snapshot(self):
+        """
+        Return a copy of the whole buffer (branches and inlets).
+        """
+        self.sync_flows()
+        return self._buf.copy()
+
+
+    def restore(self, snap):
+        """
+        Put the plant back to a snapshot().
+        """
+        self._buf[:] = snap
+        self._scatter_flows()
+        return None
+
+
+    def release(self):
+        """
+        Give the units back model components in lists of their own, and unbind them from the buffer.
+        """
+        for _u in self._wwtp:
+            _u._mo_comps = _u._mo_comps.tolist()
+            _u._so_comps = _u._so_comps.tolist()
+            _u._in_comps = _u._in_comps.tolist()
+        return None
@@ -0,0 +1,841 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the equation-based system of a whole wastewater treatment plant.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Equation-based (simultaneous) formulation of a whole plant for steady state simulation.
+
+The state of the plant is the flow and the model components of every outlet branch of every process unit, arranged
+in blocks of [flow, comp_0, ..., comp_12] (see splitter._num_comps). The inlet flow and concentrations of a unit are not
+states: they are the sum of the flows and the flow weighted average of the concentrations of the branches discharging
+into it.
+
+The residual of the plant has one equation per state:
+
+    1) flow: influent design flows, a flow balance for every unit, the user defined branch flows of the splitters, and
+    the WAS flow that meets the target SRT;
+
+    2) model components: inlet blending for pipes and splitters, mass balances of the asm_reactors, and the solids
+    split of the final clarifiers.
+
+The residual is solved with a damped Newton method. Pseudo-transient continuation on the reactor mass balances is used
+as the fallback when the Newton iterations stall.
+"""
+## @namespace plant_system
+## @file plant_system.py
+
+
+from collections import deque
+import contextlib
+import time
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from ..ASMModel import constants
+from ..ASMModel import asm_1
+from ..utils.flow_system import flow_system
+
+
+## indices of the particulate model components that settle in a final_clarifier (ASM1)
+_PARTICULATE_INDEX = [7, 8, 9, 10, 11, 12]
+## indices of the model components that make up TSS (see ASMModel.composition.COMPOSITES)
+_TSS_INDEX = [7, 8, 9, 10, 11]
+## HRT above which the final_clarifier outlets are considered anoxic, d (see final_clarifier._settle_solids())
+_CLARIFIER_ANOXIC_HRT = 15 / 1440
+## smallest fraction of its current value a state can be reduced to in one Newton/pseudo-transient step
+_MIN_STEP_RATIO = 0.1
+
+
+class plant_system(object):
+    """
+    Whole plant steady state equation system built from a process flow diagram.
+
+    The plant_system reads its initial state from the process units (flows, outlet concentrations, and the "sludge" in
+    the asm_reactors) and writes the solution back into them, so that the usual reporting functions (e.g.
+    run.show_concs()) work after solve().
+    """
+
+    def __init__(self, wwtp=[], target_SRT=5, fix_DO=True, DO_sat_T=10):
+        """
+        Index the branches of the PFD and set up the equations of the plant.
+
+        Args:
+            wwtp:       list of all process units of the plant (see utils.pfd.check());
+            target_SRT: target solids retention time, d;
+            fix_DO:     whether to simulate w/ fix DO setpoints in the asm_reactors;
+            DO_sat_T:   saturated DO conc. under the site conditions, mg/L
+
+        Return:
+            None
+        """
+        self._wwtp = wwtp[:]
+        self._SRT = target_SRT
+        self._fix_DO = fix_DO
+        self._DO_sat_T = DO_sat_T
+        ## instrument of the current solve(), if any
+        self._instr = None
+
+        ## number of model components
+        self._nc = constants._NUM_ASM1_COMPONENTS
+        ## size of a branch block: [flow, model components]
+        self._bs = self._nc + 1
+
+        ## linear flow balances of the plant, which also index the branches in the order of the state vector
+        self._flows = flow_system(self._wwtp)
+        self._branches = self._flows._branches
+        self._bid = self._flows._bid
+        self._uid = self._flows._uid
+
+        self._num_units = len(self._wwtp)
+        self._num_branches = len(self._branches)
+        ## (branches, model components) TSS weights of the branches, w/ the composition of their units
+        self._tss_w = np.array([_u.get_composition().get_row('TSS') for _u, _br in self._branches])
+        ## total number of states (and equations)
+        self._size = self._num_branches * self._bs
+
+        # sparse incidence matrices: inlet (branch -> receiving unit) and outlet (branch -> owning unit)
+        self._inlet_mat = self._flows._inlet_mat.tocsr()
+        self._outlet_mat = self._flows._outlet_mat.tocsr()
+        ## branches discharging into every unit
+        self._inlet_branches = [self._inlet_mat.indices[self._inlet_mat.indptr[_k]:self._inlet_mat.indptr[_k + 1]]
+                                for _k in range(self._num_units)]
+
+        self._ready = self._set_flow_eqs() and self._set_comp_eqs()
+        if self._ready:
+            self._set_sparsity()
+
+        return None
+
+
+    def _set_flow_eqs(self):
+        """
+        Take the flow equations of the branches from the flow balances of the plant.
+
+        The SRT relation replaces the fixed total WAS flow of the flow balances in the residual.
+
+        Return:
+            bool, whether the flow equations are square and non-singular.
+
+        See:
+            flow_system._set_flow_eqs();
+            residual().
+        """
+        if not self._flows.is_ready():
+            return False
+        for _attr in ('_inf_rows', '_design_flows', '_bal_rows', '_bal_units', '_spec_rows', '_spec_flows',
+                      '_was_branches', '_eff_branches', '_srt_row', '_ref_flow'):
+            setattr(self, _attr, getattr(self._flows, _attr))
+        return True
+
+
+    def _set_comp_eqs(self):
+        """
+        Sort the branches by the type of their model component equations.
+
+        Return:
+            bool
+        """
+        _blend_b, _blend_u = [], []
+        self._inf_b, _inf_comps = [], []
+        self._reac_b, self._reac_u, self._reactors = [], [], []
+        self._clar = []
+
+        for _b, (_u, _br) in enumerate(self._branches):
+            _t = _u.get_type()
+            if _t == 'Influent':
+                self._inf_b.append(_b)
+                _inf_comps.append(_u.blend_inlet_comps())
+            elif _t == 'ASMReactor':
+                self._reac_b.append(_b)
+                self._reac_u.append(self._uid[_u])
+                self._reactors.append(_u)
+            elif _t == 'FinalClarifier':
+                if _br == 'Main':
+                    self._clar.append((self._uid[_u], _b, self._bid[(_u, 'Side')],
+                                       _u._capture_rate, _u._active_vol))
+            else:
+                _blend_b.append(_b)
+                _blend_u.append(self._uid[_u])
+
+        self._blend_b = np.array(_blend_b, dtype=int)
+        self._blend_u = np.array(_blend_u, dtype=int)
+        self._inf_b = np.array(self._inf_b, dtype=int)
+        self._inf_comps = np.array(_inf_comps).reshape(-1, self._nc)
+        self._reac_b = np.array(self._reac_b, dtype=int)
+        self._reac_u = np.array(self._reac_u, dtype=int)
+        # final clarifiers as arrays: unit, main and side branches, capture rates, volumes
+        _clar = np.array(self._clar, dtype=float).reshape(-1, 5)
+        self._clar_u, self._clar_mo, self._clar_so = (_clar[:, _k].astype(int) for _k in range(3))
+        self._clar_cap, self._clar_vol = _clar[:, 3], _clar[:, 4]
+
+        self.update_reactor_conditions()
+
+        return True
+
+
+    def update_reactor_conditions(self):
+        """
+        Refresh the kinetics, volumes, and DO settings of the asm_reactors.
+
+        Call this after changing the model conditions (e.g. temperature, DO) or the volumes of the reactors of an
+        existing plant_system.
+
+        See:
+            ASMModel.asm_1.stack_models().
+        """
+        _sludges = [_r._sludge for _r in self._reactors]
+        self._reac_params, self._reac_stoichs = asm_1.stack_models(_sludges)
+        self._reac_vols = np.array([_r.get_active_vol() for _r in self._reactors], dtype=float)
+        self._reac_DO = np.array([_s.get_bulk_DO() for _s in _sludges], dtype=float)
+        self._reac_KLa = np.array([_s._KLa for _s in _sludges], dtype=float)
+        self._reac_fix_DO = np.array([self._fix_DO or _s.get_bulk_DO() == 0 for _s in _sludges], dtype=bool)
+        return None
+
+
+    def is_ready(self):
+        """
+        Return whether the plant has a square equation system.
+        """
+        return self._ready
+
+
+    def get_size(self):
+        """
+        Return the number of states (and equations) of the plant.
+        """
+        return self._size
+
+
+    def _blocks(self, x):
+        """
+        Return the flows (B,), model components (B, 13), total inflows (U,), and inlet mass flows (U, 13).
+        """
+        _X = x.reshape(self._num_branches, self._bs)
+        _Q = _X[:, 0]
+        _C = _X[:, 1:]
+        return _Q, _C, self._inlet_mat @ _Q, self._inlet_mat @ (_Q[:, None] * _C)
+
+
+    def _TSS(self, comps, branches):
+        """
+        Total suspended solids of the model component rows of branches, mg/L.
+
+        See:
+            splitter.get_TSS().
+        """
+        return np.sum(comps * self._tss_w[branches], axis=-1)
+
+
+    def residual(self, x):
+        """
+        Scaled residual of the plant's steady state equations.
+
+        Flow equations are divided by the reference (plant influent) flow. Model component equations are in mg/L,
+        except for those of the asm_reactors that are the negative dC/dt in mg/L/d.
+
+        Args:
+            x:  state vector (see get_state())
+
+        Return:
+            numpy.ndarray of the same size as x
+        """
+        _Q, _C, _Qin, _Min = self._blocks(x)
+        _R = np.empty((self._num_branches, self._bs))
+        _qr = self._ref_flow
+
+        # flows
+        _R[self._inf_rows, 0] = _Q[self._inf_rows] - self._design_flows
+        _R[self._bal_rows, 0] = _Qin[self._bal_units] - (self._outlet_mat @ _Q)[self._bal_units]
+        _R[self._spec_rows, 0] = _Q[self._spec_rows] - self._spec_flows
+        if self._srt_row is not None:
+            _R[self._srt_row, 0] = self._srt_residual(_Q, _C)
+        _R[:, 0] /= _qr
+
+        # inlet blending of pipes, splitters, effluent, and WAS
+        _R[self._blend_b, 1:] = (_Qin[self._blend_u, None] * _C[self._blend_b] - _Min[self._blend_u]) / _qr
+
+        # influent
+        _R[self._inf_b, 1:] = _C[self._inf_b] - self._inf_comps
+
+        # asm_reactors
+        if len(self._reac_b):
+            _R[self._reac_b, 1:] = self._reactor_residual(_C[self._reac_b], _Qin[self._reac_u], _Min[self._reac_u])
+
+        # final clarifiers
+        if len(self._clar_u):
+            _u, _mo, _so, _cap = self._clar_u, self._clar_mo, self._clar_so, self._clar_cap[:, None]
+            _R[_mo, 1:] = (_Qin[_u, None] * _C[_mo] - _Min[_u]) / _qr
+            _R[_so, 1:] = (_Qin[_u, None] * _C[_so] - _Min[_u]) / _qr
+            _p = np.array(_PARTICULATE_INDEX)
+            _Mp = _Min[_u][:, _p]
+            _R[_mo[:, None], _p + 1] = (_Q[_mo, None] * _C[_mo][:, _p] - (1 - _cap) * _Mp) / _qr
+            _R[_so[:, None], _p + 1] = (_Q[_so, None] * _C[_so][:, _p] - _cap * _Mp) / _qr
+            _anoxic = (_Qin[_u] <= 0) | (self._clar_vol > _CLARIFIER_ANOXIC_HRT * _Qin[_u])
+            _R[_mo[_anoxic], 1] = _C[_mo[_anoxic], 0]
+            _R[_so[_anoxic], 1] = _C[_so[_anoxic], 0]
+
+        return _R.ravel()
+
+
+    def _reactor_residual(self, comps, inflows, in_mass):
+        """
+        Negative dC/dt of all the asm_reactors, mg/L/d.
+
+        Args:
+            comps:      (n, 13) reactor concentrations;
+            inflows:    (n,) total inflows, m3/d;
+            in_mass:    (n, 13) inlet mass flows, g/d
+
+        Return:
+            (n, 13) numpy.ndarray
+
+        See:
+            ASMModel.ASM_1._dCdt().
+        """
+        _res = (inflows[:, None] * comps - in_mass) / self._reac_vols[:, None]
+        _res -= asm_1.batch_reaction_rates(comps, self._reac_params, self._reac_stoichs)
+        _res[:, 0] -= self._reac_KLa * (self._DO_sat_T - comps[:, 0])
+        _res[self._reac_fix_DO, 0] = comps[self._reac_fix_DO, 0] - self._reac_DO[self._reac_fix_DO]
+        return _res
+
+
+    def _srt_residual(self, flows, comps):
+        """
+        Solids wasted (WAS + effluent) minus the reactor solids inventory over the target SRT, g/d.
+
+        See:
+            WAS.set_WAS_flow().
+        """
+        _wasted = np.dot(flows[self._was_branches], self._TSS(comps[self._was_branches], self._was_branches))
+        _wasted += np.dot(flows[self._eff_branches], self._TSS(comps[self._eff_branches], self._eff_branches))
+        _inventory = np.dot(self._reac_vols, self._TSS(comps[self._reac_b], self._reac_b)) if len(self._reac_b) else 0.0
+        return _wasted - _inventory / self._SRT
+
+
+    def jacobian_sparsity(self):
+        """
+        Structural non-zeros of the plant jacobian, derived from the PFD connectivity.
+
+        The equations of a branch only involve the branches of the same unit and those discharging into that unit:
+
+            1) flow equations involve the flows of those branches;
+
+            2) the equation of a model component involves the flows and the same model component of those branches;
+
+            3) the mass balances of an asm_reactor also couple the model components of the reactor as per the
+            structure of the ASM stoichiometrics and process rates.
+
+        The SRT relation is the only equation that reaches across the plant (WAS, effluent, and reactor solids).
+
+        The pattern can be given to scipy.integrate.solve_ivp() as jac_sparsity, or to any sparse solver.
+
+        Return:
+            scipy.sparse.csr_matrix of bool, (n, n)
+
+        See:
+            jacobian().
+        """
+        return self._pattern.tocsr()
+
+
+    def _set_sparsity(self):
+        """
+        Build the sparsity pattern and the column groups for the colored finite differences.
+
+        See:
+            jacobian_sparsity();
+            _color_columns().
+        """
+        _bs = self._bs
+        _nc = self._nc
+        _rows, _cols = [], []
+
+        # kinetics coupling inside an asm_reactor: (stoichiometrics)^T x (process rate derivatives), plus dilution
+        _probe = np.linspace(1.0, 2.0, _nc)
+        _kin = (np.abs(self._reac_stoichs[0].T) @ np.abs(asm_1.batch_process_rate_derivs(_probe, self._reac_params[0])[0])
+                if len(self._reactors) else np.zeros((_nc, _nc)))
+        _kin = (_kin != 0) | np.eye(_nc, dtype=bool)
+        _kin_i, _kin_k = np.nonzero(_kin)
+
+        _reac_set = set(self._reac_b.tolist())
+        for _u in self._wwtp:
+            _own = [self._bid[(_u, _br)] for _br in ('Main', 'Side') if (_u, _br) in self._bid]
+            _related = _own + self._inlet_branches[self._uid[_u]].tolist()
+            for _b in _own:
+                for _c in _related:
+                    # flows of the related branches in every equation of the branch
+                    _rows.extend(range(_b * _bs, _b * _bs + _bs))
+                    _cols.extend([_c * _bs] * _bs)
+                    # model component i of the related branches in the equation of model component i
+                    _rows.extend(range(_b * _bs + 1, _b * _bs + _bs))
+                    _cols.extend(range(_c * _bs + 1, _c * _bs + _bs))
+                if _b in _reac_set:
+                    _rows.extend(_b * _bs + 1 + _kin_i)
+                    _cols.extend(_b * _bs + 1 + _kin_k)
+
+        _fd_rows, _fd_cols = np.array(_rows, dtype=int), np.array(_cols, dtype=int)
+
+        # SRT relation: WAS and effluent flows and solids, reactor solids
+        _srt_cols = []
+        if self._srt_row is not None:
+            for _b in self._was_branches + self._eff_branches:
+                _srt_cols.append(_b * _bs)
+                _srt_cols.extend(_b * _bs + 1 + np.array(_TSS_INDEX))
+            for _b in self._reac_b:
+                _srt_cols.extend(_b * _bs + 1 + np.array(_TSS_INDEX))
+            # the SRT relation replaces whatever else the pattern has in its row
+            _keep = _fd_rows != self._srt_row * _bs
+            _fd_rows, _fd_cols = _fd_rows[_keep], _fd_cols[_keep]
+        _srt_cols = np.array(_srt_cols, dtype=int)
+
+        _all_rows = np.concatenate([_fd_rows, np.full(len(_srt_cols), -1 if self._srt_row is None
+                                                       else self._srt_row * _bs, dtype=int)])
+        _all_cols = np.concatenate([_fd_cols, _srt_cols])
+        _n = self._size
+        self._pattern = sparse.coo_matrix((np.ones(len(_all_rows), dtype=bool), (_all_rows, _all_cols)),
+                                          shape=(_n, _n)).tocsc()
+        self._pattern.sum_duplicates()
+        self._pattern.sort_indices()
+
+        # rows/cols of the stored entries in CSC order
+        _coo = self._pattern.tocoo()
+        self._pat_rows, self._pat_cols = _coo.row, _coo.col
+        self._srt_mask = (self._pat_rows == self._srt_row * _bs) if self._srt_row is not None \
+                            else np.zeros(len(self._pat_rows), dtype=bool)
+
+        self._col_groups = self._color_columns(self._pat_rows[~self._srt_mask], self._pat_cols[~self._srt_mask])
+        return None
+
+
+    def _color_columns(self, rows, cols):
+        """
+        Greedy grouping of the columns that share no row, so that each group needs only one residual evaluation.
+
+        Args:
+            rows, cols: row and column indices of the structural non-zeros
+
+        Return:
+            numpy.ndarray of the group number of each column
+        """
+        _n = self._size
+        _by_col = sparse.csc_matrix((np.ones(len(rows)), (rows, cols)), shape=(_n, _n))
+        # columns sharing a row w/ each column
+        _adj = (_by_col.T @ _by_col).tocsr()
+        _groups = np.full(_n, -1, dtype=int)
+        _mark = np.full(_n + 1, -1, dtype=int)
+        for _k in range(_n):
+            _taken = _groups[_adj.indices[_adj.indptr[_k]:_adj.indptr[_k + 1]]]
+            _taken = _taken[_taken >= 0]
+            # the first group w/o any of the columns sharing a row w/ column _k
+            _mark[_taken] = _k
+            _groups[_k] = np.argmax(_mark[:len(_taken) + 1] != _k)
+        return _groups
+
+
+    def jacobian(self, x, res=None):
+        """
+        Sparse jacobian of the residual.
+
+        The entries are computed by forward differences with the columns grouped by jacobian_sparsity(), so the
+        number of residual evaluations is the number of column groups instead of the number of states. The row of
+        the SRT relation is differentiated analytically.
+
+        Args:
+            x:      state vector;
+            res:    residual at x, if already known.
+
+        Return:
+            scipy.sparse.csc_matrix, (n, n)
+
+        See:
+            jacobian_sparsity();
+            dense_jacobian().
+        """
+        if res is None:
+            res = self.residual(x)
+        _h = 1e-7 * np.maximum(np.abs(x), 1.0)
+        _num_groups = self._col_groups.max() + 1
+        _dR = np.empty((_num_groups, self._size))
+        for _g in range(_num_groups):
+            _x = x.copy()
+            _in_g = self._col_groups == _g
+            _x[_in_g] += _h[_in_g]
+            _dR[_g] = self.residual(_x) - res
+
+        _fd = ~self._srt_mask
+        _data = np.empty(len(self._pat_rows))
+        _r, _c = self._pat_rows[_fd], self._pat_cols[_fd]
+        _data[_fd] = _dR[self._col_groups[_c], _r] / _h[_c]
+        if self._srt_row is not None:
+            _data[self._srt_mask] = self._srt_jacobian(x)[self._pat_cols[self._srt_mask]]
+
+        return sparse.csc_matrix((_data, self._pattern.indices, self._pattern.indptr), shape=(self._size, self._size))
+
+
+    def _srt_jacobian(self, x):
+        """
+        Gradient of the (scaled) SRT relation w.r.t. the state vector.
+
+        See:
+            _srt_residual().
+        """
+        _X = x.reshape(self._num_branches, self._bs)
+        _grad = np.zeros((self._num_branches, self._bs))
+        for _b in self._was_branches + self._eff_branches:
+            _grad[_b, 0] = self._TSS(_X[_b, 1:], _b)
+            _grad[_b, 1:] = _X[_b, 0] * self._tss_w[_b]
+        for _b, _v in zip(self._reac_b, self._reac_vols):
+            _grad[_b, 1:] = -_v * self._tss_w[_b] / self._SRT
+        return _grad.ravel() / self._ref_flow
+
+
+    def dense_jacobian(self, x, res=None):
+        """
+        Forward difference jacobian of the residual, one state at a time.
+
+        This is the reference for jacobian(). It takes one residual evaluation per state.
+
+        Args:
+            x:      state vector;
+            res:    residual at x, if already known.
+
+        Return:
+            dense (n, n) numpy.ndarray
+        """
+        if res is None:
+            res = self.residual(x)
+        _J = np.empty((self._size, self._size))
+        _x = x.copy()
+        for _k in range(self._size):
+            _h = 1e-7 * max(abs(_x[_k]), 1.0)
+            _x[_k] += _h
+            _J[:, _k] = (self.residual(_x) - res) / _h
+            _x[_k] = x[_k]
+        return _J
+
+
+    def get_state(self):
+        """
+        Pack the current flows and outlet concentrations of the process units into a state vector.
+
+        Return:
+            numpy.ndarray
+        """
+        _X = np.zeros((self._num_branches, self._bs))
+        for _b, (_u, _br) in enumerate(self._branches):
+            if _br == 'Main':
+                _X[_b, 0] = _u.get_main_outflow()
+                _c = _u.get_main_outlet_concs()
+            else:
+                _X[_b, 0] = _u.get_side_outflow()
+                _c = _u.get_side_outlet_concs()
+            if len(_c) == self._nc:
+                _X[_b, 1:] = _c
+        return _X.ravel()
+
+
+    def set_state(self, x):
+        """
+        Write a state vector back into the process units.
+
+        Args:
+            x:  state vector (see get_state())
+
+        Return:
+            None
+        """
+        _Q, _C, _Qin, _Min = self._blocks(x)
+        for _u in self._wwtp:
+            _k = self._uid[_u]
+            _mo = self._bid[(_u, 'Main')]
+            if _u.get_type() != 'Influent':
+                _u._total_inflow = _Qin[_k]
+                if _Qin[_k] > 0:
+                    _u._in_comps[:] = (_Min[_k] / _Qin[_k]).tolist()
+            _u._mo_flow = _Q[_mo]
+            _u._mo_comps[:] = _C[_mo].tolist()
+            _u._prev_mo_comps = _C[_mo].tolist()
+            if _u.has_sidestream():
+                _so = self._bid[(_u, 'Side')]
+                _u._so_flow = _Q[_so]
+                _u._so_comps[:] = _C[_so].tolist()
+                _u._prev_so_comps = _C[_so].tolist()
+            else:
+                _u._so_comps[:] = _C[_mo].tolist()
+                _u._prev_so_comps = _C[_mo].tolist()
+            if _u.get_type() == 'ASMReactor':
+                _u._sludge._comps = _C[_mo].tolist()
+        return None
+
+
+    def _sweep(self, x):
+        """
+        Update the concentrations of all non-reactor branches from their current inlets, in the order of the flow.
+
+        Return:
+            None (x is updated in place)
+        """
+        _X = x.reshape(self._num_branches, self._bs)
+        for _u in self._flow_order():
+            _t = _u.get_type()
+            if _t in ('Influent', 'ASMReactor'):
+                continue
+            _in = self._inlet_branches[self._uid[_u]]
+            _Qin = np.sum(_X[_in, 0])
+            if _Qin <= 0:
+                continue
+            _Min = _X[_in, 0] @ _X[_in, 1:]
+            _mo = self._bid[(_u, 'Main')]
+            _X[_mo, 1:] = _Min / _Qin
+            if _u.has_sidestream():
+                _so = self._bid[(_u, 'Side')]
+                _X[_so, 1:] = _Min / _Qin
+                if _t == 'FinalClarifier' and _X[_mo, 0] > 0 and _X[_so, 0] > 0:
+                    _cap = _u._capture_rate
+                    _X[_mo, [i + 1 for i in _PARTICULATE_INDEX]] = (1 - _cap) * _Min[_PARTICULATE_INDEX] / _X[_mo, 0]
+                    _X[_so, [i + 1 for i in _PARTICULATE_INDEX]] = _cap * _Min[_PARTICULATE_INDEX] / _X[_so, 0]
+                    if _u._active_vol / _Qin > _CLARIFIER_ANOXIC_HRT:
+                        _X[_mo, 1] = _X[_so, 1] = 0.0
+        return None
+
+
+    def _flow_order(self):
+        """
+        Return the process units in breadth first order from the influent(s).
+        """
+        _order = [_u for _u in self._wwtp if _u.get_type() == 'Influent']
+        _seen = np.zeros(self._num_units, dtype=bool)
+        _seen[[self._uid[_u] for _u in _order]] = True
+        _queue = deque(_order)
+        while _queue:
+            _u = _queue.popleft()
+            for _d in (_u.get_downstream_main(), _u.get_downstream_side()):
+                if _d in self._uid and not _seen[self._uid[_d]]:
+                    _seen[self._uid[_d]] = True
+                    _order.append(_d)
+                    _queue.append(_d)
+        return _order
+
+
+    def initial_state(self, rounds=3):
+        """
+        Build a consistent starting point from the current state of the process units.
+
+        The reactor concentrations are taken as they are (e.g. the initial guess from run.initial_guess()). The flows
+        are solved from the linear flow equations at a fixed WAS flow, the other concentrations are swept from the
+        influent, and the WAS flow is then updated from the SRT relation. This is repeated a few rounds.
+
+        Args:
+            rounds: number of flow/concentration rounds
+
+        Return:
+            state vector (numpy.ndarray)
+        """
+        _x = self.get_state()
+        _X = _x.reshape(self._num_branches, self._bs)
+        _X[self._inf_b, 1:] = self._inf_comps
+
+        _WAS_flow = float(np.sum(_X[self._was_branches, 0])) if self._was_branches else 0.0
+        for _r in range(rounds):
+            _X[:, 0] = np.maximum(self._flows.solve(_WAS_flow), 0.0)
+            self._sweep(_x)
+            self._sweep(_x)
+            if self._srt_row is None:
+                break
+            _tss_w = np.mean(self._TSS(_X[self._was_branches, 1:], self._was_branches))
+            if _tss_w > 0:
+                _X[self._was_branches, 0] = 0.0
+                _WAS_flow = max(-self._srt_residual(_X[:, 0], _X[:, 1:]) / _tss_w, 0.0)
+
+        return _x
+
+
+    def solve(self, x0=None, tol=1E-6, max_iter=50, max_ptc_steps=200, verbose=False, instr=None):
+        """
+        Solve the plant's steady state.
+
+        A damped Newton method (backtracking on the 2-norm of the scaled residual, with concentrations and flows kept
+        non-negative) is tried first. If it stalls, pseudo-transient continuation takes over: the reactor mass
+        balances are given a pseudo time step that grows as the residual decreases (switched evolution relaxation),
+        until the iteration becomes Newton's.
+
+        Args:
+            x0:             initial state vector, default: initial_state();
+            tol:            convergence limit on the max. abs. scaled residual;
+            max_iter:       max. number of Newton iterations;
+            max_ptc_steps:  max. number of pseudo-transient steps;
+            verbose:        whether to print the progress;
+            instr:          utils.instrument.instrument w/ a run started, recording the residual and jacobian
+                            evaluations and the residual norm of every iteration, or None
+
+        Return:
+            {'converged': bool, 'iterations': int, 'ptc_steps': int, 'residual': float, 'wall_time': float}
+
+        See:
+            residual();
+            jacobian();
+            initial_state().
+        """
+        _start = time.time()
+        _stats = {'converged': False, 'iterations': 0, 'ptc_steps': 0, 'residual': np.inf, 'wall_time': 0.0}
+
+        if not self._ready:
+            print('ERROR: The plant equation system is not square. Check the PFD.')
+            return _stats
+
+        self._instr = instr
+        if instr is not None:
+            instr.wrap(self, 'residual')
+            instr.wrap(self, 'jacobian')
+        _phase = instr.phase if instr is not None else (lambda _name: contextlib.nullcontext())
+
+        try:
+            _x = self.initial_state() if x0 is None else np.array(x0, dtype=float)
+            _r = self.residual(_x)
+
+            with _phase('newton'):
+                _x, _r, _its, _ok = self._newton(_x, _r, tol, max_iter, verbose)
+            _stats['iterations'] = _its
+
+            if not _ok:
+                if verbose:
+                    print('Newton stalled; switching to pseudo-transient continuation.')
+                with _phase('ptc'):
+                    _x, _r, _steps, _ok = self._pseudo_transient(_x, _r, tol, max_ptc_steps, verbose)
+                _stats['ptc_steps'] = _steps
+        finally:
+            self._instr = None
+
+        _stats['converged'] = _ok
+        _stats['residual'] = float(np.max(np.abs(_r)))
+        self.set_state(_x)
+        _stats['wall_time'] = time.time() - _start
+
+        if not _ok:
+            print('WARN: Plant steady state not converged, max. residual = {:.3e}'.format(_stats['residual']))
+
+        return _stats
+
+
+    def _solve_linear(self, J, r):
+        """
+        Return the Newton step -J^-1 r, or None if J is singular.
+
+        The states are ordered by branch along the PFD, which keeps the fill-in of the LU factors close to linear in
+        the size of the plant; a fill reducing column ordering (e.g. COLAMD) costs more than it saves here. Threshold
+        pivoting that prefers the diagonal keeps the fill-in from growing w/ the row exchanges.
+        """
+        try:
+            return splu(J.tocsc(), permc_spec='NATURAL', diag_pivot_thresh=0.1).solve(-r)
+        except RuntimeError:
+            return None
+
+
+    def _bounded_step(self, x, dx):
+        """
+        Take the step dx from x while keeping every state non-negative.
+
+        A state can drop by at most (1 - _MIN_STEP_RATIO) of its current value in one step. This keeps e.g. the
+        nitrifiers from being clipped to zero by an overshooting step, since X_BA = 0 is itself a (washout) steady
+        state that the iterations would not leave again.
+        """
+        return np.maximum(x + dx, _MIN_STEP_RATIO * x)
+
+
+    def _newton(self, x, r, tol, max_iter, verbose):
+        """
+        Damped Newton iterations.
+
+        Return:
+            x, residual, number of iterations, converged (bool)
+        """
+        _norm = np.linalg.norm(r)
+        for _it in range(max_iter):
+            if np.max(np.abs(r)) < tol:
+                return x, r, _it, True
+
+            _dx = self._solve_linear(self.jacobian(x, r), r)
+            if _dx is None or not np.all(np.isfinite(_dx)):
+                return x, r, _it, False
+
+            _a = 1.0
+            while _a > 1e-4:
+                _xt = self._bounded_step(x, _a * _dx)
+                _rt = self.residual(_xt)
+                _nt = np.linalg.norm(_rt)
+                if np.isfinite(_nt) and _nt <= (1.0 - 1e-4 * _a) * _norm:
+                    break
+                _a *= 0.5
+            else:
+                return x, r, _it, False
+
+            x, r, _norm = _xt, _rt, _nt
+            if self._instr is not None:
+                self._instr.add_residual(np.max(np.abs(r)))
+            if verbose:
+                print(' Newton {:>3d}: step = {:.3f}, |R| = {:.3e}'.format(_it + 1, _a, np.max(np.abs(r))))
+
+        return x, r, max_iter, np.max(np.abs(r)) < tol
+
+
+    def _pseudo_transient(self, x, r, tol, max_steps, verbose, dt=0.1):
+        """
+        Pseudo-transient continuation on the reactor mass balances.
+
+        Return:
+            x, residual, number of steps, converged (bool)
+        """
+        # pseudo time derivative applies to the reactor concentrations that are not fixed (e.g. fixed DO)
+        _shift = np.zeros((self._num_branches, self._bs))
+        _shift[self._reac_b, 1:] = 1.0
+        _shift[self._reac_b[self._reac_fix_DO], 1] = 0.0
+        _shift = _shift.ravel()
+
+        _norm = np.linalg.norm(r)
+        for _k in range(max_steps):
+            if np.max(np.abs(r)) < tol:
+                return x, r, _k, True
+
+            _J = self.jacobian(x, r) + sparse.diags(_shift / dt)
+            _dx = self._solve_linear(_J, r)
+            if _dx is None or not np.all(np.isfinite(_dx)):
+                dt *= 0.1
+                continue
+
+            _xt = self._bounded_step(x, _dx)
+            _rt = self.residual(_xt)
+            _nt = np.linalg.norm(_rt)
+            if not np.isfinite(_nt):
+                dt *= 0.1
+                continue
+
+            dt = min(dt * _norm / max(_nt, 1e-300), 1e8)
+            x, r, _norm = _xt, _rt, _nt
+            if self._instr is not None:
+                self._instr.add_residual(np.max(np.abs(r)))
+            if verbose:
+                print(' PTC {:>3d}: dt = {:.3e}, |R| = {:.3e}'.format(_k + 1, dt, np.max(np.abs(r))))
+
+        return x, r, max_steps, np.max(np.abs(r)) < tol
@@ -0,0 +1,456 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the on-disk store of simulation results.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""On-disk store of the trajectories of the process units.
+
+A record is the time and the [flow, 13 model components] of every branch (the main/side outlets of the units), i.e.
+what run.get_dynamic() passes to its writer. The records are kept in a directory:
+
+    index.json          the branches, the columns, and the chunks written so far;
+
+    t_NNNNN.dat         times of the records in chunk NNNNN, float64;
+
+    x_NNNNN.dat         (chunk_len, number of branches, 14) results of the records in chunk NNNNN, float64.
+
+The chunk files are preallocated and written through memory maps by a background thread, so that the simulation only
+hands the records over and never waits for the disk (unless it runs far ahead of it). The index is rewritten every
+time a chunk is filled, which keeps the results of a simulation that stops half way readable up to the last full
+chunk.
+
+results_reader slices the chunks by branch, component, and time window straight from the memory maps, so that long
+runs can be post-processed without loading them into memory.
+
+Usage:
+
+    with results_store('run_1', flow_system(wwtp).get_branches()) as store:
+        run.get_dynamic(wwtp, series, (0, 365), 1/1440, writer=store)
+
+    res = results_reader('run_1')
+    t, nh = res.get('Effluent_1', comps='S_NH', t_window=(100, 110))
+    t, eff = res.get_composites('Effluent_1', names=['TSS', 'TN'])
+"""
+## @namespace results_store
+## @file results_store.py
+
+
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+from ..ASMModel.composition import DEFAULT_COMPOSITION, branch_composites
+
+
+## columns of the results of a branch: flow (m3/d) and the ASM1 model components (mg/L)
+COLUMNS = ('Q', 'S_DO', 'S_I', 'S_S', 'S_NH', 'S_NS', 'S_NO', 'S_ALK', 'X_I', 'X_S', 'X_BH', 'X_BA', 'X_D', 'X_NS')
+
+_INDEX_FILE = 'index.json'
+
+
+def _chunk_files(path, k):
+    """
+    Return the paths of the time and result files of chunk k.
+    """
+    return os.path.join(path, 't_{:05d}.dat'.format(k)), os.path.join(path, 'x_{:05d}.dat'.format(k))
+
+
+class results_store(object):
+    """
+    Writer of the results of a simulation into chunked, memory mapped files.
+
+    A results_store is a writer of run.get_dynamic() and utils.plant_dynamics: store(t, X) hands the record over to
+    the background thread and returns.
+
+    General Functions:
+        append(), flush(), close()
+    """
+
+    def __init__(self, path, branches, chunk_len=10000, queue_len=256):
+        """
+        Args:
+            path:       directory of the store, created if needed. The files of an earlier store there are replaced;
+            branches:   [(unit or unit name, 'Main'|'Side')] in the order of the rows of the results (see
+                        flow_system.get_branches());
+            chunk_len:  number of records per chunk;
+            queue_len:  number of records waiting for the writer thread before append() blocks
+
+        Return:
+            None
+        """
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+
+        self._branches = [[getattr(_u, '__name__', _u), _br] for _u, _br in branches]
+        self._chunk_len = max(int(chunk_len), 1)
+
+        ## [{'n': records, 't0': first time, 't1': last time}] of every chunk
+        self._chunks = []
+        self._t_map = None
+        self._x_map = None
+        self._n = 0
+        self._error = None
+
+        self._queue = queue.Queue(maxsize=max(int(queue_len), 1))
+        self._thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._thread.start()
+        self._write_index()
+        return None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+    def __call__(self, t, results):
+        """
+        Same as append(), so that a store can be used as the writer of a simulation.
+        """
+        self.append(t, results)
+        return None
+
+
+    def append(self, t, results):
+        """
+        Add a record.
+
+        Args:
+            t:          time, d;
+            results:    (number of branches, 14) [flow, 13 model components] of the branches
+
+        Return:
+            None
+
+        Raises:
+            IOError if writing an earlier record failed, so that the simulation stops rather than losing its results
+        """
+        if self._thread is None:
+            print('ERROR: Results store {} is closed, record at t = {} dropped.'.format(self._path, t))
+            return None
+        self._check_error()
+        self._queue.put((float(t), np.array(results, dtype=float)))
+        return None
+
+
+    def _check_error(self):
+        """
+        Raise the error of the writer thread, if any.
+        """
+        if self._error is not None:
+            raise IOError('Writing results to {} failed: {}'.format(self._path, self._error)) from self._error
+        return None
+
+
+    def _write_loop(self):
+        """
+        Move the records from the queue into the chunk files, until a None comes through.
+        """
+        while True:
+            _item = self._queue.get()
+            try:
+                if _item is None:
+                    return None
+                if self._error is None:
+                    self._write(*_item)
+            except Exception as _e:
+                self._error = _e
+            finally:
+                self._queue.task_done()
+
+
+    def _write(self, t, results):
+        """
+        Write a record into the chunk in use, starting a new chunk when it is full.
+        """
+        if self._x_map is None or self._chunks[-1]['n'] == self._chunk_len:
+            self._new_chunk()
+        _c = self._chunks[-1]
+        _j = _c['n']
+        self._t_map[_j] = t
+        self._x_map[_j] = results.reshape(self._x_map.shape[1:])
+        if _j == 0:
+            _c['t0'] = t
+        _c['t1'] = t
+        _c['n'] = _j + 1
+        self._n += 1
+        return None
+
+
+    def _new_chunk(self):
+        """
+        Close the chunk in use and preallocate the next one.
+        """
+        self._release()
+        if self._chunks:
+            self._write_index()
+        _k = len(self._chunks)
+        _t_file, _x_file = _chunk_files(self._path, _k)
+        _shape = (self._chunk_len, len(self._branches), len(COLUMNS))
+        self._t_map = np.memmap(_t_file, dtype=np.float64, mode='w+', shape=(self._chunk_len,))
+        self._x_map = np.memmap(_x_file, dtype=np.float64, mode='w+', shape=_shape)
+        self._chunks.append({'n': 0, 't0': None, 't1': None})
+        return None
+
+
+    def _release(self):
+        """
+        Flush and drop the memory maps of the chunk in use.
+        """
+        if self._x_map is not None:
+            self._t_map.flush()
+            self._x_map.flush()
+        self._t_map = self._x_map = None
+        return None
+
+
+    def _write_index(self):
+        """
+        Write the index of the store.
+        """
+        _index = {'branches': self._branches, 'columns': list(COLUMNS), 'chunk_len': self._chunk_len,
+                  'num_records': sum(_c['n'] for _c in self._chunks), 'chunks': self._chunks}
+        _file = os.path.join(self._path, _INDEX_FILE)
+        with open(_file + '.tmp', 'w') as _f:
+            json.dump(_index, _f, indent=1)
+        os.replace(_file + '.tmp', _file)
+        return None
+
+
+    def flush(self):
+        """
+        Wait until the records appended so far are on disk, and update the index.
+
+        Raises:
+            IOError if writing a record failed
+        """
+        if self._thread is None:
+            return None
+        self._queue.join()
+        self._check_error()
+        if self._x_map is not None:
+            self._t_map.flush()
+            self._x_map.flush()
+        self._write_index()
+        return None
+
+
+    def close(self):
+        """
+        Write the remaining records, trim the last chunk to its records, and stop the writer thread.
+
+        Return:
+            number of records in the store
+        """
+        if self._thread is None:
+            return self._n
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._release()
+
+        if self._chunks and self._chunks[-1]['n'] < self._chunk_len:
+            _n = self._chunks[-1]['n']
+            _t_file, _x_file = _chunk_files(self._path, len(self._chunks) - 1)
+            os.truncate(_t_file, _n * 8)
+            os.truncate(_x_file, _n * 8 * len(self._branches) * len(COLUMNS))
+        self._write_index()
+
+        if self._error is not None:
+            print('ERROR: Writing results to {} failed: {}'.format(self._path, self._error))
+        return self._n
+
+
+class results_reader(object):
+    """
+    Read-only, zero-copy access to a store written by results_store.
+
+    General Functions:
+        get_branches(), get_times(), slices(), get()
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path:   directory of the store
+
+        Return:
+            None
+        """
+        self._path = path
+        with open(os.path.join(path, _INDEX_FILE), 'r') as _f:
+            _index = json.load(_f)
+        self._branches = [tuple(_b) for _b in _index['branches']]
+        self._columns = _index['columns']
+        self._chunks = [_c for _c in _index['chunks'] if _c['n'] > 0]
+
+        self._t_maps = []
+        self._x_maps = []
+        _shape = (len(self._branches), len(self._columns))
+        for _k, _c in enumerate(self._chunks):
+            _t_file, _x_file = _chunk_files(path, _k)
+            self._t_maps.append(np.memmap(_t_file, dtype=np.float64, mode='r', shape=(_c['n'],)))
+            self._x_maps.append(np.memmap(_x_file, dtype=np.float64, mode='r', shape=(_c['n'],) + _shape))
+        return None
+
+
+    def __len__(self):
+        return sum(_c['n'] for _c in self._chunks)
+
+
+    def get_branches(self):
+        """
+        Return the (unit name, 'Main'|'Side') of every branch, in the order of the results.
+        """
+        return self._branches[:]
+
+
+    def get_times(self):
+        """
+        Return the times of all the records, d.
+        """
+        return np.concatenate(self._t_maps) if self._t_maps else np.zeros(0)
+
+
+    def _branch_index(self, unit, branch):
+        """
+        Return the index of the branch of a unit (unit or name), or a slice of all branches if unit is None.
+        """
+        if unit is None:
+            return slice(None)
+        _name = getattr(unit, '__name__', unit)
+        if (_name, branch) not in self._branches:
+            print('ERROR: No {} branch of {} in the results.'.format(branch, _name))
+            return None
+        return self._branches.index((_name, branch))
+
+
+    def _comp_index(self, comps):
+        """
+        Return the column index(es) of comps: None (all), a name or an index, or a list of them. Consecutive columns
+        are turned into a slice so that they can be read without a copy.
+        """
+        if comps is None:
+            return slice(None)
+        if isinstance(comps, (str, int, np.integer)):
+            return self._columns.index(comps) if isinstance(comps, str) else int(comps)
+        _idx = [self._columns.index(_c) if isinstance(_c, str) else int(_c) for _c in comps]
+        if _idx and _idx == list(range(_idx[0], _idx[0] + len(_idx))):
+            return slice(_idx[0], _idx[0] + len(_idx))
+        return _idx
+
+
+    def _empty(self, unit, branch):
+        """
+        Return the results of no record of a branch (or of all branches), shaped as those of a window of records.
+        """
+        _empty = np.zeros((0, len(self._branches), len(self._columns)))
+        if unit is None:
+            return _empty
+        _name = getattr(unit, '__name__', unit)
+        if (_name, branch) not in self._branches:
+            return np.zeros(0)
+        return _empty[:, self._branches.index((_name, branch))]
+
+
+    def slices(self, unit=None, branch='Main', comps=None, t_window=None):
+        """
+        Iterate over the results one chunk at a time.
+
+        Args:
+            unit:       unit or unit name; all branches if None;
+            branch:     'Main' | 'Side';
+            comps:      None (all columns), a column name (see COLUMNS) or index, or a list of them;
+            t_window:   (start, end) times, d; all records if None
+
+        Return:
+            generator of (times, results) of every chunk in the window. Both are views of the memory maps, except
+            for non-consecutive comps
+        """
+        _b = self._branch_index(unit, branch)
+        if _b is None:
+            return None
+        _col = self._comp_index(comps)
+        _lo, _hi = (-np.inf, np.inf) if t_window is None else t_window
+        for _c, _t, _x in zip(self._chunks, self._t_maps, self._x_maps):
+            if _c['t1'] < _lo or _c['t0'] > _hi:
+                continue
+            _i = int(np.searchsorted(_t, _lo, side='left'))
+            _j = int(np.searchsorted(_t, _hi, side='right'))
+            if _j > _i:
+                yield _t[_i:_j], _x[_i:_j, _b, _col]
+        return None
+
+
+    def get(self, unit=None, branch='Main', comps=None, t_window=None):
+        """
+        Return the results of a branch over a time window.
+
+        The results are views of the memory maps when the window is within a chunk (and the comps are consecutive);
+        a window across chunks is copied into one array. Use slices() to go through long windows without copying.
+
+        Args:
+            same as slices()
+
+        Return:
+            times, results (number of times first)
+        """
+        _parts = list(self.slices(unit, branch, comps, t_window))
+        if len(_parts) == 1:
+            return _parts[0]
+        if not _parts:
+            _empty = self._empty(unit, branch)
+            return np.zeros(0), _empty if _empty.ndim == 1 else _empty[..., self._comp_index(comps)]
+        return np.concatenate([_p[0] for _p in _parts]), np.concatenate([_p[1] for _p in _parts])
+
+
+    def get_composites(self, unit=None, branch='Main', names=None, t_window=None, compositions=DEFAULT_COMPOSITION):
+        """
+        Return the composites (TSS, COD, TN, ...) of a branch, or of all the branches, over a time window.
+
+        The composites of every chunk are one matrix product over its records, straight from the memory map.
+
+        Args:
+            unit, branch, t_window: see slices();
+            names:                  names of the composites (see ASMModel.composition.COMPOSITES); all if None;
+            compositions:           composition_matrix of the branches, or a list of one per branch of the results
+                                    when unit is None
+
+        Return:
+            times, (number of times, [number of branches,] number of composites) composites
+        """
+        _parts = [(_t, branch_composites(_x, compositions, names))
+                  for _t, _x in self.slices(unit, branch, None, t_window)]
+        if len(_parts) == 1:
+            return _parts[0]
+        if not _parts:
+            _empty = self._empty(unit, branch)
+            return np.zeros(0), _empty if _empty.ndim == 1 else branch_composites(_empty, compositions, names)
+        return np.concatenate([_p[0] for _p in _parts]), np.concatenate([_p[1] for _p in _parts])
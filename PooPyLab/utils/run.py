@@ -34,8 +34,18 @@ from ..unit_procs.bio import asm_reactor
 from ..unit_procs.physchem import final_clarifier
 from ..utils.datatypes import flow_data_src
 from ..utils import pfd
+from ..utils.plant_system import plant_system
+from ..utils.plant_dynamics import plant_dynamics
+from ..utils.plant_graph import plant_graph
+from ..utils.flow_system import flow_system
+from ..utils.accelerate import tear_accelerator
+from ..utils.instrument import instrument
+from ..utils import partition
 
-import cProfile
+import contextlib
+import time
+
+import numpy as np
 
 
 def input_inf_concs(asm_ver, inf_unit):
@@ -66,19 +76,18 @@ def input_inf_concs(asm_ver, inf_unit):
     """
     print("Please define the influent constituents...")
 
-    inf_concs = []
-
     neg = True
     while neg:
-        inf_concs.append(eval(input('Carbonaceous BOD5 (mg/L) =')))
-        inf_concs.append(eval(input('Total Suspended Solids (mg/L) =')))
-        inf_concs.append(eval(input('Volatile Suspended Solids (mg/L) =')))
-        inf_concs.append(eval(input('Total Kjeldahl Nitrogen (mg/L) =')))
-        inf_concs.append(eval(input('Ammonium Nitrogen (mg/L) =')))
-        inf_concs.append(eval(input('Nitrite and Nitrate Nitrogen (mg/L) =')))
-        inf_concs.append(eval(input('Total Phosphorus (mg/L) =')))
-        inf_concs.append(eval(input('Alkalinity (mmol/L as CaCO3) =')))
-        inf_concs.append(eval(input('Dissolved Oxygen (mg/L) =')))
+        inf_concs = []
+        inf_concs.append(float(input('Carbonaceous BOD5 (mg/L) =')))
+        inf_concs.append(float(input('Total Suspended Solids (mg/L) =')))
+        inf_concs.append(float(input('Volatile Suspended Solids (mg/L) =')))
+        inf_concs.append(float(input('Total Kjeldahl Nitrogen (mg/L) =')))
+        inf_concs.append(float(input('Ammonium Nitrogen (mg/L) =')))
+        inf_concs.append(float(input('Nitrite and Nitrate Nitrogen (mg/L) =')))
+        inf_concs.append(float(input('Total Phosphorus (mg/L) =')))
+        inf_concs.append(float(input('Alkalinity (mmol/L as CaCO3) =')))
+        inf_concs.append(float(input('Dissolved Oxygen (mg/L) =')))
 
         for conc in inf_concs:
             if conc < 0:
@@ -273,16 +282,18 @@ def initial_guess(params={}, reactors=[], inf_flow=1.0, plant_inf=[]):
             init_X_I, init_X_S, init_X_BH, init_X_BA, init_X_D, init_X_NS]
 
 
-def _forward(me, visited=[]):
+def _forward(me, visited, graph):
     """
     Set the flow data source by visiting process units along the flow paths.
 
     This function is to be called by forward_set_flow(). It follows the flow paths and decide whether additional flow
-    data sources can be decided based on what's known.
+    data sources can be decided based on what's known. Each unit leads to at most one other unit, so the path is
+    followed in a loop.
 
     Args:
         me:         current process unit under analysis;
-        visisted:   list of process units visited already.
+        visited:    bool array of the units visited already, indexed by the ids in graph;
+        graph:      plant_graph of the PFD.
 
     Return:
         None
@@ -290,68 +301,64 @@ def _forward(me, visited=[]):
     See:
         forward_set_flow().
     """
-    if me in visited or me is None:
-        return None
+    while me is not None and not visited[graph.get_id(me)]:
+        visited[graph.get_id(me)] = True
 
-    visited.append(me)
+        _in = me.get_upstream()
+        _mo = me.get_downstream_main()
+        _so = me.get_downstream_side()
 
-    _in = me.get_upstream()
-    _mo = me.get_downstream_main()
-    _so = me.get_downstream_side()
+        _in_f_ds, _mo_f_ds, _so_f_ds = me.get_flow_data_src()
 
-    _in_f_ds, _mo_f_ds, _so_f_ds = me.get_flow_data_src()
+        _in_f_known = (_in_f_ds != flow_data_src.TBD)
 
-    _in_f_known = (_in_f_ds != flow_data_src.TBD)
-
-    _mo_f_known = (_mo_f_ds != flow_data_src.TBD)
+        _mo_f_known = (_mo_f_ds != flow_data_src.TBD)
 
-    _so_f_known = (_so_f_ds != flow_data_src.TBD)
+        _so_f_known = (_so_f_ds != flow_data_src.TBD)
 
-    if _in_f_known:
-        if _so is None:
-            if not _mo_f_known:
-                me.set_flow_data_src('Main', flow_data_src.UPS)
-                _forward(_mo, visited)
-            #else:
-                #pass
-        else:
-            if not _mo_f_known:
-                if _so_f_known:
+        _next = None
+        if _in_f_known:
+            if _so is None:
+                if not _mo_f_known:
                     me.set_flow_data_src('Main', flow_data_src.UPS)
-                #else:
-                    #pass
+                    _next = _mo
             else:
-                if _so_f_known:
-                    # both _mo_f_known and _so_f_known
-                    return None
+                if not _mo_f_known:
+                    if _so_f_known:
+                        me.set_flow_data_src('Main', flow_data_src.UPS)
                 else:
-                    me.set_flow_data_src('Side', flow_data_src.UPS)
-                    _forward(_so, visited)
-    else:
-        # _in_flow_data_src == TBD, can it be determined?
-        _me_in_f_ds_known = True
-        for _f in _in:
-            _f_in_f_ds, _f_mo_f_ds, _f_so_f_ds = _f.get_flow_data_src()
-            if _f.get_downstream_main() == me:
-                if _f_mo_f_ds == flow_data_src.TBD:
-                    _me_in_f_ds_known = False
-                    break
-            else:
-                if _f_so_f_ds == flow_data_src.TBD:
-                    _me_in_f_ds_known = False
-                    break
-        if _me_in_f_ds_known:
-            me.set_flow_data_src('Inlet', flow_data_src.UPS)
-            _forward(me, visited)
+                    if _so_f_known:
+                        # both _mo_f_known and _so_f_known
+                        return None
+                    else:
+                        me.set_flow_data_src('Side', flow_data_src.UPS)
+                        _next = _so
+        else:
+            # _in_flow_data_src == TBD, can it be determined?
+            _me_in_f_ds_known = True
+            for _f in _in:
+                _f_in_f_ds, _f_mo_f_ds, _f_so_f_ds = _f.get_flow_data_src()
+                if _f.get_downstream_main() == me:
+                    if _f_mo_f_ds == flow_data_src.TBD:
+                        _me_in_f_ds_known = False
+                        break
+                else:
+                    if _f_so_f_ds == flow_data_src.TBD:
+                        _me_in_f_ds_known = False
+                        break
+            if _me_in_f_ds_known:
+                me.set_flow_data_src('Inlet', flow_data_src.UPS)
+        me = _next
     return None
 
 
-def forward_set_flow(wwtp):
+def forward_set_flow(wwtp, graph=None):
     """
     Set the _upstream_set_mo_flow flag of those influenced by the starters.
 
     Args:
-        wwtp:   list of all units in a wwtp.
+        wwtp:   list of all units in a wwtp;
+        graph:  plant_graph of wwtp, built here if not given.
 
     Return:
         None
@@ -364,8 +371,10 @@ def forward_set_flow(wwtp):
     """
     #TODO: this function is unlikely to be needed in the equation-based solving system
     #
+    if graph is None:
+        graph = plant_graph(wwtp)
 
-    _visited = []
+    _visited = np.zeros(graph.size(), dtype=bool)
     _starters = []
 
     # find potential starters
@@ -382,74 +391,81 @@ def forward_set_flow(wwtp):
             _starters.append(_u)
 
     for _s in _starters:
-        _forward(_s, _visited)
+        _forward(_s, _visited, graph)
 
     return None
 
 
-def _BFS(_to_visit, _visited, mn, fDO, DOsat):
+def traverse_plant(wwtp, plant_inf, mn, fDO, DOsat, graph=None):
     """
-    Breadth First Search type of traverse.
+    Visit every process units on the PFD starting from the influent.
+
+    The units are visited breadth first, with the sidestream receiver of a unit ahead of its mainstream receiver.
 
     Args:
-        _to_visit:      list of process units to be visited;
-        _visited:       list of process units visited.
-        mn:             method name used in scipy.integrate.solveivp()
-        fDO:            whether to simulate at a fix DO setpoint, bool
-        DOsat:          DO saturation conc. under the site conditions, mg/L
+        wwtp:       list of all process units on the WWTP's PFD;
+        plant_inf:  plant influent unit;
+        mn:         method name for scipy.integrate.solveivp();
+        fDO:        whether to simulate w/ a fix DO setpoint, bool,
+        DOsat:      DO saturation conc. under the site coniditions, mg/L;
+        graph:      plant_graph of wwtp, built here if not given.
 
     Return:
-        list of process units in their visited order.
+        None
+
+    See:
+        plant_graph.bfs_order();
+        traverse_blocks().
     """
+    if graph is None:
+        graph = plant_graph(wwtp)
 
-    if len(_to_visit) == 0:
-        return [_u.__name__ for _u in _visited]
-
-    _next = _to_visit.pop(0)
-
-    if _next not in _visited:
-        _visited.append(_next)
-        _next.update_combined_input()
-        _next.discharge(mn, fDO, DOsat)
-        if _next.has_sidestream():
-            _next_s = _next.get_downstream_side()
-            if _next_s not in _visited:
-                _to_visit.append(_next_s)
-        _next_m = _next.get_downstream_main()
-        if _next_m not in _visited and _next_m is not None:
-            _to_visit.append(_next_m)
-        return _BFS(_to_visit, _visited, mn, fDO, DOsat)
-    else:
-        return [_u.__name__ for _u in _visited]
+    for _i in graph.bfs_order([graph.get_id(plant_inf)]):
+        _u = graph.get_unit(_i)
+        _u.update_combined_input()
+        _u.discharge(mn, fDO, DOsat)
 
+    return None
 
-def traverse_plant(wwtp, plant_inf, mn, fDO, DOsat):
+
+def traverse_blocks(blocks, settled, mn, fDO, DOsat):
     """
-    Visit every process units on the PFD starting from the influent.
+    Visit the process units block by block in the calculation order of the partitioned PFD.
+
+    A block without tear streams is not on any loop. Once its units have converged and its upstream blocks are
+    settled, its inputs no longer change and it is skipped in the following passes. The blocks on loops are calculated
+    in every pass.
 
     Args:
-        wwtp:       list of all process units on the WWTP's PFD;
-        plant_inf:  plant influent unit;
+        blocks:     calculation sequence from partition.calc_order();
+        settled:    list of bool, one per block, updated in place;
         mn:         method name for scipy.integrate.solveivp();
         fDO:        whether to simulate w/ a fix DO setpoint, bool,
         DOsat:      DO saturation conc. under the site coniditions, mg/L
 
     Return:
-        None
+        number of units calculated in this pass (int)
 
     See:
-        _BFS();
+        utils.partition;
+        traverse_plant().
     """
-
-    _to_visit = [plant_inf]
-    _visited = []
-    _finished = []
-
-    while len(_visited) < len(wwtp):
-        _finished = _BFS(_to_visit, _visited, mn, fDO, DOsat)
-    #print("visited:", _finished)
-
-    return None
+    _unsettled = set()
+    _count = 0
+    for _i, (_units, _tears) in enumerate(blocks):
+        if settled[_i]:
+            continue
+        for _u in _units:
+            _u.update_combined_input()
+            _u.discharge(mn, fDO, DOsat)
+        _count += len(_units)
+
+        _fed_by_unsettled = any(_up in _unsettled for _u in _units for _up in (_u.get_upstream() or []))
+        if len(_tears) == 0 and not _fed_by_unsettled and all(_u.is_converged() for _u in _units):
+            settled[_i] = True
+        else:
+            _unsettled.update(_units)
+    return _count
 
 
 def _sum_of_known_inflows(me, my_inlet_of_unknown_flow):
@@ -481,10 +497,10 @@ def _backward(me):
 
     This function is to be called by backward_set_flow(). It decides whether additional flow data sources can be
     determined based on (_mo_flow + _so_flow). If so, proceed and set the inflow and trace further upstream of "me".
+    Each unit leads to at most one upstream unit, so the path is followed in a loop.
 
     Args:
         me:         current process unit under analysis;
-        visisted:   list of process units visited already.
 
     Return:
         None
@@ -494,6 +510,23 @@ def _backward(me):
         forward_set_flow();
         _forward().
     """
+    _seen = set()
+    while me is not None and me not in _seen:
+        _seen.add(me)
+        me = _backward_step(me)
+    return None
+
+
+def _backward_step(me):
+    """
+    Set the flow data source of "me", and the flow of its upstream unit if there is only one undefined.
+
+    Return:
+        the upstream unit to continue with, or None
+
+    See:
+        _backward().
+    """
 
     _in_f_ds, _mo_f_ds, _so_f_ds = me.get_flow_data_src()
 
@@ -556,7 +589,7 @@ def _backward(me):
             _target.set_sidestream_flow(_residual)
 
         if _target.get_flow_data_src()[0] == flow_data_src.DNS:
-            _backward(_target)
+            return _target
 
     return None
 
@@ -583,7 +616,9 @@ def backward_set_flow(start=[]):
     return None
 
 
-def get_steady_state(wwtp=[], target_SRT=5, verbose=False, diagnose=False, mn='BDF', fDO=True, DOsat=10):
+def get_steady_state(wwtp=[], target_SRT=5, verbose=False, diagnose=False, mn='BDF', fDO=True, DOsat=10,
+                        solver='SM', accel=None, cache=None, init_state=None, show=True, instr=None,
+                        max_passes=5000):
     """ 
     Integrate the entire plant towards a steady state at the target SRT.
 
@@ -594,32 +629,64 @@ def get_steady_state(wwtp=[], target_SRT=5, verbose=False, diagnose=False, mn='B
         wwtp:       all process units in a wastewater treatment plant
         target_SRT: target solids retention time (d) for the steady state
         verbose:    flag for more detailed output
-        diagnose:   flag for the use of cProfile for performance analysis
+        diagnose:   flag for printing the summary of the instrumented run (see utils.instrument)
         mn:         method used in scipy.integrate.solveivp(), string
         fDO:        whether to simulate w/ a fix DO setpoint, bool
         DOsat:      DO saturation conc. under the site conditions, mg/L
+        solver:     'SM' for the sequential modular loop, 'Newton' for the equation-based plant_system
+        accel:      convergence accelerator of the 'SM' loop: None, 'Wegstein', or 'Anderson'
+        cache:      utils.ss_cache.steady_state_cache of converged states, or None
+        init_state: plant state (see plant_system.get_state()) to start from instead of initial_guess(), or None
+        show:       whether to print the initial guess and the final concentrations
+        instr:      utils.instrument.instrument recording the run, or None (one is used if diagnose)
+        max_passes: max. number of passes of the 'SM' loop
 
     Return:
-        None
+        {'solver': str, 'converged': bool, 'iterations': int, 'wall_time': float, 'accel': str,
+        'residuals': [float], 'cache': None | 'exact' | 'near' | 'miss'}
+
+    Note:
+        The 'SM' solver integrates every reactor for one day per pass and repeats the passes until all the units
+        converge, or for max_passes at most. The 'Newton' solver solves the steady state equations of the whole plant
+        at once (see utils.plant_system), with its own pseudo-transient fallback.
+
+        The branch flows of every 'SM' pass are solved from the flow balances of the plant at the WAS flow of the pass
+        (see utils.flow_system). The 'SM' passes follow the calculation order of the partitioned PFD (see
+        utils.partition). The 'residuals' are the pass-to-pass changes of the tear streams and the reactor contents
+        (see utils.accelerate). They are empty for the 'Newton' solver.
+
+        With a cache, a plant that has been solved before (same configuration, kinetics, influent, and SRT) gets its
+        cached state back without any iteration. A plant close to a cached one starts from the cached state instead of
+        initial_guess(). Converged states are added to the cache.
 
     See:
         utils.pdf;
-        forward_set_flow();
-        backward_set_flow();
-        traverse_plant()
+        utils.ss_cache;
+        utils.instrument;
+        utils.plant_system;
+        utils.partition;
+        utils.accelerate;
+        utils.flow_system;
+        traverse_blocks()
     """
 
+    if solver not in ('SM', 'Newton') or accel not in (None, 'Wegstein', 'Anderson'):
+        print('ERROR: Unknown steady state solver {} or accelerator {}.'.format(solver, accel))
+        return {'solver': solver, 'converged': False, 'iterations': 0, 'wall_time': 0.0, 'accel': accel,
+                'residuals': [], 'cache': None}
+
     # identify units of different types
-    _inf = pfd.get_all_units(wwtp, 'Influent')
-    _reactors = pfd.get_all_units(wwtp, 'ASMReactor')
+    _graph = plant_graph(wwtp)
+    _inf = _graph.get_units('Influent')
+    _reactors = _graph.get_units('ASMReactor')
 
     # _WAS may be an empty [], see below (after intial guess)
-    _WAS = pfd.get_all_units(wwtp, 'WAS')
+    _WAS = _graph.get_units('WAS')
 
-    _splitters = pfd.get_all_units(wwtp, 'Splitter')
+    _splitters = _graph.get_units('Splitter')
     _srt_ctrl = [_u for _u in _splitters if _u.is_SRT_controller()]
-    _final_clar = pfd.get_all_units(wwtp, 'Final_Clarifier')
-    _eff = pfd.get_all_units(wwtp, 'Effluent')
+    _final_clar = _graph.get_units('FinalClarifier')
+    _eff = _graph.get_units('Effluent')
     _plant_inf_flow = sum([_u.get_main_outflow() for _u in _inf])
 
     if verbose:
@@ -650,50 +717,289 @@ def get_steady_state(wwtp=[], target_SRT=5, verbose=False, diagnose=False, mn='B
         _u.update_combined_input()
         _u.discharge(mn, fDO, DOsat)
 
+    for fc in _final_clar:
+        fc.set_capture_rate(0.992)
+
+    _hit, _cached = (None, None) if cache is None else cache.lookup(wwtp, _SRT, fDO, DOsat)
+    if _hit == 'exact':
+        _start = time.time()
+        plant_system(wwtp, _SRT, fDO, DOsat).set_state(_cached)
+        if show:
+            show_concs(wwtp)
+        return {'solver': solver, 'converged': True, 'iterations': 0, 'wall_time': time.time() - _start,
+                'accel': accel if solver == 'SM' else None, 'residuals': [], 'cache': 'exact'}
+
     # TODO: what if there are multiple influent units?
     #       An equation-based solving system would take care of that
-    if len(_reactors):
+    if _hit == 'near':
+        if show:
+            print('Initial guess from a cached steady state of a similar plant.\n\n')
+        cache.seed(wwtp, _cached)
+    elif init_state is not None:
+        # the Newton solver starts from the seeded plant_system
+        _sys = plant_system(wwtp, _SRT, fDO, DOsat)
+        _sys.set_state(init_state)
+    elif len(_reactors):
         _params = _reactors[0].get_model_params()
         _seed = initial_guess(_params, _reactors, _inf[0].get_main_outflow(), _inf[0].get_main_outlet_concs())
         format_sd = '{:<.3f}, ' * len(_seed)
-        print('Initial guess =', format_sd.format(*_seed), '\n\n')
+        if show:
+            print('Initial guess =', format_sd.format(*_seed), '\n\n')
         for _r in wwtp:
             _r.assign_initial_guess(_seed)
 
-    for fc in _final_clar:
-        fc.set_capture_rate(0.992)
-
-    forward_set_flow(wwtp)
-
-    # collect all the possible starting points for backward flow setting
-    _backward_start_points = [_w for _w in _WAS] + [_e for _e in _eff]
-
-    if diagnose:
-        profile = cProfile.Profile()
-        profile.enable()
+    if diagnose and instr is None:
+        instr = instrument()
+    if instr is not None:
+        instr.start_run('steady_state', solver=solver, accel=accel if solver == 'SM' else None, target_SRT=_SRT,
+                        num_units=len(wwtp), cache=None if cache is None else (_hit or 'miss'))
+        instr.attach(wwtp)
+        _phase = instr.phase
+    else:
+        _phase = lambda _name: contextlib.nullcontext()
 
+    _start = time.time()
     r = 0
-    while True:
-        if len(_WAS) == 0:
-            _WAS_flow = 0
+    _converged = False
+    try:
+        if solver == 'Newton':
+            if init_state is None or _hit == 'near':
+                _sys = plant_system(wwtp, _SRT, fDO, DOsat)
+            _stats = _sys.solve(verbose=verbose, instr=instr)
+            r = _stats['iterations'] + _stats['ptc_steps']
+            _converged = _stats['converged']
+            _residuals = []
         else:
-            _WAS_flow = _WAS[0].set_WAS_flow(_SRT, _reactors, _eff)
-            _WAS[0].set_mainstream_flow(_WAS_flow)
-        _eff[0].set_mainstream_flow(_plant_inf_flow - _WAS_flow)
-        backward_set_flow(_backward_start_points)
-        traverse_plant(wwtp, _inf[0], mn, fDO, DOsat)
-
-        if check_global_cnvg(wwtp):
-            break
-        r += 1
+            # the flow balances only change with the WAS flow from pass to pass
+            _flows = flow_system(wwtp)
+            if not _flows.is_ready():
+                print('ERROR: The branch flows of the PFD can not be solved.')
+                return {'solver': solver, 'converged': False, 'iterations': 0, 'wall_time': time.time() - _start,
+                        'accel': accel, 'residuals': [], 'cache': None}
+
+            # partition the PFD, and run the units outside the loops only until they settle
+            _blocks = partition.calc_order(wwtp, graph=_graph)
+            _settled = [False] * len(_blocks)
+
+            _acc = tear_accelerator(wwtp, partition.flatten(_blocks), accel)
+            if verbose:
+                print('Tear streams: {}'.format([(_u.__name__, _br) for _u, _br in _acc.get_tear_streams()]))
+
+            _done = False
+            while r < max_passes:
+                with _phase('flow'):
+                    if len(_WAS) == 0:
+                        _WAS_flow = 0
+                    else:
+                        _WAS_flow = _WAS[0].set_WAS_flow(_SRT, _reactors, _eff)
+                    _flows.set_flows(_WAS_flow)
+                with _phase('accelerate'):
+                    _acc.start_pass()
+                with _phase('traverse'):
+                    _count = traverse_blocks(_blocks, _settled, mn, fDO, DOsat)
+
+                with _phase('convergence'):
+                    _done = check_global_cnvg(wwtp)
+                with _phase('accelerate'):
+                    # the units of the settled blocks are not calculated again, so they are not to be moved either
+                    _fixed = set(_u for (_units, _tears), _s in zip(_blocks, _settled) if _s for _u in _units)
+                    _acc.end_pass(verbose, accelerate=not _done, fixed=_fixed)
+                if instr is not None:
+                    instr.count('units_calculated', _count)
+                if _done:
+                    break
+                r += 1
+            _converged = _done
+            if not _converged:
+                print('WARN: Plant steady state not converged after {} passes.'.format(max_passes))
+            _residuals = _acc.get_residuals()
+            if instr is not None:
+                for _res in _residuals:
+                    instr.add_residual(_res)
+    finally:
+        # the units are put back even if the solution fails or is interrupted (e.g. by a time limit)
+        if instr is not None:
+            instr.end_run(converged=_converged, iterations=r)
+
+    _wall_time = time.time() - _start
 
     if diagnose:
-        profile.disable()
-        profile.print_stats()
+        instr.summary()
+
+    if cache is not None and _converged:
+        cache.store(wwtp, _SRT, plant_system(wwtp, _SRT, fDO, DOsat).get_state(), fDO, DOsat)
 
-    show_concs(wwtp)
+    if show:
+        show_concs(wwtp)
 
     if verbose:
         print("TOTAL ITERATION = ", r)
+        print("WALL TIME = {:.3f} (sec)".format(_wall_time))
+
+    return {'solver': solver, 'converged': _converged, 'iterations': r, 'wall_time': _wall_time,
+            'accel': accel if solver == 'SM' else None, 'residuals': _residuals,
+            'cache': None if cache is None else (_hit or 'miss')}
+
+
+def sweep_steady_state(wwtp=[], srt_list=[], temps=None, mn='BDF', fDO=True, DOsat=10, solver='SM', accel=None,
+                       extrapolate=True, verbose=False):
+    """
+    Solve the steady states of the plant over a range of SRTs (and wastewater temperatures).
 
+    The points are solved outward from the median SRT: up to the longest SRT, then down from the median to the
+    shortest, at every temperature in ascending order. Only the first point starts from initial_guess(). Every other
+    point starts from the converged state of its neighbour, extrapolated linearly in SRT from the last two points of
+    the same leg. The first point at another temperature starts from the median SRT point at the temperature before.
+
+    Going outward from the middle keeps every start close to a converged state: a long SRT is hard to reach from
+    initial_guess(), and a plant started w/ its nitrifiers washed out (at a short SRT) stays w/o them at any SRT.
+
+    Args:
+        wwtp:           all process units in a wastewater treatment plant
+        srt_list:       target SRTs, d
+        temps:          wastewater temperatures of all the asm_reactors, degC; None to keep the current ones
+        mn:             method used in scipy.integrate, string
+        fDO:            whether to simulate w/ a fix DO setpoint, bool
+        DOsat:          DO saturation conc. under the site conditions, mg/L
+        solver:         'SM' or 'Newton', see get_steady_state()
+        accel:          convergence accelerator of the 'SM' loop, see get_steady_state()
+        extrapolate:    whether to extrapolate the starting states from the last two points
+        verbose:        flag for more detailed output
+
+    Return:
+        {'SRT': (n,) array, 'temp': (n,) array (nan w/o temps), 'converged': (n,) bool array,
+        'iterations': (n,) int array, 'wall_time': (n,) array, 'WAS_flow': (n,) array,
+        'effluent': (n, 13) model components of the (first) effluent, 'states': [plant state of every point]},
+        in the order of the sweep. The asm_reactors are left at their original temperatures, w/ the state of the last
+        point.
+
+    See:
+        get_steady_state();
+        utils.plant_system.
+    """
+    _reactors = pfd.get_all_units(wwtp, 'ASMReactor')
+    _conds = [(_r._sludge._temperature, _r._sludge._bulk_DO) for _r in _reactors]
+    _eff = pfd.get_all_units(wwtp, 'Effluent')
+    _WAS = pfd.get_all_units(wwtp, 'WAS')
+    # only to pack the states, which do not depend on the SRT
+    _packer = None
+
+    _srts = sorted(srt_list)
+    _mid = len(_srts) // 2
+    _legs = []
+    for _T in ([None] if temps is None else sorted(temps)):
+        _legs += [(_T, _srts[_mid:]), (_T, _srts[:_mid][::-1])]
+
+    _table = {'SRT': [], 'temp': [], 'converged': [], 'iterations': [], 'wall_time': [], 'WAS_flow': [],
+              'effluent': [], 'states': []}
+    # converged states of the median SRT points, by temperature
+    _mids = {}
+    _last_T = None
+    for _T, _leg in _legs:
+        if not _leg:
+            continue
+        if _T is not None:
+            for _r, (_t, _DO) in zip(_reactors, _conds):
+                _r.set_model_condition(_T, _DO)
+        # (SRT, state) of the last points of the leg, w/ the median point in front of a downward leg
+        _hist = [(_srts[_mid], _mids[_T])] if _T in _mids else []
+        for _SRT in _leg:
+            if len(_hist) == 2 and extrapolate:
+                (_s0, _x0), (_s1, _x1) = _hist
+                _seed = np.maximum(_x1 + (_SRT - _s1) / (_s1 - _s0) * (_x1 - _x0), 0.0)
+            elif _hist:
+                _seed = _hist[-1][1]
+            else:
+                _seed = _mids.get(_last_T)
+
+            _stats = get_steady_state(wwtp, _SRT, verbose, False, mn, fDO, DOsat, solver, accel, init_state=_seed,
+                                      show=verbose)
+            if _packer is None:
+                _packer = plant_system(wwtp, _SRT, fDO, DOsat)
+            _state = _packer.get_state()
+            _hist = (_hist + [(_SRT, _state)])[-2:]
+            if _SRT == _srts[_mid] and _T not in _mids:
+                _mids[_T] = _state
+
+            _table['SRT'].append(_SRT)
+            _table['temp'].append(np.nan if _T is None else _T)
+            _table['converged'].append(_stats['converged'])
+            _table['iterations'].append(_stats['iterations'])
+            _table['wall_time'].append(_stats['wall_time'])
+            _table['WAS_flow'].append(sum(_u.get_main_outflow() for _u in _WAS))
+            _table['effluent'].append(_eff[0].get_main_outlet_concs() if _eff else [np.nan] * 13)
+            _table['states'].append(_state)
+            if verbose:
+                print('SRT = {} d, T = {} degC: {} iterations, {:.3f} sec'.format(_SRT, _T, _stats['iterations'],
+                                                                                   _stats['wall_time']))
+        _last_T = _T
+
+    if temps is not None:
+        for _r, (_t, _DO) in zip(_reactors, _conds):
+            _r.set_model_condition(_t, _DO)
+
+    for _col in ('SRT', 'temp', 'wall_time', 'WAS_flow', 'effluent'):
+        _table[_col] = np.array(_table[_col], dtype=float)
+    _table['converged'] = np.array(_table['converged'], dtype=bool)
+    _table['iterations'] = np.array(_table['iterations'], dtype=int)
+    return _table
+
+
+def get_dynamic(wwtp=[], influent_series={}, t_span=(0, 1), dt_out=1/96, mn='BDF', fDO=True, DOsat=10,
+                WAS_flow=None, writer=None, verbose=False, temp_series=None, instr=None):
+    """
+    Simulate the entire plant over time with time varying influent(s) (and wastewater temperature).
+
+    All the asm_reactors are integrated together as one ODE system, with the flows and the concentrations of the other
+    units solved at every time the integrator asks for (see utils.plant_dynamics). The simulation starts from the
+    current state of the process units, e.g. the results of get_steady_state().
+
+    Args:
+        wwtp:               all process units in a wastewater treatment plant
+        influent_series:    {influent unit: function of time t (d) returning (flow, 13 model components)} or
+                            {influent unit: (times, flows, comps)}; influents not listed follow their own time
+                            series (see influent.set_time_series()) or stay constant
+        t_span:             (start, end) of the simulation, d
+        dt_out:             interval of the outputs, d
+        mn:                 method used in scipy.integrate, e.g. 'BDF', 'Radau', 'LSODA', string
+        fDO:                whether to simulate w/ a fix DO setpoint, bool
+        DOsat:              DO saturation conc. under the site conditions, mg/L
+        WAS_flow:           total WAS flow during the simulation, m3/d (the current WAS flow if None)
+        writer:             function of (t, results) called at every output time, with the results as a (B, 14)
+                            array of [flow, 13 model components] of the branches, e.g. a utils.results_store. The
+                            results are returned in memory if None
+        verbose:            flag for more detailed output
+        temp_series:        function of time t (d) returning the wastewater temperature(s) of the asm_reactors, or
+                            (times, temps) arrays (see utils.plant_dynamics.interp_temperatures()); constant if None
+        instr:              utils.instrument.instrument recording the run, or None
+
+    Return:
+        {'t': output times, 'results': (n_t, B, 14) array or None, 'branches': [(unit name, 'Main'|'Side')],
+        'success': bool, 'message': str, 'steps': int, 'rhs_evals': int, 'wall_time': float}, or None if the plant
+        can not be simulated.
+
+    See:
+        utils.plant_dynamics;
+        get_steady_state().
+    """
+    _sys = plant_dynamics(wwtp, influent_series, WAS_flow, fDO, DOsat, temp_series)
+    if not _sys.is_ready():
+        print('ERROR: The plant can not be simulated dynamically.')
+        return None
+
+    if instr is not None:
+        instr.start_run('dynamic', method=mn, t_span=list(t_span), num_units=len(wwtp))
+    _stats = {'success': False, 'steps': 0}
+    try:
+        _stats = _sys.simulate(t_span, dt_out, mn, writer=writer, verbose=verbose, instr=instr)
+    finally:
+        if instr is not None:
+            instr.end_run(success=_stats['success'], steps=_stats['steps'])
+    _stats['branches'] = [(_u.__name__, _br) for _u, _br in _sys.get_branches()]
+
+    if verbose:
+        show_concs(wwtp)
+        print("TOTAL STEPS = ", _stats['steps'])
+        print("WALL TIME = {:.3f} (sec)".format(_stats['wall_time']))
 
+    return _stats
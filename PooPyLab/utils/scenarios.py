@@ -0,0 +1,421 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the parallel scenario runner.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Steady states of a plant under many scenarios, in parallel processes.
+
+A scenario is a row of a table whose columns set the conditions of the plant before its steady state is solved. The
+columns known by default are:
+
+    'SRT':          target SRT, d;
+    'temp':         wastewater temperature of all the asm_reactors, degC;
+    'inf_flow':     total influent flow, m3/d (split among the influents as designed);
+    'RAS_ratio':    mainstream flow of the SRT controlling splitter / total influent flow;
+    'IR_ratio':     user defined sidestream flow of every other splitter / total influent flow.
+
+Other columns need a setter, i.e. a function of (wwtp, value).
+
+Every worker process builds the plant once, by the construct function it is given (e.g. construct() of the examples),
+and then solves the scenarios sent to it one after another. Every scenario starts from the design conditions of the
+plant and from run.initial_guess(), so the results do not depend on which worker solves which scenario. The scenarios
+are sent to the workers in chunks to keep the inter-process traffic low.
+
+With warm_start, a scenario starts instead from the converged state of the scenario before it in the same chunk. That
+saves iterations when the rows of a chunk are neighbours (e.g. a trajectory of utils.sensitivity), and the results
+then depend on the chunks but still not on the workers.
+
+Besides the effluent model components, the workers can evaluate named outputs of the (first) effluent, e.g. 'get_TN'
+or 'get_TSS'.
+
+Usage:
+
+    from MLE import construct
+
+    table = run_scenarios(construct, {'SRT': [5, 10, 15], 'temp': [12, 12, 20]}, max_workers=4)
+"""
+## @namespace scenarios
+## @file scenarios.py
+
+
+import concurrent.futures
+import contextlib
+import io
+import math
+import os
+import signal
+import time
+
+import numpy as np
+
+from ..utils import pfd, run
+from ..utils.datatypes import flow_data_src
+from ..utils.plant_system import plant_system
+
+
+## outcomes of a scenario
+STATUS = ('ok', 'not converged', 'timeout', 'error')
+
+## the plant of a worker process, and its design conditions
+_PLANT = None
+_DESIGN = None
+_SETTERS = None
+_SOLVER = None
+_OUTPUTS = ()
+## plant_system of the worker's plant, only to pack its converged states
+_PACKER = None
+
+
+class _scenario_timeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise _scenario_timeout()
+
+
+def _total_inflow(wwtp):
+    return sum(_u.get_main_outflow() for _u in pfd.get_all_units(wwtp, 'Influent'))
+
+
+def _set_temp(wwtp, temp):
+    for _r in pfd.get_all_units(wwtp, 'ASMReactor'):
+        _r.set_model_condition(temp, _r._sludge._bulk_DO)
+    return None
+
+
+def _set_inf_flow(wwtp, flow):
+    _inf = pfd.get_all_units(wwtp, 'Influent')
+    _total = _total_inflow(wwtp)
+    for _u in _inf:
+        _u.set_mainstream_flow(flow * (_u.get_main_outflow() / _total if _total > 0 else 1.0 / len(_inf)))
+    return None
+
+
+def _set_RAS_ratio(wwtp, ratio):
+    for _u in pfd.get_all_units(wwtp, 'Splitter'):
+        if _u.is_SRT_controller():
+            _u.set_mainstream_flow(ratio * _total_inflow(wwtp))
+    return None
+
+
+def _set_IR_ratio(wwtp, ratio):
+    for _u in pfd.get_all_units(wwtp, 'Splitter'):
+        if not _u.is_SRT_controller() and _u.get_flow_data_src()[2] == flow_data_src.PRG:
+            _u.set_sidestream_flow(ratio * _total_inflow(wwtp))
+    return None
+
+
+## setters of the default columns, in the order they are applied ('SRT' is an argument of the solver)
+DEFAULT_SETTERS = {'temp': _set_temp, 'inf_flow': _set_inf_flow, 'RAS_ratio': _set_RAS_ratio,
+                   'IR_ratio': _set_IR_ratio}
+
+
+def _design_conditions(wwtp):
+    """
+    Return the conditions a scenario may change, to restore them before the next one.
+    """
+    return [(_u, _u.get_main_outflow(), _u.get_side_outflow() if _u.has_sidestream() else None,
+             (_u._sludge._temperature, _u._sludge._bulk_DO) if _u.get_type() == 'ASMReactor' else None)
+            for _u in wwtp]
+
+
+def _restore(design):
+    for _u, _mo, _so, _cond in design:
+        _ds = _u.get_flow_data_src()
+        if _u.get_type() == 'Influent' or _ds[1] == flow_data_src.PRG:
+            _u.set_mainstream_flow(_mo)
+        if _so is not None and _ds[2] == flow_data_src.PRG:
+            _u.set_sidestream_flow(_so)
+        if _cond is not None:
+            _u.set_model_condition(*_cond)
+    return None
+
+
+def _find_output(wwtp, output):
+    """
+    Return the method of a unit that evaluates an output, or None.
+
+    Args:
+        wwtp:   all process units of the plant;
+        output: name of a method of the (first) effluent, e.g. 'get_TN', or (unit name or type, method name), e.g.
+                ('ASMReactor', 'get_TSS') for the MLSS of the first asm_reactor
+
+    Return:
+        bound method
+    """
+    _unit, _method = ('Effluent', output) if isinstance(output, str) else output
+    _found = [_u for _u in wwtp if _u.get_name() == _unit] or pfd.get_all_units(wwtp, _unit)
+    if not _found or not hasattr(_found[0], _method):
+        print('ERROR: No unit {} w/ output {} in the plant.'.format(_unit, _method))
+        return None
+    return getattr(_found[0], _method)
+
+
+def _init_worker(construct, setters, solver, outputs=()):
+    """
+    Build the plant of a worker process.
+    """
+    global _PLANT, _DESIGN, _SETTERS, _SOLVER, _OUTPUTS, _PACKER
+    with contextlib.redirect_stdout(io.StringIO()):
+        _PLANT = construct()
+        pfd.check(_PLANT)
+    _DESIGN = _design_conditions(_PLANT)
+    _SETTERS = setters
+    _SOLVER = solver
+    _OUTPUTS = tuple(_find_output(_PLANT, _o) for _o in outputs)
+    _PACKER = None
+    return None
+
+
+def _pack_state():
+    """
+    Return the current state of the worker's plant (see plant_system.get_state()).
+    """
+    global _PACKER
+    if _PACKER is None:
+        _PACKER = plant_system(_PLANT, _SOLVER.get('target_SRT', 5), _SOLVER.get('fDO', True),
+                               _SOLVER.get('DOsat', 10))
+    return _PACKER.get_state()
+
+
+def _solve_one(columns, row, timeout, init_state=None):
+    """
+    Solve the steady state of the worker's plant under one scenario, from init_state if given.
+
+    Return:
+        status index, iterations, wall time, WAS flow, effluent model components, outputs
+    """
+    _failed = [np.nan] * 13, [np.nan] * len(_OUTPUTS)
+    _start = time.time()
+    _SRT = _SOLVER.get('target_SRT', 5)
+    _kw = {_k: _v for _k, _v in _SOLVER.items() if _k != 'target_SRT'}
+    _timer = timeout is not None and hasattr(signal, 'setitimer')
+    try:
+        _restore(_DESIGN)
+        for _c, _v in zip(columns, row):
+            if _c == 'SRT':
+                _SRT = _v
+            elif _c in _SETTERS:
+                _SETTERS[_c](_PLANT, _v)
+        if _timer:
+            signal.signal(signal.SIGALRM, _on_alarm)
+            signal.setitimer(signal.ITIMER_REAL, timeout)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _stats = run.get_steady_state(_PLANT, _SRT, show=False, init_state=init_state, **_kw)
+    except _scenario_timeout:
+        return (STATUS.index('timeout'), 0, time.time() - _start, np.nan) + _failed
+    except Exception:
+        return (STATUS.index('error'), 0, time.time() - _start, np.nan) + _failed
+    finally:
+        if _timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+    _WAS = sum(_u.get_main_outflow() for _u in pfd.get_all_units(_PLANT, 'WAS'))
+    _eff = pfd.get_all_units(_PLANT, 'Effluent')
+    return (STATUS.index('ok' if _stats['converged'] else 'not converged'), _stats['iterations'],
+            time.time() - _start, _WAS, _eff[0].get_main_outlet_concs() if _eff else _failed[0],
+            [np.nan if _f is None else _f() for _f in _OUTPUTS])
+
+
+def _solve_chunk(columns, rows, timeout, warm_start=False, init_states=None, keep_states=False):
+    """
+    Solve the scenarios of a chunk, each from its init_state if given, or else from the converged state of the one
+    before it if warm_start.
+
+    Return:
+        [results of _solve_one() + (converged state if keep_states, or None,)]
+    """
+    _results = []
+    _state = None
+    for _k, _row in enumerate(rows):
+        _init = None if init_states is None else init_states[_k]
+        if _init is None and warm_start:
+            _init = _state
+        _res = _solve_one(columns, _row, timeout, _init)
+        _ok = _res[0] == STATUS.index('ok')
+        _state = _pack_state() if _ok and (warm_start or keep_states) else None
+        _results.append(_res + (_state if keep_states else None,))
+    return _results
+
+
+class scenario_runner(object):
+    """
+    Pool of worker processes, each w/ its own copy of a plant, solving scenarios of the plant.
+
+    The workers stay up between calls of run(), so that a long study (e.g. utils.monte_carlo) builds the plant only
+    once per worker.
+
+    General Functions:
+        run(), close()
+    """
+
+    def __init__(self, construct, setters={}, max_workers=None, timeout=None, outputs=(), **solver_args):
+        """
+        Args:
+            construct:      function building the plant and returning its process units, e.g. construct() of an
+                            example. It must be picklable, i.e. a module level function;
+            setters:        {column: picklable function of (wwtp, value)} in addition to DEFAULT_SETTERS;
+            max_workers:    number of worker processes (os.cpu_count() if None). 0 solves the scenarios in this
+                            process;
+            timeout:        max. time of a scenario, sec (Unix only);
+            outputs:        outputs to evaluate: names of the methods of the (first) effluent, e.g. 'get_TN', or
+                            (unit name or type, method name), e.g. ('ASMReactor', 'get_TSS');
+            solver_args:    keyword arguments of run.get_steady_state(), e.g. solver='Newton', target_SRT=10 (w/o
+                            an 'SRT' column)
+
+        Return:
+            None
+        """
+        self._setters = dict(DEFAULT_SETTERS)
+        self._setters.update(setters)
+        self._timeout = timeout
+        self._outputs = list(outputs)
+        self._workers = (os.cpu_count() or 1) if max_workers is None else max_workers
+        self._pool = None
+        if self._workers == 0:
+            _init_worker(construct, self._setters, solver_args, self._outputs)
+        else:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker,
+                                                                initargs=(construct, self._setters, solver_args,
+                                                                          self._outputs))
+        return None
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+
+    def close(self):
+        """
+        Shut the worker processes down.
+        """
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        return None
+
+
+    def run(self, scenarios, columns=None, chunk_size=None, progress=None, warm_start=False, init_states=None,
+            keep_states=False):
+        """
+        Solve the steady state of the plant under every scenario of a table.
+
+        Args:
+            scenarios:      {column: (n,) values}, or an (n, number of columns) array w/ the names in columns;
+            columns:        names of the columns of an array of scenarios;
+            chunk_size:     number of scenarios sent to a worker at a time (about 4 chunks per worker if None);
+            progress:       function of (scenarios done, total scenarios) called as the chunks come back, or None;
+            warm_start:     whether to start every scenario of a chunk from the converged state of the one before it;
+            init_states:    [plant state (see plant_system.get_state()) or None] to start the scenarios from, or None;
+            keep_states:    whether to return the converged states
+
+        Return:
+            {column: (n,) array of the scenarios, 'status': (n,) int array (index of STATUS),
+            'iterations': (n,) int array, 'wall_time': (n,) array, 'WAS_flow': (n,) array,
+            'effluent': (n, 13) array of the model components of the (first) effluent,
+            'outputs': (n, number of outputs) array, 'states': [converged state or None] if keep_states}, in the
+            order of the scenarios
+        """
+        if isinstance(scenarios, dict):
+            columns = list(scenarios.keys())
+            _table = np.column_stack([np.asarray(scenarios[_c], dtype=float) for _c in columns])
+        else:
+            _table = np.atleast_2d(np.asarray(scenarios, dtype=float))
+            columns = list(columns)
+
+        for _c in columns:
+            if _c != 'SRT' and _c not in self._setters:
+                print('WARN: Scenario column {} has no setter and is ignored.'.format(_c))
+        # apply the columns in the order of the setters, e.g. the flow before the flow ratios
+        _names = list(self._setters)
+        _order = sorted(range(len(columns)), key=lambda _k: _names.index(columns[_k]) if columns[_k] in _names
+                        else -1)
+        _cols = [columns[_k] for _k in _order]
+        _rows = _table[:, _order]
+
+        _n = len(_rows)
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(_n / (4 * max(self._workers, 1))))
+        _chunks = [(_k, _rows[_k:_k + chunk_size],
+                    None if init_states is None else list(init_states[_k:_k + chunk_size]))
+                   for _k in range(0, _n, chunk_size)]
+
+        _results = [None] * _n
+        _done = 0
+        if self._pool is None:
+            for _k, _chunk, _inits in _chunks:
+                _results[_k:_k + len(_chunk)] = _solve_chunk(_cols, _chunk, self._timeout, warm_start, _inits,
+                                                             keep_states)
+                _done += len(_chunk)
+                if progress is not None:
+                    progress(_done, _n)
+        else:
+            _futures = {self._pool.submit(_solve_chunk, _cols, _chunk, self._timeout, warm_start, _inits,
+                                          keep_states): (_k, len(_chunk)) for _k, _chunk, _inits in _chunks}
+            for _f in concurrent.futures.as_completed(_futures):
+                _k, _m = _futures[_f]
+                try:
+                    _results[_k:_k + _m] = _f.result()
+                except Exception as _e:
+                    print('ERROR: Scenarios {} to {} failed in a worker: {}'.format(_k, _k + _m - 1, _e))
+                    _results[_k:_k + _m] = [(STATUS.index('error'), 0, 0.0, np.nan, [np.nan] * 13,
+                                             [np.nan] * len(self._outputs), None)] * _m
+                _done += _m
+                if progress is not None:
+                    progress(_done, _n)
+
+        _out = {_c: _table[:, _k] for _k, _c in enumerate(columns)}
+        _out['status'] = np.array([_r[0] for _r in _results], dtype=int)
+        _out['iterations'] = np.array([_r[1] for _r in _results], dtype=int)
+        _out['wall_time'] = np.array([_r[2] for _r in _results], dtype=float)
+        _out['WAS_flow'] = np.array([_r[3] for _r in _results], dtype=float)
+        _out['effluent'] = np.array([_r[4] for _r in _results], dtype=float).reshape(_n, 13)
+        _out['outputs'] = np.array([_r[5] for _r in _results], dtype=float).reshape(_n, len(self._outputs))
+        if keep_states:
+            _out['states'] = [_r[6] for _r in _results]
+        return _out
+
+
+def run_scenarios(construct, scenarios, columns=None, setters={}, max_workers=None, chunk_size=None, timeout=None,
+                  progress=None, outputs=(), **solver_args):
+    """
+    Solve the steady state of a plant under every scenario of a table, in parallel worker processes.
+
+    Args:
+        construct, setters, max_workers, timeout, outputs, solver_args: see scenario_runner;
+        scenarios, columns, chunk_size, progress:                       see scenario_runner.run()
+
+    Return:
+        see scenario_runner.run()
+
+    See:
+        run.get_steady_state().
+    """
+    with scenario_runner(construct, setters, max_workers, timeout, outputs, **solver_args) as _runner:
+        return _runner.run(scenarios, columns, chunk_size, progress)
@@ -0,0 +1,293 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the global sensitivity analysis of the model parameters.
+#
+#    Author: Kai Zhang
+#
+#
+"""Global sensitivity of the effluent quality to the ASM1 parameters.
+
+Two methods are available, both over ranges of the kinetic parameters at 20C (see asm_1._PARAM_NAMES; other scenario
+columns of utils.scenarios, e.g. 'temp', can be included too):
+
+    morris():   Morris elementary effects along random one-at-a-time trajectories of a grid in the parameter space.
+                mu_star ranks the parameters by their overall effect, and sigma tells the nonlinear/interacting ones.
+                It takes (number of parameters + 1) x number of trajectories steady states, and is the screening
+                method to run first;
+
+    sobol():    Sobol first order and total indices, by the Saltelli sampling scheme and the Saltelli (2010) / Jansen
+                estimators. It takes (number of parameters + 2) x number of samples steady states.
+
+The outputs are the names of methods of the effluent, e.g. 'get_TN' or 'get_TSS' (see unit_procs.streams.pipe).
+
+The steady states are solved by the workers of a utils.scenarios.scenario_runner. The model evaluations are batched so
+that the points that differ in one parameter (a Morris trajectory, or a Saltelli sample w/ its cross samples) go to the
+same worker in one chunk, each starting from the converged state of the one before it.
+
+Usage:
+
+    from MLE import construct
+
+    res = morris(construct, default_bounds(), num_trajectories=10, target_SRT=15, solver='Newton')
+    res['params'][np.argmax(res['mu_star'][:, res['outputs'].index('get_TN')])]
+"""
+## @namespace sensitivity
+## @file sensitivity.py
+
+
+import numpy as np
+from scipy.stats import qmc
+
+from ..ASMModel import asm_1
+from ..utils.monte_carlo import kinetic_setters
+from ..utils.scenarios import scenario_runner, STATUS
+
+
+def default_bounds(names=asm_1._PARAM_NAMES, rel=0.25):
+    """
+    Return ranges of the kinetic parameters at 20C around their default values.
+
+    Args:
+        names:  parameter names;
+        rel:    relative half width of the ranges
+
+    Return:
+        {parameter name: (low, high)}
+    """
+    _defaults = asm_1.ASM_1()._kinetics_20C
+    return {_n: (_defaults[_n] * (1 - rel), _defaults[_n] * (1 + rel)) for _n in names}
+
+
+def morris_sample(num_params, num_trajectories, levels, rng):
+    """
+    Draw Morris trajectories in the unit hypercube.
+
+    Every trajectory starts at a random point of the grid of levels, and moves every parameter once, in random order,
+    by delta = levels / (2 x (levels - 1)) up or down.
+
+    Args:
+        num_params:         number of parameters;
+        num_trajectories:   number of trajectories;
+        levels:             number of levels of the grid (even);
+        rng:                numpy.random.Generator
+
+    Return:
+        (num_trajectories, num_params + 1, num_params) points, (num_trajectories, num_params) order in which the
+        parameters are moved, (num_trajectories, num_params) signed steps of the parameters
+    """
+    _k = num_params
+    _delta = levels / (2.0 * (levels - 1))
+    _grid = np.arange(levels) / (levels - 1.0)
+    _starts = _grid[_grid <= 1 - _delta + 1E-12]
+
+    _points = np.empty((num_trajectories, _k + 1, _k))
+    _order = np.empty((num_trajectories, _k), dtype=int)
+    _steps = np.empty((num_trajectories, _k))
+    for _t in range(num_trajectories):
+        _up = rng.random(_k) < 0.5
+        _x = rng.choice(_starts, _k) + np.where(_up, 0.0, _delta)
+        _steps[_t] = np.where(_up, _delta, -_delta)
+        _order[_t] = rng.permutation(_k)
+        _points[_t, 0] = _x
+        for _s, _i in enumerate(_order[_t]):
+            _x = _x.copy()
+            _x[_i] += _steps[_t, _i]
+            _points[_t, _s + 1] = _x
+    return _points, _order, _steps
+
+
+def morris_indices(y, order, steps):
+    """
+    Compute the Morris statistics of the elementary effects.
+
+    The effects of the steps into or out of a failed point (NaN) are left out.
+
+    Args:
+        y:      (number of trajectories, number of parameters + 1, number of outputs) outputs at the points;
+        order, steps:   see morris_sample()
+
+    Return:
+        mu, mu_star, sigma: (number of parameters, number of outputs) arrays
+    """
+    _y = np.asarray(y, dtype=float)
+    _T, _k = order.shape
+    _ee = np.empty((_T, _k, _y.shape[2]))
+    _rows = np.arange(_T)[:, None]
+    _ee[_rows, order] = (_y[:, 1:] - _y[:, :-1]) / steps[_rows, order][:, :, None]
+    _num = np.count_nonzero(np.isfinite(_ee), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        _mu = np.nansum(_ee, axis=0) / _num
+        _mu_star = np.nansum(np.abs(_ee), axis=0) / _num
+        _sigma = np.sqrt(np.nansum((_ee - _mu) ** 2, axis=0) / (_num - 1))
+    return _mu, _mu_star, _sigma
+
+
+def saltelli_sample(num_params, num_samples, rng):
+    """
+    Draw the two independent Sobol sequences of the Saltelli scheme in the unit hypercube.
+
+    Args:
+        num_params:     number of parameters;
+        num_samples:    number of samples, rounded up to a power of 2;
+        rng:            numpy.random.Generator
+
+    Return:
+        A, B: (number of samples, num_params) arrays
+    """
+    _m = int(np.ceil(np.log2(max(num_samples, 2))))
+    _u = qmc.Sobol(2 * num_params, scramble=True, seed=rng).random_base2(_m)
+    return _u[:, :num_params], _u[:, num_params:]
+
+
+def _cross_samples(A, B):
+    """
+    Return the (n, k + 2, k) groups [A, A w/ column i from B for every i, B] of every sample.
+    """
+    _n, _k = A.shape
+    _groups = np.repeat(A[:, None, :], _k + 2, axis=1)
+    _i = np.arange(_k)
+    _groups[:, 1 + _i, _i] = B[:, _i]
+    _groups[:, -1] = B
+    return _groups
+
+
+def sobol_indices(fA, fB, fAB, num_resamples=100, rng=None):
+    """
+    Compute the Sobol first order and total indices from the outputs of the Saltelli scheme.
+
+    The samples w/ a failed point (NaN) in any of their groups are left out, output by output.
+
+    Args:
+        fA, fB:         (n, number of outputs) outputs at A and B;
+        fAB:            (n, number of parameters, number of outputs) outputs at A w/ column i from B;
+        num_resamples:  number of bootstrap resamples of the confidence intervals;
+        rng:            numpy.random.Generator of the bootstrap
+
+    Return:
+        S1, ST, S1_conf, ST_conf: (number of parameters, number of outputs) arrays; the confidence intervals are the
+        half widths at 95%
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    _fA, _fB, _fAB = (np.asarray(_f, dtype=float) for _f in (fA, fB, fAB))
+    _k, _m = _fAB.shape[1:]
+    _S1, _ST, _S1c, _STc = (np.full((_k, _m), np.nan) for _ in range(4))
+
+    def _indices(a, b, ab):
+        _V = np.var(np.concatenate([a, b], axis=-1), axis=-1)[..., None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (np.mean(b[..., None, :] * (ab - a[..., None, :]), axis=-1) / _V,
+                    0.5 * np.mean((a[..., None, :] - ab) ** 2, axis=-1) / _V)
+
+    for _o in range(_m):
+        _ok = np.isfinite(_fA[:, _o]) & np.isfinite(_fB[:, _o]) & np.isfinite(_fAB[:, :, _o]).all(axis=1)
+        _n = np.count_nonzero(_ok)
+        if _n < 2:
+            continue
+        _a, _b, _ab = _fA[_ok, _o], _fB[_ok, _o], _fAB[_ok, :, _o].T
+        _S1[:, _o], _ST[:, _o] = _indices(_a, _b, _ab)
+        if num_resamples > 0:
+            _r = rng.integers(0, _n, (num_resamples, _n))
+            _s1, _st = _indices(_a[_r], _b[_r], np.moveaxis(_ab[:, _r], 0, 1))
+            _S1c[:, _o] = 1.96 * np.nanstd(_s1, axis=0, ddof=1)
+            _STc[:, _o] = 1.96 * np.nanstd(_st, axis=0, ddof=1)
+    return _S1, _ST, _S1c, _STc
+
+
+def _evaluate(construct, names, rows, group_size, outputs, max_workers, timeout, progress, solver_args):
+    """
+    Solve the plant at the rows of parameter values, a group (chunk) at a time w/ warm starts.
+
+    Return:
+        (number of rows, number of outputs) outputs w/ NaN at the failed rows, number of failed rows, total
+        iterations
+    """
+    with scenario_runner(construct, kinetic_setters(names), max_workers, timeout, outputs=outputs,
+                         **solver_args) as _runner:
+        _res = _runner.run(rows, names, chunk_size=group_size, progress=progress, warm_start=True)
+    _ok = _res['status'] == STATUS.index('ok')
+    _y = np.where(_ok[:, None], _res['outputs'], np.nan)
+    return _y, int(np.count_nonzero(~_ok)), int(_res['iterations'].sum())
+
+
+def morris(construct, bounds, num_trajectories=10, levels=4, outputs=('get_TN', 'get_TSS'), seed=0, max_workers=None,
+           timeout=None, progress=None, **solver_args):
+    """
+    Screen the parameters of a plant by their Morris elementary effects on the effluent.
+
+    The elementary effects are the changes of the outputs per change of a parameter over its whole range.
+
+    Args:
+        construct:          function building the plant (see utils.scenarios.scenario_runner);
+        bounds:             {kinetic parameter at 20C or scenario column: (low, high)}, see default_bounds();
+        num_trajectories:   number of trajectories;
+        levels:             number of levels of the grid;
+        outputs:            names of the methods of the effluent;
+        seed:               seed of the random numbers;
+        max_workers:        number of worker processes (see utils.scenarios.scenario_runner);
+        timeout:            max. time of a steady state, sec;
+        progress:           function of (evaluations done, total evaluations), or None;
+        solver_args:        keyword arguments of run.get_steady_state(), e.g. solver='Newton', target_SRT=10
+
+    Return:
+        {'params': [names], 'outputs': [names], 'mu', 'mu_star', 'sigma': (number of params, number of outputs)
+        arrays, 'evaluations': int, 'failed': int, 'iterations': int}
+    """
+    _names = list(bounds)
+    _lo, _hi = (np.array([bounds[_n][_j] for _n in _names], dtype=float) for _j in (0, 1))
+    _k = len(_names)
+
+    _points, _order, _steps = morris_sample(_k, num_trajectories, levels, np.random.default_rng(seed))
+    _rows = _lo + _points.reshape(-1, _k) * (_hi - _lo)
+    _y, _failed, _iters = _evaluate(construct, _names, _rows, _k + 1, outputs, max_workers, timeout, progress,
+                                    solver_args)
+    _mu, _mu_star, _sigma = morris_indices(_y.reshape(num_trajectories, _k + 1, -1), _order, _steps)
+
+    return {'params': _names, 'outputs': list(outputs), 'mu': _mu, 'mu_star': _mu_star, 'sigma': _sigma,
+            'evaluations': len(_rows), 'failed': _failed, 'iterations': _iters}
+
+
+def sobol(construct, bounds, num_samples=64, outputs=('get_TN', 'get_TSS'), seed=0, num_resamples=100,
+          max_workers=None, timeout=None, progress=None, **solver_args):
+    """
+    Compute the Sobol sensitivity indices of the effluent of a plant to its parameters.
+
+    Args:
+        construct, bounds, outputs, seed, max_workers, timeout, progress, solver_args:  see morris();
+        num_samples:    number of samples of the Saltelli scheme, rounded up to a power of 2;
+        num_resamples:  number of bootstrap resamples of the confidence intervals
+
+    Return:
+        {'params': [names], 'outputs': [names], 'S1', 'ST', 'S1_conf', 'ST_conf': (number of params, number of
+        outputs) arrays, 'evaluations': int, 'failed': int, 'iterations': int}
+    """
+    _names = list(bounds)
+    _lo, _hi = (np.array([bounds[_n][_j] for _n in _names], dtype=float) for _j in (0, 1))
+    _k = len(_names)
+    _rng = np.random.default_rng(seed)
+
+    _A, _B = saltelli_sample(_k, num_samples, _rng)
+    _rows = _lo + _cross_samples(_A, _B).reshape(-1, _k) * (_hi - _lo)
+    _y, _failed, _iters = _evaluate(construct, _names, _rows, _k + 2, outputs, max_workers, timeout, progress,
+                                    solver_args)
+    _y = _y.reshape(len(_A), _k + 2, -1)
+    _S1, _ST, _S1c, _STc = sobol_indices(_y[:, 0], _y[:, -1], _y[:, 1:-1], num_resamples, _rng)
+
+    return {'params': _names, 'outputs': list(outputs), 'S1': _S1, 'ST': _ST, 'S1_conf': _S1c, 'ST_conf': _STc,
+            'evaluations': len(_rows), 'failed': _failed, 'iterations': _iters}
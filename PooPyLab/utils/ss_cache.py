@@ -0,0 +1,274 @@
+# This file is part of PooPyLab.
+#
+# PooPyLab is a simulation software for biological wastewater treatment processes using International Water Association
+# Activated Sludge Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    PooPyLab is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+#    License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any
+#    later version.
+#
+#    PooPyLab is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied
+#    warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+#    details.
+#
+#    You should have received a copy of the GNU General Public License along with PooPyLab. If not, see
+#    <http://www.gnu.org/licenses/>.
+#
+#
+#    Definition of the on-disk cache of steady state results.
+#
+#    Author: Kai Zhang
+#
+#
+
+"""Cache of converged steady states, addressed by the content of the plant.
+
+A plant is described by:
+
+    1) its configuration as saved by pfd.save_wwtp(), with the codenames replaced by the positions of the units in the
+    PFD (so that the same plant built again, which gets new codenames, is still the same plant);
+
+    2) the kinetic parameters (get_model_params()), temperature and DO setpoint of every asm_reactor;
+
+    3) the model components and flow of every influent, and the user defined flows of the splitters;
+
+    4) the target SRT and the DO settings of the simulation.
+
+The hash of the description is the key of the converged state (see plant_system.get_state()) on disk. The numbers in
+the description are also kept apart from the rest of it (the "topology"), so that a plant with the same topology and
+nearby numbers can start from the closest cached state instead of the generic run.initial_guess().
+
+The least recently used states are evicted beyond the max. number of entries.
+
+Usage:
+
+    cache = steady_state_cache('ss_cache')
+    run.get_steady_state(wwtp, target_SRT=10, cache=cache)
+"""
+## @namespace ss_cache
+## @file ss_cache.py
+
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from ..utils import pfd
+from ..utils.flow_system import flow_system
+
+
+_INDEX_FILE = 'index.json'
+
+## fields of the unit configs that only name the units
+_NAME_FIELDS = ('Codename', 'Name', 'ID')
+
+## fields of the unit configs that refer to other units by codename
+_LINK_FIELDS = ('Inlet_Codenames', 'Main_Outlet_Codename', 'Side_Outlet_Codename')
+
+
+def _split_numbers(obj, numbers):
+    """
+    Replace the numbers (incl. numeric strings) in a json-like object by '#', collecting them in order.
+
+    Return:
+        the object w/o its numbers
+    """
+    if isinstance(obj, dict):
+        return {_k: _split_numbers(obj[_k], numbers) for _k in sorted(obj)}
+    if isinstance(obj, (list, tuple)):
+        return [_split_numbers(_v, numbers) for _v in obj]
+    if isinstance(obj, bool) or obj is None:
+        return obj
+    if isinstance(obj, (int, float, np.integer, np.floating)):
+        numbers.append(float(obj))
+        return '#'
+    if isinstance(obj, str):
+        try:
+            numbers.append(float(obj))
+            return '#'
+        except ValueError:
+            return obj
+    return str(obj)
+
+
+def _hash(obj):
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+def describe(wwtp, target_SRT, fDO=True, DOsat=10):
+    """
+    Describe a plant and the settings of its steady state simulation.
+
+    The influents are described by their model components, i.e. they should have been discharged.
+
+    Args:
+        wwtp:       all process units in a wastewater treatment plant;
+        target_SRT: target SRT, d;
+        fDO:        whether the DO is fixed at the setpoints;
+        DOsat:      DO saturation conc., mg/L
+
+    Return:
+        (key, topology key, numeric values of the description)
+    """
+    _pos = {_u.get_codename(): str(_k) for _k, _u in enumerate(wwtp)}
+    _sheet = []
+    for _u, (_code, _cfg) in zip(wwtp, pfd.get_config(wwtp)['Flowsheet'].items()):
+        _cfg = {_f: _v for _f, _v in _cfg.items() if _f not in _NAME_FIELDS}
+        for _f in _LINK_FIELDS:
+            if _f in _cfg:
+                _cfg[_f] = ' '.join('U' + _pos[_c] if _c in _pos else _c for _c in _cfg[_f].split())
+        if _u.get_type() == 'ASMReactor':
+            _cfg['Kinetics'] = _u.get_model_params()
+            _cfg['Temperature'] = _u._sludge._temperature
+            _cfg['DO'] = _u._sludge._bulk_DO
+        elif _u.get_type() == 'Influent':
+            _cfg['Flow'] = _u.get_main_outflow()
+            _cfg['Model_Components'] = list(_u.get_main_outlet_concs())
+        _sheet.append(_cfg)
+
+    _flows = flow_system(wwtp)
+    _desc = {'Flowsheet': _sheet,
+             'Specified Flows': [] if not _flows.is_ready() else _flows._spec_flows.tolist(),
+             'Global Params': {'SRT': target_SRT, 'Fixed DO': bool(fDO), 'DO Sat.': DOsat}}
+
+    _numbers = []
+    _topology = _split_numbers(_desc, _numbers)
+    # the flags stay w/ the topology: only numbers are "nearby"
+    return _hash(_desc), _hash(_topology), np.array(_numbers)
+
+
+class steady_state_cache(object):
+    """
+    LRU cache of converged plant states on disk.
+
+    General Functions:
+        lookup(), store(), seed()
+    """
+
+    def __init__(self, path, max_entries=64, near_tol=0.25):
+        """
+        Args:
+            path:           directory of the cache, created if needed;
+            max_entries:    max. number of cached states;
+            near_tol:       max. relative difference of any number in the description of a near hit
+
+        Return:
+            None
+        """
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+        self._max_entries = max(int(max_entries), 1)
+        self._near_tol = near_tol
+
+        ## {key: {'topology': str, 'values': [float], 'used': int}}
+        self._index = {}
+        ## use counter for the LRU order
+        self._clock = 0
+        _file = os.path.join(path, _INDEX_FILE)
+        if os.path.exists(_file):
+            with open(_file, 'r') as _f:
+                _saved = json.load(_f)
+            self._index = _saved['entries']
+            self._clock = _saved['clock']
+        return None
+
+
+    def __len__(self):
+        return len(self._index)
+
+
+    def _state_file(self, key):
+        return os.path.join(self._path, key + '.npy')
+
+
+    def _write_index(self):
+        _file = os.path.join(self._path, _INDEX_FILE)
+        with open(_file + '.tmp', 'w') as _f:
+            json.dump({'entries': self._index, 'clock': self._clock}, _f)
+        os.replace(_file + '.tmp', _file)
+        return None
+
+
+    def _touch(self, key):
+        self._clock += 1
+        self._index[key]['used'] = self._clock
+        self._write_index()
+        return None
+
+
+    def lookup(self, wwtp, target_SRT, fDO=True, DOsat=10):
+        """
+        Find the cached state of a plant, or of the closest plant w/ the same topology.
+
+        Args:
+            see describe()
+
+        Return:
+            ('exact' | 'near' | None, state vector or None)
+        """
+        _key, _topo, _values = describe(wwtp, target_SRT, fDO, DOsat)
+        if _key in self._index and os.path.exists(self._state_file(_key)):
+            self._touch(_key)
+            return 'exact', np.load(self._state_file(_key))
+
+        _best, _best_d = None, self._near_tol
+        for _k, _e in self._index.items():
+            if _e['topology'] != _topo or len(_e['values']) != len(_values):
+                continue
+            _v = np.array(_e['values'])
+            _scale = np.maximum(np.maximum(np.abs(_v), np.abs(_values)), 1E-12)
+            _d = float(np.max(np.abs(_v - _values) / _scale)) if len(_v) else 0.0
+            if _d <= _best_d:
+                _best, _best_d = _k, _d
+        if _best is not None and os.path.exists(self._state_file(_best)):
+            self._touch(_best)
+            return 'near', np.load(self._state_file(_best))
+        return None, None
+
+
+    def store(self, wwtp, target_SRT, state, fDO=True, DOsat=10):
+        """
+        Cache the converged state of a plant, evicting the least recently used states beyond max_entries.
+
+        Args:
+            wwtp, target_SRT, fDO, DOsat:   see describe();
+            state:                          converged state vector (see plant_system.get_state())
+
+        Return:
+            key of the state
+        """
+        _key, _topo, _values = describe(wwtp, target_SRT, fDO, DOsat)
+        np.save(self._state_file(_key), np.asarray(state, dtype=float))
+        self._index[_key] = {'topology': _topo, 'values': _values.tolist(), 'used': 0}
+        self._touch(_key)
+
+        while len(self._index) > self._max_entries:
+            _old = min(self._index, key=lambda _k: self._index[_k]['used'])
+            del self._index[_old]
+            if os.path.exists(self._state_file(_old)):
+                os.remove(self._state_file(_old))
+        self._write_index()
+        return _key
+
+
+    def seed(self, wwtp, state):
+        """
+        Assign the main outlet concentrations of a (near hit) state to the units as their initial guesses.
+
+        Args:
+            wwtp:   all process units in a wastewater treatment plant, in the order of the cached state;
+            state:  cached state vector
+
+        Return:
+            None
+        """
+        _branches = flow_system(wwtp).get_branches()
+        _X = np.asarray(state).reshape(len(_branches), -1)
+        for (_u, _br), _x in zip(_branches, _X):
+            if _br == 'Main' and _u.get_type() != 'Influent':
+                _u.assign_initial_guess(_x[1:].tolist())
+        return None
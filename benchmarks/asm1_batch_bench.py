@@ -0,0 +1,61 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the batched ASM1 kinetics of several reactors.
+#
+#    Compares one call of asm_1.batch_reaction_rates() (and its jacobian
+#    counterpart) for n reactors against looping over the n ASM_1 models,
+#    which is what the plant currently does with one model per reactor.
+#
+
+import numpy as np
+
+import context
+from PooPyLab.ASMModel.asm_1 import ASM_1
+from PooPyLab.ASMModel import asm_1
+from asm1_rhs_bench import evals_per_sec
+
+
+def loop_rates(sludges, comps):
+    return [np.dot(s._process_rates(c), s._stoich_mat) for s, c in zip(sludges, comps)]
+
+
+def loop_jacobians(sludges, comps):
+    return [np.dot(s._stoich_mat.T, s._process_rate_derivs(c)) for s, c in zip(sludges, comps)]
+
+
+if __name__ == '__main__':
+
+    base = np.array([2.0, 30.0, 5.0, 2.0, 1.0, 8.0, 5.0, 1000.0, 100.0, 2000.0, 100.0, 500.0, 5.0])
+
+    print('{:>6s}{:>14s}{:>16s}{:>16s}{:>10s}'.format('n', 'quantity', 'loop (1/s)', 'batched (1/s)', 'speedup'))
+    for n in (1, 4, 16, 64):
+        sludges = [ASM_1(ww_temp=10 + 15 * k / max(n - 1, 1), DO=2) for k in range(n)]
+        comps = base * (1 + 0.01 * np.arange(n))[:, None]
+        params, stoichs = asm_1.stack_models(sludges)
+
+        for name, loop, batch in (('rates', loop_rates, asm_1.batch_reaction_rates),
+                                  ('jacobians', loop_jacobians, asm_1.batch_reaction_jacobians)):
+            t_loop = evals_per_sec(loop, (sludges, comps), min_time=0.5)
+            t_batch = evals_per_sec(batch, (comps, params, stoichs), min_time=0.5)
+            print('{:>6d}{:>14s}{:>16,.0f}{:>16,.0f}{:>10.2f}'.format(n, name, t_loop, t_batch, t_batch / t_loop))
@@ -0,0 +1,84 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the ASM1 right-hand-side (dC/dt) evaluations.
+#
+#    Compares the vectorized ASM_1._dCdt() against the reference, component
+#    by component ASM_1._dCdt_ref(), with the reactor concentrations given
+#    both as a python list and as a numpy array (the latter is what
+#    scipy.integrate.solve_ivp() passes in).
+#
+
+import time
+
+import numpy as np
+
+import context
+from PooPyLab.ASMModel.asm_1 import ASM_1
+
+
+def evals_per_sec(func, args, min_time=1.0):
+    """
+    Call func(*args) repeatedly for at least min_time seconds.
+
+    Return:
+        RHS evaluations per second (float)
+    """
+    n = 0
+    batch = 1000
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            func(*args)
+        n += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return n / elapsed
+
+
+if __name__ == '__main__':
+
+    sludge = ASM_1(ww_temp=15, DO=2)
+
+    # mixed liquor and reactor inlet of a typical nitrifying plant
+    mo_comps = [2.0, 30.0, 5.0, 2.0, 1.0, 8.0, 5.0, 1000.0, 100.0, 2000.0, 100.0, 500.0, 5.0]
+    in_comps = [0.0, 30.0, 200.0, 25.0, 2.0, 0.0, 6.0, 50.0, 150.0, 0.0, 0.0, 0.0, 10.0]
+
+    vol = 1000.0  # m3
+    flow = 2000.0  # m3/d
+
+    for fix_DO in (True, False):
+        diff = np.max(np.abs(sludge._dCdt(0, mo_comps, vol, flow, in_comps, fix_DO, 9.0)
+                             - np.array(sludge._dCdt_ref(0, mo_comps, vol, flow, in_comps, fix_DO, 9.0))))
+        print('fix_DO = {}: max. |vectorized - reference| = {:.3e}'.format(fix_DO, diff))
+    print()
+
+    inputs = {'list': (mo_comps, in_comps),
+              'ndarray': (np.array(mo_comps), np.array(in_comps))}
+
+    print('{:>10s}{:>18s}{:>18s}{:>10s}'.format('input', 'reference (1/s)', 'vectorized (1/s)', 'speedup'))
+    for name, (mo, inl) in inputs.items():
+        args = (0, mo, vol, flow, inl, False, 9.0)
+        ref = evals_per_sec(sludge._dCdt_ref, args)
+        vec = evals_per_sec(sludge._dCdt, args)
+        print('{:>10s}{:>18,.0f}{:>18,.0f}{:>10.2f}'.format(name, ref, vec, vec / ref))
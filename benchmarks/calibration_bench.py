@@ -0,0 +1,81 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the calibration of six ASM1 parameters of an example
+#    plant.
+#
+#    The measurements are the steady state of the example plant under
+#    a known set of parameters, w/ 1% noise. utils.calibration fits
+#    the parameters from the ASM1 defaults in this process and with
+#    the worker processes of all the CPUs. The wall time, number of
+#    steady states solved, and the fitted parameters are reported.
+#
+#    Usage:
+#        python calibration_bench.py [example]
+#
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import context
+from PooPyLab.utils.calibration import calibrate
+from PooPyLab.utils.scenarios import run_scenarios
+from PooPyLab.utils.monte_carlo import kinetic_setters
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'examples')))
+
+
+OUTPUTS = ['get_TN', 'get_inorgN', 'get_orgN', 'get_COD', 'get_TSS', ('ASMReactor', 'get_TSS'),
+           ('ASMReactor', 'get_sN'), ('ASMReactor', 'get_VSS')]
+
+TRUTH = {'u_max_A': 0.7, 'b_LH': 0.55, 'K_NH': 0.8, 'Y_H': 0.63, 'u_max_H': 5.5, 'K_S': 15.0}
+
+RANGES = {'u_max_A': (0.4, 1.2), 'b_LH': (0.3, 0.9), 'K_NH': (0.3, 2.0), 'Y_H': (0.5, 0.8), 'u_max_H': (3.0, 8.0),
+          'K_S': (5.0, 40.0)}
+
+
+if __name__ == '__main__':
+
+    name = sys.argv[1] if len(sys.argv) > 1 else 'MLE'
+    construct = __import__(name).construct
+
+    res = run_scenarios(construct, {_n: [_v] for _n, _v in TRUTH.items()}, setters=kinetic_setters(TRUTH),
+                        max_workers=0, outputs=OUTPUTS, solver='Newton', target_SRT=15)
+    rng = np.random.default_rng(0)
+    measured = res['outputs'][0] * (1 + 0.01 * rng.standard_normal(len(OUTPUTS)))
+    measurements = [(_o, _v, 1.0 / (0.01 * _v)) for _o, _v in zip(OUTPUTS, measured)]
+
+    print('Calibration of {} parameters of {}, {} CPUs'.format(len(TRUTH), name, os.cpu_count()))
+    print('{:>10s}{:>12s}{:>10s}{:>10s}{:>12s}'.format('workers', 'wall (s)', 'solves', 'memo', 'cost'))
+    for n in sorted({0, os.cpu_count() or 1}):
+        start = time.time()
+        fit = calibrate(construct, RANGES, measurements, max_workers=n, solver='Newton', target_SRT=15)
+        print('{:>10s}{:>12.2f}{:>10d}{:>10d}{:>12.4g}'.format('in-proc.' if n == 0 else str(n), time.time() - start,
+                                                               fit['evaluations'], fit['memo_hits'], fit['cost']))
+
+    print('{:>10s}{:>10s}{:>10s}{:>10s}'.format('param', 'true', 'fitted', 'std'))
+    for _n, _x, _s in zip(fit['params'], fit['x'], fit['std']):
+        print('{:>10s}{:>10.3f}{:>10.3f}{:>10.3g}'.format(_n, TRUTH[_n], _x, _s))
@@ -0,0 +1,9 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import PooPyLab.ASMModel.asm_1
+import PooPyLab.unit_procs.streams
+import PooPyLab.unit_procs.physchem
+import PooPyLab.unit_procs.bio
+import PooPyLab.utils
@@ -0,0 +1,93 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the whole plant dynamic simulation on the example plants.
+#
+#    Each example plant in examples/ is solved for steady state and then
+#    simulated with run.get_dynamic() under a diurnal influent (flow and
+#    loads +/- 30% around the design values) for a number of days, with
+#    hourly outputs. The integrator steps, the derivative evaluations, and
+#    the wall time are reported for each integration method.
+#
+#    Usage:
+#        python dynamic_bench.py [days [example ...]]
+#
+
+import contextlib
+import importlib
+import io
+import os
+import sys
+
+import numpy as np
+
+import context
+from PooPyLab.utils import pfd, run
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'examples')))
+
+
+EXAMPLES = ['CMAS', 'MLE', 'FOUR_STG_BARDEN', 'PRE_POST_AX_DN']
+METHODS = ['BDF', 'LSODA', 'Radau']
+
+
+def diurnal(inlet, days, amplitude=0.3):
+    """
+    Sinusoidal daily variation of the flow and the loads around the current influent.
+    """
+    t = np.linspace(0, days, int(days * 96) + 1)
+    f = 1.0 + amplitude * np.sin(2 * np.pi * t)
+    return t, inlet.get_main_outflow() * f, np.array(inlet.get_main_outlet_concs())[None, :] * f[:, None]
+
+
+def simulate_example(name, days, method):
+    """
+    Build the example plant, bring it to steady state, and simulate it under the diurnal influent.
+
+    Return:
+        statistics from run.get_dynamic()
+    """
+    example = importlib.reload(importlib.import_module(name))
+    with contextlib.redirect_stdout(io.StringIO()):
+        wwtp = example.construct()
+        pfd.check(wwtp)
+        run.get_steady_state(wwtp, target_SRT=example.SRT, solver='Newton')
+        inlet = pfd.get_all_units(wwtp, 'Influent')[0]
+        stats = run.get_dynamic(wwtp, {inlet: diurnal(inlet, days)}, (0, days), 1/24, mn=method,
+                                writer=lambda t, X: None)
+    return stats
+
+
+if __name__ == '__main__':
+
+    days = float(sys.argv[1]) if len(sys.argv) > 1 else 30
+    examples = sys.argv[2:] or EXAMPLES
+
+    print('{} days, hourly outputs'.format(days))
+    print('{:<18s}{:>8s}{:>10s}{:>12s}{:>12s}'.format('example', 'method', 'steps', 'rhs evals', 'wall (s)'))
+    for name in examples:
+        for method in METHODS:
+            stats = simulate_example(name, days, method)
+            print('{:<18s}{:>8s}{:>10d}{:>12d}{:>12.2f}{}'.format(
+                    name, method, stats['steps'], stats['rhs_evals'], stats['wall_time'],
+                    '' if stats['success'] else '  FAILED'))
@@ -0,0 +1,264 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    End-to-end benchmark suite over the example plants, w/ baselines.
+#
+#    Every example plant in examples/ is built fresh and solved for
+#    steady state at several SRTs and wastewater temperatures with the
+#    steady state solvers of run.get_steady_state(). Each case runs in
+#    a process of its own, which reports the wall time (best of the
+#    repeats), outer iterations, rhs and jacobian evaluations (see
+#    utils.instrument) and its peak resident memory. A case that does
+#    not finish within the timeout, or whose process fails, is kept in
+#    the results w/ the status 'timeout' or 'error', counts as not
+#    converged, and makes the suite fail (exit status 1).
+#
+#    The results can be saved as the baseline of the machine (tagged by
+#    its host name, CPU, and the versions of Python, NumPy and SciPy)
+#    in benchmarks/baselines/. When a baseline of the machine exists,
+#    the cases are compared to it, and the ones beyond the threshold
+#    are reported as regressions (exit status 1).
+#
+#    Usage:
+#        python example_suite_bench.py [--examples CMAS MLE ...]
+#            [--srts 5 10 20] [--temps 12 20]
+#            [--solvers Newton SM SM+AA SM+W]
+#            [--repeat 1] [--timeout 120] [--threshold 0.2]
+#            [--baseline FILE] [--save]
+#
+
+import argparse
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import scipy
+
+import context
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.instrument import instrument
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'examples')))
+
+EXAMPLES = ['CSTR', 'CMAS', 'MLE', 'FOUR_STG_BARDEN', 'PRE_POST_AX_DN']
+
+## solvers of the suite: name -> (solver, accel) of run.get_steady_state()
+SOLVERS = {'Newton': ('Newton', None), 'SM': ('SM', None), 'SM+AA': ('SM', 'Anderson'), 'SM+W': ('SM', 'Wegstein')}
+
+## metrics compared to the baseline, and whether the threshold is relative (else any increase is a regression)
+METRICS = (('wall_time', True), ('iterations', False), ('rhs_evals', True), ('peak_rss_mb', True))
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+
+def machine_info():
+    """
+    Return the description of the machine and its tag.
+    """
+    info = {'node': platform.node(), 'machine': platform.machine(), 'processor': platform.processor(),
+            'system': platform.system(), 'cpu_count': os.cpu_count(), 'python': platform.python_version(),
+            'numpy': np.__version__, 'scipy': scipy.__version__}
+    info['tag'] = hashlib.sha1(json.dumps(info, sort_keys=True).encode()).hexdigest()[:12]
+    return info
+
+
+def default_baseline(info):
+    return os.path.join(BASELINE_DIR, '{}-{}.json'.format(info['node'] or 'machine', info['tag']))
+
+
+def case_key(case):
+    return '{example}/SRT={SRT:g}/T={temp:g}/{solver}'.format(**case)
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident memory of this process, MB (None if not available).
+    """
+    if resource is None:
+        return None
+    _rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return _rss / (1024.0 ** 2 if sys.platform == 'darwin' else 1024.0)
+
+
+def solve_case(case):
+    """
+    Build the example plant from scratch, set its reactor temperatures, and solve it for steady state.
+
+    Return:
+        statistics of run.get_steady_state(), record of the run (see utils.instrument)
+    """
+    solver, accel = SOLVERS[case['solver']]
+    example = importlib.reload(importlib.import_module(case['example']))
+    instr = instrument()
+    with contextlib.redirect_stdout(io.StringIO()):
+        wwtp = example.construct()
+        pfd.check(wwtp)
+        for r in pfd.get_all_units(wwtp, 'ASMReactor'):
+            r.set_model_condition(case['temp'], r._sludge.get_bulk_DO())
+        stats = run.get_steady_state(wwtp, target_SRT=case['SRT'], mn='BDF', fDO=True, DOsat=10, solver=solver,
+                                     accel=accel, show=False, instr=instr)
+    return stats, instr.get_last_run()
+
+
+def run_case(case, repeat=1):
+    """
+    Solve a case repeat times in this process, and return its metrics.
+    """
+    wall = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stats, rec = solve_case(case)
+        wall.append(time.perf_counter() - start)
+    if case['solver'] == 'Newton':
+        rhs = rec['phases'].get('residual', {}).get('calls', 0)
+        jac = rec['phases'].get('jacobian', {}).get('calls', 0)
+    else:
+        rhs = sum(u.get('rhs_evals', 0) for u in rec['units'].values())
+        jac = sum(u.get('jac_evals', 0) for u in rec['units'].values())
+    return {'status': 'converged' if stats['converged'] else 'not converged',
+            'converged': bool(stats['converged']), 'wall_time': min(wall), 'iterations': int(stats['iterations']),
+            'rhs_evals': int(rhs), 'jac_evals': int(jac), 'peak_rss_mb': peak_rss_mb()}
+
+
+def run_case_process(case, repeat=1, timeout=None):
+    """
+    Run a case in a process of its own, so that its peak memory is its own.
+
+    Return:
+        metrics of the case (see run_case()); a case that timed out or failed has the status 'timeout' or 'error',
+        and no values
+    """
+    failed = {'status': 'error', 'converged': False, 'wall_time': None, 'iterations': None, 'rhs_evals': None,
+              'jac_evals': None, 'peak_rss_mb': None}
+    try:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), '--case', json.dumps(case),
+                              '--repeat', str(repeat)], capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        print('WARN: {} timed out after {} s.'.format(case_key(case), timeout))
+        return dict(failed, status='timeout')
+    if out.returncode != 0:
+        print('ERROR: {} failed:\n{}'.format(case_key(case), out.stderr[-2000:]))
+        return failed
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """
+    Return the regressions of the results w.r.t. the baseline: [(case, metric, baseline value, value)].
+    """
+    regressions = []
+    for key, res in results.items():
+        base = baseline['cases'].get(key)
+        if base is None:
+            continue
+        if base['converged'] and not res['converged']:
+            regressions.append((key, 'status', base.get('status', 'converged'), res['status']))
+            continue
+        for metric, relative in METRICS:
+            b, v = base.get(metric), res.get(metric)
+            if b is None or v is None:
+                continue
+            if (v > b * (1 + threshold)) if relative else (v > b):
+                regressions.append((key, metric, b, v))
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Steady state benchmarks of the example plants.')
+    parser.add_argument('--examples', nargs='+', default=EXAMPLES)
+    parser.add_argument('--srts', nargs='+', type=float, default=[5, 10, 20])
+    parser.add_argument('--temps', nargs='+', type=float, default=[12, 20])
+    parser.add_argument('--solvers', nargs='+', default=list(SOLVERS), choices=sorted(SOLVERS))
+    parser.add_argument('--repeat', type=int, default=1, help='solves per case, the best wall time is kept')
+    parser.add_argument('--timeout', type=float, default=120, help='max. time of a case, s')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative increase reported as regression')
+    parser.add_argument('--baseline', default=None, help='baseline file, default: the one of this machine')
+    parser.add_argument('--save', action='store_true', help='save the results as the baseline')
+    parser.add_argument('--case', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is not None:
+        # a single case in a process of its own (see run_case_process())
+        print(json.dumps(run_case(json.loads(args.case), args.repeat)))
+        sys.exit(0)
+
+    info = machine_info()
+    cases = [{'example': e, 'SRT': s, 'temp': t, 'solver': v}
+             for e in args.examples for s in args.srts for t in args.temps for v in args.solvers]
+    print('{} cases on {} ({}), tag {}'.format(len(cases), info['node'], info['machine'], info['tag']))
+    print('{:<40s}{:>9s}{:>10s}{:>8s}{:>10s}{:>8s}{:>10s}'.format('case', 'conv', 'wall (s)', 'iter', 'rhs', 'jac',
+                                                                 'RSS (MB)'))
+    results = {}
+    for case in cases:
+        res = results[case_key(case)] = run_case_process(case, args.repeat, args.timeout)
+        print('{:<40s}{:>9s}{:>10s}{:>8s}{:>10s}{:>8s}{:>10s}'.format(
+            case_key(case), {'converged': 'yes', 'not converged': 'NO'}.get(res['status'], res['status'].upper()),
+            *['-' if res[m] is None else f.format(res[m]) for m, f in (
+                ('wall_time', '{:.3f}'), ('iterations', '{:d}'), ('rhs_evals', '{:d}'), ('jac_evals', '{:d}'),
+                ('peak_rss_mb', '{:.1f}'))]))
+
+    failures = [key for key, res in results.items() if res['status'] in ('timeout', 'error')]
+    if failures:
+        print('\n{} case(s) timed out or failed:'.format(len(failures)))
+        for key in failures:
+            print(' {:<40s}{:>14s}'.format(key, results[key]['status']))
+
+    status = 1 if failures else 0
+    path = args.baseline or default_baseline(info)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            baseline = json.load(f)
+        if baseline['machine']['tag'] != info['tag']:
+            print('WARN: The baseline is of another machine ({}).'.format(baseline['machine']['tag']))
+        regressions = compare(results, baseline, args.threshold)
+        print('\nCompared to the baseline of {}: {} regression(s) beyond {:.0%}'.format(
+            baseline['created'], len(regressions), args.threshold))
+        for key, metric, b, v in regressions:
+            print(' {:<40s}{:>14s}: {} -> {}'.format(key, metric, b, v))
+        status = 1 if regressions or failures else 0
+    else:
+        print('\nNo baseline of this machine at {}.'.format(path))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'machine': info, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'threshold': args.threshold,
+                       'cases': results}, f, indent=1)
+        print('Baseline saved to {}.'.format(path))
+
+    sys.exit(status)
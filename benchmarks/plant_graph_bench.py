@@ -0,0 +1,100 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the graph analysis of large process flow diagrams.
+#
+#    A plant of parallel activated sludge trains (influent, reactor,
+#    clarifier, RAS/WAS splitter, effluent, WAS, and the pipes between
+#    them) is built with about the requested number of units. The time
+#    to build the plant_graph and to run the PFD check, flow setting,
+#    and partitioning on it is reported.
+#
+#    Usage:
+#        python plant_graph_bench.py [number of units]
+#
+
+import contextlib
+import io
+import sys
+import time
+
+import context
+from PooPyLab.unit_procs.streams import influent, effluent, WAS, pipe, splitter
+from PooPyLab.unit_procs.bio import asm_reactor
+from PooPyLab.unit_procs.physchem import final_clarifier
+from PooPyLab.utils import pfd, run, partition
+from PooPyLab.utils.plant_graph import plant_graph
+
+
+def build_trains(num_units):
+    """
+    Return a PFD of parallel CMAS trains with about num_units units.
+    """
+    wwtp = []
+    for t in range(max(1, num_units // 12)):
+        inlet, outlet, waste = influent(), effluent(), WAS()
+        p1, p2, p3, p4, p5, ras = pipe(), pipe(), pipe(), pipe(), pipe(), pipe()
+        ra, fc, splt = asm_reactor(), final_clarifier(), splitter()
+        inlet.set_downstream_main(p1)
+        p1.set_downstream_main(ra)
+        ra.set_downstream_main(p2)
+        p2.set_downstream_main(fc)
+        fc.set_downstream_main(p3)
+        fc.set_downstream_side(p4)
+        p3.set_downstream_main(outlet)
+        p4.set_downstream_main(splt)
+        splt.set_downstream_main(ras)
+        splt.set_downstream_side(p5)
+        ras.set_downstream_main(ra)
+        p5.set_downstream_main(waste)
+        inlet.set_mainstream_flow(37800)
+        splt.set_mainstream_flow(37800)
+        wwtp += [inlet, p1, ra, p2, fc, p3, p4, splt, ras, p5, outlet, waste]
+    return wwtp
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args)
+    return result, (time.perf_counter() - start) * 1000.0
+
+
+if __name__ == '__main__':
+    num_units = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    wwtp = build_trains(num_units)
+
+    graph, t_build = timed(plant_graph, wwtp)
+    groups, t_scc = timed(graph.get_groups)
+    loop, t_loop = timed(graph.find_main_only_loop)
+    order, t_bfs = timed(graph.bfs_order, graph.get_ids('Influent'))
+    _, t_check = timed(pfd.check, wwtp)
+    _, t_fwd = timed(run.forward_set_flow, wwtp, graph)
+    blocks, t_part = timed(partition.calc_order, wwtp, partition._MAX_LOOPS, graph)
+
+    print('{} units, {} groups, {} blocks on loops'.format(len(wwtp), len(groups),
+                                                          sum(1 for b in blocks if b[1])))
+    for name, ms in [('plant_graph()', t_build), ('get_groups()', t_scc), ('find_main_only_loop()', t_loop),
+                     ('bfs_order()', t_bfs), ('pfd.check()', t_check), ('run.forward_set_flow()', t_fwd),
+                     ('partition.calc_order()', t_part)]:
+        print('{:<26s}{:>10.2f} ms'.format(name, ms))
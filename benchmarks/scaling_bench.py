@@ -0,0 +1,128 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Scaling of the PFD checks, flow setting, and steady state solution
+#    with the size of the plant.
+#
+#    Regional plants of parallel MLE trains with step feed zones and
+#    several clarifiers per train (see utils.pfd_generator) are built
+#    for growing numbers of trains. For each plant the time of
+#    pfd.check(), run.forward_set_flow(), the assembly and solution of
+#    the flow balances (flow_system), pfd.save_wwtp(), the steady state
+#    solution, and one sequential modular pass (run.traverse_plant())
+#    at the steady state is reported against the number of units,
+#    along with the slope of log(time) vs. log(units) of each column.
+#    The steady state is skipped for plants beyond --max-ss-units.
+#
+#    Usage:
+#        python scaling_bench.py [--trains 1 2 5 10 20 40] [--zones 4]
+#            [--clarifiers 2] [--solver Newton] [--SRT 10]
+#            [--max-ss-units 2000]
+#
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import context
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.flow_system import flow_system
+from PooPyLab.utils.pfd_generator import regional_plant, count_units
+
+COLUMNS = ('pfd.check', 'forward_set_flow', 'flow_system', 'save_wwtp', 'steady state', 'SM pass')
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_plant(num_trains, num_zones, num_clarifiers, solver, SRT, max_ss_units):
+    """
+    Build a regional plant and time the PFD check, the flow setting, and the steady state solution on it.
+
+    Return:
+        {column: time, s (None if skipped)}, statistics of run.get_steady_state() (None if skipped)
+    """
+    wwtp = regional_plant(num_trains, num_zones, num_clarifiers)
+    times = dict.fromkeys(COLUMNS)
+    ok, times['pfd.check'] = timed(pfd.check, wwtp)
+    if not ok:
+        print('ERROR: The regional plant of {} trains failed pfd.check().'.format(num_trains))
+        return times, None
+    _, times['forward_set_flow'] = timed(run.forward_set_flow, wwtp)
+    _, times['flow_system'] = timed(lambda: flow_system(wwtp).solve(0.0))
+    with tempfile.TemporaryDirectory() as tmp:
+        _, times['save_wwtp'] = timed(pfd.save_wwtp, wwtp, {'SRT': SRT}, os.path.join(tmp, 'regional.json'))
+
+    if len(wwtp) > max_ss_units:
+        return times, None
+    # forward_set_flow() above has tagged the flow data sources, so the plant is built again for the solution
+    wwtp = regional_plant(num_trains, num_zones, num_clarifiers)
+    timed(pfd.check, wwtp)
+    stats, times['steady state'] = timed(run.get_steady_state, wwtp, target_SRT=SRT, solver=solver, show=False)
+    inlet = pfd.get_all_units(wwtp, 'Influent')[0]
+    _, times['SM pass'] = timed(run.traverse_plant, wwtp, inlet, 'BDF', True, 10)
+    return times, stats
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Scaling of the PFD checks and solvers with the plant size.')
+    parser.add_argument('--trains', nargs='+', type=int, default=[1, 2, 5, 10, 20, 40])
+    parser.add_argument('--zones', type=int, default=4, help='step feed zones per train')
+    parser.add_argument('--clarifiers', type=int, default=2, help='final clarifiers per train')
+    parser.add_argument('--solver', default='Newton', choices=['Newton', 'SM'])
+    parser.add_argument('--SRT', type=float, default=10)
+    parser.add_argument('--max-ss-units', type=int, default=2000, help='largest plant solved for steady state')
+    args = parser.parse_args()
+
+    print('{} zones, {} clarifiers per train; steady state by {}'.format(args.zones, args.clarifiers, args.solver))
+    print('{:>7s}{:>7s}'.format('trains', 'units') + ''.join('{:>21s}'.format(c + ' (s)') for c in COLUMNS)
+          + '{:>7s}'.format('iter'))
+    sizes, rows = [], []
+    for n in args.trains:
+        times, stats = run_plant(n, args.zones, args.clarifiers, args.solver, args.SRT, args.max_ss_units)
+        sizes.append(count_units(n, args.zones, args.clarifiers))
+        rows.append(times)
+        iters = '-' if stats is None else '{:d}{}'.format(stats['iterations'], '' if stats['converged'] else '!')
+        print('{:>7d}{:>7d}'.format(n, sizes[-1])
+              + ''.join('{:>21s}'.format('-' if times[c] is None else '{:.4f}'.format(times[c])) for c in COLUMNS)
+              + '{:>7s}'.format(iters))
+
+    # time ~ units^slope
+    slopes = []
+    for c in COLUMNS:
+        pts = [(s, r[c]) for s, r in zip(sizes, rows) if r[c]]
+        if len(pts) > 1 and pts[0][0] != pts[-1][0]:
+            slopes.append('{:.2f}'.format(np.polyfit(*np.log(np.array(pts)).T, 1)[0]))
+        else:
+            slopes.append('-')
+    print('{:>14s}'.format('slope') + ''.join('{:>21s}'.format(s) for s in slopes))
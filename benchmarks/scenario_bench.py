@@ -0,0 +1,83 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the parallel scenario runner on an example plant.
+#
+#    A grid of (SRT, temperature, influent flow, RAS ratio, IR ratio)
+#    scenarios of the example plant is solved with utils.scenarios
+#    in this process and with 1, 2, 4, ... worker processes up to the
+#    number of CPUs. The scenarios per second and the speedup over one
+#    worker are reported.
+#
+#    Usage:
+#        python scenario_bench.py [example [number of scenarios]]
+#
+
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+import context
+from PooPyLab.utils.scenarios import run_scenarios, STATUS
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'examples')))
+
+
+def make_grid(n):
+    """
+    Return the first n scenarios of a full factorial grid.
+    """
+    grid = itertools.product([6, 8, 10, 12, 15, 20], [10, 12, 15, 20], [30000, 37800, 45000], [0.5, 0.75, 1.0],
+                             [2.0, 3.0, 4.0])
+    rows = np.array(list(itertools.islice(itertools.cycle(grid), n)), dtype=float)
+    return {'SRT': rows[:, 0], 'temp': rows[:, 1], 'inf_flow': rows[:, 2], 'RAS_ratio': rows[:, 3],
+            'IR_ratio': rows[:, 4]}
+
+
+if __name__ == '__main__':
+
+    name = sys.argv[1] if len(sys.argv) > 1 else 'MLE'
+    num = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    construct = __import__(name).construct
+    table = make_grid(num)
+
+    workers = [0] + [2 ** k for k in range(int(np.log2(os.cpu_count() or 1)) + 1)]
+    if (os.cpu_count() or 1) not in workers:
+        workers.append(os.cpu_count())
+
+    print('{} scenarios of {}, {} CPUs'.format(num, name, os.cpu_count()))
+    print('{:>10s}{:>12s}{:>14s}{:>10s}{:>8s}'.format('workers', 'wall (s)', 'scenarios/s', 'speedup', 'ok'))
+    base = None
+    for n in workers:
+        start = time.time()
+        res = run_scenarios(construct, table, max_workers=n, solver='Newton')
+        wall = time.time() - start
+        if n == 1:
+            base = wall
+        print('{:>10s}{:>12.2f}{:>14.1f}{:>10s}{:>8d}'.format(
+                'in-proc.' if n == 0 else str(n), wall, num / wall,
+                '' if base is None or n == 0 else '{:.2f}'.format(base / wall),
+                int(np.sum(res['status'] == STATUS.index('ok')))))
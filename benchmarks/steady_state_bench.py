@@ -0,0 +1,84 @@
+#   This file is part of PooPyLab.
+#
+#    PooPyLab is a simulation software for biological wastewater treatment
+#    processes using the International Water Association Activated Sludge
+#    Models.
+#
+#    Copyright (C) Kai Zhang
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+#
+# --------------------------------------------------------------------
+#    Benchmarking the steady state solvers on the example plants.
+#
+#    Each example plant in examples/ is built fresh and solved with the
+#    sequential modular loop ('SM'), the same loop with Anderson
+#    acceleration of the tear streams ('SM+AA'), and with the
+#    equation-based plant system ('Newton') of run.get_steady_state().
+#    The iteration counts,
+#    wall times, and the largest relative difference between the SM and
+#    Newton solutions in the reactors are reported.
+#
+#    Usage:
+#        python steady_state_bench.py [example ...]
+#
+
+import contextlib
+import importlib
+import io
+import os
+import sys
+
+import numpy as np
+
+import context
+from PooPyLab.utils import pfd, run
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'examples')))
+
+EXAMPLES = ['CMAS', 'MLE', 'FOUR_STG_BARDEN', 'PRE_POST_AX_DN']
+
+
+def solve_example(name, solver, accel=None):
+    """
+    Build the example plant from scratch and solve it for steady state.
+
+    Return:
+        statistics from run.get_steady_state(), reactor concentrations (numpy.ndarray)
+    """
+    example = importlib.reload(importlib.import_module(name))
+    with contextlib.redirect_stdout(io.StringIO()):
+        wwtp = example.construct()
+        pfd.check(wwtp)
+        stats = run.get_steady_state(wwtp, target_SRT=example.SRT, mn='BDF', fDO=True, DOsat=10, solver=solver,
+                                     accel=accel)
+    reactors = pfd.get_all_units(wwtp, 'ASMReactor')
+    return stats, np.array([r.get_main_outlet_concs() for r in reactors])
+
+
+if __name__ == '__main__':
+
+    examples = sys.argv[1:] or EXAMPLES
+
+    print('{:<18s}{:>10s}{:>10s}{:>12s}{:>12s}{:>12s}{:>12s}{:>14s}'.format(
+            'example', 'SM iter', 'SM (s)', 'SM+AA iter', 'SM+AA (s)', 'Newton iter', 'Newton (s)', 'max rel diff'))
+    for name in examples:
+        sm, sm_comps = solve_example(name, 'SM')
+        aa, aa_comps = solve_example(name, 'SM', 'Anderson')
+        nt, nt_comps = solve_example(name, 'Newton')
+        diff = np.max(np.abs(nt_comps - sm_comps) / (1.0 + np.abs(nt_comps)))
+        print('{:<18s}{:>10d}{:>10.2f}{:>12d}{:>12.2f}{:>12d}{:>12.2f}{:>14.2e}'.format(
+                name, sm['iterations'], sm['wall_time'], aa['iterations'], aa['wall_time'], nt['iterations'],
+                nt['wall_time'], diff))
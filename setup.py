@@ -26,5 +26,5 @@ setuptools.setup(
         "Operating System :: OS Independent"
     ],
     python_requires='>=3',
-    install_requires=['scipy']
+    install_requires=['numpy', 'scipy']
 )
@@ -0,0 +1,81 @@
+import context
+import numpy as np
+from PooPyLab.unit_procs.streams import influent, effluent, pipe
+from PooPyLab.unit_procs.bio import asm_reactor
+from PooPyLab.utils import pfd, run, partition
+from PooPyLab.utils.accelerate import find_tear_streams, tear_accelerator
+from test_plant_system import build_cmas
+
+
+def solve(accel):
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    stats = run.get_steady_state(wwtp, target_SRT=10, solver='SM', accel=accel)
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    return stats, np.array(ra.get_main_outlet_concs())
+
+
+def build_cstr(temp):
+    # examples/CSTR.py: a reactor w/o any recycle, whose block settles in the SM loop
+    inlet, p1, ra, p2, outlet = influent(), pipe(), asm_reactor(), pipe(), effluent()
+    inlet.set_downstream_main(p1)
+    p1.set_downstream_main(ra)
+    ra.set_downstream_main(p2)
+    p2.set_downstream_main(outlet)
+    inlet.set_mainstream_flow(37800)
+    ra.set_model_condition(temp, 2.0)
+    ra.set_active_vol(37800 * 2)
+    return [inlet, p1, ra, p2, outlet]
+
+
+if __name__ == '__main__':
+    print('TEAR STREAMS:')
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    tears = find_tear_streams(partition.flatten(partition.calc_order(wwtp)))
+    print(' ', [(u.__name__, br) for u, br in tears])
+    # the only recycle is the RAS pipe going back into the reactor
+    assert len(tears) == 1 and tears[0][0].get_downstream_main().get_type() == 'ASMReactor'
+
+    print('ACCELERATED SM LOOP:')
+    plain, plain_comps = solve(None)
+    for accel in ('Wegstein', 'Anderson'):
+        stats, comps = solve(accel)
+        print(' {}: {} passes vs. {} (plain)'.format(accel, stats['iterations'], plain['iterations']))
+        assert stats['accel'] == accel and len(stats['residuals']) == stats['iterations'] + 1
+        assert stats['iterations'] < plain['iterations']
+        assert np.allclose(comps, plain_comps, rtol=1e-2, atol=1e-2)
+
+    print('PASS LIMIT:')
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    stats = run.get_steady_state(wwtp, target_SRT=10, solver='SM', show=False, max_passes=5)
+    assert not stats['converged'] and stats['iterations'] == 5
+
+    print('UNKNOWN SOLVER OR ACCELERATOR:')
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    comps = ra.get_main_outlet_concs()
+    for solver, accel in (('newton', None), ('SM', 'anderson')):
+        stats = run.get_steady_state(wwtp, target_SRT=10, solver=solver, accel=accel, show=False)
+        assert not stats['converged'] and stats['iterations'] == 0
+    # nothing was calculated
+    assert ra.get_main_outlet_concs() == comps
+
+    print('STALLED ACCELERATOR:')
+    acc = tear_accelerator(wwtp, wwtp, 'Anderson', patience=3)
+    for res in [1.0] + [2.0] * 3:
+        acc._check_stall(res)
+    assert acc._damping == 0.5 and acc._method == 'Anderson'
+    for res in [2.0] * 9:
+        acc._check_stall(res)
+    # damped below the limit: plain substitution from here on
+    assert acc._damping < 0.1 and acc._method is None
+
+    print('CSTR W/ EVERY ACCELERATOR:')
+    for temp in (10, 12, 20):
+        for accel in (None, 'Wegstein', 'Anderson'):
+            wwtp = build_cstr(temp)
+            pfd.check(wwtp)
+            stats = run.get_steady_state(wwtp, target_SRT=2, solver='SM', accel=accel, show=False, max_passes=300)
+            print(' {} degC, {}: {} passes'.format(temp, accel, stats['iterations']))
+            assert stats['converged'], (temp, accel)
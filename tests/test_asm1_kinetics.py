@@ -0,0 +1,62 @@
+import context
+import numpy as np
+from PooPyLab.ASMModel.asm_1 import ASM_1, _PARAM_NAMES
+from PooPyLab.ASMModel import asm_1
+
+
+if __name__ == '__main__':
+    sludge = ASM_1(ww_temp=12, DO=2)
+
+    mo_comps = [2.0, 30.0, 5.0, 2.0, 1.0, 8.0, 5.0, 1000.0, 100.0, 2000.0, 100.0, 500.0, 5.0]
+    in_comps = [0.0, 30.0, 200.0, 25.0, 2.0, 0.0, 6.0, 50.0, 150.0, 0.0, 0.0, 0.0, 10.0]
+
+    print('VECTORIZED VS. REFERENCE dC/dt:')
+    for fix_DO in (True, False):
+        vec = sludge._dCdt(0, mo_comps, 1000, 2000, in_comps, fix_DO, 9.0)
+        ref = sludge._dCdt_ref(0, mo_comps, 1000, 2000, in_comps, fix_DO, 9.0)
+        print(' fix_DO={}: max. abs. diff = {:.3e}'.format(fix_DO, np.max(np.abs(vec - ref))))
+        assert np.allclose(vec, ref, rtol=1e-12, atol=1e-9)
+
+    print('PARAMETER VECTOR AND STOICHIOMETRIC MATRIX:')
+    params = sludge.get_params()
+    assert list(sludge.get_param_vector()) == [params[n] for n in _PARAM_NAMES]
+    stoich_mat = sludge.get_stoich_matrix()
+    for k, v in sludge.get_stoichs().items():
+        j, i = k.split('_')
+        assert stoich_mat[int(j), int(i)] == v
+    print(' {} parameters, {} non-zero stoichiometrics'.format(len(_PARAM_NAMES), np.count_nonzero(stoich_mat)))
+
+    print('PARAMETERS FOLLOW update():')
+    sludge.update(20, 2)
+    assert sludge.get_param_vector()[0] == sludge.get_params()['u_max_H'] == 6.0
+    print(' OK')
+
+    print('ANALYTICAL JACOBIAN VS. CENTRAL DIFFERENCES:')
+    sludge.update(12, 2)
+    y = np.array(mo_comps)
+    for fix_DO in (True, False):
+        jac = sludge.jacobian(0, y, 1000, 2000, in_comps, fix_DO, 9.0)
+        fd = np.zeros((len(y), len(y)))
+        for k in range(len(y)):
+            h = 1e-6 * max(1.0, abs(y[k]))
+            yp, ym = y.copy(), y.copy()
+            yp[k] += h
+            ym[k] -= h
+            fd[:, k] = (sludge._dCdt(0, yp, 1000, 2000, in_comps, fix_DO, 9.0)
+                        - sludge._dCdt(0, ym, 1000, 2000, in_comps, fix_DO, 9.0)) / (2 * h)
+        print(' fix_DO={}: max. abs. diff = {:.3e}'.format(fix_DO, np.max(np.abs(jac - fd))))
+        assert np.allclose(jac, fd, rtol=1e-5, atol=1e-5)
+
+    print('BATCHED KINETICS VS. SINGLE REACTORS:')
+    sludges = [ASM_1(ww_temp=T, DO=DO) for T, DO in ((10, 0.0), (14, 0.5), (20, 2.0), (25, 1.0))]
+    comps = np.array([[DO * 0.9, 30.0, 5.0 + k, 2.0, 1.0, 8.0 - k, 5.0, 1000.0, 100.0, 2000.0 + 100 * k, 100.0, 500.0, 5.0]
+                      for k, DO in enumerate((0.0, 0.5, 2.0, 1.0))])
+    params, stoichs = asm_1.stack_models(sludges)
+    rates = asm_1.batch_reaction_rates(comps, params, stoichs)
+    jacs = asm_1.batch_reaction_jacobians(comps, params, stoichs)
+    for k, s in enumerate(sludges):
+        assert np.allclose(rates[k], np.dot(s._process_rates(comps[k]), s.get_stoich_matrix()), rtol=1e-12)
+        assert np.allclose(jacs[k], np.dot(s.get_stoich_matrix().T, s._process_rate_derivs(comps[k])), rtol=1e-12)
+    # shared stoichiometrics broadcast to all reactors
+    assert np.allclose(asm_1.batch_reaction_rates(comps, params, stoichs[0]), rates)
+    print(' {} reactors OK'.format(len(sludges)))
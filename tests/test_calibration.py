@@ -0,0 +1,45 @@
+import context
+import time
+import numpy as np
+from PooPyLab.utils.calibration import calibrator, calibrate
+from PooPyLab.utils.scenarios import scenario_runner
+from PooPyLab.utils.monte_carlo import kinetic_setters
+from test_plant_system import build_cmas
+
+
+OUTPUTS = ['get_TN', 'get_inorgN', 'get_COD', ('ASMReactor', 'get_TSS'), ('ASMReactor', 'get_VSS')]
+
+
+if __name__ == '__main__':
+    truth = {'Y_H': 0.62, 'b_LH': 0.5, 'u_max_H': 5.0}
+    with scenario_runner(build_cmas, kinetic_setters(truth), max_workers=0, outputs=OUTPUTS, solver='Newton',
+                         target_SRT=10) as runner:
+        measured = runner.run([list(truth.values())], list(truth))['outputs'][0]
+    print('MEASURED:', measured)
+    # 1% std. deviation of every measurement
+    measurements = [(o, v, 1.0 / (0.01 * v)) for o, v in zip(OUTPUTS, measured)]
+    ranges = {'Y_H': (0.5, 0.8), 'b_LH': (0.3, 0.9), 'u_max_H': (3.0, 8.0)}
+
+    print('CALIBRATED FROM THE DEFAULTS:')
+    t0 = time.perf_counter()
+    with calibrator(build_cmas, ranges, measurements, max_workers=0, solver='Newton', target_SRT=10) as cal:
+        res = cal.fit()
+        # memoized vectors are not solved again
+        n = res['evaluations']
+        cal.evaluate([[0.4, 0.3, 0.6], [0.4, 0.3, 0.6]])
+        assert len(cal._memo) == n + 1
+    print(' {:.2f} s, {} steady states, {} memo hits'.format(time.perf_counter() - t0, res['evaluations'],
+                                                             res['memo_hits']))
+    print(' x = {}, x0 = {}'.format(res['x'], res['x0']))
+    assert res['success'] and np.allclose(res['x0'], [0.67, 0.62, 6.0])
+    assert np.allclose(res['x'], list(truth.values()), rtol=1e-4)
+    assert np.allclose(res['simulated'], measured, rtol=1e-6) and res['memo_hits'] > 0
+    print(' OK')
+
+    print('POOLED, FROM THE MIDDLE OF THE RANGES:')
+    t0 = time.perf_counter()
+    pooled = calibrate(build_cmas, ranges, measurements, x0=[0.65, 0.6, 5.5], max_workers=2, solver='Newton',
+                       target_SRT=10)
+    print(' {:.2f} s, {} steady states'.format(time.perf_counter() - t0, pooled['evaluations']))
+    assert pooled['success'] and np.allclose(pooled['x'], list(truth.values()), rtol=1e-4)
+    print(' OK')
@@ -0,0 +1,99 @@
+import context
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from PooPyLab.ASMModel.composition import composition_matrix, branch_composites, COMPOSITES, DEFAULT_COMPOSITION
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.plant_state import plant_state
+from PooPyLab.utils.results_store import results_store, results_reader, COLUMNS
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    names = [c[0] for c in COMPOSITES]
+
+    print('MATRIX AGAINST THE DEFINITIONS:')
+    comps = np.random.default_rng(3).uniform(0, 100, 13)
+    vals = DEFAULT_COMPOSITION.evaluate(comps)
+    for (name, idx, factor), v in zip(COMPOSITES, vals):
+        div = {None: 1.0, 'COD_TSS': 1.2, 'COD_VSS': 1.42}[factor]
+        assert np.isclose(v, comps[idx].sum() / div, rtol=1e-14), name
+    assert np.isclose(vals[names.index('COD')], vals[names.index('sCOD')] + vals[names.index('pCOD')])
+    assert np.isclose(vals[names.index('TN')], vals[names.index('orgN')] + vals[names.index('inorgN')])
+    assert np.isclose(vals[names.index('TN')], vals[names.index('TKN')] + vals[names.index('NOxN')])
+    print(' OK')
+
+    print('UNIT GETTERS:')
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.get_steady_state(wwtp, target_SRT=10, solver='Newton')
+    fc = pfd.get_all_units(wwtp, 'FinalClarifier')[0]
+    rows = {'Main': fc.get_main_outlet_concs(), 'Side': fc.get_side_outlet_concs(), 'Inlet': list(fc._in_comps)}
+    for br, row in rows.items():
+        for name in ('TSS', 'VSS', 'COD', 'sCOD', 'pCOD', 'TN', 'orgN', 'inorgN', 'pN', 'sN'):
+            assert np.isclose(getattr(fc, 'get_' + name)(br), DEFAULT_COMPOSITION.evaluate(row, [name])[0],
+                              rtol=1e-12), (br, name)
+    print(' OK')
+
+    print('SLUDGE TYPE OF A UNIT:')
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    tss, fc_tss = ra.get_TSS(), fc.get_TSS()
+    ra.set_composition(composition_matrix(COD_TSS=1.48, COD_VSS=1.42))
+    assert np.isclose(ra.get_TSS() * 1.48, tss * 1.2) and fc.get_TSS() == fc_tss
+    assert ra.get_composition().get_factors() == {'COD_TSS': 1.48, 'COD_VSS': 1.42}
+    print(' OK')
+
+    print('ALL BRANCHES AT ONCE:')
+    state = plant_state(wwtp)
+    comp = state.get_composites()
+    for b, (u, br) in enumerate(state.get_branches()):
+        assert np.isclose(comp[b, names.index('TSS')], u.get_TSS(br)), u.__name__
+        assert np.isclose(comp[b, names.index('TN')], u.get_TN(br)), u.__name__
+    state.release()
+    print(' OK')
+
+    print('SRT W/ THE SLUDGE TYPE OF THE REACTOR:')
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = run.get_steady_state(wwtp, target_SRT=10, solver='Newton')
+    assert stats['converged']
+    outlet, waste = pfd.get_all_units(wwtp, 'Effluent')[0], pfd.get_all_units(wwtp, 'WAS')[0]
+    srt = ra.get_TSS() * ra.get_active_vol() / (waste.get_TSS() * waste.get_main_outflow()
+                                                 + outlet.get_TSS() * outlet.get_main_outflow())
+    print(' SRT = {:.6f} d'.format(srt))
+    assert abs(srt - 10) < 1e-6
+    print(' OK')
+
+    print('A YEAR OF 1-MINUTE RECORDS:')
+    tmp = tempfile.mkdtemp()
+    path = os.path.join(tmp, 'year')
+    branches = [('Influent_1', 'Main'), ('Effluent_1', 'Main'), ('WAS_1', 'Main')]
+    n = 365 * 1440
+    rng = np.random.default_rng(5)
+    block = rng.uniform(0, 100, (1440, len(branches), len(COLUMNS)))
+    with results_store(path, branches, chunk_len=1440 * 30) as store:
+        for k in range(n):
+            store(k / 1440.0, block[k % 1440])
+    res = results_reader(path)
+    t0 = time.perf_counter()
+    tt, eff = res.get_composites('Effluent_1', names=['TSS', 'TN', 'COD'])
+    t_eff = time.perf_counter() - t0
+    print(' {} records of the effluent in {:.3f} s'.format(len(tt), t_eff))
+    assert eff.shape == (n, 3)
+    assert np.allclose(eff[:1440], DEFAULT_COMPOSITION.evaluate(block[:, 1, 1:], ['TSS', 'TN', 'COD']))
+    assert np.allclose(eff[-1440:], eff[:1440])
+    assert t_eff < 10
+
+    # all branches, the WAS w/ a sludge type of its own
+    heavy = composition_matrix(COD_TSS=1.48)
+    tt, allc = res.get_composites(names=['TSS'], t_window=(0, 1 - 1e-9),
+                                  compositions=[DEFAULT_COMPOSITION, DEFAULT_COMPOSITION, heavy])
+    assert allc.shape == (1440, 3, 1)
+    assert np.allclose(allc[:, 2, 0], heavy.evaluate(block[:, 2, 1:], ['TSS'])[:, 0])
+    assert np.allclose(allc[:, :2], branch_composites(block[:, :2], DEFAULT_COMPOSITION, ['TSS']))
+    shutil.rmtree(tmp)
+    print(' OK')
@@ -0,0 +1,66 @@
+import context
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.flow_system import flow_system
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    inlet, ra, fc, splt, outlet, waste = [pfd.get_all_units(wwtp, t)[0] for t in
+                                          ('Influent', 'ASMReactor', 'FinalClarifier', 'Splitter', 'Effluent', 'WAS')]
+
+    print('SQUARE, NON-SINGULAR FLOW SYSTEM:')
+    flows = flow_system(wwtp)
+    assert flows.is_ready()
+    A = flows.matrix()
+    assert A.shape == (len(flows.get_branches()),) * 2
+    print(' {} branches, {} nonzeros'.format(A.shape[0], A.nnz))
+
+    print('FLOW BALANCES AT DIFFERENT WAS FLOWS:')
+    lu = flows._lu
+    for Q_w in (0.0, 250.0, 800.0):
+        flows.set_flows(Q_w)
+        # the factorization is reused, only the right hand side changes
+        assert flows._lu is lu
+        assert abs(waste.get_main_outflow() - Q_w) < 1e-6
+        assert abs(outlet.get_main_outflow() + Q_w - inlet.get_main_outflow()) < 1e-6
+        assert abs(splt.get_main_outflow() - 37800) < 1e-6
+        for u in wwtp:
+            if u.get_type() == 'Influent':
+                continue
+            out = u.get_main_outflow() + (u.get_side_outflow() if u.has_sidestream() else 0.0)
+            assert abs(u.totalize_inflow() - out) < 1e-6
+            assert abs(u._total_inflow - out) < 1e-6
+        print(' WAS = {:.1f}: RAS = {:.1f}, underflow = {:.1f}'.format(Q_w, splt.get_main_outflow(),
+                                                                      fc.get_side_outflow()))
+    assert np.allclose(flows.solve(250.0), np.linalg.solve(A.toarray(), flows.rhs(250.0)))
+
+    print('UPDATED SPECIFICATIONS:')
+    splt.set_mainstream_flow(30000)
+    flows.update_specs()
+    flows.set_flows(250.0)
+    assert flows._lu is lu and abs(fc.get_side_outflow() - 30250.0) < 1e-6
+    splt.set_mainstream_flow(37800)
+    flows.update_specs()
+    print(' OK')
+
+    print('UNDERDETERMINED FLOWS:')
+    # a second user defined branch on the SRT controller leaves the clarifier underflow to two equations
+    wwtp = build_cmas()
+    splt = pfd.get_all_units(wwtp, 'Splitter')[0]
+    splt.set_sidestream_flow(100)
+    assert not flow_system(wwtp).is_ready()
+    print(' OK')
+
+    print('SM LOOP ON THE SOLVED FLOWS:')
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    stats = run.get_steady_state(wwtp, target_SRT=10, solver='SM', accel='Anderson')
+    inlet, fc, outlet, waste = [pfd.get_all_units(wwtp, t)[0] for t in
+                                ('Influent', 'FinalClarifier', 'Effluent', 'WAS')]
+    assert stats['converged']
+    assert abs(outlet.get_main_outflow() + waste.get_main_outflow() - inlet.get_main_outflow()) < 1e-6
+    assert abs(fc.get_main_outflow() + fc.get_side_outflow() - fc.totalize_inflow()) < 1e-6
+    print(' OK')
@@ -0,0 +1,56 @@
+import context
+import contextlib
+import io
+import time
+import numpy as np
+from PooPyLab.unit_procs.streams import influent, batch_fractionate
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(12)
+    n = 200
+    concs = np.column_stack([rng.uniform(50, 400, n), rng.uniform(50, 400, n), rng.uniform(40, 300, n),
+                             rng.uniform(15, 60, n), rng.uniform(10, 45, n), rng.uniform(0, 5, n),
+                             rng.uniform(2, 15, n), rng.uniform(3, 9, n), rng.uniform(0, 2, n)])
+    fracs = {'COD:BOD5': rng.uniform(1.5, 2.5, n), 'SCOD:COD': rng.uniform(0.2, 0.8, n),
+             'RBCOD:SCOD': rng.uniform(0.5, 0.9, n), 'SBCOD:PCOD': rng.uniform(0.5, 0.9, n),
+             'SON:SCOD': rng.uniform(0.005, 0.05, n), 'RBON:SON': 0.8, 'SBON:PON': 0.75}
+
+    print('BATCH = SINGLE SAMPLES, W/ PER-SAMPLE FRACTIONS:')
+    comps, neg = batch_fractionate(concs, fracs)
+    assert comps.shape == (n, 13) and neg.shape == (n,)
+    inf = influent()
+    for i in range(n):
+        inf.set_constituents('ASM1', list(concs[i]))
+        for name, val in fracs.items():
+            inf._model_fracs['ASM1'][name] = np.broadcast_to(val, (n,))[i]
+        inf._in_comps = [-1.0] * 13
+        with contextlib.redirect_stdout(io.StringIO()):
+            ref = inf._convert_to_model_comps()
+        if neg[i]:
+            # the single sample version leaves the components as they were
+            assert ref == [-1.0] * 13
+        else:
+            assert np.allclose(comps[i], ref)
+    print(' {} of {} samples w/ negative model components'.format(np.count_nonzero(neg), n))
+    assert 0 < np.count_nonzero(neg) < n
+
+    print('SHARED FRACTIONS, ONE SAMPLE:')
+    inf = influent()
+    sample = [inf._BOD5, inf._TSS, inf._VSS, inf._TKN, inf._NH3N, inf._NOxN, inf._TP, inf._Alk, inf._DO]
+    one, one_neg = batch_fractionate(sample, inf._model_fracs['ASM1'])
+    assert one.shape == (1, 13) and not one_neg[0]
+    assert np.allclose(one[0], inf._convert_to_model_comps())
+    print(' OK')
+
+    print('INFLUENT.FRACTIONATE() CLIPS THE NEGATIVES:')
+    clipped = inf.fractionate(np.vstack([sample, [250, 250, 200, 10, 40, 0, 10, 6, 0]]))
+    assert np.all(clipped >= 0) and np.allclose(clipped[0], one[0])
+    print(' OK')
+
+    print('ONE MILLION SAMPLES:')
+    big = np.tile(sample, (1000000, 1))
+    t0 = time.perf_counter()
+    comps, neg = batch_fractionate(big, inf._model_fracs['ASM1'])
+    print(' {:.3f} s'.format(time.perf_counter() - t0))
+    assert comps.shape == (1000000, 13) and not neg.any()
@@ -0,0 +1,80 @@
+import context
+import os
+import shutil
+import tempfile
+import numpy as np
+from PooPyLab.unit_procs.streams import influent
+from PooPyLab.utils.inf_reader import influent_reader, COLUMNS
+from PooPyLab.utils.plant_dynamics import interp_series
+
+
+def make_records(days=10, per_day=96):
+    t = np.arange(days * per_day) / per_day
+    f = 1.0 + 0.3 * np.sin(2 * np.pi * t)
+    base = np.array([250.0, 250.0, 200.0, 40.0, 28.0, 0.0, 10.0, 6.0, 0.0])
+    return np.column_stack([t, 37800 * f, base[None, :] * f[:, None]])
+
+
+if __name__ == '__main__':
+    inlet = influent()
+    records = make_records()
+    ref = interp_series(records[:, 0], records[:, 1], inlet.fractionate(records[:, 2:]))
+    times = np.concatenate([np.linspace(0, 10, 2001), [9.5, 0.3, 5.1, 12.0, -1.0]])
+    tmp = tempfile.mkdtemp()
+
+    print('FRACTIONATION MATCHES THE SINGLE SAMPLE VERSION:')
+    concs = [inlet._BOD5, inlet._TSS, inlet._VSS, inlet._TKN, inlet._NH3N, inlet._NOxN, inlet._TP, inlet._Alk,
+             inlet._DO]
+    assert np.allclose(inlet.fractionate([concs])[0], inlet._convert_to_model_comps())
+    print(' OK')
+
+    # the same series from every kind of source, read 100 records at a time
+    csv_path = os.path.join(tmp, 'inf.csv')
+    with open(csv_path, 'w') as f:
+        # columns in a different order, named as in the lab reports
+        f.write('Flow,Time,BOD5,TSS,VSS,TKN,NH3-N,NOx-N,TP,Alk,DO\n')
+        for r in records:
+            f.write(','.join(repr(float(v)) for v in [r[1], r[0]] + list(r[2:])) + '\n')
+    iso_path = os.path.join(tmp, 'inf_iso.csv')
+    with open(iso_path, 'w') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        start = np.datetime64('2020-01-01T00:00:00')
+        for r in records:
+            f.write(','.join([str(start + np.timedelta64(int(round(r[0] * 86400)), 's'))]
+                             + [repr(float(v)) for v in r[1:]]) + '\n')
+    npy_path = os.path.join(tmp, 'inf.npy')
+    np.save(npy_path, records)
+    bin_path = os.path.join(tmp, 'inf.bin')
+    records.tofile(bin_path)
+
+    sources = {'CSV': csv_path, 'CSV w/ timestamps': iso_path, 'npy': npy_path, 'binary': bin_path,
+               'iterator': iter(records)}
+    for name, source in sources.items():
+        print('{} SOURCE:'.format(name.upper()))
+        reader = influent_reader(source, inlet.fractionate, chunk_size=100)
+        lookup_times = np.sort(times) if name == 'iterator' else times
+        for t in lookup_times:
+            q, c = reader(t)
+            q_ref, c_ref = ref(t)
+            assert abs(q - q_ref) < 1e-6 * q_ref and np.allclose(c, c_ref, rtol=1e-9, atol=1e-9), (name, t)
+        # never more than two chunks in memory
+        assert len(reader._t) <= 200
+        print(' OK, {} chunks'.format(len(reader._first_t)))
+        reader.close()
+
+    print('CHUNKS:')
+    reader = influent_reader(csv_path, inlet.fractionate, chunk_size=300)
+    sizes = [len(t) for t, q, c in reader.chunks()]
+    assert sum(sizes) == len(records) and max(sizes) == 300
+    assert np.allclose(np.concatenate([t for t, q, c in reader.chunks()]), records[:, 0])
+    print(' ', sizes)
+    reader.close()
+
+    print('INFLUENT UNIT WITH A TIME SERIES:')
+    assert np.allclose(inlet.get_inflow_at(3.3)[1], inlet._convert_to_model_comps())
+    inlet.set_time_series(npy_path, chunk_size=500)
+    q, c = inlet.get_inflow_at(0.25)
+    assert abs(q - 1.3 * 37800) < 1e-6 and np.allclose(c, ref(0.25)[1])
+    print(' OK')
+
+    shutil.rmtree(tmp, ignore_errors=True)
@@ -0,0 +1,132 @@
+import context
+import contextlib
+import io
+import json
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.instrument import instrument, UNIT_METHODS
+from PooPyLab.utils.plant_dynamics import interp_series
+from test_plant_system import build_cmas
+
+
+def new_plant():
+    wwtp = build_cmas()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+    return wwtp
+
+
+def unwrapped(wwtp):
+    return all(m not in u.__dict__ for u in wwtp for m, k in UNIT_METHODS)
+
+
+if __name__ == '__main__':
+    instr = instrument()
+
+    print('SEQUENTIAL MODULAR RUN:')
+    wwtp = new_plant()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = run.get_steady_state(wwtp, target_SRT=10, solver='SM', accel='Wegstein', instr=instr)
+    rec = instr.get_last_run()
+    print(' {} passes, {:.3f} s'.format(stats['iterations'], rec['wall_time']))
+    assert rec['kind'] == 'steady_state' and rec['solver'] == 'SM' and rec['converged']
+    assert rec['iterations'] == stats['iterations']
+    assert set(rec['phases']) >= {'flow', 'traverse', 'accelerate', 'convergence'}
+    assert rec['phases']['flow']['calls'] == stats['iterations'] + 1
+    assert np.allclose(rec['residuals'], stats['residuals'])
+    assert sum(p['time'] for p in rec['phases'].values()) <= rec['wall_time']
+    assert len(rec['units']) == len(wwtp)
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    r_rec = rec['units'][ra.__name__]
+    assert r_rec['discharge']['calls'] > 0 and r_rec['steps'] > 0 and r_rec['rhs_evals'] >= r_rec['steps']
+    assert r_rec['flow']['time'] <= r_rec['discharge']['time']
+    # the reactor dominates the traverse
+    assert r_rec['discharge']['time'] == max(u['discharge']['time'] for u in rec['units'].values())
+    assert rec['counters']['units_calculated'] >= r_rec['discharge']['calls']
+    assert unwrapped(wwtp)
+    print(' OK')
+
+    print('NEWTON RUN:')
+    wwtp = new_plant()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = run.get_steady_state(wwtp, target_SRT=10, solver='Newton', instr=instr)
+    rec = instr.get_last_run()
+    assert rec['solver'] == 'Newton' and rec['converged']
+    assert rec['phases']['residual']['calls'] > stats['iterations'] and rec['phases']['jacobian']['calls'] > 0
+    assert len(rec['residuals']) == stats['iterations'] and rec['residuals'][-1] < 1E-6
+    assert rec['phases']['newton']['time'] <= rec['wall_time']
+    assert unwrapped(wwtp) and 'residual' not in vars(run.plant_system(wwtp))
+    print(' OK')
+
+    print('DYNAMIC RUN:')
+    inlet = pfd.get_all_units(wwtp, 'Influent')[0]
+    t = np.linspace(0, 2, 49)
+    f = 1 + 0.3 * np.sin(2 * np.pi * t)
+    inf_comps = np.array(inlet.get_main_outlet_concs())
+    series = interp_series(t, inlet.get_main_outflow() * f, inf_comps[None, :] * f[:, None])
+    for method in ('BDF', 'RK45'):
+        stats = run.get_dynamic(wwtp, {inlet: series}, (0, 2), 1/24, mn=method, instr=instr)
+        rec = instr.get_last_run()
+        c = rec['counters']
+        print(' {}: {} steps, {} rejected, {} rhs, {} jacobians, {} LU'.format(
+            method, c['steps'], c['rejected_steps'], c['rhs_evals'], c['jac_evals'], c['lu_decomps']))
+        assert rec['kind'] == 'dynamic' and rec['success']
+        assert c['steps'] == stats['steps'] and 0 <= c['rejected_steps'] < c['steps']
+        assert c['rhs_evals'] >= c['steps']
+        assert rec['phases']['output']['calls'] > 0 and rec['phases']['integrate']['calls'] == c['steps']
+        if method == 'BDF':
+            assert c['jac_evals'] == rec['phases']['ode_jacobian']['calls'] > 0 and c['lu_decomps'] > 0
+        else:
+            assert c['jac_evals'] == 0
+    print(' OK')
+
+    print('JSON EXPORT:')
+    runs = json.loads(instr.to_json())['runs']
+    assert [r['kind'] for r in runs] == ['steady_state', 'steady_state', 'dynamic', 'dynamic']
+    assert runs[0]['units'][ra.__name__]['steps'] == instr.get_runs()[0]['units'][ra.__name__]['steps']
+    print(' OK')
+
+    print('DIAGNOSE FLAG:')
+    wwtp = new_plant()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        run.get_steady_state(wwtp, target_SRT=10, solver='SM', diagnose=True, show=False)
+    assert 'steady_state run' in out.getvalue() and 'traverse' in out.getvalue()
+    assert unwrapped(wwtp)
+    print(' OK')
+
+    print('FAILED RUNS ARE CLOSED:')
+    class interrupted(Exception):
+        pass
+
+    def interrupt(*args, **kwargs):
+        raise interrupted()
+
+    wwtp = new_plant()
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    ra.discharge = interrupt
+    num_runs = len(instr.get_runs())
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run.get_steady_state(wwtp, target_SRT=10, solver='SM', accel='Anderson', instr=instr)
+        raise AssertionError('the interruption was lost')
+    except interrupted:
+        pass
+    rec = instr.get_last_run()
+    assert instr._run is None and len(instr.get_runs()) == num_runs + 1 and not rec['converged']
+    # the units are put back as they were before the run
+    assert ra.__dict__['discharge'] is interrupt
+    del ra.discharge
+    assert unwrapped(wwtp)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.get_steady_state(wwtp, target_SRT=10, solver='Newton')
+    try:
+        run.get_dynamic(wwtp, {}, (0, 1), 1/24, writer=interrupt, instr=instr)
+        raise AssertionError('the interruption was lost')
+    except interrupted:
+        pass
+    rec = instr.get_last_run()
+    assert instr._run is None and rec['kind'] == 'dynamic' and not rec['success']
+    assert unwrapped(wwtp)
+    print(' OK')
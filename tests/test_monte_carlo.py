@@ -0,0 +1,71 @@
+import context
+import os
+import tempfile
+import time
+import numpy as np
+from PooPyLab.utils.monte_carlo import monte_carlo, latin_hypercube, streaming_stats, OUTPUTS
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(1)
+
+    print('STREAMING STATISTICS:')
+    x = np.column_stack([rng.normal(5, 2, 20000), rng.lognormal(0, 1, 20000), rng.uniform(0, 1, 20000)])
+    stats = streaming_stats(3, (0.05, 0.5, 0.95))
+    t0 = time.perf_counter()
+    stats.update(x[:10000])
+    # restored half way through
+    resumed = streaming_stats(3, (0.05, 0.5, 0.95))
+    resumed.set_state(stats.get_state())
+    resumed.update(x[10000:])
+    stats.update(x[10000:])
+    print(' {:.2f} s for {} vectors'.format(time.perf_counter() - t0, len(x)))
+    assert len(resumed) == len(x)
+    assert np.allclose(resumed.get_mean(), x.mean(axis=0)) and np.allclose(resumed.get_var(), x.var(axis=0, ddof=1))
+    exact = np.quantile(x, (0.05, 0.5, 0.95), axis=0)
+    spread = exact[-1] - exact[0]
+    print(' max. quantile error / 90% range: {:.4f}'.format(np.max(np.abs(resumed.get_quantiles() - exact) / spread)))
+    assert np.all(np.abs(resumed.get_quantiles() - exact) < 0.02 * spread)
+    assert np.array_equal(resumed.get_quantiles(), stats.get_quantiles())
+    few = streaming_stats(1, (0.5,))
+    few.update([[1.0], [3.0], [2.0]])
+    assert np.allclose(few.get_quantiles(), [[2.0]])
+    print(' OK')
+
+    print('LATIN HYPERCUBE:')
+    lhs = latin_hypercube([('uniform', 2, 4), ('normal', 1, 0.5), ('lognormal', 0.8, 0.2), ('triangular', 0, 1, 3)],
+                          100, rng)
+    assert lhs.shape == (100, 4) and (lhs[:, 1] >= 0).all()
+    # one draw in every interval of equal probability
+    assert np.array_equal(np.sort(np.floor((lhs[:, 0] - 2) / 2 * 100)), np.arange(100))
+    print(' OK')
+
+    print('MONTE CARLO:')
+    dists = {'u_max_A': ('lognormal', 0.8, 0.15), 'K_NH': ('uniform', 0.5, 1.5)}
+    kw = {'batch_size': 4, 'seed': 7, 'max_workers': 0, 'solver': 'Newton', 'target_SRT': 10}
+    t0 = time.perf_counter()
+    full = monte_carlo(build_cmas, dists, 12, **kw)
+    print(' {:.2f} s for {} draws'.format(time.perf_counter() - t0, full['draws']))
+    assert full['draws'] == 12 and full['failed'] == 0
+    assert full['quantiles'].shape == (3, len(OUTPUTS)) and (full['std'] > 0).all()
+    nh = full['outputs'].index('NH3N')
+    assert full['quantiles'][0, nh] <= full['quantiles'][1, nh] <= full['quantiles'][2, nh]
+    for k, o in enumerate(full['outputs']):
+        print(' {:5s} mean {:8.3f}  std {:7.3f}  p5 {:8.3f}  p95 {:8.3f}'.format(
+              o, full['mean'][k], full['std'][k], full['quantiles'][0, k], full['quantiles'][2, k]))
+    print(' OK')
+
+    print('RESUMED FROM A CHECKPOINT:')
+    with tempfile.TemporaryDirectory() as tmp:
+        ckpt = os.path.join(tmp, 'mc.npz')
+        part = monte_carlo(build_cmas, dists, 8, checkpoint=ckpt, **kw)
+        assert part['draws'] == 8
+        calls = []
+        rest = monte_carlo(build_cmas, dists, 12, checkpoint=ckpt, progress=lambda d, n: calls.append(d), **kw)
+        # only the last batch is solved again
+        assert calls == [12]
+        assert rest['draws'] == 12
+        assert np.allclose(rest['mean'], full['mean'], rtol=1e-9) and np.allclose(rest['std'], full['std'], rtol=1e-9)
+        assert np.allclose(rest['quantiles'], full['quantiles'], rtol=1e-9)
+    print(' OK')
@@ -0,0 +1,83 @@
+import context
+from itertools import combinations
+from PooPyLab.unit_procs.streams import influent, effluent, WAS, pipe, splitter
+from PooPyLab.unit_procs.bio import asm_reactor
+from PooPyLab.unit_procs.physchem import final_clarifier
+from PooPyLab.utils import partition
+
+
+def build_biegler():
+    # The flowsheet of Chapter 8 of Biegler, Grossmann, and Westerberg (1997), as in
+    # archive/partition_tearing_test_3.py
+    Inf = [influent() for i in range(4)]
+    Eff = [effluent() for i in range(4)]
+    Pipe = [pipe() for i in range(35)]
+    Splt = [splitter() for i in range(11)]
+    React = [asm_reactor() for i in range(7)]
+    Clarifier = final_clarifier()
+    WAS1 = WAS()
+
+    for s, n in zip(Splt, 'CFGRSOLMKIN'):
+        s.__name__ = n
+    for r, n in zip(React, 'ABEHQJP'):
+        r.__name__ = n
+    Clarifier.__name__ = 'D'
+
+    links = [(Inf[0], Pipe[0]), (Pipe[0], React[2]), (React[2], Pipe[1]), (Pipe[1], React[0]),
+             (Inf[1], Pipe[30]), (Pipe[30], React[0]), (React[0], Pipe[2]), (Pipe[2], React[1]),
+             (React[1], Pipe[3]), (Pipe[3], Splt[0]), (Pipe[27], Clarifier), (Pipe[4], Splt[1]),
+             (Pipe[24], Splt[2]), (Pipe[5], React[3]), (Pipe[26], Splt[0]), (Pipe[25], Eff[3]),
+             (Pipe[29], React[2]), (Pipe[28], React[3]), (React[3], Pipe[6]), (Pipe[6], Splt[9]),
+             (Pipe[23], React[4]), (Pipe[7], React[5]), (React[5], Pipe[8]), (React[4], Pipe[13]),
+             (Pipe[13], Splt[3]), (Pipe[14], React[5]), (Pipe[15], Eff[2]), (Pipe[8], Splt[8]),
+             (Pipe[19], Eff[1]), (Pipe[9], Splt[6]), (Pipe[31], Splt[7]), (Pipe[10], Splt[5]),
+             (Pipe[22], Splt[4]), (Pipe[32], Splt[10]), (Pipe[33], Eff[0]), (Pipe[34], Splt[6]),
+             (Pipe[16], WAS1), (Pipe[12], React[4]), (Pipe[11], Splt[4]), (Pipe[17], React[6]),
+             (React[6], Pipe[18]), (Pipe[18], Splt[8]), (Inf[2], Pipe[20]), (Pipe[20], Splt[5]),
+             (Inf[3], Pipe[21]), (Pipe[21], React[6])]
+    for up, down in links:
+        up.set_downstream_main(down)
+
+    splits = [(Splt[0], Pipe[27], Pipe[4]), (Splt[1], Pipe[5], Pipe[24]), (Splt[2], Pipe[26], Pipe[25]),
+              (Clarifier, Pipe[29], Pipe[28]), (Splt[9], Pipe[23], Pipe[7]), (Splt[3], Pipe[14], Pipe[15]),
+              (Splt[8], Pipe[9], Pipe[19]), (Splt[6], Pipe[31], Pipe[10]), (Splt[7], Pipe[22], Pipe[32]),
+              (Splt[10], Pipe[33], Pipe[34]), (Splt[4], Pipe[12], Pipe[16]), (Splt[5], Pipe[17], Pipe[11])]
+    for s, main, side in splits:
+        s.set_downstream_main(main)
+        s.set_downstream_side(side)
+
+    return Inf + Pipe + React + Splt + Eff + [WAS1, Clarifier]
+
+
+def breaks_all(loops, tears):
+    return all(any(s in tears for s in lp) for lp in loops)
+
+
+if __name__ == '__main__':
+    wwtp = build_biegler()
+
+    print('GROUPS:')
+    groups = [g for g in partition.find_groups(wwtp) if len(g) > 1]
+    for g in groups:
+        print(' ', sorted(u.__name__ for u in g if len(u.__name__) == 1))
+    assert sum(len(g) for g in partition.find_groups(wwtp)) == len(wwtp)
+
+    print('CALCULATION ORDER:')
+    blocks = partition.calc_order(wwtp)
+    done = set()
+    for units, tears in blocks:
+        # every stream into a block comes from an earlier block or is torn
+        for u in units:
+            for up in u.get_upstream() or []:
+                br = 'Main' if up.get_downstream_main() is u else 'Side'
+                assert up in done or (up, br) in tears
+            done.add(u)
+        if tears:
+            loops, complete = partition.find_loops(units)
+            print(' {} units, {} loops, tears = {}'.format(len(units), len(loops),
+                                                           [(u.__name__, br) for u, br in tears]))
+            assert complete and breaks_all(loops, tears)
+            # no smaller tear set exists
+            streams = sorted({s for lp in loops for s in lp}, key=lambda s: (wwtp.index(s[0]), s[1]))
+            assert not any(breaks_all(loops, set(c)) for c in combinations(streams, len(tears) - 1))
+    assert len(partition.flatten(blocks)) == len(wwtp)
@@ -0,0 +1,72 @@
+import context
+import json
+import os
+import tempfile
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.flow_system import flow_system
+from PooPyLab.utils.pfd_generator import regional_plant, count_units
+
+
+def unit(wwtp, name):
+    return [u for u in wwtp if u.__name__ == name][0]
+
+
+if __name__ == '__main__':
+    print('UNIT COUNTS:')
+    for n, k, m in ((1, 1, 1), (1, 3, 1), (3, 1, 2), (4, 2, 3)):
+        wwtp = regional_plant(n, k, m)
+        assert len(wwtp) == count_units(n, k, m) == len(set(wwtp))
+        assert len(pfd.get_all_units(wwtp, 'ASMReactor')) == 2 * n * k
+        assert len(pfd.get_all_units(wwtp, 'FinalClarifier')) == n * m
+    assert regional_plant(0, 1, 1) == []
+    print(' OK')
+
+    print('ONE TRAIN IS AN MLE PLANT:')
+    wwtp = regional_plant()
+    types = sorted(u.get_type() for u in wwtp)
+    assert types.count('Pipe') == 9 and types.count('Splitter') == 2 and len(wwtp) == 17
+    assert pfd.check(wwtp)
+    print(' OK')
+
+    print('REGIONAL PLANT PASSES THE PFD CHECK AND SAVES:')
+    wwtp = regional_plant(40, 4, 2)
+    assert pfd.check(wwtp)
+    assert sum(u.is_SRT_controller() for u in pfd.get_all_units(wwtp, 'Splitter')) == 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'regional.json')
+        pfd.save_wwtp(wwtp, {'SRT': 10}, path)
+        with open(path, 'r') as f:
+            saved = json.load(f)
+    assert len(saved['Flowsheet']) == len(wwtp)
+    print(' OK')
+
+    print('FLOWS ARE SPLIT EVENLY:')
+    Q = 37800
+    n, k, m = 3, 2, 2
+    wwtp = regional_plant(n, k, m, inf_flow=Q, RAS_ratio=0.5, IR_ratio=3.0)
+    pfd.check(wwtp)
+    fs = flow_system(wwtp)
+    fs.set_flows(WAS_flow=200.0)
+    for t in range(1, n + 1):
+        ax1 = unit(wwtp, 'T{:02d}_AX1'.format(t))
+        # influent share of the 1st zone, RAS, and IR; the RAS and IR pass through all the zones
+        assert np.isclose(ax1.get_main_outflow(), Q / n / k + 0.5 * Q / n + 3.0 * Q / n)
+        for z in range(1, k + 1):
+            assert np.isclose(unit(wwtp, 'T{:02d}_OX{}'.format(t, z)).get_main_outflow(),
+                              Q / n * (z / k + 0.5 + 3.0))
+    assert np.isclose(pfd.get_all_units(wwtp, 'WAS')[0].get_main_outflow(), 200.0)
+    assert np.isclose(pfd.get_all_units(wwtp, 'Effluent')[0].get_main_outflow(), Q - 200.0)
+    print(' OK')
+
+    print('STEADY STATE OF PARALLEL TRAINS:')
+    wwtp = regional_plant(2, 2, 2)
+    pfd.check(wwtp)
+    stats = run.get_steady_state(wwtp, target_SRT=10, solver='Newton', show=False)
+    assert stats['converged']
+    # the trains are fed and returned the same flows, so they are alike
+    for z in ('AX1', 'OX1', 'AX2', 'OX2'):
+        c1 = np.array(unit(wwtp, 'T01_' + z).get_main_outlet_concs())
+        c2 = np.array(unit(wwtp, 'T02_' + z).get_main_outlet_concs())
+        assert np.allclose(c1, c2, rtol=1e-6, atol=1e-8)
+    print(' OK')
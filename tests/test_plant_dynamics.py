@@ -0,0 +1,70 @@
+import context
+import contextlib
+import io
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.plant_dynamics import plant_dynamics, interp_series
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.get_steady_state(wwtp, target_SRT=10, solver='Newton')
+    inlet, ra, outlet, waste = [pfd.get_all_units(wwtp, t)[0] for t in ('Influent', 'ASMReactor', 'Effluent', 'WAS')]
+    ss_comps = np.array(ra.get_main_outlet_concs())
+
+    print('STEADY STATE IS AT REST:')
+    dyn = plant_dynamics(wwtp)
+    assert dyn.is_ready()
+    y = dyn.get_reactor_state()
+    f0 = dyn.dydt(0.0, y)
+    print(' max |dC/dt| = {:.2e}'.format(np.max(np.abs(f0))))
+    assert np.max(np.abs(f0)) < 1e-6
+
+    print('ANALYTIC JACOBIAN:')
+    J = dyn.ode_jacobian(0.0, y).toarray()
+    J_fd = np.zeros_like(J)
+    for k in range(len(y)):
+        h = 1e-6 * max(1.0, abs(y[k]))
+        yp = y.copy()
+        yp[k] += h
+        J_fd[:, k] = (dyn.dydt(0.0, yp) - f0) / h
+    print(' max abs. diff. = {:.2e}, max |J| = {:.2e}'.format(np.max(np.abs(J - J_fd)), np.max(np.abs(J))))
+    assert np.allclose(J, J_fd, rtol=1e-4, atol=1e-3)
+
+    print('ALGEBRAIC BRANCHES MATCH THE STEADY STATE:')
+    X = dyn.expand(0.0, y)
+    for b, (u, br) in enumerate(dyn.get_branches()):
+        c = u.get_main_outlet_concs() if br == 'Main' else u.get_side_outlet_concs()
+        q = u.get_main_outflow() if br == 'Main' else u.get_side_outflow()
+        assert abs(X[b, 0] - q) < 1e-6 * (1 + q)
+        assert np.allclose(X[b, 1:], c, rtol=1e-6, atol=1e-6)
+    print(' OK')
+
+    print('CONSTANT INFLUENT:')
+    stats = run.get_dynamic(wwtp, {}, (0, 5), 1.0)
+    assert stats['success'] and len(stats['t']) == 6 and stats['results'].shape == (6, len(dyn.get_branches()), 14)
+    assert np.allclose(ra.get_main_outlet_concs(), ss_comps, rtol=1e-4, atol=1e-4)
+    print(' {} steps'.format(stats['steps']))
+
+    print('DIURNAL INFLUENT, STREAMED:')
+    t = np.linspace(0, 3, 3 * 24 + 1)
+    f = 1.0 + 0.3 * np.sin(2 * np.pi * t)
+    inf_comps = np.array(inlet.get_main_outlet_concs())
+    series = interp_series(t, inlet.get_main_outflow() * f, inf_comps[None, :] * f[:, None])
+    assert np.isclose(series(0.25)[0], 1.3 * inlet.get_main_outflow())
+    streamed = []
+    stats = run.get_dynamic(wwtp, {inlet: series}, (0, 3), 1/24, writer=lambda t, X: streamed.append((t, X.copy())))
+    assert stats['success'] and stats['results'] is None and len(streamed) == 73
+    b_inf, b_eff, b_was = [[b for b, (u, br) in enumerate(dyn.get_branches()) if u is x][0]
+                           for x in (inlet, outlet, waste)]
+    for t_k, X in streamed:
+        # flows follow the influent, with the WAS flow held
+        assert abs(X[b_inf, 0] - series(t_k)[0]) < 1e-6 * X[b_inf, 0]
+        assert abs(X[b_eff, 0] + X[b_was, 0] - X[b_inf, 0]) < 1e-6 * X[b_inf, 0]
+        assert np.all(X[:, 1:] >= -1e-6)
+    nh = [X[b_eff, 4] for t_k, X in streamed]
+    print(' effluent S_NH: min {:.3f}, max {:.3f} mg/L'.format(min(nh), max(nh)))
+    assert max(nh) > min(nh)
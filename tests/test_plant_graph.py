@@ -0,0 +1,60 @@
+import context
+from PooPyLab.unit_procs.streams import influent, effluent, pipe, splitter
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.datatypes import flow_data_src
+from PooPyLab.utils.plant_graph import plant_graph, BRANCHES
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    print('CSR ARRAYS MATCH THE CONNECTIONS:')
+    wwtp = build_cmas()
+    graph = plant_graph(wwtp)
+    for i, u in enumerate(wwtp):
+        assert graph.get_id(u) == i and graph.get_unit(i) is u
+        rcv, br = graph.receivers(i)
+        expected = [(u.get_downstream_main(), 'Main')] + ([(u.get_downstream_side(), 'Side')]
+                                                          if u.has_sidestream() else [])
+        assert [(wwtp[j], BRANCHES[b]) for j, b in zip(rcv, br)] == [e for e in expected if e[0] is not None]
+        dsc, br = graph.dischargers(i)
+        assert [wwtp[j] for j in dsc] == list(u.get_upstream() or [])
+        for j, b in zip(dsc, br):
+            assert (wwtp[j].get_downstream_main() if b == 0 else wwtp[j].get_downstream_side()) is u
+    for t in ('Influent', 'ASMReactor', 'FinalClarifier', 'Splitter', 'Pipe', 'Effluent', 'WAS'):
+        assert graph.get_units(t) == pfd.get_all_units(wwtp, t)
+    print(' OK')
+
+    print('GROUPS IN TOPOLOGICAL ORDER:')
+    groups = graph.get_groups()
+    rank = {i: k for k, g in enumerate(groups) for i in g}
+    for i in range(graph.size()):
+        for j in graph.receivers(i)[0]:
+            assert rank[j] >= rank[i]
+    print(' ', [[wwtp[i].__name__ for i in g] for g in groups if len(g) > 1])
+    assert sorted(len(g) for g in groups)[-1] == 6
+
+    print('MAIN-ONLY LOOP:')
+    assert not graph.find_main_only_loop()
+    # a loop through mainstreams only, behind a unit that is not on it
+    inlet, a, b, c = influent(), pipe(), splitter(), pipe()
+    inlet.set_downstream_main(a)
+    a.set_downstream_main(b)
+    b.set_downstream_main(c)
+    c.set_downstream_main(b)
+    loop = plant_graph([inlet, a, b, c]).find_main_only_loop()
+    print(' ', [[inlet, a, b, c][i].__name__ for i in loop])
+    assert sorted(loop) == [2, 3]
+    # only the first unit used to be checked, which cannot reach the loop here
+    assert pfd._has_main_only_loops([effluent(), inlet, a, b, c])
+
+    print('LONG CHAIN WITHOUT RECURSION:')
+    chain = [influent()] + [pipe() for i in range(5000)] + [effluent()]
+    for up, down in zip(chain[:-1], chain[1:]):
+        up.set_downstream_main(down)
+    chain[0].set_mainstream_flow(100)
+    graph = plant_graph(chain)
+    run.forward_set_flow(chain, graph)
+    assert chain[-2].get_flow_data_src()[1] == flow_data_src.UPS
+    assert len(graph.bfs_order([0])) == len(chain)
+    assert len(graph.get_groups()) == len(chain)
+    print(' OK')
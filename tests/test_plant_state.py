@@ -0,0 +1,64 @@
+import context
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.plant_system import plant_system
+from PooPyLab.utils.plant_state import plant_state
+from test_plant_system import build_cmas
+
+
+def effluent_of(wwtp):
+    return pfd.get_all_units(wwtp, 'Effluent')[0].get_main_outlet_concs()
+
+
+if __name__ == '__main__':
+    SRT = 10
+
+    for solver in ('SM', 'Newton'):
+        print('REFERENCE (LIST BACKED UNITS), {}:'.format(solver))
+        ref = build_cmas()
+        pfd.check(ref)
+        assert run.get_steady_state(ref, target_SRT=SRT, solver=solver)['converged']
+        ref_eff = effluent_of(ref)
+        print(' OK')
+
+        print('BOUND PLANT, {}:'.format(solver))
+        wwtp = build_cmas()
+        pfd.check(wwtp)
+        state = plant_state(wwtp)
+        stats = run.get_steady_state(wwtp, target_SRT=SRT, solver=solver)
+        assert stats['converged']
+        eff = effluent_of(wwtp)
+        assert isinstance(eff, list)
+        assert np.allclose(eff, ref_eff, rtol=1e-9, atol=1e-9), (eff, ref_eff)
+        print(' OK')
+
+    print('VIEWS INTO ONE BUFFER:')
+    buf = state._buf
+    for u in wwtp:
+        for comps in (u._mo_comps, u._so_comps, u._in_comps):
+            assert isinstance(comps, np.ndarray) and np.shares_memory(comps, buf)
+    print(' OK')
+
+    print('STATE VECTOR LAYOUT:')
+    ps = plant_system(wwtp)
+    assert [(u, b) for u, b in state.get_branches()] == [(u, b) for u, b in ps._branches]
+    assert np.allclose(state.get_state(), ps.get_state())
+    print(' OK')
+
+    print('SNAPSHOT AND RESTORE:')
+    snap = state.snapshot()
+    x = state.get_state()
+    state.set_state(np.zeros_like(x))
+    assert not np.any(state.get_branch_comps())
+    state.restore(snap)
+    assert np.array_equal(state.get_state(), x)
+    assert np.allclose(effluent_of(wwtp), eff)
+    print(' OK')
+
+    print('RELEASE:')
+    state.release()
+    for u in wwtp:
+        assert isinstance(u._mo_comps, list) and isinstance(u._in_comps, list)
+    assert run.get_steady_state(wwtp, target_SRT=SRT, solver='Newton')['converged']
+    assert np.allclose(effluent_of(wwtp), ref_eff, rtol=1e-6, atol=1e-6)
+    print(' OK')
@@ -0,0 +1,80 @@
+import context
+import numpy as np
+from PooPyLab.unit_procs.streams import splitter, pipe, influent, effluent, WAS
+from PooPyLab.unit_procs.bio import asm_reactor
+from PooPyLab.unit_procs.physchem import final_clarifier
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.plant_system import plant_system
+
+
+def build_cmas():
+    # Inlet -> p1 -> ra -> p2 -> fc -> p3 -> outlet; fc -> p4 -> splt* -> RAS -> ra; splt* -> p5 -> waste
+    inlet, outlet, waste = influent(), effluent(), WAS()
+    p1, p2, p3, p4, p5, RAS = pipe(), pipe(), pipe(), pipe(), pipe(), pipe()
+    ra, fc, splt = asm_reactor(), final_clarifier(), splitter()
+    inlet.set_downstream_main(p1)
+    p1.set_downstream_main(ra)
+    ra.set_downstream_main(p2)
+    p2.set_downstream_main(fc)
+    fc.set_downstream_main(p3)
+    fc.set_downstream_side(p4)
+    p3.set_downstream_main(outlet)
+    p4.set_downstream_main(splt)
+    splt.set_downstream_main(RAS)
+    splt.set_downstream_side(p5)
+    splt.set_as_SRT_controller(True)
+    RAS.set_downstream_main(ra)
+    p5.set_downstream_main(waste)
+    inlet.set_mainstream_flow(37800)
+    splt.set_mainstream_flow(37800)
+    ra.set_model_condition(10, 2.0)
+    ra.set_active_vol(14000)
+    return [inlet, p1, p2, p3, p4, p5, ra, fc, outlet, RAS, waste, splt]
+
+
+if __name__ == '__main__':
+    SRT = 10
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+
+    stats = run.get_steady_state(wwtp, target_SRT=SRT, solver='Newton')
+    print('NEWTON:', stats)
+    assert stats['converged']
+
+    inlet, ra, fc, outlet, waste = [pfd.get_all_units(wwtp, t)[0]
+                                    for t in ('Influent', 'ASMReactor', 'FinalClarifier', 'Effluent', 'WAS')]
+
+    print('PLANT FLOW BALANCE:')
+    assert abs(outlet.get_main_outflow() + waste.get_main_outflow() - inlet.get_main_outflow()) < 1e-6
+    assert abs(fc.get_main_outflow() + fc.get_side_outflow() - fc.totalize_inflow()) < 1e-6
+    print(' OK')
+
+    print('TARGET SRT:')
+    srt = ra.get_TSS() * ra.get_active_vol() / (waste.get_TSS() * waste.get_main_outflow()
+                                                 + outlet.get_TSS() * outlet.get_main_outflow())
+    print(' SRT = {:.6f} d'.format(srt))
+    assert abs(srt - SRT) < 1e-6
+
+    print('REACTOR AT STEADY STATE:')
+    ra.update_combined_input()
+    dcdt = ra._sludge._dCdt(0, ra.get_main_outlet_concs(), ra.get_active_vol(), ra.totalize_inflow(),
+                            ra._in_comps, True, 10)
+    print(' max. |dC/dt| = {:.3e}'.format(np.max(np.abs(dcdt))))
+    assert np.max(np.abs(dcdt)) < 1e-4
+
+    print('SPARSE JACOBIAN:')
+    plant = plant_system(wwtp, SRT)
+    x = plant.initial_state()
+    dense = plant.dense_jacobian(x)
+    pattern = plant.jacobian_sparsity().toarray()
+    assert not np.any((dense != 0) & ~pattern)
+    colored = plant.jacobian(x).toarray()
+    print(' non-zeros = {} of {}, column groups = {}'.format(pattern.sum(), pattern.size,
+                                                             plant._col_groups.max() + 1))
+    print(' max. |J - J_dense| = {:.3e}'.format(np.max(np.abs(colored - dense))))
+    assert np.allclose(colored, dense, rtol=1e-4, atol=1e-4)
+
+    print('NON-SQUARE PFD IS REPORTED:')
+    splt = pfd.get_all_units(wwtp, 'Splitter')[0]
+    splt.set_sidestream_flow(500)
+    assert not plant_system(wwtp, SRT).is_ready()
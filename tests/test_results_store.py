@@ -0,0 +1,102 @@
+import context
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.flow_system import flow_system
+from PooPyLab.utils.results_store import results_store, results_reader, COLUMNS
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    tmp = tempfile.mkdtemp()
+    branches = [('Influent_1', 'Main'), ('Clarifier_1', 'Main'), ('Clarifier_1', 'Side')]
+    n = 2500
+    t = np.arange(n) / 1440.0
+    X = np.random.default_rng(5).uniform(0, 100, (n, len(branches), len(COLUMNS)))
+
+    print('WRITE IN CHUNKS:')
+    path = os.path.join(tmp, 'synthetic')
+    t0 = time.perf_counter()
+    with results_store(path, branches, chunk_len=1000) as store:
+        for k in range(n):
+            store(t[k], X[k])
+        t_append = time.perf_counter() - t0
+    print(' {} records appended in {:.3f} s'.format(n, t_append))
+    assert sorted(f for f in os.listdir(path) if f.startswith('x_')) == ['x_00000.dat', 'x_00001.dat', 'x_00002.dat']
+    # the last chunk is trimmed to its records
+    assert os.path.getsize(os.path.join(path, 'x_00002.dat')) == 500 * len(branches) * len(COLUMNS) * 8
+
+    print('READ BACK:')
+    res = results_reader(path)
+    assert len(res) == n and res.get_branches() == branches
+    assert np.array_equal(res.get_times(), t)
+    tt, xx = res.get()
+    assert np.array_equal(xx, X)
+    print(' OK')
+
+    print('EMPTY WINDOW:')
+    tt, xx = res.get(t_window=(10, 11))
+    assert tt.shape == (0,) and xx.shape == (0, len(branches), len(COLUMNS))
+    tt, nh = res.get('Clarifier_1', 'Side', 'S_NH', (10, 11))
+    assert nh.shape == (0,)
+    tt, sol = res.get('Influent_1', comps=['S_DO', 'S_NH'], t_window=(10, 11))
+    assert sol.shape == (0, 2)
+    tt, comp = res.get_composites(names=['TSS', 'TN'], t_window=(10, 11))
+    assert comp.shape == (0, len(branches), 2)
+    print(' OK')
+
+    print('WRITER ERROR IS RAISED:')
+    path = os.path.join(tmp, 'failed')
+    store = results_store(path, branches, chunk_len=10)
+    store(0.0, X[0])
+    store(1.0, X[0, :2])    # wrong shape, fails in the writer thread
+    try:
+        store.flush()
+        raise AssertionError('flush() did not raise')
+    except IOError as e:
+        assert 'failed' in str(e)
+    try:
+        store(2.0, X[0])
+        raise AssertionError('append() did not raise')
+    except IOError:
+        pass
+    with contextlib.redirect_stdout(io.StringIO()):
+        store.close()
+    print(' OK')
+
+    print('ZERO-COPY SLICES:')
+    tt, nh = res.get('Clarifier_1', 'Side', 'S_NH', (0.1, 0.5))
+    sel = (t >= 0.1) & (t <= 0.5)
+    assert np.array_equal(tt, t[sel]) and np.array_equal(nh, X[sel, 2, COLUMNS.index('S_NH')])
+    assert isinstance(nh, np.memmap) and not nh.flags['OWNDATA']
+    tt, sol = res.get('Influent_1', comps=['S_DO', 'S_I', 'S_S'], t_window=(1.0, 1.2))
+    assert isinstance(sol, np.memmap) and sol.shape[1] == 3
+    # across chunks, one view per chunk
+    parts = list(res.slices('Influent_1', comps='Q', t_window=(0.5, 1.5)))
+    assert len(parts) == 3 and all(isinstance(p[1], np.memmap) for p in parts)
+    assert np.array_equal(np.concatenate([p[1] for p in parts]), X[(t >= 0.5) & (t <= 1.5), 0, 0])
+    print(' OK')
+
+    print('DYNAMIC RUN INTO A STORE:')
+    wwtp = build_cmas()
+    pfd.check(wwtp)
+    with contextlib.redirect_stdout(io.StringIO()):
+        run.get_steady_state(wwtp, target_SRT=10, solver='Newton')
+    path = os.path.join(tmp, 'dynamic')
+    with results_store(path, flow_system(wwtp).get_branches(), chunk_len=10) as store:
+        stats = run.get_dynamic(wwtp, {}, (0, 1), 1/48, writer=store)
+    res = results_reader(path)
+    assert stats['success'] and len(res) == 49
+    assert res.get_branches() == [tuple(b) for b in stats['branches']]
+    outlet = pfd.get_all_units(wwtp, 'Effluent')[0]
+    tt, eff = res.get(outlet)
+    assert np.allclose(eff[-1, 1:], outlet.get_main_outlet_concs())
+    print(' OK, {} chunks'.format(len(res._chunks)))
+
+    del res, tt, nh, sol, parts, eff
+    shutil.rmtree(tmp, ignore_errors=True)
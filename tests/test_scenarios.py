@@ -0,0 +1,54 @@
+import context
+import contextlib
+import io
+import time
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.scenarios import run_scenarios, STATUS
+from test_plant_system import build_cmas
+
+
+if __name__ == '__main__':
+    table = {'SRT': [5, 8, 10, 12, 6, 10], 'temp': [10, 12, 15, 20, 10, 10], 'inf_flow': [37800, 30000, 40000,
+             37800, 37800, 37800], 'RAS_ratio': [1.0, 0.8, 1.0, 0.5, 1.0, 1.0]}
+
+    print('SERIAL:')
+    calls = []
+    t0 = time.perf_counter()
+    serial = run_scenarios(build_cmas, table, max_workers=0, progress=lambda d, n: calls.append((d, n)),
+                           solver='Newton')
+    print(' {:.2f} s'.format(time.perf_counter() - t0))
+    assert (serial['status'] == STATUS.index('ok')).all() and calls[-1] == (6, 6)
+    assert serial['effluent'].shape == (6, 13) and np.array_equal(serial['SRT'], table['SRT'])
+
+    print('SAME AS ONE PLANT SOLVED DIRECTLY:')
+    wwtp = build_cmas()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+        wwtp[0].set_mainstream_flow(30000)
+        wwtp[-1].set_mainstream_flow(0.8 * 30000)
+        wwtp[6].set_model_condition(12, 2.0)
+        run.get_steady_state(wwtp, 8, solver='Newton', show=False)
+    eff = pfd.get_all_units(wwtp, 'Effluent')[0]
+    assert np.allclose(serial['effluent'][1], eff.get_main_outlet_concs(), rtol=1e-6, atol=1e-8)
+    # the design conditions are back between scenarios
+    wwtp = build_cmas()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+        run.get_steady_state(wwtp, 10, solver='Newton', show=False)
+    eff = pfd.get_all_units(wwtp, 'Effluent')[0]
+    assert np.allclose(serial['effluent'][5], eff.get_main_outlet_concs(), rtol=1e-6, atol=1e-8)
+    print(' OK')
+
+    print('PROCESS POOL:')
+    t0 = time.perf_counter()
+    pooled = run_scenarios(build_cmas, table, max_workers=2, chunk_size=2, solver='Newton')
+    print(' {:.2f} s'.format(time.perf_counter() - t0))
+    assert np.array_equal(pooled['status'], serial['status'])
+    assert np.allclose(pooled['effluent'], serial['effluent'], rtol=1e-9, atol=1e-12)
+
+    print('TIMEOUT:')
+    rows = np.array([[10, 10], [12, 10]])
+    timed = run_scenarios(build_cmas, rows, columns=['SRT', 'temp'], max_workers=1, timeout=1e-3, solver='SM')
+    assert (timed['status'] == STATUS.index('timeout')).all() and np.isnan(timed['effluent']).all()
+    print(' OK')
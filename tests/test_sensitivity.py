@@ -0,0 +1,77 @@
+import context
+import time
+import numpy as np
+from PooPyLab.utils.sensitivity import morris, sobol, morris_sample, morris_indices, saltelli_sample, sobol_indices
+from PooPyLab.utils.sensitivity import default_bounds, _cross_samples
+from PooPyLab.utils.scenarios import scenario_runner, STATUS
+from PooPyLab.utils.monte_carlo import kinetic_setters
+from test_plant_system import build_cmas
+
+
+def ishigami(x):
+    return np.sin(x[..., 0]) + 7 * np.sin(x[..., 1]) ** 2 + 0.1 * x[..., 2] ** 4 * np.sin(x[..., 0])
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(3)
+
+    print('MORRIS OF A KNOWN FUNCTION:')
+    points, order, steps = morris_sample(4, 20, 4, rng)
+    assert points.min() >= 0 and points.max() <= 1
+    # every step moves one parameter
+    assert (np.count_nonzero(np.diff(points, axis=1), axis=2) == 1).all()
+    coef = np.array([1.0, -2.0, 0.0, 0.5])
+    y = (points @ coef + 3 * points[..., 0] * points[..., 3])[..., None]
+    mu, mu_star, sigma = morris_indices(y, order, steps)
+    # x0 and x3 interact, the others are linear
+    assert np.allclose(mu_star[1:3, 0], [2, 0]) and mu_star[0, 0] > 1 and mu_star[3, 0] > 0.5
+    assert np.isclose(mu[1, 0], -2) and mu_star[2, 0] == 0 and sigma[1, 0] < 1e-9 and sigma[3, 0] > 0.1
+    print(' OK')
+
+    print('SOBOL OF THE ISHIGAMI FUNCTION:')
+    A, B = saltelli_sample(3, 4000, rng)
+    assert A.shape == (4096, 3)
+    groups = -np.pi + 2 * np.pi * _cross_samples(A, B)
+    f = ishigami(groups)[..., None]
+    S1, ST, S1_conf, ST_conf = sobol_indices(f[:, 0], f[:, -1], f[:, 1:-1], 100, rng)
+    print(' S1 = {}, ST = {}'.format(np.round(S1[:, 0], 3), np.round(ST[:, 0], 3)))
+    assert np.allclose(S1[:, 0], [0.314, 0.442, 0.0], atol=0.03)
+    assert np.allclose(ST[:, 0], [0.558, 0.442, 0.244], atol=0.03)
+    assert (S1_conf > 0).all() and (S1_conf < 0.1).all()
+    print(' OK')
+
+    print('WARM STARTS ALONG A TRAJECTORY:')
+    bounds = default_bounds(['u_max_A', 'K_NH', 'Y_H', 'b_LH'])
+    names = list(bounds)
+    lo, hi = (np.array([bounds[n][j] for n in names]) for j in (0, 1))
+    points, order, steps = morris_sample(len(names), 2, 4, np.random.default_rng(0))
+    rows = lo + points.reshape(-1, len(names)) * (hi - lo)
+    with scenario_runner(build_cmas, kinetic_setters(names), max_workers=0, outputs=('get_TN', 'get_TSS'),
+                         solver='Newton', target_SRT=10) as runner:
+        cold = runner.run(rows, names, chunk_size=len(names) + 1)
+        warm = runner.run(rows, names, chunk_size=len(names) + 1, warm_start=True)
+    assert (cold['status'] == STATUS.index('ok')).all() and (warm['status'] == STATUS.index('ok')).all()
+    print(' iterations: cold {}, warm {}'.format(cold['iterations'].sum(), warm['iterations'].sum()))
+    assert warm['iterations'].sum() < cold['iterations'].sum()
+    assert np.allclose(warm['outputs'], cold['outputs'], rtol=1e-6)
+    assert np.allclose(cold['outputs'][:, 0], cold['effluent'][:, [3, 4, 5, 12]].sum(axis=1))
+    print(' OK')
+
+    print('MORRIS OF THE PLANT:')
+    t0 = time.perf_counter()
+    res = morris(build_cmas, bounds, num_trajectories=4, max_workers=0, solver='Newton', target_SRT=10)
+    print(' {} evaluations, {} failed, {:.2f} s'.format(res['evaluations'], res['failed'], time.perf_counter() - t0))
+    assert res['evaluations'] == 4 * 5 and res['failed'] == 0
+    for k, p in enumerate(res['params']):
+        print(' {:8s} mu* TN {:7.3f}  TSS {:7.3f}'.format(p, *res['mu_star'][k]))
+    # the nitrifier growth rate matters to the TN
+    assert res['mu_star'][names.index('u_max_A'), 0] > 0
+
+    print('SOBOL OF THE PLANT, POOLED:')
+    t0 = time.perf_counter()
+    res = sobol(build_cmas, bounds, num_samples=8, max_workers=2, solver='Newton', target_SRT=10)
+    print(' {} evaluations, {} failed, {:.2f} s'.format(res['evaluations'], res['failed'], time.perf_counter() - t0))
+    assert res['evaluations'] == 8 * 6 and res['S1'].shape == (4, 2) and np.isfinite(res['ST']).all()
+    for k, p in enumerate(res['params']):
+        print(' {:8s} ST TN {:7.3f}  TSS {:7.3f}'.format(p, *res['ST'][k]))
+    print(' OK')
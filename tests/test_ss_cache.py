@@ -0,0 +1,84 @@
+import context
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import numpy as np
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.ss_cache import steady_state_cache, describe
+from test_plant_system import build_cmas
+
+
+def solve(wwtp, cache, SRT=10, solver='SM'):
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+        stats = run.get_steady_state(wwtp, target_SRT=SRT, solver=solver, accel='Anderson', cache=cache)
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    return stats, np.array(ra.get_main_outlet_concs())
+
+
+if __name__ == '__main__':
+    tmp = tempfile.mkdtemp()
+    cache = steady_state_cache(os.path.join(tmp, 'cache'), max_entries=3)
+
+    print('SAME PLANT BUILT TWICE, SAME KEY:')
+    a, b = build_cmas(), build_cmas()
+    for w in (a, b):
+        with contextlib.redirect_stdout(io.StringIO()):
+            pfd.check(w)
+    assert a[0].get_codename() != b[0].get_codename()
+    assert describe(a, 10)[0] == describe(b, 10)[0]
+    assert describe(a, 10)[0] != describe(a, 12)[0] and describe(a, 10)[1] == describe(a, 12)[1]
+    print(' OK')
+
+    print('MISS, THEN EXACT HIT:')
+    solved = build_cmas()
+    stats, ref = solve(solved, cache)
+    assert stats['cache'] == 'miss' and stats['converged'] and len(cache) == 1
+    wwtp = build_cmas()
+    stats, hit = solve(wwtp, cache)
+    assert stats['cache'] == 'exact' and stats['iterations'] == 0
+    assert np.allclose(hit, ref)
+    waste = pfd.get_all_units(wwtp, 'WAS')[0]
+    assert waste.get_main_outflow() > 0
+    print(' {:.4f} s'.format(stats['wall_time']))
+
+    print('NEAR HIT SEEDS THE INITIAL GUESS:')
+    cold_cache = steady_state_cache(os.path.join(tmp, 'cold'))
+    cold, _ = solve(build_cmas(), cold_cache, SRT=11)
+    assert cold['cache'] == 'miss'
+    warm, warm_concs = solve(build_cmas(), cache, SRT=11)
+    assert warm['cache'] == 'near' and warm['converged']
+    print(' SM passes: cold {}, seeded {}'.format(cold['iterations'], warm['iterations']))
+    assert warm['iterations'] < cold['iterations']
+
+    print('OTHER KINETICS, NO HIT:')
+    wwtp = build_cmas()
+    wwtp[6].set_model_condition(25, 2.0)
+    stats, _ = solve(wwtp, cache, solver='Newton')
+    assert stats['cache'] == 'miss'
+    print(' OK')
+
+    print('LEAST RECENTLY USED EVICTED:')
+    assert len(cache) == 3
+    # the influents have been discharged by the solver
+    key_10, key_11 = describe(solved, 10)[0], describe(solved, 11)[0]
+    solve(build_cmas(), cache, SRT=10)
+    solve(build_cmas(), cache, SRT=30)
+    assert len(cache) == 3 and key_10 in cache._index
+    assert not os.path.exists(os.path.join(tmp, 'cache', key_11 + '.npy'))
+    # the index survives on disk
+    assert set(steady_state_cache(os.path.join(tmp, 'cache'))._index) == set(cache._index)
+    print(' OK')
+
+    print('NEAR HIT IS QUIET W/O SHOW:')
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        wwtp = build_cmas()
+        pfd.check(wwtp)
+        stats = run.get_steady_state(wwtp, target_SRT=11, solver='Newton', cache=cache, show=False)
+    assert stats['cache'] == 'near' and 'Initial guess' not in out.getvalue()
+    print(' OK')
+
+    shutil.rmtree(tmp, ignore_errors=True)
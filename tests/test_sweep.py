@@ -0,0 +1,61 @@
+import context
+import contextlib
+import io
+import time
+import numpy as np
+from PooPyLab.utils import pfd, run
+from test_plant_system import build_cmas
+
+
+def checked(wwtp):
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+    return wwtp
+
+
+if __name__ == '__main__':
+    # longer SRTs need a negative WAS flow w/ the effluent solids of this plant
+    srts = [20, 3, 4, 5, 6, 8, 10, 12, 15, 18]
+    # outward from the median
+    order = [10, 12, 15, 18, 20, 8, 6, 5, 4, 3]
+
+    for solver in ('SM', 'Newton'):
+        print('{} SOLVER, SRT SWEEP:'.format(solver))
+        accel = 'Anderson' if solver == 'SM' else None
+        cold = []
+        t0 = time.perf_counter()
+        for srt in order:
+            wwtp = checked(build_cmas())
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = run.get_steady_state(wwtp, target_SRT=srt, solver=solver, accel=accel, show=False)
+            eff = pfd.get_all_units(wwtp, 'Effluent')[0]
+            cold.append((stats['iterations'], eff.get_main_outlet_concs()))
+        t_cold = time.perf_counter() - t0
+
+        wwtp = checked(build_cmas())
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            table = run.sweep_steady_state(wwtp, srts, solver=solver, accel=accel)
+        t_warm = time.perf_counter() - t0
+
+        assert list(table['SRT']) == order and table['converged'].all()
+        assert table['effluent'].shape == (len(srts), 13) and len(table['states']) == len(srts)
+        for (it, conc), row in zip(cold, table['effluent']):
+            assert np.allclose(row, conc, rtol=1e-2, atol=1e-2)
+        print(' iterations: from scratch {}, warm started {}'.format(sum(c[0] for c in cold),
+                                                                     table['iterations'].sum()))
+        print(' wall time: from scratch {:.2f} s, warm started {:.2f} s'.format(t_cold, t_warm))
+        assert table['iterations'].sum() < sum(c[0] for c in cold)
+
+    print('SRT x TEMPERATURE:')
+    wwtp = checked(build_cmas())
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    with contextlib.redirect_stdout(io.StringIO()):
+        table = run.sweep_steady_state(wwtp, [5, 10, 20], temps=[20, 12], solver='Newton')
+    assert list(table['temp']) == [12] * 3 + [20] * 3 and list(table['SRT']) == [10, 20, 5, 10, 20, 5]
+    assert table['converged'].all()
+    # warmer, more nitrification
+    nh = table['effluent'][:, 3]
+    assert np.all(nh[3:] < nh[:3])
+    assert ra._sludge._temperature == 10
+    print(' OK')
@@ -0,0 +1,81 @@
+import context
+import contextlib
+import io
+import time
+import numpy as np
+from PooPyLab.ASMModel import asm_1
+from PooPyLab.utils import pfd, run
+from PooPyLab.utils.plant_dynamics import plant_dynamics, interp_temperatures
+from test_plant_system import build_cmas
+
+
+def solved_cmas():
+    wwtp = build_cmas()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pfd.check(wwtp)
+        run.get_steady_state(wwtp, target_SRT=10, solver='Newton', show=False)
+    return wwtp
+
+
+if __name__ == '__main__':
+    print('CLOSED FORM PARAMETERS:')
+    sludge = asm_1.ASM_1(20, 2)
+    p20 = sludge.get_param_vector_20C()
+    temps = np.array([8.0, 12.5, 20.0, 27.3])
+    table = asm_1.params_at_temperature(p20, temps)
+    assert table.shape == (4, 19)
+    for T, row in zip(temps, table):
+        assert np.allclose(row, asm_1.ASM_1(T, 2).get_param_vector(), rtol=1e-14, atol=0)
+    # (times, reactors) of temperatures w/ a row of parameters per reactor
+    stacked = asm_1.params_at_temperature(np.vstack([p20, 2 * p20]), temps[:, None] + [0.0, 1.0])
+    assert stacked.shape == (4, 2, 19) and np.allclose(stacked[2, 1], 2 * asm_1.ASM_1(21, 2).get_param_vector())
+    t0 = time.perf_counter()
+    asm_1.params_at_temperature(p20, np.linspace(5, 25, 8760))
+    print(' {:.2f} ms for a year of hourly temperatures'.format(1000 * (time.perf_counter() - t0)))
+    print(' OK')
+
+    print('STOICHIOMETRICS ONLY SET AGAIN WHEN THEY CHANGE:')
+    mat = sludge._stoich_mat
+    sludge.update(11.0, 2.0)
+    assert sludge._stoich_mat is mat
+    sludge.alter_kinetic_20C('Y_H', 0.6)
+    sludge.update(11.0, 2.0)
+    assert sludge._stoich_mat is not mat and np.isclose(sludge.get_stoichs()['0_2'], -1.0 / 0.6)
+    print(' OK')
+
+    print('CONSTANT PROFILE AT THE REACTOR TEMPERATURE:')
+    wwtp = solved_cmas()
+    plain = run.get_dynamic(wwtp, {}, (0, 2), 0.5)
+    wwtp = solved_cmas()
+    profiled = run.get_dynamic(wwtp, {}, (0, 2), 0.5, temp_series=lambda t: 10.0)
+    assert np.array_equal(plain['results'], profiled['results'])
+    print(' OK')
+
+    print('STEP TO 15C:')
+    wwtp = solved_cmas()
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    ra.set_model_condition(15, 2.0)
+    warm = run.get_dynamic(wwtp, {}, (0, 5), 0.5)
+    wwtp = solved_cmas()
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    stepped = run.get_dynamic(wwtp, {}, (0, 5), 0.5, temp_series=([0, 5], [15, 15]))
+    assert np.allclose(warm['results'], stepped['results'], rtol=1e-12, atol=1e-12)
+    assert ra._sludge._temperature == 15.0
+    print(' OK')
+
+    print('DIURNAL TEMPERATURE:')
+    wwtp = solved_cmas()
+    ra = pfd.get_all_units(wwtp, 'ASMReactor')[0]
+    t = np.linspace(0, 3, 3 * 24 + 1)
+    T = 10 + 3 * np.sin(2 * np.pi * t)
+    profile = interp_temperatures(t, T)
+    assert np.isclose(profile(0.25)[0], 13.0)
+    dyn = plant_dynamics(wwtp, temp_series=(t, T))
+    y = dyn.get_reactor_state()
+    dyn.dydt(0.25, y)
+    assert np.allclose(dyn._reac_params[0], asm_1.ASM_1(13.0, 2).get_param_vector())
+    stats = run.get_dynamic(wwtp, {}, (0, 3), 1 / 24, temp_series=(t, T))
+    nh = stats['results'][:, [b for b, (u, br) in enumerate(stats['branches']) if u == ra.__name__][0], 4]
+    print(' {} steps, NH3-N {:.3f} to {:.3f} mg/L'.format(stats['steps'], nh.min(), nh.max()))
+    assert stats['success'] and nh.max() > nh.min()
+    print(' OK')